@@ -49,14 +49,23 @@ async def query_faq(request: QueryRequest):
     return results
 
 
-@router.post("/update-index")
+@router.post("/update-index", status_code=202)
 async def update_faq_index():
     """
-    触发知识库的热更新。
-    系统将从 data/faqs.csv 重新加载并建立索引。
+    触发知识库的增量热更新（后台执行）。
+    系统将从 data/faqs.csv 读取 FAQ，只向量化新增/变化的条目，在影子集合中构建后原子切换；
+    更新期间 /query 继续使用旧集合。返回的 job_id 可用于轮询任务状态。
     """
-    try:
-        result = index_manager.update_index()
-        return {"status": "success", "message": result["message"]}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"索引更新失败: {str(e)}")
+    job = index_manager.start_update_job()
+    return {"status": job["status"], "job_id": job["job_id"]}
+
+
+@router.get("/update-index/{job_id}")
+async def get_update_status(job_id: str):
+    """
+    查询索引更新任务状态：pending / running / succeeded / failed。
+    """
+    job = index_manager.get_update_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
@@ -39,5 +39,9 @@ INDEX_DIR = "vector_index" # Milvus Lite 数据将存储在这里
 MILVUS_HOST = "localhost"
 MILVUS_PORT = "19530"
 MILVUS_URI = "./milvus_demo.db" # Milvus Lite 使用本地文件
-COLLECTION_NAME = "faq_collection"
+COLLECTION_NAME = "faq_collection" # 对外的 alias 名；物理集合为 faq_collection_<时间戳>
 DIMENSION = 1536 # 通义千问 text-embedding-v2 模型的维度
+
+# --- 增量更新配置 ---
+UPDATE_BATCH_SIZE = 100 # 复制旧向量/向量化新条目的批大小
+OLD_COLLECTION_GRACE_SECONDS = 10 # 切换后延迟删除旧集合的秒数
@@ -1,32 +1,67 @@
 import os
+import json
+import time
+import uuid
+import hashlib
+import threading
 import pandas as pd
 from llama_index.core import (
     VectorStoreIndex,
     StorageContext,
-    Document,
 )
+from llama_index.core.schema import TextNode, MetadataMode
 from llama_index.vector_stores.milvus import MilvusVectorStore
-from llama_index.core.node_parser import SemanticSplitterNodeParser
 from . import config
 
 
 # 使用单例模式确保全局只有一个 IndexManager 实例
 _query_engine = None
 _index = None
+_active_collection = None
 
+# 后台更新任务：同一时间只运行一个
+_jobs = {}
+_job_lock = threading.Lock()
+_running_job_id = None
+
+# 当前生效集合的指针文件（Milvus Lite 不支持 alias 时以它为准）
+ACTIVE_POINTER_FILE = os.path.join(config.INDEX_DIR, "active_collection.json")
+
+
+def _load_active_collection() -> str:
+    """读取当前生效的物理集合名，没有记录时沿用旧版本的固定集合名"""
+    if os.path.exists(ACTIVE_POINTER_FILE):
+        with open(ACTIVE_POINTER_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)["collection"]
+    return config.COLLECTION_NAME
+
+
+def _save_active_collection(collection_name: str):
+    """原子写入指针文件：先写临时文件再 os.replace"""
+    os.makedirs(config.INDEX_DIR, exist_ok=True)
+    tmp_file = ACTIVE_POINTER_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({"collection": collection_name, "updated_at": time.time()}, f)
+    os.replace(tmp_file, ACTIVE_POINTER_FILE)
 
-def _initialize_index():
-    """内部函数，用于初始化或加载索引"""
-    global _index, _query_engine
 
-    print("正在初始化 Milvus 向量存储...")
-    vector_store = MilvusVectorStore(
+def _open_vector_store(collection_name: str, overwrite: bool = False) -> MilvusVectorStore:
+    return MilvusVectorStore(
         uri=config.MILVUS_URI,
-        collection_name=config.COLLECTION_NAME,
+        collection_name=collection_name,
         dim=config.DIMENSION,
-        overwrite=False,  # 设置为 False 以便重用现有集合
+        overwrite=overwrite,
     )
-    
+
+
+def _initialize_index():
+    """内部函数，用于初始化或加载索引"""
+    global _index, _query_engine, _active_collection
+
+    _active_collection = _load_active_collection()
+    print(f"正在初始化 Milvus 向量存储（集合: {_active_collection}）...")
+    vector_store = _open_vector_store(_active_collection, overwrite=False)  # 重用现有集合
+
     storage_context = StorageContext.from_defaults(vector_store=vector_store)
 
     if not os.path.exists(config.FAQ_FILE):
@@ -52,26 +87,36 @@ def _initialize_index():
     print("索引和查询引擎初始化完成。")
 
 
-def _build_index_from_file(storage_context: StorageContext) -> VectorStoreIndex:
-    """从 CSV 文件构建索引"""
-    print(f"从文件 {config.FAQ_FILE} 构建新索引...")
+def faq_hash(question: str, answer: str) -> str:
+    """FAQ 的稳定哈希，作为节点 ID；问题或答案变化即视为新条目"""
+    return hashlib.sha1(f"{question}\n{answer}".encode("utf-8")).hexdigest()
+
+
+def _load_faq_nodes() -> list:
+    """
+    读取 CSV，每条 FAQ 构建一个节点。
+    FAQ 本身就是最小的检索单元，整条保留也保证 /query 能解析出"问题/答案"两部分。
+    """
     df = pd.read_csv(config.FAQ_FILE)
-    documents = []
+    nodes = {}
     for _, row in df.iterrows():
-        doc_text = f"问题: {row['question']}\n答案: {row['answer']}"
-        documents.append(Document(text=doc_text, metadata={"question": row['question']}))
+        node_id = faq_hash(str(row['question']), str(row['answer']))
+        nodes[node_id] = TextNode(
+            id_=node_id,
+            text=f"问题: {row['question']}\n答案: {row['answer']}",
+            metadata={"question": row['question']},
+        )
+    return list(nodes.values())
 
-    # 使用语义切分器优化文档切片
-    splitter = SemanticSplitterNodeParser.from_defaults(
-        embed_model=config.EMBED_MODEL
-    )
-    
-    index = VectorStoreIndex.from_documents(
-        documents,
+
+def _build_index_from_file(storage_context: StorageContext) -> VectorStoreIndex:
+    """从 CSV 文件构建索引"""
+    print(f"从文件 {config.FAQ_FILE} 构建新索引...")
+    return VectorStoreIndex(
+        _load_faq_nodes(),
         storage_context=storage_context,
-        transformations=[splitter]
+        embed_model=config.EMBED_MODEL,
     )
-    return index
 
 
 def get_query_engine():
@@ -81,29 +126,157 @@ def get_query_engine():
     return _query_engine
 
 
-def update_index():
+def _list_ids(client, collection_name: str) -> set:
+    """列出集合中的全部主键（节点 ID）"""
+    if not client.has_collection(collection_name):
+        return set()
+    ids = set()
+    iterator = client.query_iterator(
+        collection_name=collection_name,
+        batch_size=config.UPDATE_BATCH_SIZE,
+        filter='id != ""',
+        output_fields=["id"],
+    )
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            ids.update(row["id"] for row in rows)
+    finally:
+        iterator.close()
+    return ids
+
+
+def _swap_alias(client, collection_name: str):
+    """让对外的 alias 指向新集合；Milvus Lite 不支持 alias 时跳过，以指针文件为准"""
+    try:
+        try:
+            client.alter_alias(collection_name=collection_name, alias=config.COLLECTION_NAME)
+        except Exception:
+            client.create_alias(collection_name=collection_name, alias=config.COLLECTION_NAME)
+    except Exception as e:
+        print(f"alias 切换跳过（{e}），以指针文件为准。")
+
+
+def update_index(progress=None) -> dict:
     """
-    热更新索引。
-    这将清空现有集合并从文件中重新构建索引。
+    增量热更新索引。
+    1. 按 FAQ 哈希与当前生效集合做差集，只向量化新增/变化的条目
+    2. 在影子集合中构建：未变化的条目直接复制原有向量，新条目分批向量化后写入
+    3. 构建完成后先把 alias 切到影子集合，再原子切换查询引擎和指针文件
+    4. 宽限期后删除旧集合；删除失败只记录日志，不影响本次更新结果
+    整个过程中 /query 始终使用旧集合，不会看到空集合。
     """
-    global _index, _query_engine
-    print("开始热更新索引...")
-    
-    # 创建一个新的 Milvus 存储，并设置 overwrite=True 来清空旧集合
-    vector_store = MilvusVectorStore(
-        uri=config.MILVUS_URI,
-        collection_name=config.COLLECTION_NAME,
-        dim=config.DIMENSION,
-        overwrite=True, 
-    )
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-    
-    # 从文件重新构建索引
-    _index = _build_index_from_file(storage_context)
-    _query_engine = _index.as_query_engine(similarity_top_k=3)
-    
-    print("索引热更新完成。")
-    return {"message": "索引已成功更新。"}
+    global _index, _query_engine, _active_collection
+    report = progress or (lambda **kwargs: None)
+    print("开始增量更新索引...")
+
+    if _query_engine is None:
+        _initialize_index()
+    old_collection = _active_collection
+    old_store = _open_vector_store(old_collection)
+    client = old_store.client
+
+    nodes = _load_faq_nodes()
+    live_ids = _list_ids(client, old_collection)
+    kept_ids = [node.node_id for node in nodes if node.node_id in live_ids]
+    new_nodes = [node for node in nodes if node.node_id not in live_ids]
+    stats = {
+        "total": len(nodes),
+        "unchanged": len(kept_ids),
+        "added": len(new_nodes),
+        "removed": len(live_ids) - len(kept_ids),
+    }
+    report(stage="diff", **stats)
+    print(f"差异统计: {stats}")
+    if not new_nodes and not stats["removed"]:
+        return {"message": "FAQ 没有变化，无需更新。", **stats}
+
+    # 影子集合：新建物理集合，旧集合继续对外服务
+    shadow_collection = f"{config.COLLECTION_NAME}_{int(time.time())}"
+    try:
+        shadow_store = _open_vector_store(shadow_collection, overwrite=True)
+
+        # 未变化的条目按原样复制（含向量和全部字段），不重新调用嵌入模型
+        for start in range(0, len(kept_ids), config.UPDATE_BATCH_SIZE):
+            rows = client.get(collection_name=old_collection,
+                              ids=kept_ids[start:start + config.UPDATE_BATCH_SIZE], output_fields=["*"])
+            client.insert(collection_name=shadow_collection, data=rows)
+            report(stage="copy", done=min(start + config.UPDATE_BATCH_SIZE, len(kept_ids)), **stats)
+
+        # 新增/变化的条目分批向量化
+        for start in range(0, len(new_nodes), config.UPDATE_BATCH_SIZE):
+            batch = new_nodes[start:start + config.UPDATE_BATCH_SIZE]
+            embeddings = config.EMBED_MODEL.get_text_embedding_batch(
+                [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+            )
+            for node, embedding in zip(batch, embeddings):
+                node.embedding = embedding
+            shadow_store.add(batch)
+            report(stage="embed", done=min(start + config.UPDATE_BATCH_SIZE, len(new_nodes)), **stats)
+        client.flush(collection_name=shadow_collection)
+
+        new_index = VectorStoreIndex.from_vector_store(vector_store=shadow_store)
+        new_engine = new_index.as_query_engine(similarity_top_k=3)
+    except Exception:
+        # 构建失败时删除未完成的影子集合，避免每次失败都残留一个集合
+        if shadow_collection != old_collection and client.has_collection(shadow_collection):
+            client.drop_collection(shadow_collection)
+        raise
+
+    # 先切 alias：第二次更新起旧集合仍持有 alias，不先移走的话 Milvus 会拒绝删除旧集合
+    _swap_alias(client, shadow_collection)
+    # 原子切换：替换进程内的查询引擎，再更新指针文件
+    _index, _query_engine, _active_collection = new_index, new_engine, shadow_collection
+    _save_active_collection(shadow_collection)
+    # 留出宽限期，让切换前已拿到旧查询引擎的请求执行完再删除旧集合
+    time.sleep(config.OLD_COLLECTION_GRACE_SECONDS)
+    try:
+        if old_collection != shadow_collection and client.has_collection(old_collection):
+            client.drop_collection(old_collection)
+    except Exception as e:
+        # 新集合已生效，旧集合删除失败只会残留一个集合，不把更新标记为失败
+        print(f"删除旧集合 {old_collection} 失败（{e}），请稍后手动清理。")
+
+    print(f"索引增量更新完成，当前集合: {shadow_collection}")
+    return {"message": "索引已成功更新。", "collection": shadow_collection, **stats}
+
+
+def start_update_job() -> dict:
+    """在后台线程中执行 update_index，已有任务运行时直接返回该任务"""
+    global _running_job_id
+    with _job_lock:
+        if _running_job_id is not None:
+            return _jobs[_running_job_id]
+        job_id = uuid.uuid4().hex
+        job = {"job_id": job_id, "status": "pending", "created_at": time.time(),
+               "finished_at": None, "progress": {}, "result": None, "error": None}
+        _jobs[job_id] = job
+        _running_job_id = job_id
+
+    def run():
+        global _running_job_id
+        job["status"] = "running"
+        try:
+            job["result"] = update_index(progress=lambda **kwargs: job["progress"].update(kwargs))
+            job["status"] = "succeeded"
+        except Exception as e:
+            print(f"索引更新失败: {e}")
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = time.time()
+            with _job_lock:
+                _running_job_id = None
+
+    threading.Thread(target=run, name=f"faq-update-{job_id[:8]}", daemon=True).start()
+    return job
+
+
+def get_update_job(job_id: str):
+    """查询后台更新任务状态，不存在时返回 None"""
+    return _jobs.get(job_id)
 
 
 # 在模块加载时自动初始化
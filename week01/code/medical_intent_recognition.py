@@ -5,8 +5,9 @@
 
 import json
 import re
-from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
+from collections import deque
+from typing import Dict, List, Tuple, Optional, Iterable, Set
+from dataclasses import dataclass, replace
 from enum import Enum
 
 class UrgencyLevel(Enum):
@@ -37,6 +38,65 @@ class MedicalResponse:
     suggestions: List[str]
     follow_up_questions: List[str]
 
+class KeywordAutomaton:
+    """关键词自动机（Aho-Corasick）
+
+    把多张关键词表编译成一个自动机，对输入只扫描一遍，
+    就能得到所有命中的类别标签，耗时与关键词总数无关。
+    判断结果与逐个 `keyword in text` 完全一致。
+    """
+
+    def __init__(self, tables: Iterable[Tuple[str, List[str]]]):
+        """
+        Args:
+            tables: (类别标签, 关键词列表) 序列，同一个关键词可以属于多个标签
+        """
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.labels: List[Set[str]] = [set()]
+        self.empty_labels: Set[str] = set()  # 含空字符串关键词的标签，任何输入都命中
+
+        # 1. 构建字典树
+        for label, keywords in tables:
+            for keyword in keywords:
+                if not keyword:
+                    self.empty_labels.add(label)
+                    continue
+                node = 0
+                for ch in keyword:
+                    if ch not in self.goto[node]:
+                        self.goto.append({})
+                        self.fail.append(0)
+                        self.labels.append(set())
+                        self.goto[node][ch] = len(self.goto) - 1
+                    node = self.goto[node][ch]
+                self.labels[node].add(label)
+
+        # 2. 广度优先计算失败指针，并沿失败指针合并标签
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(ch, 0)
+                self.labels[child] = self.labels[child] | self.labels[self.fail[child]]
+
+    def scan(self, text: str) -> Set[str]:
+        """扫描一遍文本，返回所有命中的类别标签"""
+        hits = set(self.empty_labels)
+        node = 0
+        goto, fail, labels = self.goto, self.fail, self.labels
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if labels[node]:
+                hits |= labels[node]
+        return hits
+
 class MedicalIntentRecognizer:
     """医疗意图识别器"""
     
@@ -218,25 +278,56 @@ class PromptTemplateManager:
 class MedicalDialogueManager:
     """医疗对话管理器"""
     
+    # 意图关键词表，按优先级排列：命中多个意图时取排在前面的
+    INTENT_KEYWORDS: List[Tuple[IntentType, List[str]]] = [
+        (IntentType.SYMPTOM_INQUIRY, ["疼", "痛", "不舒服", "症状"]),
+        (IntentType.APPOINTMENT_BOOKING, ["挂号", "预约", "看医生"]),
+        (IntentType.DEPARTMENT_RECOMMENDATION, ["科室", "哪个科"]),
+        (IntentType.EMERGENCY_ASSESSMENT, ["紧急", "急诊", "严重"]),
+        (IntentType.MEDICATION_INQUIRY, ["药", "吃什么药"]),
+    ]
+    
+    # 提升紧急程度的关键词
+    EMERGENCY_KEYWORDS = ["剧烈", "严重", "急性", "突然", "无法忍受"]
+    
     def __init__(self):
         self.recognizer = MedicalIntentRecognizer()
         self.prompt_manager = PromptTemplateManager()
         self.conversation_history = []
+        self.compile_keywords()
+    
+    def compile_keywords(self):
+        """把意图、紧急、症状三张关键词表编译进同一个自动机
+        
+        扩展 symptom_keywords 或上面的关键词表后需要重新调用
+        """
+        tables = [(f"intent:{intent.name}", keywords) for intent, keywords in self.INTENT_KEYWORDS]
+        tables.append(("urgency:emergency", self.EMERGENCY_KEYWORDS))
+        tables.extend((f"symptom:{symptom}", keywords)
+                      for symptom, keywords in self.recognizer.symptom_keywords.items())
+        self.keyword_automaton = KeywordAutomaton(tables)
+    
+    def _scan(self, user_input: str) -> Set[str]:
+        """一次扫描得到输入命中的全部类别标签"""
+        return self.keyword_automaton.scan(user_input)
         
     def process_user_input(self, user_input: str) -> MedicalResponse:
         """处理用户输入并返回医疗响应"""
         
+        # 0. 关键词扫描：意图、症状、紧急关键词一次扫描全部得到
+        hits = self._scan(user_input)
+        
         # 1. 意图识别
-        intent = self._classify_intent(user_input)
+        intent = self._classify_intent(user_input, hits)
         
         # 2. 症状提取
-        symptoms = self._extract_symptoms(user_input)
+        symptoms = self._extract_symptoms(user_input, hits)
         
         # 3. 科室推荐
         department = self._recommend_department(symptoms)
         
         # 4. 紧急程度评估
-        urgency = self._assess_urgency(symptoms, user_input)
+        urgency = self._assess_urgency(symptoms, user_input, hits)
         
         # 5. 生成分析和建议
         analysis = self._generate_analysis(symptoms, user_input)
@@ -245,19 +336,7 @@ class MedicalDialogueManager:
         # 6. 生成后续问题
         follow_up_questions = self._generate_follow_up_questions(symptoms, intent)
         
-        # 7. 记录对话历史
-        self.conversation_history.append({
-            "user_input": user_input,
-            "timestamp": "2024-01-01 12:00:00",  # 实际应用中使用真实时间戳
-            "response": {
-                "intent": intent.value,
-                "symptoms": symptoms,
-                "department": department,
-                "urgency": urgency.value
-            }
-        })
-        
-        return MedicalResponse(
+        response = MedicalResponse(
             intent=intent,
             symptoms=symptoms,
             recommended_department=department,
@@ -266,30 +345,62 @@ class MedicalDialogueManager:
             suggestions=suggestions,
             follow_up_questions=follow_up_questions
         )
+        
+        # 7. 记录对话历史
+        self._record_history(user_input, response)
+        
+        return response
     
-    def _classify_intent(self, user_input: str) -> IntentType:
+    def _record_history(self, user_input: str, response: MedicalResponse):
+        """记录一轮对话"""
+        self.conversation_history.append({
+            "user_input": user_input,
+            "timestamp": "2024-01-01 12:00:00",  # 实际应用中使用真实时间戳
+            "response": {
+                "intent": response.intent.value,
+                "symptoms": response.symptoms,
+                "department": response.recommended_department,
+                "urgency": response.urgency_level.value
+            }
+        })
+    
+    def triage_batch(self, user_inputs: List[str]) -> List[MedicalResponse]:
+        """批量分诊：一次处理多轮/多位患者的咨询，结果与逐条调用 process_user_input 一致
+        
+        同一批中重复的咨询只分析一次，返回各自独立的副本；每条咨询都会记入对话历史
+        """
+        analyzed: Dict[str, MedicalResponse] = {}
+        responses = []
+        for user_input in user_inputs:
+            if user_input not in analyzed:
+                analyzed[user_input] = self.process_user_input(user_input)
+                responses.append(analyzed[user_input])
+                continue
+            response = replace(
+                analyzed[user_input],
+                symptoms=list(analyzed[user_input].symptoms),
+                suggestions=list(analyzed[user_input].suggestions),
+                follow_up_questions=list(analyzed[user_input].follow_up_questions)
+            )
+            self._record_history(user_input, response)
+            responses.append(response)
+        return responses
+    
+    def _classify_intent(self, user_input: str, hits: Optional[Set[str]] = None) -> IntentType:
         """分类用户意图"""
-        # 关键词匹配方式的简化实现
-        if any(keyword in user_input for keyword in ["疼", "痛", "不舒服", "症状"]):
-            return IntentType.SYMPTOM_INQUIRY
-        elif any(keyword in user_input for keyword in ["挂号", "预约", "看医生"]):
-            return IntentType.APPOINTMENT_BOOKING
-        elif any(keyword in user_input for keyword in ["科室", "哪个科"]):
-            return IntentType.DEPARTMENT_RECOMMENDATION
-        elif any(keyword in user_input for keyword in ["紧急", "急诊", "严重"]):
-            return IntentType.EMERGENCY_ASSESSMENT
-        elif any(keyword in user_input for keyword in ["药", "吃什么药"]):
-            return IntentType.MEDICATION_INQUIRY
-        else:
-            return IntentType.SYMPTOM_INQUIRY  # 默认为症状咨询
+        # 关键词匹配方式的简化实现：取命中意图中优先级最高的
+        hits = self._scan(user_input) if hits is None else hits
+        for intent, _ in self.INTENT_KEYWORDS:
+            if f"intent:{intent.name}" in hits:
+                return intent
+        return IntentType.SYMPTOM_INQUIRY  # 默认为症状咨询
     
-    def _extract_symptoms(self, user_input: str) -> List[str]:
+    def _extract_symptoms(self, user_input: str, hits: Optional[Set[str]] = None) -> List[str]:
         """提取症状关键词"""
-        extracted_symptoms = []
-        for symptom, keywords in self.recognizer.symptom_keywords.items():
-            if any(keyword in user_input for keyword in keywords):
-                extracted_symptoms.append(symptom)
-        return extracted_symptoms
+        hits = self._scan(user_input) if hits is None else hits
+        # 按症状库顺序输出，主要症状（第一个）决定推荐科室
+        return [symptom for symptom in self.recognizer.symptom_keywords
+                if f"symptom:{symptom}" in hits]
     
     def _recommend_department(self, symptoms: List[str]) -> str:
         """推荐科室"""
@@ -300,14 +411,15 @@ class MedicalDialogueManager:
         primary_symptom = symptoms[0]
         return self.recognizer.department_mapping.get(primary_symptom, "内科")
     
-    def _assess_urgency(self, symptoms: List[str], user_input: str) -> UrgencyLevel:
+    def _assess_urgency(self, symptoms: List[str], user_input: str,
+                        hits: Optional[Set[str]] = None) -> UrgencyLevel:
         """评估紧急程度"""
         if not symptoms:
             return UrgencyLevel.NORMAL
         
         # 检查紧急关键词
-        emergency_keywords = ["剧烈", "严重", "急性", "突然", "无法忍受"]
-        if any(keyword in user_input for keyword in emergency_keywords):
+        hits = self._scan(user_input) if hits is None else hits
+        if "urgency:emergency" in hits:
             return UrgencyLevel.URGENT
         
         # 根据症状评估
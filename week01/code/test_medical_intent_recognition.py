@@ -0,0 +1,157 @@
+"""
+medical_intent_recognition.py 的测试用例
+验证关键词自动机与原始逐个关键词判断的结果完全一致，以及批量分诊接口
+"""
+
+import sys
+import os
+import time
+import random
+import itertools
+
+# 添加当前目录到 Python 路径，以便导入 medical_intent_recognition 模块
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from medical_intent_recognition import (
+    MedicalDialogueManager, IntentType, UrgencyLevel, KeywordAutomaton
+)
+
+# 原始实现中的意图关键词表（按 if/elif 顺序）
+ORIGINAL_INTENT_RULES = [
+    (["疼", "痛", "不舒服", "症状"], IntentType.SYMPTOM_INQUIRY),
+    (["挂号", "预约", "看医生"], IntentType.APPOINTMENT_BOOKING),
+    (["科室", "哪个科"], IntentType.DEPARTMENT_RECOMMENDATION),
+    (["紧急", "急诊", "严重"], IntentType.EMERGENCY_ASSESSMENT),
+    (["药", "吃什么药"], IntentType.MEDICATION_INQUIRY),
+]
+ORIGINAL_EMERGENCY_KEYWORDS = ["剧烈", "严重", "急性", "突然", "无法忍受"]
+
+
+def original_classify_intent(user_input):
+    """原始实现：依次对每张关键词表做 any(keyword in input)"""
+    for keywords, intent in ORIGINAL_INTENT_RULES:
+        if any(keyword in user_input for keyword in keywords):
+            return intent
+    return IntentType.SYMPTOM_INQUIRY
+
+
+def original_extract_symptoms(manager, user_input):
+    return [symptom for symptom, keywords in manager.recognizer.symptom_keywords.items()
+            if any(keyword in user_input for keyword in keywords)]
+
+
+def original_assess_urgency(manager, symptoms, user_input):
+    if not symptoms:
+        return UrgencyLevel.NORMAL
+    if any(keyword in user_input for keyword in ORIGINAL_EMERGENCY_KEYWORDS):
+        return UrgencyLevel.URGENT
+    for symptom in symptoms:
+        if symptom in manager.recognizer.urgency_rules:
+            return manager.recognizer.urgency_rules[symptom]
+    return UrgencyLevel.NORMAL
+
+
+def build_inputs(manager, num_random=2000, seed=7):
+    """覆盖全部关键词：单个关键词、两两组合、随机拼接"""
+    keywords = [k for keywords, _ in ORIGINAL_INTENT_RULES for k in keywords]
+    keywords += ORIGINAL_EMERGENCY_KEYWORDS
+    keywords += [k for ks in manager.recognizer.symptom_keywords.values() for k in ks]
+    fillers = ["", "我", "今天", "有点", "孩子", "，", "怎么办？", "已经三天了"]
+
+    inputs = list(keywords)
+    inputs += [a + "，" + b for a, b in itertools.combinations(keywords, 2)]
+    rng = random.Random(seed)
+    for _ in range(num_random):
+        parts = rng.sample(keywords, rng.randint(0, 4)) + rng.sample(fillers, 3)
+        rng.shuffle(parts)
+        inputs.append("".join(parts))
+    inputs += ["", "你好", "头头痛痛", "药药药", "剧烈剧烈头痛"]
+    return inputs
+
+
+def test_keyword_automaton_matches_substring():
+    """自动机的命中结果与逐个 `keyword in text` 一致（含重叠、嵌套关键词）"""
+    tables = [("a", ["痛", "头痛", "偏头痛"]), ("b", ["头"]), ("c", ["吃什么药", "药"]), ("d", ["什么"])]
+    automaton = KeywordAutomaton(tables)
+    rng = random.Random(1)
+    alphabet = "偏头痛吃什么药的"
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 10)))
+        expected = {label for label, keywords in tables if any(k in text for k in keywords)}
+        assert automaton.scan(text) == expected, text
+
+
+def test_equivalence_with_original_rules():
+    """意图、症状、紧急程度与原始实现逐条一致"""
+    manager = MedicalDialogueManager()
+    for user_input in build_inputs(manager):
+        symptoms = original_extract_symptoms(manager, user_input)
+        assert manager._classify_intent(user_input) == original_classify_intent(user_input), user_input
+        assert manager._extract_symptoms(user_input) == symptoms, user_input
+        assert manager._assess_urgency(symptoms, user_input) == \
+            original_assess_urgency(manager, symptoms, user_input), user_input
+
+        response = manager.process_user_input(user_input)
+        assert response.intent == original_classify_intent(user_input)
+        assert response.symptoms == symptoms
+
+
+def test_extended_symptom_keywords():
+    """扩展症状库后重新编译，新症状同样能被识别"""
+    manager = MedicalDialogueManager()
+    manager.recognizer.symptom_keywords["失眠"] = ["失眠", "睡不着", "入睡困难", "早醒"]
+    manager.compile_keywords()
+    assert manager._extract_symptoms("最近总是睡不着，还头疼") == ["头痛", "失眠"]
+
+
+def test_triage_batch():
+    """批量分诊结果与逐条处理一致，重复咨询返回独立副本并记入历史"""
+    inputs = ["我头痛得厉害，已经持续两天了",
+              "孩子发烧38.5度，还咳嗽，应该看哪个科？",
+              "胸口疼，呼吸困难，这严重吗？",
+              "我头痛得厉害，已经持续两天了"]
+    sequential_manager = MedicalDialogueManager()
+    expected = [sequential_manager.process_user_input(text) for text in inputs]
+
+    manager = MedicalDialogueManager()
+    responses = manager.triage_batch(inputs)
+    assert responses == expected
+    assert len(manager.conversation_history) == len(inputs)
+    assert manager.conversation_history == sequential_manager.conversation_history
+
+    responses[3].suggestions.append("额外建议")
+    assert "额外建议" not in responses[0].suggestions
+
+
+def test_throughput():
+    """吞吐量对比：原始逐表判断 vs 自动机单次扫描"""
+    manager = MedicalDialogueManager()
+    inputs = build_inputs(manager)
+
+    start = time.perf_counter()
+    for user_input in inputs:
+        symptoms = original_extract_symptoms(manager, user_input)
+        original_classify_intent(user_input)
+        original_assess_urgency(manager, symptoms, user_input)
+    original_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for user_input in inputs:
+        hits = manager._scan(user_input)
+        symptoms = manager._extract_symptoms(user_input, hits)
+        manager._classify_intent(user_input, hits)
+        manager._assess_urgency(symptoms, user_input, hits)
+    automaton_seconds = time.perf_counter() - start
+
+    print(f"\n{len(inputs)} 条咨询")
+    print(f"原始实现: {len(inputs) / original_seconds:,.0f} 条/秒")
+    print(f"自动机:   {len(inputs) / automaton_seconds:,.0f} 条/秒")
+
+
+if __name__ == "__main__":
+    test_keyword_automaton_matches_substring()
+    test_equivalence_with_original_rules()
+    test_extended_symptom_keywords()
+    test_triage_batch()
+    test_throughput()
+    print("全部测试通过")
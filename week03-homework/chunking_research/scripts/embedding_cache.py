@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+持久化向量缓存
+
+按文本内容哈希缓存embedding结果，供分块实验网格中的所有配置共享：
+不同分块配置切出的相同文本块、所有配置共用的评测问题，只会向DashScope请求一次。
+缓存存放在SQLite中，进程重启、实验中断后重新运行都能继续命中。
+
+使用方法：
+    from embedding_cache import CachedEmbedding
+    Settings.embed_model = CachedEmbedding.wrap(DashScopeEmbedding(...), "outputs/cache/embeddings.sqlite")
+"""
+import array
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Set
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+
+class CachedEmbedding(BaseEmbedding):
+    """包装任意embedding模型，按(模型, 文本类型, 文本)的哈希读写SQLite缓存
+
+    - 批量请求先在批内去重，再只把缓存未命中的文本交给内部模型
+    - 向量以float64原样保存，命中缓存与直接调用的结果完全一致
+    - 连接由锁保护，joblib线程并行模式下可安全共享
+    """
+
+    inner: BaseEmbedding = Field(description="实际调用的embedding模型")
+    cache_path: str = Field(description="SQLite缓存文件路径")
+
+    _conn: sqlite3.Connection = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(self, inner: BaseEmbedding, cache_path: str, embed_batch_size: int = 512, **kwargs):
+        super().__init__(
+            inner=inner,
+            cache_path=str(cache_path),
+            model_name=inner.model_name,
+            # 外层批次放大，批内去重和缓存查找的范围更大；真实请求仍按内部模型的批大小发送
+            embed_batch_size=embed_batch_size,
+            **kwargs,
+        )
+        Path(self.cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def wrap(cls, inner: BaseEmbedding, cache_path: str, **kwargs) -> "CachedEmbedding":
+        return cls(inner=inner, cache_path=cache_path, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    # ---------- 缓存读写 ----------
+    def key(self, text: str, kind: str = "text") -> str:
+        """缓存键：模型名 + 文本类型(text/query) + 文本内容的sha256"""
+        raw = f"{self.inner.model_name}\x00{kind}\x00{text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # SQLite单条语句的参数个数有限，分段查询
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array.array("d", blob).tolist()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array.array("d", vector).tobytes()) for key, vector in items.items()],
+            )
+            self._conn.commit()
+
+    def cached_keys(self, keys: Iterable[str]) -> Set[str]:
+        """返回已在缓存中的键，供实验调度估算每个配置需要新向量化的文本数"""
+        keys = list(keys)
+        found = set()
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"hits": self._hits, "misses": self._misses, "size": size}
+
+    # ---------- BaseEmbedding接口 ----------
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [self.key(text, kind) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        # 批内去重：相同文本只请求一次
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self._hits += len(texts) - len(missing)
+        self._misses += len(missing)
+        if missing:
+            if kind == "query":
+                vectors = [self.inner.get_query_embedding(text) for text in missing.values()]
+            else:
+                vectors = self.inner.get_text_embedding_batch(list(missing.values()))
+            new_items = dict(zip(missing.keys(), vectors))
+            self._store(new_items)
+            found.update(new_items)
+        return [found[key] for key in keys]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query], "query")[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text], "text")[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "text")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+本地假LLM服务 - 离线调试 llm_engine / step05 / step06 --mode async
+
+实现OpenAI兼容的 /v1/chat/completions（非流式），不依赖任何第三方库：
+- 问答生成提示词(step05)：从原文中截取句子，返回JSON数组格式的问答对
+- 其他提示词(step06答案生成)：返回上下文中的第一句话作为答案
+- --fail_rate 按比例随机返回429，用于验证重试与退避逻辑
+
+使用方法：
+python fake_llm_server.py --port 9300 --latency 0.2 --fail_rate 0.1
+export LLM_API_BASE=http://127.0.0.1:9300/v1
+"""
+import argparse
+import json
+import random
+import re
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--host", type=str, default="127.0.0.1")
+parser.add_argument("--port", type=int, default=9300)
+parser.add_argument("--latency", type=float, default=0.2, help="每个请求的响应延迟（秒）")
+parser.add_argument("--fail_rate", type=float, default=0.0, help="随机返回429的比例")
+args = parser.parse_args()
+
+_SENTENCE = re.compile(r"[^。！？.!?\n]{8,}[。！？.!?]")
+
+
+def _fake_answer(prompt: str) -> str:
+    if "问答对" in prompt:
+        # step05：从原文截取句子构造问答对
+        text = prompt.split("只输出JSON数组，不要其他内容：", 1)[-1]
+        sentences = _SENTENCE.findall(text)[:2] or [text.strip()[:50]]
+        qa = [{"question": f"原文中关于“{s.strip()[:20]}”是怎么说的？", "answer": s.strip()[:50]}
+              for s in sentences]
+        return json.dumps(qa, ensure_ascii=False)
+    # 答案生成：取上下文第一句（llama_index的QA模板用分隔线包住上下文）
+    if "---------------------" in prompt:
+        prompt = prompt.split("---------------------")[1]
+    sentences = _SENTENCE.findall(prompt)
+    return sentences[0].strip() if sentences else "Empty Response"
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        time.sleep(args.latency)
+        if random.random() < args.fail_rate:
+            self._send(429, {"error": {"message": "rate limited (fake)", "type": "rate_limit_error"}})
+            return
+        messages = body.get("messages") or [{}]
+        prompt = messages[-1].get("content") or ""
+        self._send(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-llm"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": _fake_answer(prompt)}}],
+            "usage": {"prompt_tokens": len(prompt), "completion_tokens": 0, "total_tokens": len(prompt)},
+        })
+
+    def _send(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *log_args):
+        pass  # 关闭逐请求日志
+
+
+if __name__ == "__main__":
+    print(f"fake LLM listening on http://{args.host}:{args.port}/v1")
+    ThreadingHTTPServer((args.host, args.port), Handler).serve_forever()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+异步LLM评测引擎
+
+为问答生成(step05)和实验答案生成(step06 --mode async)提供统一的并发调用层：
+1. 有界并发：asyncio.Semaphore限制同时在途的请求数
+2. 限流：令牌桶控制每秒请求数，避免触发DashScope的QPS限制
+3. 重试：限流/超时/连接错误/5xx按指数退避+随机抖动重试，结果校验失败同样重试
+4. 磁盘记忆化：每个(模型, 消息, 参数)的响应存入SQLite，重跑时不再调用API
+5. 流式落盘：每完成一个任务立即追加到JSONL，中断后重跑跳过已完成任务，
+   step07/step08 可以直接对部分结果打分出报告
+
+接口为OpenAI兼容协议，通过环境变量切换端点，离线调试时指向本地假服务：
+    python fake_llm_server.py --port 9300
+    export LLM_API_BASE=http://127.0.0.1:9300/v1
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import openai
+from openai import AsyncOpenAI
+
+DEFAULT_API_BASE = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+# 可重试的错误：限流、超时、连接中断、服务端错误
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class RateLimiter:
+    """令牌桶限流器：平均每秒rate个请求，允许burst个突发"""
+
+    def __init__(self, rate: Optional[float], burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ResponseCache:
+    """LLM响应的磁盘记忆化，键为(模型, 消息, 参数)的sha256"""
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT)")
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, messages: List[Dict], params: Dict) -> str:
+        raw = json.dumps({"model": model, "messages": messages, "params": params},
+                         ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT content FROM responses WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, content: str):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO responses (key, content) VALUES (?, ?)", (key, content))
+            self.conn.commit()
+
+
+class JsonlStore:
+    """追加写的JSONL结果文件，每条记录写完立即flush"""
+
+    def __init__(self, path, key_field: str = "id"):
+        self.path = Path(path)
+        self.key_field = key_field
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def load(self) -> List[Dict]:
+        if not self.path.exists():
+            return []
+        records = []
+        for line in self.path.read_text(encoding="utf-8").splitlines():
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # 中断时写了一半的行
+        return records
+
+    def done_keys(self) -> set:
+        return {record.get(self.key_field) for record in self.load()}
+
+    def append(self, record: Dict):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+
+
+class AsyncLLMEngine:
+    """有界并发、限流、重试、记忆化的OpenAI兼容异步调用引擎
+
+    Args:
+        model: 模型名称
+        cache_path: 响应记忆化SQLite路径，None表示不缓存
+        concurrency: 最大在途请求数
+        rps: 每秒请求数上限，None表示不限流
+        max_retries: 单个请求的最大重试次数
+        api_base/api_key: 默认读取 LLM_API_BASE / LLM_API_KEY(或DASHSCOPE_API_KEY) 环境变量
+    """
+
+    def __init__(self, model: str = "qwen-plus", cache_path=None, concurrency: int = 8,
+                 rps: Optional[float] = None, max_retries: int = 5, timeout: float = 120,
+                 api_base: Optional[str] = None, api_key: Optional[str] = None):
+        self.model = model
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.cache = ResponseCache(cache_path) if cache_path else None
+        self.limiter = RateLimiter(rps, burst=concurrency)
+        self.client = AsyncOpenAI(
+            base_url=api_base or os.getenv("LLM_API_BASE", DEFAULT_API_BASE),
+            api_key=api_key or os.getenv("LLM_API_KEY") or os.getenv("DASHSCOPE_API_KEY") or "EMPTY",
+            timeout=timeout,
+            max_retries=0,  # 重试由引擎统一处理
+        )
+        self.semaphore = None
+        self.stats = {"calls": 0, "cache_hits": 0, "retries": 0, "failures": 0}
+
+    async def complete(self, messages: List[Dict], validate: Optional[Callable[[str], Any]] = None,
+                       **params) -> Any:
+        """调用一次对话补全，返回validate(content)或原始content
+
+        validate抛出ValueError时视为可重试，校验不通过的响应不会写入缓存
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        key = ResponseCache.key(self.model, messages, params) if self.cache else None
+        if key:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                try:
+                    result = validate(cached) if validate else cached
+                    self.stats["cache_hits"] += 1
+                    return result
+                except ValueError:
+                    pass  # 旧缓存不符合当前校验规则，重新请求
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.semaphore:
+                    await self.limiter.acquire()
+                    self.stats["calls"] += 1
+                    resp = await self.client.chat.completions.create(
+                        model=self.model, messages=messages, **params)
+                content = resp.choices[0].message.content or ""
+                result = validate(content) if validate else content
+                if key:
+                    await asyncio.to_thread(self.cache.put, key, content)
+                return result
+            except (ValueError, *RETRYABLE_ERRORS) as e:
+                if attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                # 指数退避 + 全抖动，避免并发请求同时重试
+                delay = min(60.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+                print(f"请求失败({type(e).__name__}: {str(e)[:100]})，{delay:.1f}s后第{attempt + 1}次重试")
+                await asyncio.sleep(delay)
+
+    async def run(self, jobs: Iterable[Dict], store: JsonlStore,
+                  build: Callable[[Dict], Dict], validate: Optional[Callable[[str], Any]] = None,
+                  on_result: Optional[Callable[[Dict, Any], Dict]] = None, **params) -> int:
+        """并发执行一批任务并流式写入store，store中已有的任务跳过
+
+        Args:
+            jobs: 任务列表，每个任务必须包含store.key_field字段
+            build: 任务 -> messages
+            on_result: (任务, 结果) -> 写入store的记录，默认写入 {**任务, "result": 结果}
+
+        Returns:
+            int: 本次新完成的任务数
+        """
+        done = store.done_keys()
+        pending = [job for job in jobs if job[store.key_field] not in done]
+        if not pending:
+            return 0
+
+        async def one(job):
+            try:
+                result = await self.complete(build(job), validate=validate, **params)
+            except Exception as e:
+                print(f"任务 {job[store.key_field]} 失败: {e}")
+                return False
+            record = on_result(job, result) if on_result else {**job, "result": result}
+            store.append(record)
+            return True
+
+        finished = await asyncio.gather(*(one(job) for job in pending))
+        return sum(finished)
+
+    async def aclose(self):
+        await self.client.close()
@@ -18,10 +18,11 @@
    - 问题覆盖：核心观点、关键技术、数据案例、潜在影响、结构逻辑
    - 答案要求：简短精准（≤50字），可直接定位到原文
 
-3. 流式API调用：
-   - 使用流式调用避免类型检查问题
+3. 异步并发调用（llm_engine.AsyncLLMEngine）：
+   - 有界并发 + 令牌桶限流，多个文本同时生成
+   - 限流/超时/JSON解析失败按指数退避加随机抖动重试
+   - 每个请求的响应记忆化到 outputs/cache/llm_responses.sqlite，重跑不重复调用
    - 支持长文本处理（自动截断到8000字符）
-   - 包含错误重试机制和异常处理
 
 4. 数据格式和输出：
    - 输出格式：JSON列表，每个元素包含question、answer、doc字段
@@ -32,13 +33,18 @@
 ========
 # 基本使用（处理data/clean目录下的所有txt文件）
 python auto_qa.py
+python auto_qa.py --concurrency 8 --rps 5
+
+# 离线调试：指向本地假LLM服务
+python fake_llm_server.py --port 9300 &
+LLM_API_BASE=http://127.0.0.1:9300/v1 python auto_qa.py
 
 # 环境变量设置
 export DASHSCOPE_API_KEY="your_api_key_here"
 
 依赖要求：
 ========
-pip install dashscope tqdm
+pip install openai
 
 输入文件：
 ========
@@ -48,7 +54,8 @@ pip install dashscope tqdm
 
 输出文件：
 ========
-- 位置：outputs/qa.json
+- 位置：outputs/qa.jsonl（逐文本流式写入，中断后重跑跳过已完成的文本）
+- 位置：outputs/qa.json（全部完成后由qa.jsonl汇总生成）
 - 格式：JSON数组，每个问答对包含：
   {
     "question": "问题内容",
@@ -61,16 +68,16 @@ pip install dashscope tqdm
 - 需要有效的DASHSCOPE_API_KEY环境变量
 - API调用有频率限制，大量文件处理时请注意
 - 生成质量依赖于输入文本的质量和结构
-- 支持递归重试机制，但可能导致无限循环（需要手动中断）
+- 单个文本最多尝试3次，仍失败的文本不写入qa.jsonl，重跑时会再次尝试
 
 作者: AI Assistant
 日期: 2025-10-29
 版本: 1.0.0
 """
 
-import os, json, dashscope
+import os, json, asyncio, argparse
 from pathlib import Path
-from tqdm import tqdm
+from llm_engine import AsyncLLMEngine, JsonlStore
 
 def _get_default_data_dir() -> str:
     """获取默认的data/clean目录路径
@@ -110,9 +117,10 @@ def _get_default_output_dir() -> str:
     
     return outputs_dir
 
-dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
 DATA_DIR  = Path(_get_default_data_dir())
 QA_FILE   = Path(_get_default_output_dir()) / "qa.json"
+QA_STORE  = Path(_get_default_output_dir()) / "qa.jsonl"
+LLM_CACHE = Path(_get_default_output_dir()) / "cache" / "llm_responses.sqlite"
 
 PROMPT = """
 你是一名专业分析师。请仔细阅读以下文本，并生成 1-2 个高质量的问题及其对应答案。
@@ -134,143 +142,105 @@ PROMPT = """
 {text}
 """
 
-def build_qa_one(text: str, retry_count: int = 0) -> list:
-    full_prompt = PROMPT.format(text=text[:8000])          # 截断避免超长
+def parse_qa_content(content: str) -> list:
+    """从模型回复中解析问答对列表，解析失败抛出ValueError（由引擎负责重试）"""
+    # 确保内容是字符串类型且非空
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError(f"响应内容为空或类型错误: {type(content)}, 内容: {content}")
     
-    try:
-        # 使用非流式调用
-        resp = dashscope.Generation.call(
-            model="qwen-plus",
-            messages=[{"role": "user", "content": full_prompt}],  # type: ignore
-            result_format="message",
-            temperature=0.3,
-            max_tokens=2000,
-            stream=False,  # 非流式调用
-        )
-        
-        # 统一处理响应内容
-        content = ""
-        
-        # 检查响应类型并提取内容
-        if isinstance(resp, str):
-            # 如果直接返回字符串
-            content = resp
-        elif hasattr(resp, 'output') and hasattr(resp.output, 'choices'):  # type: ignore
-            # 标准响应对象格式
-            try:
-                content = resp.output.choices[0].message.content  # type: ignore
-            except (AttributeError, IndexError) as e:
-                print(f"响应格式异常: {e}, 响应类型: {type(resp)}")
-                raise ValueError(f"无法从响应中提取内容: {e}")
-        elif hasattr(resp, '__iter__'):
-            # 迭代器格式（流式响应的情况）
-            for chunk in resp:  # type: ignore
-                if hasattr(chunk, 'status_code') and chunk.status_code == 200:  # type: ignore
-                    chunk_content = chunk.output.choices[0].message.content  # type: ignore
-                    if isinstance(chunk_content, str):
-                        content = chunk_content  # 直接赋值最后一个完整响应
-                elif hasattr(chunk, 'output'):
-                    # 有些情况下可能没有status_code
-                    try:
-                        chunk_content = chunk.output.choices[0].message.content  # type: ignore
-                        if isinstance(chunk_content, str):
-                            content = chunk_content
-                    except Exception:
-                        continue
-        else:
-            # 其他未知格式
-            print(f"未知响应格式: {type(resp)}")
-            print(f"响应内容: {str(resp)[:200]}...")
-            raise ValueError(f"未知的响应格式: {type(resp)}")
-        
-        # 确保内容是字符串类型且非空
-        if not isinstance(content, str) or not content.strip():
-            raise ValueError(f"响应内容为空或类型错误: {type(content)}, 内容: {content}")
-        
-        # 清理内容，去除可能的前缀和后缀干扰
-        content = content.strip()
-        
-        # 处理流式响应可能导致的重复内容问题
-        # 如果发现内容重复模式，尝试提取最后一个完整的JSON
-        if content.count('[{') > 1:
-            # 查找最后一个看起来像JSON开始的位置
-            last_json_start = content.rfind('[{"question"')
-            if last_json_start > 0:
-                content = content[last_json_start:]
-                print(f"检测到重复内容，提取最后部分: {content[:100]}...")
-        
-        # 尝试找到JSON数组的开始和结束
-        if content.startswith('[') and content.endswith(']'):
-            json_content = content
+    # 清理内容，去除可能的前缀和后缀干扰
+    content = content.strip()
+    
+    # 处理流式响应可能导致的重复内容问题
+    # 如果发现内容重复模式，尝试提取最后一个完整的JSON
+    if content.count('[{') > 1:
+        # 查找最后一个看起来像JSON开始的位置
+        last_json_start = content.rfind('[{"question"')
+        if last_json_start > 0:
+            content = content[last_json_start:]
+            print(f"检测到重复内容，提取最后部分: {content[:100]}...")
+    
+    # 尝试找到JSON数组的开始和结束
+    if content.startswith('[') and content.endswith(']'):
+        json_content = content
+    else:
+        # 如果不是标准JSON格式，尝试提取JSON部分
+        start_idx = content.find('[')
+        end_idx = content.rfind(']')
+        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+            json_content = content[start_idx:end_idx+1]
         else:
-            # 如果不是标准JSON格式，尝试提取JSON部分
-            start_idx = content.find('[')
-            end_idx = content.rfind(']')
-            if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                json_content = content[start_idx:end_idx+1]
-            else:
-                # 如果找不到完整的JSON，尝试查找部分JSON
-                question_start = content.find('{"question"')
-                if question_start != -1:
-                    # 构造一个最小的JSON数组
-                    partial_content = content[question_start:]
-                    # 尝试找到第一个完整的对象
-                    brace_count = 0
-                    end_pos = -1
-                    for i, char in enumerate(partial_content):
-                        if char == '{':
-                            brace_count += 1
-                        elif char == '}':
-                            brace_count -= 1
-                            if brace_count == 0:
-                                end_pos = i + 1
-                                break
-                    
-                    if end_pos > 0:
-                        json_content = '[' + partial_content[:end_pos] + ']'
-                        print(f"构造部分JSON: {json_content}")
-                    else:
-                        raise ValueError(f"无法在响应中找到有效的JSON格式")
+            # 如果找不到完整的JSON，尝试查找部分JSON
+            question_start = content.find('{"question"')
+            if question_start != -1:
+                # 构造一个最小的JSON数组
+                partial_content = content[question_start:]
+                # 尝试找到第一个完整的对象
+                brace_count = 0
+                end_pos = -1
+                for i, char in enumerate(partial_content):
+                    if char == '{':
+                        brace_count += 1
+                    elif char == '}':
+                        brace_count -= 1
+                        if brace_count == 0:
+                            end_pos = i + 1
+                            break
+                
+                if end_pos > 0:
+                    json_content = '[' + partial_content[:end_pos] + ']'
+                    print(f"构造部分JSON: {json_content}")
                 else:
-                    raise ValueError(f"无法在响应中找到有效的JSON数组格式")
-        
-        # 解析 JSON
-        qa = json.loads(json_content)
-        if not isinstance(qa, list) or len(qa) < 1:
-            raise ValueError("生成的问答对数量不足或格式错误")
-        
-        return qa
-        
-    except json.JSONDecodeError as e:
-        print(f"JSON解析失败 (尝试 {retry_count + 1}/3): {e}")
-        print(f"问题内容前200字符: {content[:200] if 'content' in locals() else 'N/A'}")
-        # 限制重试次数避免无限递归
-        if retry_count < 2:
-            print("重试中...")
-            return build_qa_one(text, retry_count + 1)
-        else:
-            print("重试次数超限，跳过此文本")
-            return []
-    except Exception as e:
-        print(f"生成问答对失败 (尝试 {retry_count + 1}/3): {e}")
-        if retry_count < 2:
-            print("重试中...")
-            return build_qa_one(text, retry_count + 1)
-        else:
-            print("重试次数超限，跳过此文本")
-            return []
+                    raise ValueError(f"无法在响应中找到有效的JSON格式")
+            else:
+                raise ValueError(f"无法在响应中找到有效的JSON数组格式")
+    
+    # 解析 JSON
+    qa = json.loads(json_content)
+    if not isinstance(qa, list) or len(qa) < 1:
+        raise ValueError("生成的问答对数量不足或格式错误")
+    
+    return qa
+
+def build_messages(job: dict) -> list:
+    full_prompt = PROMPT.format(text=job["text"][:8000])          # 截断避免超长
+    return [{"role": "user", "content": full_prompt}]
+
+async def generate_all(concurrency: int, rps: float) -> int:
+    """并发为所有文本生成问答对，结果逐文本写入qa.jsonl"""
+    engine = AsyncLLMEngine(model="qwen-plus", cache_path=LLM_CACHE, concurrency=concurrency,
+                            rps=rps, max_retries=2)
+    store = JsonlStore(QA_STORE, key_field="doc")
+    jobs = [{"doc": txt_file.stem, "text": txt_file.read_text(encoding="utf-8", errors="ignore")}
+            for txt_file in sorted(DATA_DIR.glob("*.txt"))]
+    print(f"共 {len(jobs)} 个文本，已完成 {len(store.done_keys())} 个")
+    try:
+        finished = await engine.run(
+            jobs, store, build=build_messages, validate=parse_qa_content,
+            on_result=lambda job, qa: {"doc": job["doc"], "qa": qa},
+            temperature=0.3, max_tokens=2000,
+        )
+    finally:
+        await engine.aclose()
+    print(f"本次新完成 {finished} 个文本，调用统计: {engine.stats}")
+    return finished
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=8, help="最大并发请求数")
+    parser.add_argument("--rps", type=float, default=None, help="每秒请求数上限，默认不限")
+    cli = parser.parse_args()
+
     # 确保输出目录存在
     os.makedirs(QA_FILE.parent, exist_ok=True)
-    
+    asyncio.run(generate_all(cli.concurrency, cli.rps))
+
+    # 由流式结果汇总成标准问答对文件
     all_qa = []
-    for txt_file in tqdm(list(DATA_DIR.glob("*.txt")), desc="生成问答对"):
-        text = txt_file.read_text(encoding="utf-8", errors="ignore")
-        qa_list = build_qa_one(text)
-        for qa in qa_list:
-            qa["doc"] = txt_file.stem   # 记录来源，方便溯源
-        all_qa.extend(qa_list)
+    for record in JsonlStore(QA_STORE, key_field="doc").load():
+        for qa in record["qa"]:
+            qa["doc"] = record["doc"]   # 记录来源，方便溯源
+        all_qa.extend(record["qa"])
 
     QA_FILE.write_text(json.dumps(all_qa, ensure_ascii=False, indent=2))
     print(f"完成！共 {len(all_qa)} 条问答对 → {QA_FILE}")
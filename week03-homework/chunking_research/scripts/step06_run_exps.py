@@ -6,14 +6,22 @@
 1. sequential - 顺序执行（默认，稳定可靠）
 2. parallel - 并行执行（速度快，但可能遇到兼容性问题）
 3. auto - 自动模式（先测试再选择最佳方式）
+4. async - 异步模式（检索在本地完成，答案生成交给llm_engine并发调用，推荐）
+
+向量缓存与调度：
+- 所有配置共享 outputs/cache/embeddings.sqlite 中的向量缓存，相同文本块/问题只向量化一次
+- 运行前先切分全部配置，统计跨配置的重复文本块，并按新增向量化数量从少到多排列配置
+- 每个配置的问答结果逐条写入 outputs/checkpoints/<exp_id>.jsonl，中断后重跑从断点继续
 
 使用方法：
 python run_exps.py                           # 默认顺序模式（推荐）
 python run_exps.py --mode sequential         # 显式指定顺序模式
 python run_exps.py --mode parallel --jobs 4  # 并行模式，4个线程
 python run_exps.py --mode auto --jobs 2      # 自动模式，最多2个线程
+python run_exps.py --mode async --jobs 8     # 异步模式，最多8个并发LLM请求
+python run_exps.py --prewarm                 # 先批量向量化全网格去重后的文本块，再逐个运行配置
 """
-import os, json, yaml, itertools
+import os, json, yaml, itertools, asyncio
 from pathlib import Path
 from tqdm import tqdm
 from joblib import Parallel, delayed
@@ -47,6 +55,10 @@ from llama_index.core.node_parser import (
     MarkdownNodeParser,
 )
 from llama_index.core.postprocessor import MetadataReplacementPostProcessor
+from llama_index.core.schema import MetadataMode
+from llama_index.core.prompts.chat_prompts import CHAT_TEXT_QA_PROMPT
+from embedding_cache import CachedEmbedding
+from llm_engine import AsyncLLMEngine, JsonlStore
 
 # ---------- 1. 全局配置 ----------
 Settings.llm = OpenAILike(
@@ -56,7 +68,7 @@ Settings.llm = OpenAILike(
     is_chat_model=True,
     temperature=0.3,
 )
-Settings.embed_model = DashScopeEmbedding(
+_dashscope_embedding = DashScopeEmbedding(
     model_name=DashScopeTextEmbeddingModels.TEXT_EMBEDDING_V3,
     embed_batch_size=6,
     embed_input_length=8192
@@ -86,6 +98,12 @@ data_dir_str, output_dir_str = _get_project_dirs()
 DATA_DIR: Path = Path(data_dir_str)
 OUTPUT_DIR: Path = Path(output_dir_str)
 OUTPUT_DIR.mkdir(exist_ok=True)
+CHECKPOINT_DIR: Path = OUTPUT_DIR / "checkpoints"
+CACHE_PATH: Path = OUTPUT_DIR / "cache" / "embeddings.sqlite"
+LLM_CACHE_PATH: Path = OUTPUT_DIR / "cache" / "llm_responses.sqlite"
+
+# 全网格共享的持久化向量缓存
+Settings.embed_model = CachedEmbedding.wrap(_dashscope_embedding, CACHE_PATH)
 
 # ---------- 2. 载入实验配置 ----------
 def _get_config_path():
@@ -161,14 +179,36 @@ def get_splitter(name: str, params: dict):
     raise ValueError(f"unknown splitter {name}")
 
 # ---------- 4. 单组实验 ----------
+# plan_tasks 预先切分好的节点，run_one 直接复用，避免重复切分
+PLANNED_NODES = {}
+
+def _checkpoint_file(exp_id: str) -> Path:
+    return CHECKPOINT_DIR / f"{exp_id}.jsonl"
+
+def _load_checkpoint(exp_id: str) -> dict:
+    """读取配置的断点：question -> 已完成的结果"""
+    ckpt = _checkpoint_file(exp_id)
+    done = {}
+    if ckpt.exists():
+        for line in ckpt.read_text(encoding="utf-8").splitlines():
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 中断时写了一半的行
+            done[item["question"]] = item
+    return done
+
 def run_one(exp_id: str, splitter, docs, qs):
     try:
         print(f"开始实验: {exp_id}")
-        nodes = splitter.get_nodes_from_documents(docs)
+        nodes = PLANNED_NODES.pop(exp_id, None)
+        if nodes is None:
+            nodes = splitter.get_nodes_from_documents(docs)
         print(f"生成了 {len(nodes)} 个节点")
         
+        # 向量来自共享缓存，只有未见过的文本块才会真正调用API
         index = VectorStoreIndex(nodes, embed_model=Settings.embed_model)
-        print(f"创建了向量索引")
+        print(f"创建了向量索引，缓存统计: {Settings.embed_model.stats()}")
 
         # SentenceWindow 需要特殊后处理
         post = None
@@ -177,15 +217,26 @@ def run_one(exp_id: str, splitter, docs, qs):
 
         engine = index.as_query_engine(similarity_top_k=5, node_postprocessors=post or [])
 
-        results = []
-        for i, q in enumerate(qs):
-            print(f"处理问题 {i+1}/{len(qs)}: {q[:50]}...")
-            resp = engine.query(q)
-            ctx = [n.node.get_content() for n in resp.source_nodes]
-            results.append({"question": q, "answer": str(resp), "contexts": ctx})
+        # 断点续跑：已完成的问题直接复用
+        done = _load_checkpoint(exp_id)
+        if done:
+            print(f"从断点恢复 {len(done)}/{len(qs)} 个问题")
+        CHECKPOINT_DIR.mkdir(exist_ok=True)
+        with open(_checkpoint_file(exp_id), "a", encoding="utf-8") as ckpt:
+            for i, q in enumerate(qs):
+                if q in done:
+                    continue
+                print(f"处理问题 {i+1}/{len(qs)}: {q[:50]}...")
+                resp = engine.query(q)
+                ctx = [n.node.get_content() for n in resp.source_nodes]
+                done[q] = {"question": q, "answer": str(resp), "contexts": ctx}
+                ckpt.write(json.dumps(done[q], ensure_ascii=False) + "\n")
+                ckpt.flush()
+        results = [done[q] for q in qs]
             
         out_file = OUTPUT_DIR / f"{exp_id}.json"
         out_file.write_text(json.dumps(results, ensure_ascii=False, indent=2))
+        _checkpoint_file(exp_id).unlink(missing_ok=True)
         print(f"完成实验: {exp_id}, 结果保存到: {out_file}")
         return exp_id
         
@@ -195,6 +246,58 @@ def run_one(exp_id: str, splitter, docs, qs):
         traceback.print_exc()
         raise
 
+def plan_tasks(tasks, documents, prewarm=False):
+    """实验调度：切分全部配置，按新增向量化数量从少到多排序
+    
+    共享缓存下整个网格的API调用量等于去重后未缓存的文本块数，与执行顺序无关；
+    按边际成本贪心排序能让已缓存/与前序配置重复度高的配置先完成，中断时已产出的结果最多。
+    
+    Args:
+        tasks: 任务列表，每个元素为 (exp_id, splitter)
+        documents: 文档列表
+        prewarm: 是否在运行配置前一次性向量化全网格去重后的文本块
+        
+    Returns:
+        list: 重新排序后的任务列表
+    """
+    cache = Settings.embed_model
+    pending = []
+    for exp_id, sp in tasks:
+        if (OUTPUT_DIR / f"{exp_id}.json").exists():
+            pending.append((exp_id, sp, set()))
+            continue
+        nodes = sp.get_nodes_from_documents(documents)
+        PLANNED_NODES[exp_id] = nodes
+        # 与VectorStoreIndex向量化时使用的文本保持一致（含参与embedding的元数据）
+        texts = {cache.key(n.get_content(metadata_mode=MetadataMode.EMBED)): n.get_content(metadata_mode=MetadataMode.EMBED)
+                 for n in nodes}
+        pending.append((exp_id, sp, texts))
+    
+    all_texts = {}
+    for _, _, texts in pending:
+        all_texts.update(texts)
+    total_chunks = sum(len(PLANNED_NODES.get(exp_id, [])) for exp_id, _, _ in pending)
+    known = cache.cached_keys(all_texts)
+    print(f"📦 全网格共 {total_chunks} 个文本块，去重后 {len(all_texts)} 个，"
+          f"已缓存 {len(known)} 个，需新向量化 {len(all_texts) - len(known)} 个")
+    
+    if prewarm:
+        missing = [text for key, text in all_texts.items() if key not in known]
+        if missing:
+            print(f"预热向量缓存: {len(missing)} 个文本块")
+            cache.get_text_embedding_batch(missing, show_progress=True)
+        known = set(all_texts)
+    
+    ordered = []
+    while pending:
+        # 贪心：每次选新增向量化数量最少的配置
+        best = min(pending, key=lambda item: len(item[2].keys() - known))
+        pending.remove(best)
+        print(f"   {best[0]}: 新增向量化 {len(best[2].keys() - known)} 个")
+        known |= best[2].keys()
+        ordered.append((best[0], best[1]))
+    return ordered
+
 # ---------- 5. 执行方式封装 ----------
 def run_experiments_parallel(tasks, documents, questions, n_jobs=4):
     """并行执行实验
@@ -355,6 +458,86 @@ def run_experiments_auto(tasks, documents, questions, prefer_parallel=True, n_jo
         print(f"✓ 顺序执行完成，总共完成 {len(results)} 个任务")
         return results
 
+def _prepare_async_jobs(exp_id: str, splitter, docs, qs):
+    """构建索引并完成全部问题的检索，返回待生成答案的任务列表
+    
+    提示词与 query engine 默认的 compact 合成方式一致（chat 模型使用 CHAT_TEXT_QA_PROMPT），
+    top5 上下文放在一次调用中
+    """
+    nodes = PLANNED_NODES.pop(exp_id, None)
+    if nodes is None:
+        nodes = splitter.get_nodes_from_documents(docs)
+    index = VectorStoreIndex(nodes, embed_model=Settings.embed_model)
+    retriever = index.as_retriever(similarity_top_k=5)
+    post = MetadataReplacementPostProcessor(target_metadata_key="window") \
+        if isinstance(splitter, SentenceWindowNodeParser) else None
+    
+    jobs = []
+    for q in qs:
+        source_nodes = retriever.retrieve(q)
+        if post is not None:
+            source_nodes = post.postprocess_nodes(source_nodes, query_str=q)
+        context_str = "\n\n".join(n.node.get_content(metadata_mode=MetadataMode.LLM) for n in source_nodes)
+        messages = [{"role": m.role.value, "content": m.content}
+                    for m in CHAT_TEXT_QA_PROMPT.format_messages(context_str=context_str, query_str=q)]
+        jobs.append({"question": q, "contexts": [n.node.get_content() for n in source_nodes], "messages": messages})
+    print(f"{exp_id}: {len(nodes)} 个节点，{len(jobs)} 个问题检索完成")
+    return jobs
+
+def _finalize_async(exp_id: str, store: JsonlStore, qs) -> bool:
+    """全部问题都有答案时由断点文件生成最终结果"""
+    done = {record["question"]: record for record in store.load()}
+    if any(q not in done for q in qs):
+        print(f"⚠️  {exp_id}: {len(done)}/{len(qs)} 个问题完成，保留断点文件，重跑可继续")
+        return False
+    out_file = OUTPUT_DIR / f"{exp_id}.json"
+    out_file.write_text(json.dumps([done[q] for q in qs], ensure_ascii=False, indent=2))
+    store.path.unlink(missing_ok=True)
+    print(f"完成实验: {exp_id}, 结果保存到: {out_file}")
+    return True
+
+async def _run_experiments_async(tasks, documents, questions, concurrency):
+    engine = AsyncLLMEngine(model="qwen-plus", cache_path=LLM_CACHE_PATH, concurrency=concurrency)
+    runs = []
+    try:
+        for exp_id, sp in tasks:
+            if (OUTPUT_DIR / f"{exp_id}.json").exists():
+                print(f"⏭️  跳过已存在的实验: {exp_id}")
+                continue
+            # 索引构建和检索在线程中执行，同时前面配置的答案生成请求继续在途
+            jobs = await asyncio.to_thread(_prepare_async_jobs, exp_id, sp, documents, questions)
+            store = JsonlStore(_checkpoint_file(exp_id), key_field="question")
+            run = engine.run(
+                jobs, store, build=lambda job: job["messages"],
+                on_result=lambda job, answer: {"question": job["question"], "answer": answer,
+                                               "contexts": job["contexts"]},
+                temperature=0.3,
+            )
+            runs.append((exp_id, store, asyncio.create_task(run)))
+        for exp_id, store, run in runs:
+            await run
+        finished = [exp_id for exp_id, store, _ in runs if _finalize_async(exp_id, store, questions)]
+    finally:
+        await engine.aclose()
+    print(f"LLM调用统计: {engine.stats}")
+    return finished
+
+def run_experiments_async(tasks, documents, questions, concurrency=8):
+    """异步执行实验：检索本地完成，答案生成并发调用LLM
+    
+    Args:
+        tasks: 任务列表，每个元素为 (exp_id, splitter)
+        documents: 文档列表
+        questions: 问题列表
+        concurrency: 最大并发LLM请求数
+        
+    Returns:
+        list: 本次完成的实验ID列表
+    """
+    CHECKPOINT_DIR.mkdir(exist_ok=True)
+    print(f"使用异步模式执行 {len(tasks)} 个任务，LLM并发数: {concurrency}")
+    return asyncio.run(_run_experiments_async(tasks, documents, questions, concurrency))
+
 # ---------- 6. 构造参数笛卡尔积 ----------
 tasks = []
 for item in cfg["splitters"]:
@@ -388,6 +571,7 @@ if __name__ == "__main__":
     
     mode = "sequential"  # 默认顺序模式，更稳定可靠
     n_jobs = 4          # 默认并行数（仅在并行/自动模式下使用）
+    prewarm = "--prewarm" in sys.argv
     
     # 简单的命令行参数解析
     if len(sys.argv) > 1:
@@ -400,15 +584,22 @@ if __name__ == "__main__":
                 except ValueError:
                     print(f"警告: 无效的并行数 '{sys.argv[i + 1]}'，使用默认值 {n_jobs}")
     
-    print(f"执行模式: {mode}" + (f", 并行数: {n_jobs}" if mode in ["parallel", "auto"] else ""))
+    print(f"执行模式: {mode}" + (f", 并行数: {n_jobs}" if mode in ["parallel", "auto", "async"] else ""))
+    
+    # 按缓存命中调度实验顺序
+    tasks = plan_tasks(tasks, documents, prewarm=prewarm)
     
     # 根据模式执行
     if mode == "parallel":
         results = run_experiments_parallel(tasks, documents, QUESTIONS, n_jobs)
         print(f"\n🎉 并行执行完成，共完成 {len(results)} 个任务，结果见 outputs/*.json")
+    elif mode == "async":
+        results = run_experiments_async(tasks, documents, QUESTIONS, n_jobs)
+        print(f"\n🎉 异步执行完成，本次完成 {len(results)} 个任务，结果见 outputs/*.json")
     elif mode == "sequential":
         results = run_experiments_sequential(tasks, documents, QUESTIONS)
         print(f"\n🎉 顺序执行完成，结果见 outputs/*.json")
     else:  # auto mode
         results = run_experiments_auto(tasks, documents, QUESTIONS, prefer_parallel=True, n_jobs=n_jobs)
-        print(f"\n🎉 自动执行完成，结果见 outputs/*.json")
\ No newline at end of file
+        print(f"\n🎉 自动执行完成，结果见 outputs/*.json")
+    print(f"向量缓存统计: {Settings.embed_model.stats()}")
\ No newline at end of file
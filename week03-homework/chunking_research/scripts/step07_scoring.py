@@ -61,7 +61,10 @@ RAG系统评估指标计算工具
 - outputs目录下的实验结果JSON文件（run_exps.py生成）
 - qa.json文件（auto_qa.py生成的标准问答对）
 
+- outputs/checkpoints/*.jsonl：尚未完成实验的断点结果（按已完成的问题打分，标记为partial）
+
 输出：
+- metrics.jsonl：逐实验流式写入的指标，结果文件未变化的实验重跑时直接复用
 - metrics.csv：包含所有指标的评估结果表格
 - bertscore_bar.png：BERTScore_F1指标的可视化柱状图
 
@@ -112,6 +115,8 @@ OUTPUTS_BASE = _get_default_outputs_dir()
 EXP_DIR  = Path(OUTPUTS_BASE)               # run_exps.py 生成的 json
 QA_FILE  = Path(OUTPUTS_BASE) / "qa.json"  # auto_qa.py 生成的问答对
 CSV_OUT  = Path(OUTPUTS_BASE) / "metrics.csv"
+METRICS_STORE = Path(OUTPUTS_BASE) / "metrics.jsonl"  # 逐实验流式写入，step08可对部分结果出报告
+CKPT_DIR = Path(OUTPUTS_BASE) / "checkpoints"        # run_exps.py 未完成实验的断点
 
 # ---------- 2. 载入标准问答 ----------
 qa_map = {item["question"]: item["answer"] for item in json.loads(QA_FILE.read_text())}
@@ -143,13 +148,8 @@ def redundancy_ratio(contexts):
     return 1 - len(tokens_set) / max(len(tokens_all), 1)
 
 # ---------- 4. 逐实验打分 ----------
-records = []
-for exp_json in tqdm(list(EXP_DIR.glob("*.json")), desc="Scoring"):
-    if exp_json.name == "qa.json":
-        continue
-    data = json.loads(exp_json.read_text())
-    exp_name = exp_json.stem
-
+def score_rows(data):
+    """对一个实验的问答结果计算全部指标"""
     hits_1, hits_3, hits_5, mrr, redunds = [], [], [], [], []
     bleu_scores, bert_p, bert_r, bert_f1 = [], [], [], []
 
@@ -188,8 +188,8 @@ for exp_json in tqdm(list(EXP_DIR.glob("*.json")), desc="Scoring"):
             bert_r.append(0.0)
             bert_f1.append(0.0)
 
-    records.append({
-        "exp": exp_name,
+    return {
+        "n": len(hits_1),
         "Hit@1": np.mean(hits_1),
         "Hit@3": np.mean(hits_3),
         "Hit@5": np.mean(hits_5),
@@ -197,12 +197,51 @@ for exp_json in tqdm(list(EXP_DIR.glob("*.json")), desc="Scoring"):
         "Redundancy": np.mean(redunds),
         "BLEU": np.mean(bleu_scores),
         "BERTScore_F1": np.mean(bert_f1),
-    })
+    }
+
+def _load_rows(path: Path):
+    if path.suffix == ".jsonl":
+        rows = []
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # 中断时写了一半的行
+        return rows
+    return json.loads(path.read_text())
+
+# 待打分的结果：已完成实验的json + 尚未完成实验的断点jsonl
+sources = {p.stem: p for p in EXP_DIR.glob("*.json") if p.name != "qa.json"}
+if CKPT_DIR.exists():
+    for ckpt in CKPT_DIR.glob("*.jsonl"):
+        sources.setdefault(ckpt.stem, ckpt)
+
+# 已打过分且结果文件未变化的实验直接复用
+scored = {}
+if METRICS_STORE.exists():
+    for line in METRICS_STORE.read_text(encoding="utf-8").splitlines():
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        scored[row["exp"]] = row
+
+records = []
+with open(METRICS_STORE, "a", encoding="utf-8") as store:
+    for exp_name, exp_path in tqdm(sorted(sources.items()), desc="Scoring"):
+        source_id = f"{exp_path.name}:{exp_path.stat().st_mtime_ns}"
+        row = scored.get(exp_name)
+        if row is None or row.get("source") != source_id:
+            row = {"exp": exp_name, **score_rows(_load_rows(exp_path)),
+                   "partial": exp_path.suffix == ".jsonl", "source": source_id}
+            store.write(json.dumps(row, ensure_ascii=False) + "\n")
+            store.flush()
+        records.append(row)
 
 # ---------- 5. 保存 ----------
-df = pd.DataFrame(records)
+df = pd.DataFrame(records).drop(columns=["source"])
 df.to_csv(CSV_OUT, index=False, float_format="%.4f")
-print(f"✅ 已写入 {CSV_OUT}  共 {len(df)} 组实验")
+print(f"✅ 已写入 {CSV_OUT}  共 {len(df)} 组实验（其中 {int(df['partial'].sum())} 组为部分结果）")
 
 # ---------- 6. 快速可视化 ----------
 import seaborn as sns, matplotlib.pyplot as plt
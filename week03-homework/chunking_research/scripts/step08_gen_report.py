@@ -28,12 +28,33 @@ def _get_project_root() -> str:
 # ---------- 1. 路径 ----------
 PROJECT_ROOT = Path(_get_project_root())
 CSV        = PROJECT_ROOT / "outputs/metrics.csv"
+METRICS_STORE = PROJECT_ROOT / "outputs/metrics.jsonl"
 FIG_DIR    = PROJECT_ROOT / "report/img"; FIG_DIR.mkdir(parents=True, exist_ok=True)
 TEMPLATE   = PROJECT_ROOT / "templates/report_template.md"
 REPORT_MD  = PROJECT_ROOT / "report/report.md"
 
 # ---------- 2. 读数据 ----------
-df = pd.read_csv(CSV)
+def _load_metrics() -> pd.DataFrame:
+    """优先读metrics.csv；打分中途中断时metrics.jsonl更新，读其中每个实验的最新一行"""
+    if CSV.exists() and (not METRICS_STORE.exists() or CSV.stat().st_mtime >= METRICS_STORE.stat().st_mtime):
+        return pd.read_csv(CSV)
+    latest = {}
+    for line in METRICS_STORE.read_text(encoding="utf-8").splitlines():
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        latest[row["exp"]] = row
+    print(f"使用流式指标 {METRICS_STORE}（{len(latest)} 组实验）")
+    return pd.DataFrame(list(latest.values())).drop(columns=["source"], errors="ignore")
+
+df = _load_metrics()
+if "partial" in df.columns:
+    # 部分结果在报告中标注，提示指标只覆盖已完成的问题
+    partial = df["partial"].astype(bool)
+    if partial.any():
+        print(f"⚠️  {int(partial.sum())} 组实验为部分结果")
+    df.loc[partial, "exp"] = df.loc[partial, "exp"] + "（部分）"
 df = df.round(4)
 
 # ---------- 3. 生成所有指标的图表 ----------
@@ -14,6 +14,42 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+
+def concatenate_text(text_blocks: List[Dict]) -> str:
+    """将文本块拼接成完整文本"""
+    # 按垂直位置排序（假设从上到下阅读）
+    sorted_blocks = sorted(text_blocks, key=lambda x: x['bbox'][0][1])
+    
+    # 拼接文本，保留一定的结构
+    lines = []
+    for block in sorted_blocks:
+        text = block['text'].strip()
+        conf = block['confidence']
+        lines.append(f"[Text Block] (conf: {conf:.2f}): {text}")
+    
+    return '\n'.join(lines)
+
+
+def build_document(image_path: str, ocr_results: Dict[str, Any], ocr_version: str, lang: str,
+                   extra_metadata: Optional[Dict[str, Any]] = None) -> Document:
+    """根据OCR结果创建Document对象（单张识别与批量识别共用）"""
+    metadata = {
+        'image_path': str(image_path),
+        'ocr_model': ocr_version,
+        'language': lang,
+        'num_text_blocks': ocr_results['num_text_blocks'],
+        'avg_confidence': ocr_results['avg_confidence'],
+        'file_name': os.path.basename(image_path),
+        'file_size': os.path.getsize(image_path),
+        **(extra_metadata or {})
+    }
+    
+    return Document(
+        text=concatenate_text(ocr_results['text_blocks']),
+        metadata=metadata
+    )
+
+
 class ImageOCRReader(BaseReader):
     """使用PP-OCR从图像中提取文本并返回Document"""
     
@@ -34,6 +70,15 @@ class ImageOCRReader(BaseReader):
         self.lang = lang
         self.use_gpu = use_gpu
         self.ocr_version = ocr_version
+        # 构造参数，批量模式下每个工作进程用它重建一个相同配置的OCR模型
+        self.reader_kwargs = {
+            'lang': lang,
+            'use_gpu': use_gpu,
+            'ocr_version': ocr_version,
+            'text_detection_model_name': text_detection_model_name,
+            'text_recognition_model_name': text_recognition_model_name,
+            **kwargs
+        }
         
         # 初始化OCR模型
         ocr_params = {
@@ -96,36 +141,66 @@ class ImageOCRReader(BaseReader):
                 print(f"[OCR ERROR] {error_msg}")
                 raise FileNotFoundError(error_msg)
             
-        try:
-            print(f"[OCR DEBUG] 开始OCR处理...")
-            ocr_results = self._perform_ocr(abs_file_path)
+            try:
+                print(f"[OCR DEBUG] 开始OCR处理...")
+                ocr_results = self._perform_ocr(abs_file_path)
             
-            # 创建Document
-            print(f"[OCR DEBUG] 创建Document...")
-            doc = self._create_document(abs_file_path, ocr_results)
-            documents.append(doc)
-            print(f"[OCR DEBUG] 文件处理完成")
+                # 创建Document
+                print(f"[OCR DEBUG] 创建Document...")
+                doc = self._create_document(abs_file_path, ocr_results)
+                documents.append(doc)
+                print(f"[OCR DEBUG] 文件处理完成")
             
-        except Exception as file_error:
-            print(f"[OCR ERROR] 处理文件 {file_path} 时发生错误: {type(file_error).__name__}: {str(file_error)}")
-            import traceback
-            traceback.print_exc()
-            raise file_error
-        finally:
-            # 清理临时文件
-            temp_dir = os.path.dirname(abs_file_path)
-            temp_name = f"temp_resized_{os.path.basename(abs_file_path)}"
-            temp_path = os.path.join(temp_dir, temp_name)
-            if os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                    print(f"[OCR DEBUG] 清理临时文件: {temp_path}")
-                except Exception as cleanup_error:
-                    print(f"[OCR DEBUG] 清理临时文件失败: {cleanup_error}")
+            except Exception as file_error:
+                print(f"[OCR ERROR] 处理文件 {file_path} 时发生错误: {type(file_error).__name__}: {str(file_error)}")
+                import traceback
+                traceback.print_exc()
+                raise file_error
+            finally:
+                # 清理临时文件
+                temp_dir = os.path.dirname(abs_file_path)
+                temp_name = f"temp_resized_{os.path.basename(abs_file_path)}"
+                temp_path = os.path.join(temp_dir, temp_name)
+                if os.path.exists(temp_path):
+                    try:
+                        os.remove(temp_path)
+                        print(f"[OCR DEBUG] 清理临时文件: {temp_path}")
+                    except Exception as cleanup_error:
+                        print(f"[OCR DEBUG] 清理临时文件失败: {cleanup_error}")
         
         print(f"[OCR DEBUG] 所有文件处理完成，共生成 {len(documents)} 个Document")
         return documents
     
+    def iter_batch(self, file: Union[str, List[str]], max_workers: Optional[int] = None,
+                   cache_dir: Optional[str] = None, dpi: int = 300):
+        """
+        批量模式：在进程池中并行识别图像/PDF页面，页面完成即产出Document
+        Args:
+            file: 图像或PDF路径（PDF按页拆分，逐页按需渲染）
+            max_workers: 工作进程数，每个进程加载一个OCR模型，默认CPU核数
+            cache_dir: OCR结果缓存目录，按图像内容哈希+OCR参数命中
+            dpi: PDF页面渲染分辨率
+        Returns:
+            Iterator[Document]，顺序为完成顺序；全部产出后打印吞吐量与阶段耗时
+        """
+        try:
+            from .batch_ocr import BatchOCRProcessor
+        except ImportError:
+            from batch_ocr import BatchOCRProcessor
+        files = [file] if isinstance(file, str) else list(file)
+        processor = BatchOCRProcessor(self.reader_kwargs, max_workers=max_workers,
+                                      cache_dir=cache_dir, dpi=dpi)
+        self.last_batch_stats = processor.stats
+        for doc in processor.iter_documents(files):
+            yield doc
+        self.last_batch_stats = processor.stats
+        print(processor.report())
+    
+    def load_data_batch(self, file: Union[str, List[str]], max_workers: Optional[int] = None,
+                        cache_dir: Optional[str] = None, dpi: int = 300) -> List[Document]:
+        """批量模式的列表版本，参数见 iter_batch"""
+        return list(self.iter_batch(file, max_workers=max_workers, cache_dir=cache_dir, dpi=dpi))
+    
     def _perform_ocr(self, image_path: str) -> Dict[str, Any]:
         """执行OCR并返回结构化结果"""
         try:
@@ -304,38 +379,11 @@ class ImageOCRReader(BaseReader):
     
     def _create_document(self, image_path: str, ocr_results: Dict[str, Any]) -> Document:
         """根据OCR结果创建Document对象"""
-        # 拼接文本
-        full_text = self._concatenate_text(ocr_results['text_blocks'])
-        
-        # 准备元数据
-        metadata = {
-            'image_path': str(image_path),
-            'ocr_model': self.ocr_version,
-            'language': self.lang,
-            'num_text_blocks': ocr_results['num_text_blocks'],
-            'avg_confidence': ocr_results['avg_confidence'],
-            'file_name': os.path.basename(image_path),
-            'file_size': os.path.getsize(image_path)
-        }
-        
-        return Document(
-            text=full_text,
-            metadata=metadata
-        )
+        return build_document(image_path, ocr_results, self.ocr_version, self.lang)
     
     def _concatenate_text(self, text_blocks: List[Dict]) -> str:
         """将文本块拼接成完整文本"""
-        # 按垂直位置排序（假设从上到下阅读）
-        sorted_blocks = sorted(text_blocks, key=lambda x: x['bbox'][0][1])
-        
-        # 拼接文本，保留一定的结构
-        lines = []
-        for block in sorted_blocks:
-            text = block['text'].strip()
-            conf = block['confidence']
-            lines.append(f"[Text Block] (conf: {conf:.2f}): {text}")
-        
-        return '\n'.join(lines)
+        return concatenate_text(text_blocks)
     
     def visualize_ocr(self, image_path: str, output_path: Optional[str] = None) -> str:
         """可视化OCR结果 - 修复坐标映射问题"""
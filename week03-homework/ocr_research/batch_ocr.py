@@ -0,0 +1,253 @@
+# ocr_research/batch_ocr.py
+"""
+批量OCR：进程池并行 + 页面级结果缓存 + 流式返回Document
+
+- 每个工作进程初始化一个PaddleOCR模型，图像/PDF页面在进程池中并行识别
+- PDF不再整本预先渲染到磁盘，而是由工作进程逐页按需渲染
+- OCR结果按 (图像内容哈希 或 PDF内容哈希+页码+dpi) + OCR参数 缓存到磁盘，命中时不再渲染和识别
+- 在途任务数限制为 2 * 工作进程数，页面识别完成即产出Document
+- 统计吞吐量和各阶段耗时(哈希/渲染/OCR/构建Document)
+"""
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import multiprocessing
+import hashlib
+import tempfile
+import shutil
+import json
+import time
+import os
+
+from llama_index.core.schema import Document
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff'}
+OCR_MAX_DIMENSION = 1500  # 与ImageOCRReader._perform_ocr中的缩放上限保持一致
+
+# 工作进程内的OCR模型，由_init_worker创建
+_worker_reader = None
+
+
+def _file_hash(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def ocr_params_hash(reader_kwargs: Dict[str, Any]) -> str:
+    """影响识别结果的OCR参数指纹；use_gpu只影响速度，不参与"""
+    params = {k: v for k, v in reader_kwargs.items() if k != 'use_gpu'}
+    params['max_dimension'] = OCR_MAX_DIMENSION
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def cache_key(content_hash: str, params_hash: str, page: Optional[int] = None, dpi: Optional[int] = None) -> str:
+    raw = f"{content_hash}:{params_hash}:{page}:{dpi}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class OCRCache:
+    """磁盘OCR结果缓存：每个结果一个json文件，写入用临时文件+os.replace，多进程安全"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, ocr_results: Dict[str, Any]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(ocr_results, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def _to_jsonable(ocr_results: Dict[str, Any]) -> Dict[str, Any]:
+    """bbox是numpy数组，转成列表后才能缓存和跨进程传递"""
+    blocks = []
+    for block in ocr_results['text_blocks']:
+        bbox = block['bbox']
+        blocks.append({**block, 'bbox': bbox.tolist() if hasattr(bbox, 'tolist') else list(bbox)})
+    return {**ocr_results, 'text_blocks': blocks}
+
+
+def _init_worker(reader_kwargs: Dict[str, Any]):
+    """工作进程初始化：每个进程只加载一次OCR模型"""
+    global _worker_reader
+    try:
+        from .ImageOCRReader import ImageOCRReader
+    except ImportError:
+        from ImageOCRReader import ImageOCRReader
+    _worker_reader = ImageOCRReader(**reader_kwargs)
+
+
+def _ocr_task(task: Dict[str, Any]) -> Dict[str, Any]:
+    """工作进程中执行：按需渲染PDF页面，识别并写缓存"""
+    timings = {}
+    tmp_dir = None
+    image_path = task['path']
+    try:
+        if task['page'] is not None:
+            import pdf2image
+            start = time.perf_counter()
+            page_image = pdf2image.convert_from_path(
+                task['path'], dpi=task['dpi'], first_page=task['page'], last_page=task['page'])[0]
+            tmp_dir = tempfile.mkdtemp(prefix='ocr_page_')
+            image_path = os.path.join(tmp_dir, f"page_{task['page']}.png")
+            page_image.save(image_path, 'PNG')
+            timings['render'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ocr_results = _to_jsonable(_worker_reader._perform_ocr(image_path))
+        timings['ocr'] = time.perf_counter() - start
+    finally:
+        # _perform_ocr对过大图像会在同目录生成缩放后的临时文件
+        temp_path = os.path.join(os.path.dirname(image_path), f"temp_resized_{os.path.basename(image_path)}")
+        if task['page'] is None and os.path.exists(temp_path):
+            os.remove(temp_path)
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if task['cache_dir']:
+        OCRCache(task['cache_dir']).put(task['key'], ocr_results)
+    return {'task': task, 'ocr_results': ocr_results, 'timings': timings}
+
+
+class BatchOCRProcessor:
+    """进程池批量OCR，按页面完成顺序流式产出Document
+
+    Args:
+        reader_kwargs: 传给ImageOCRReader的参数(lang/use_gpu/ocr_version等)
+        max_workers: 工作进程数，默认CPU核数
+        cache_dir: OCR结果缓存目录，None表示不缓存
+        dpi: PDF页面渲染分辨率
+    """
+
+    def __init__(self, reader_kwargs: Optional[Dict[str, Any]] = None, max_workers: Optional[int] = None,
+                 cache_dir: Optional[str] = None, dpi: int = 300):
+        self.reader_kwargs = {'lang': 'ch', 'use_gpu': False, 'ocr_version': 'PP-OCRv5', **(reader_kwargs or {})}
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache = OCRCache(cache_dir) if cache_dir else None
+        self.dpi = dpi
+        self.params_hash = ocr_params_hash(self.reader_kwargs)
+        self.stats = {}
+
+    def _expand(self, paths: Iterable[str]) -> List[Dict[str, Any]]:
+        """把输入展开成页面级任务：图像一页，PDF每页一个任务"""
+        tasks = []
+        for path in paths:
+            abs_path = os.path.abspath(path)
+            if not os.path.exists(abs_path):
+                raise FileNotFoundError(f"图像文件不存在: {abs_path}")
+            start = time.perf_counter()
+            content_hash = _file_hash(abs_path)
+            self.stats['stage_seconds']['hash'] += time.perf_counter() - start
+            if os.path.splitext(abs_path)[1].lower() == '.pdf':
+                import pdf2image
+                num_pages = pdf2image.pdfinfo_from_path(abs_path)['Pages']
+                for page in range(1, num_pages + 1):
+                    tasks.append({'path': abs_path, 'page': page, 'dpi': self.dpi,
+                                  'key': cache_key(content_hash, self.params_hash, page, self.dpi)})
+            else:
+                tasks.append({'path': abs_path, 'page': None, 'dpi': None,
+                              'key': cache_key(content_hash, self.params_hash)})
+        for task in tasks:
+            task['cache_dir'] = self.cache.cache_dir if self.cache else None
+        return tasks
+
+    def _document(self, task: Dict[str, Any], ocr_results: Dict[str, Any]) -> Document:
+        try:
+            from .ImageOCRReader import build_document
+        except ImportError:
+            from ImageOCRReader import build_document
+        start = time.perf_counter()
+        extra = {'page': task['page'], 'dpi': task['dpi']} if task['page'] is not None else {}
+        doc = build_document(task['path'], ocr_results, self.reader_kwargs['ocr_version'],
+                             self.reader_kwargs['lang'], extra_metadata=extra)
+        self.stats['stage_seconds']['document'] += time.perf_counter() - start
+        return doc
+
+    def iter_documents(self, paths: Iterable[str]) -> Iterator[Document]:
+        """流式产出Document：缓存命中的页面立即产出，其余页面识别完成即产出（不保证输入顺序）"""
+        wall_start = time.perf_counter()
+        self.stats = {'pages': 0, 'cache_hits': 0, 'ocr_pages': 0, 'failed_pages': 0,
+                      'stage_seconds': {'hash': 0.0, 'render': 0.0, 'ocr': 0.0, 'document': 0.0}}
+        tasks = self._expand(paths)
+
+        pending = []
+        for task in tasks:
+            cached = self.cache.get(task['key']) if self.cache else None
+            if cached is not None:
+                self.stats['cache_hits'] += 1
+                self.stats['pages'] += 1
+                yield self._document(task, cached)
+            else:
+                pending.append(task)
+
+        if pending:
+            workers = min(self.max_workers, len(pending))
+            # PaddleOCR不是fork安全的，工作进程用spawn方式启动
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=(self.reader_kwargs,)) as pool:
+                queue = iter(pending)
+                in_flight = set()
+                while True:
+                    # 有界提交：最多2倍进程数的任务在途，避免大批量时占满内存
+                    while len(in_flight) < workers * 2:
+                        task = next(queue, None)
+                        if task is None:
+                            break
+                        in_flight.add(pool.submit(_ocr_task, task))
+                    if not in_flight:
+                        break
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"[OCR BATCH ERROR] 页面识别失败: {type(e).__name__}: {e}")
+                            self.stats['failed_pages'] += 1
+                            continue
+                        for stage, seconds in result['timings'].items():
+                            self.stats['stage_seconds'][stage] += seconds
+                        self.stats['ocr_pages'] += 1
+                        self.stats['pages'] += 1
+                        yield self._document(result['task'], result['ocr_results'])
+
+        wall = time.perf_counter() - wall_start
+        self.stats['wall_seconds'] = wall
+        self.stats['pages_per_second'] = self.stats['pages'] / wall if wall > 0 else 0.0
+        self.stats['workers'] = min(self.max_workers, len(pending)) if pending else 0
+
+    def load_data(self, paths: Iterable[str]) -> List[Document]:
+        return list(self.iter_documents(paths))
+
+    def report(self) -> str:
+        """吞吐量与各阶段耗时摘要；OCR/渲染为各进程累计耗时，可大于墙钟时间"""
+        stats = self.stats
+        if not stats:
+            return "[OCR BATCH] 尚未运行"
+        lines = [
+            f"[OCR BATCH] 页面 {stats['pages']} (识别 {stats['ocr_pages']}, 缓存命中 {stats['cache_hits']}, "
+            f"失败 {stats['failed_pages']}), 进程 {stats.get('workers', 0)}",
+            f"[OCR BATCH] 墙钟 {stats.get('wall_seconds', 0):.2f}s, 吞吐 {stats.get('pages_per_second', 0):.2f} 页/s",
+        ]
+        for stage, seconds in stats['stage_seconds'].items():
+            count = stats['ocr_pages'] if stage in ('ocr', 'render') else stats['pages']
+            avg_ms = seconds / count * 1000 if count else 0.0
+            lines.append(f"[OCR BATCH]   {stage:<8} 累计 {seconds:.2f}s, 平均 {avg_ms:.1f}ms/页")
+        return '\n'.join(lines)
@@ -0,0 +1,85 @@
+# pip install pytest
+import pytest
+import sys
+import os
+# 添加父目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 缓存相关测试只依赖llama_index；真实识别的测试再检查paddleocr
+pytest.importorskip("llama_index")
+from batch_ocr import BatchOCRProcessor, OCRCache, cache_key, ocr_params_hash
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+TEST_IMAGES = [
+    os.path.join(DATA_DIR, "natural_scene/test.jpeg"),
+    os.path.join(DATA_DIR, "scanned_docs/test.png"),
+    os.path.join(DATA_DIR, "screenshots/test.png"),
+]
+
+
+def _image_reader():
+    pytest.importorskip("paddleocr")
+    from ImageOCRReader import ImageOCRReader
+    return ImageOCRReader(lang='ch')
+
+
+def _existing_images():
+    images = [path for path in TEST_IMAGES if os.path.exists(path)]
+    if not images:
+        pytest.skip(f"测试图像不存在: {TEST_IMAGES}")
+    return images
+
+
+def test_cache_key_depends_on_params():
+    """OCR参数变化时缓存键必须变化，use_gpu不影响结果所以不参与"""
+    base = ocr_params_hash({'lang': 'ch', 'ocr_version': 'PP-OCRv5', 'use_gpu': False})
+    assert base == ocr_params_hash({'lang': 'ch', 'ocr_version': 'PP-OCRv5', 'use_gpu': True})
+    assert base != ocr_params_hash({'lang': 'en', 'ocr_version': 'PP-OCRv5', 'use_gpu': False})
+    assert cache_key('abc', base) != cache_key('abc', base, page=1, dpi=300)
+    assert cache_key('abc', base, page=1, dpi=300) != cache_key('abc', base, page=1, dpi=200)
+
+
+def test_ocr_cache_roundtrip(tmp_path):
+    """缓存写入后可读回，未命中返回None"""
+    cache = OCRCache(str(tmp_path))
+    result = {'text_blocks': [{'text': '你好', 'confidence': 0.9, 'bbox': [[0, 1], [2, 1], [2, 3], [0, 3]]}],
+              'num_text_blocks': 1, 'avg_confidence': 0.9}
+    cache.put('ab' * 32, result)
+    assert cache.get('ab' * 32) == result
+    assert cache.get('cd' * 32) is None
+
+
+def test_batch_matches_sequential(tmp_path):
+    """批量模式与逐张识别的文本一致，第二次运行全部命中缓存"""
+    images = _existing_images()
+    reader = _image_reader()
+    sequential = {doc.metadata['image_path']: doc.text for doc in reader.load_data(images)}
+
+    processor = BatchOCRProcessor(reader.reader_kwargs, max_workers=2, cache_dir=str(tmp_path / "cache"))
+    first = processor.load_data(images)
+    assert len(first) == len(images)
+    assert processor.stats['ocr_pages'] == len(images)
+    assert processor.stats['workers'] == min(2, len(images))
+    assert processor.stats['stage_seconds']['ocr'] > 0
+    assert f"页面 {len(images)} (识别 {len(images)}, 缓存命中 0, 失败 0)" in processor.report()
+    assert {doc.metadata['image_path']: doc.text for doc in first} == sequential
+
+    second = processor.load_data(images)
+    assert processor.stats['cache_hits'] == len(images)
+    assert processor.stats['ocr_pages'] == 0
+    assert processor.stats['workers'] == 0
+    assert processor.stats['stage_seconds']['ocr'] == 0
+    assert f"页面 {len(images)} (识别 0, 缓存命中 {len(images)}, 失败 0), 进程 0" in processor.report()
+    assert {doc.metadata['image_path']: doc.text for doc in second} == sequential
+
+
+def test_reader_load_data_batch(tmp_path):
+    """ImageOCRReader.load_data_batch 返回的Document与load_data元数据一致"""
+    images = _existing_images()[:1]
+    reader = _image_reader()
+    documents = reader.load_data_batch(images, max_workers=1, cache_dir=str(tmp_path / "cache"))
+
+    assert len(documents) == 1
+    assert documents[0].metadata['language'] == 'ch'
+    assert documents[0].metadata['file_name'] == os.path.basename(images[0])
+    assert reader.last_batch_stats['pages'] == 1
@@ -14,7 +14,7 @@
 import os
 import json
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 import pdf2image
 from PIL import Image
 
@@ -33,17 +33,29 @@ def convert_pdf_to_images(pdf_path: str, output_dir: str, dpi: int = 300) -> Lis
     
     return image_paths
 
-def batch_process_images(reader, input_dir: str, output_dir: str) -> List[str]:
-    """批量处理图像目录"""
+def batch_process_images(reader, input_dir: str, output_dir: str,
+                         max_workers: Optional[int] = None, cache_dir: Optional[str] = None) -> List[str]:
+    """批量处理图像目录
+
+    指定 max_workers 或 cache_dir 时走批量模式（reader.iter_batch）：
+    目录中的PDF也会按页识别，每完成一页立即写出结果文件
+    """
     input_path = Path(input_dir)
     image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff'}
+    batch_mode = max_workers is not None or cache_dir is not None
+    if batch_mode:
+        image_extensions.add('.pdf')
     
     image_files = []
     for ext in image_extensions:
         image_files.extend(input_path.glob(f"*{ext}"))
         image_files.extend(input_path.glob(f"*{ext.upper()}"))
     
-    documents = reader.load_data([str(f) for f in image_files])
+    if batch_mode:
+        documents = reader.iter_batch([str(f) for f in sorted(image_files)],
+                                      max_workers=max_workers, cache_dir=cache_dir)
+    else:
+        documents = reader.load_data([str(f) for f in image_files])
     
     # 保存处理结果
     output_path = Path(output_dir)
@@ -59,4 +71,4 @@ def batch_process_images(reader, input_dir: str, output_dir: str) -> List[str]:
             }, f, ensure_ascii=False, indent=2)
         saved_files.append(str(result_file))
     
-    return saved_files
\ No newline at end of file
+    return saved_files
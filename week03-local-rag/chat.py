@@ -1,7 +1,11 @@
 # RAG对话系统核心引擎 - 集成检索增强生成技术
 import os
+import time
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
-from llama_index.core import StorageContext, load_index_from_storage, Settings
+from llama_index.core import Settings
 from llama_index.embeddings.dashscope import (
     DashScopeEmbedding,
     DashScopeTextEmbeddingModels,
@@ -18,6 +22,7 @@ except ImportError:
     # 通过None值标记和条件检查实现功能的优雅降级
 
 from create_kb import *
+from index_registry import index_registry
 
 # 系统配置常量
 DB_PATH = "VectorStore"  # 向量数据库根路径
@@ -38,6 +43,44 @@ EMBED_MODEL = DashScopeEmbedding(
 # 全局嵌入模型设置 - 确保检索和构建使用相同的向量空间
 Settings.embed_model = EMBED_MODEL
 
+# 临时知识库后台构建 - 单线程执行，聊天生成器轮询进度并推送到界面
+_tmp_kb_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tmp_kb")
+_tmp_kb_lock = threading.Lock()
+_tmp_kb_future = None
+_tmp_kb_progress = {"stage": "", "done": 0, "total": 0}
+
+
+def _report_tmp_kb_progress(stage, done, total):
+    _tmp_kb_progress.update(stage=stage, done=done, total=total)
+
+
+def submit_tmp_kb(files):
+    """提交临时知识库构建任务，已有任务在运行时直接复用"""
+    global _tmp_kb_future
+    with _tmp_kb_lock:
+        if _tmp_kb_future is None or _tmp_kb_future.done():
+            _report_tmp_kb_progress("排队中", 0, 0)
+            _tmp_kb_future = _tmp_kb_executor.submit(create_tmp_kb, files, _report_tmp_kb_progress)
+        return _tmp_kb_future
+
+
+def tmp_kb_progress_text():
+    stage, done, total = _tmp_kb_progress["stage"], _tmp_kb_progress["done"], _tmp_kb_progress["total"]
+    if total:
+        return f"正在为上传的文件建立索引：{stage} {done}/{total}"
+    return f"正在为上传的文件建立索引：{stage}"
+
+
+@lru_cache(maxsize=None)
+def get_reranker(top_n):
+    """按召回片段数缓存重排序器实例，避免每轮对话重复创建"""
+    if DashScopeRerank is None:
+        return None
+    return DashScopeRerank(
+        top_n=top_n,               # 重排序后保留的文档数量
+        return_documents=True      # 返回完整文档而非仅ID
+    )
+
 def get_model_response(multi_modal_input, history, model, temperature, max_tokens, history_round, db_name, similarity_threshold, chunk_cnt):
     """
     RAG对话系统核心响应生成器
@@ -58,32 +101,35 @@ def get_model_response(multi_modal_input, history, model, temperature, max_token
     
     # 动态知识库选择策略
     # 优先级：临时上传文件 > 用户选择的知识库
+    build_future = _tmp_kb_future
     if os.path.exists(os.path.join("File", TMP_NAME)):
         db_name = TMP_NAME  # 使用临时知识库
     else:
         if tmp_files:
-            # 实时构建临时知识库 - 支持即时文档问答
-            create_tmp_kb(tmp_files)
+            # 后台构建临时知识库 - 支持即时文档问答
+            build_future = submit_tmp_kb(tmp_files)
             db_name = TMP_NAME
     
+    # 临时知识库构建中：轮询进度并流式推送到界面，构建完成后再检索
+    if db_name == TMP_NAME and build_future is not None and not build_future.done():
+        while not build_future.done():
+            history[-1][-1] = tmp_kb_progress_text()
+            yield history, ""
+            time.sleep(0.5)
+    if db_name == TMP_NAME and build_future is not None and build_future.exception() is not None:
+        # 构建失败时清理残留文件，便于用户重新上传
+        print(f"临时知识库构建失败：{build_future.exception()}")
+        clear_tmp()
+    
     print(f"prompt:{prompt},tmp_files:{tmp_files},db_name:{db_name}")
     
     try:
-        # 重排序器初始化 - 采用条件性实例化避免导入错误
-        if DashScopeRerank is not None:
-            dashscope_rerank = DashScopeRerank(
-                top_n=chunk_cnt,           # 重排序后保留的文档数量
-                return_documents=True      # 返回完整文档而非仅ID
-            )
-        else:
-            dashscope_rerank = None
+        # 重排序器获取 - 按召回片段数复用实例
+        dashscope_rerank = get_reranker(chunk_cnt)
         
-        # 向量索引加载 - 从持久化存储恢复索引结构
-        storage_context = StorageContext.from_defaults(
-            persist_dir=os.path.join(DB_PATH, db_name)
-        )
-        index = load_index_from_storage(storage_context)
-        print("index获取完成")
+        # 向量索引获取 - 优先使用常驻内存的索引，目录变化时自动重新加载
+        index = index_registry.get(db_name)
+        print(f"index获取完成，常驻索引：{index_registry.stats()}")
         
         # 检索器配置 - 第一阶段粗排检索
         retriever_engine = index.as_retriever(
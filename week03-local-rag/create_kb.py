@@ -4,7 +4,8 @@
 import gradio as gr
 import os
 import shutil
-from llama_index.core import VectorStoreIndex, Settings, SimpleDirectoryReader
+import hashlib
+from llama_index.core import VectorStoreIndex, Settings, SimpleDirectoryReader, StorageContext, load_index_from_storage
 from llama_index.embeddings.dashscope import (
     DashScopeEmbedding,
     DashScopeTextEmbeddingModels,
@@ -12,12 +13,15 @@ from llama_index.embeddings.dashscope import (
 )
 from llama_index.core.schema import TextNode
 from upload_file import *
+from index_registry import index_registry
 
 # 系统路径配置 - 分层存储架构
 DB_PATH = "VectorStore"                    # 向量数据库存储根目录
 STRUCTURED_FILE_PATH = "File/Structured"   # 结构化数据源路径
 UNSTRUCTURED_FILE_PATH = "File/Unstructured"  # 非结构化数据源路径
 TMP_NAME = "tmp_abcd"                      # 临时知识库标识符
+TMP_EMBED_BATCH = 100                      # 临时知识库每批向量化的节点数，也是进度上报的粒度
+STRUCTURED_EMBED_BATCH = 500               # 结构化知识库增量更新时每批向量化的行数
 
 # 嵌入模型配置 - 采用阿里云DashScope高性能向量化服务
 EMBED_MODEL = DashScopeEmbedding(
@@ -84,6 +88,7 @@ def create_unstructured_db(db_name: str, label_name: list):
             os.mkdir(db_path)
             # 序列化索引结构到磁盘，包括向量数据和元数据
             index.storage_context.persist(db_path)
+            index_registry.invalidate(db_name)
         elif os.path.exists(db_path):
             pass  # 路径已存在，跳过创建
         
@@ -114,27 +119,8 @@ def create_structured_db(db_name: str, data_table: list):
     else:
         gr.Info("正在创建知识库，请等待知识库创建成功信息显示后前往RAG问答")
         
-        # 文档加载阶段
-        documents = []
-        for label in data_table:
-            label_path = os.path.join(STRUCTURED_FILE_PATH, label)
-            documents.extend(SimpleDirectoryReader(label_path).load_data())
-        
-        # 自定义节点构建 - 针对结构化数据的特殊处理
-        nodes = []
-        for doc in documents:
-            # 按行分割文档内容 - 每行代表一个完整的数据记录
-            doc_content = doc.get_content().split('\n')
-            for chunk in doc_content:
-                if chunk.strip():  # 跳过空行
-                    # 创建TextNode - LlamaIndex的基础文本节点类型
-                    node = TextNode(text=chunk)
-                    # 元数据保持 - 支持数据溯源和过滤查询
-                    node.metadata = {
-                        'source': doc.get_doc_id(),           # 原始文档标识
-                        'file_name': doc.metadata['file_name'] # 源文件名
-                    }
-                    nodes.append(node)
+        # 行级节点构建 - 每行数据作为独立检索单元
+        nodes = load_structured_nodes(data_table)
         
         # 从节点构建向量索引 - 跳过默认的文档分块过程
         # 这种方式确保每个数据行作为独立的检索单元
@@ -145,16 +131,149 @@ def create_structured_db(db_name: str, data_table: list):
         if not os.path.exists(db_path):
             os.mkdir(db_path)
         index.storage_context.persist(db_path)
+        # 目录已重写，丢弃常驻内存中的旧索引
+        index_registry.invalidate(db_name)
         
         gr.Info("知识库创建成功，可前往RAG问答进行提问")
 
 
+def row_node_id(table: str, file_name: str, text: str, occurrence: int = 0) -> str:
+    """
+    数据行的确定性节点ID：由数据表、文件名、行内容和该行在文件中第几次出现共同决定
+    不同数据表中的同名文件互不影响；同一文件中的重复行按出现次数区分，各自保留一个节点
+    行内容变化即视为删除旧行+新增新行
+    """
+    return hashlib.sha1(f"{table}\n{file_name}\n{text}\n{occurrence}".encode('utf-8')).hexdigest()
+
+
+def load_structured_nodes(data_table: list):
+    """
+    读取数据表并按行构建TextNode
+
+    节点ID见row_node_id，增量更新时据此与已有索引做差集；重复的行与原来一样各自保留
+    """
+    # 自定义节点构建 - 针对结构化数据的特殊处理
+    nodes = []
+    for label in data_table:
+        label_path = os.path.join(STRUCTURED_FILE_PATH, label)
+        # (文件名, 行内容) -> 已出现次数
+        occurrences = {}
+        for doc in SimpleDirectoryReader(label_path).load_data():
+            # 按行分割文档内容 - 每行代表一个完整的数据记录
+            for chunk in doc.get_content().split('\n'):
+                if chunk.strip():  # 跳过空行
+                    row_key = (doc.metadata['file_name'], chunk)
+                    occurrence = occurrences.get(row_key, 0)
+                    occurrences[row_key] = occurrence + 1
+                    # 创建TextNode - LlamaIndex的基础文本节点类型
+                    node = TextNode(text=chunk, id_=row_node_id(label, doc.metadata['file_name'], chunk, occurrence))
+                    # 元数据保持 - 支持数据溯源和过滤查询
+                    node.metadata = {
+                        'source': doc.get_doc_id(),            # 原始文档标识
+                        'file_name': doc.metadata['file_name'], # 源文件名
+                        'table': label                          # 所属数据表
+                    }
+                    nodes.append(node)
+    return nodes
+
+
+def _table_files():
+    """数据表 -> 表中的文件名集合"""
+    tables = {}
+    for label in os.listdir(STRUCTURED_FILE_PATH):
+        label_path = os.path.join(STRUCTURED_FILE_PATH, label)
+        if os.path.isdir(label_path):
+            tables[label] = {f for f in os.listdir(label_path) if os.path.isfile(os.path.join(label_path, f))}
+    return tables
+
+
+def update_structured_db(db_name: str, data_table: list):
+    """
+    结构化知识库行级增量更新
+
+    以所选数据表的当前内容为准，按节点ID（见row_node_id）与已持久化的索引做差集：
+    - 新增/变化的行分批向量化后插入索引
+    - 已不存在的行直接从向量库和docstore中删除
+    - 未变化的行不重新向量化
+    只比对属于所选数据表的节点，未选中的数据表在知识库中的行保持不变
+    旧版本构建的知识库节点没有数据表信息，按文件名找到唯一包含该文件的数据表后重新计算ID；
+    所选数据表与其他数据表有同名文件时无法确定旧节点的归属，不做更新，需删除知识库后重新创建
+    """
+    print(f"增量更新知识库：{db_name}，数据表名称为：{data_table}")
+    
+    if not data_table:
+        gr.Info("没有选择数据表")
+        return
+    elif len(db_name) == 0:
+        gr.Info("没有命名知识库")
+        return
+    db_path = os.path.join(DB_PATH, db_name)
+    if db_name not in os.listdir(DB_PATH):
+        gr.Info("知识库不存在，请先创建知识库")
+        return
+    
+    gr.Info("正在比对数据行，请等待更新完成信息显示")
+    storage_context = StorageContext.from_defaults(persist_dir=db_path)
+    index = load_index_from_storage(storage_context)
+    
+    # 已有行：按当前规则计算的节点ID -> docstore中的节点ID（新版本知识库两者相同）
+    table_files = _table_files()
+    selected = set(data_table)
+    existing = {}
+    legacy_occurrences = {}
+    ambiguous = 0
+    for node_id, node in index.docstore.docs.items():
+        file_name = node.metadata.get('file_name', '')
+        table = node.metadata.get('table')
+        if table is None:
+            tables = [label for label, files in table_files.items() if file_name in files]
+            if len(tables) != 1:
+                if selected.intersection(tables):
+                    ambiguous += 1
+                continue
+            table = tables[0]
+            if table not in selected:
+                continue
+            row_key = (table, file_name, node.get_content())
+            occurrence = legacy_occurrences.get(row_key, 0)
+            legacy_occurrences[row_key] = occurrence + 1
+            existing[row_node_id(*row_key, occurrence)] = node_id
+        elif table in selected:
+            existing[node_id] = node_id
+    if ambiguous:
+        print(f"{db_name}：{ambiguous}个旧版本节点所在文件在多个数据表中同名，无法确定归属")
+        gr.Info("知识库由旧版本创建且多个数据表中有同名文件，无法增量更新，请删除知识库后重新创建")
+        return
+    
+    nodes = load_structured_nodes(data_table)
+    current = {node.node_id for node in nodes}
+    added = [node for node in nodes if node.node_id not in existing]
+    removed = [node_id for row_id, node_id in existing.items() if row_id not in current]
+    print(f"{db_name}：共{len(nodes)}行，新增/变化{len(added)}行，删除{len(removed)}行")
+    
+    if not added and not removed:
+        gr.Info("数据没有变化，无需更新")
+        return
+    
+    # 先删后增：变化的行旧版本被删除，新版本作为新节点插入
+    if removed:
+        index.delete_nodes(removed, delete_from_docstore=True)
+    for start in range(0, len(added), STRUCTURED_EMBED_BATCH):
+        index.insert_nodes(added[start:start + STRUCTURED_EMBED_BATCH])
+        print(f"{db_name}：已向量化{min(start + STRUCTURED_EMBED_BATCH, len(added))}/{len(added)}行")
+    
+    index.storage_context.persist(db_path)
+    index_registry.invalidate(db_name)
+    gr.Info(f"知识库更新成功：新增/变化{len(added)}行，删除{len(removed)}行")
+
+
 # 删除指定名称知识库
 def delete_db(db_name:str):
     if db_name is not None:
         folder_path = os.path.join(DB_PATH, db_name)
         if os.path.exists(folder_path):
             shutil.rmtree(folder_path)
+            index_registry.invalidate(db_name)
             gr.Info(f"已成功删除{db_name}知识库")
             print(f"已成功删除{db_name}知识库")
         else:
@@ -166,24 +285,41 @@ def update_knowledge_base():
     return gr.update(choices=os.listdir(DB_PATH))
 
 # 临时文件创建知识库
-def create_tmp_kb(files):
+def create_tmp_kb(files, progress=None):
+    """
+    临时文件知识库构建，通常在后台线程中执行
+
+    节点按TMP_EMBED_BATCH分批插入索引，每批完成后通过progress(stage, done, total)上报进度，
+    构建完成后直接放入常驻索引注册表，首次提问无需再从磁盘反序列化
+    """
+    def report(stage, done=0, total=0):
+        if progress is not None:
+            progress(stage, done, total)
+
     if not os.path.exists(os.path.join("File",TMP_NAME)):
         os.mkdir(os.path.join("File",TMP_NAME))
     for file in files:
         file_name = os.path.basename(file)
         shutil.move(file,os.path.join("File",TMP_NAME,file_name))
+    report("解析文件")
     documents = SimpleDirectoryReader(os.path.join("File",TMP_NAME)).load_data()
-    index = VectorStoreIndex.from_documents(
-        documents
-    )
+    nodes = Settings.node_parser.get_nodes_from_documents(documents)
+    index = VectorStoreIndex([])
+    for start in range(0, len(nodes), TMP_EMBED_BATCH):
+        report("向量化", start, len(nodes))
+        index.insert_nodes(nodes[start:start + TMP_EMBED_BATCH])
+    report("保存索引", len(nodes), len(nodes))
     db_path = os.path.join(DB_PATH,TMP_NAME)
     if not os.path.exists(db_path):
         os.mkdir(db_path)
     index.storage_context.persist(db_path)
+    index_registry.put(TMP_NAME, index)
+    return index
 
 # 清除tmp文件夹下内容 
 def clear_tmp():
     if os.path.exists(os.path.join("File",TMP_NAME)):
         shutil.rmtree(os.path.join("File",TMP_NAME))
     if os.path.exists(os.path.join(DB_PATH,TMP_NAME)):
-        shutil.rmtree(os.path.join(DB_PATH,TMP_NAME))
\ No newline at end of file
+        shutil.rmtree(os.path.join(DB_PATH,TMP_NAME))
+    index_registry.invalidate(TMP_NAME)
\ No newline at end of file
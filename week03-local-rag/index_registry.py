@@ -0,0 +1,125 @@
+#####################################
+######       常驻索引注册表         #######
+#####################################
+import os
+import threading
+from collections import OrderedDict
+from llama_index.core import StorageContext, load_index_from_storage
+
+# 常驻索引的内存预算，默认1GB，可通过环境变量调整
+INDEX_CACHE_MAX_MB = int(os.getenv("INDEX_CACHE_MAX_MB", "1024"))
+
+
+def dir_signature(db_path: str):
+    """
+    知识库目录签名：持久化文件的(文件名, 修改时间, 大小)
+    create_kb.py重写目录后签名必然变化，其他进程改写目录时同样能被发现
+    """
+    if not os.path.isdir(db_path):
+        return None
+    signature = []
+    for entry in sorted(os.scandir(db_path), key=lambda e: e.name):
+        if entry.is_file():
+            stat = entry.stat()
+            signature.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def dir_footprint(db_path: str) -> int:
+    """以持久化文件总大小近似估算索引的内存占用（字节）"""
+    if not os.path.isdir(db_path):
+        return 0
+    return sum(entry.stat().st_size for entry in os.scandir(db_path) if entry.is_file())
+
+
+class IndexRegistry:
+    """
+    知识库索引常驻缓存
+
+    设计要点：
+    1. 反序列化索引是大知识库首token延迟的主要来源，最近使用的索引常驻内存
+    2. 按内存占用做LRU淘汰：总占用超过预算时从最久未用的开始淘汰，至少保留最近一个
+    3. 每次获取都比对目录签名，目录被重写后自动重新加载；create_kb.py写盘后也会主动invalidate
+    4. 同一知识库并发首次加载时只反序列化一次
+    """
+
+    def __init__(self, root: str, max_bytes: int = INDEX_CACHE_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # db_name -> (index, signature, footprint)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def _db_path(self, db_name: str) -> str:
+        return os.path.join(self.root, db_name)
+
+    def get(self, db_name: str):
+        """获取知识库索引，未缓存或目录已变化时从磁盘加载"""
+        db_path = self._db_path(db_name)
+        signature = dir_signature(db_path)
+        if signature is None:
+            self.invalidate(db_name)
+            raise FileNotFoundError(f"{db_name}知识库不存在")
+        with self._lock:
+            entry = self._entries.get(db_name)
+            if entry is not None and entry[1] == signature:
+                self._entries.move_to_end(db_name)
+                return entry[0]
+            load_lock = self._load_locks.setdefault(db_name, threading.Lock())
+        with load_lock:
+            # 等锁期间可能已被其他请求加载完成
+            with self._lock:
+                entry = self._entries.get(db_name)
+                if entry is not None and entry[1] == signature:
+                    self._entries.move_to_end(db_name)
+                    return entry[0]
+            storage_context = StorageContext.from_defaults(persist_dir=db_path)
+            index = load_index_from_storage(storage_context)
+            print(f"{db_name}索引已加载，占用约{dir_footprint(db_path) / 1024 / 1024:.1f}MB")
+            self.put(db_name, index, signature)
+        return index
+
+    def put(self, db_name: str, index, signature=None):
+        """放入已在内存中的索引（如刚构建完成的临时知识库），避免再从磁盘加载一次"""
+        db_path = self._db_path(db_name)
+        if signature is None:
+            signature = dir_signature(db_path)
+        footprint = dir_footprint(db_path)
+        with self._lock:
+            self._pop(db_name)
+            self._entries[db_name] = (index, signature, footprint)
+            self._total_bytes += footprint
+            self._evict()
+
+    def invalidate(self, db_name: str):
+        with self._lock:
+            self._pop(db_name)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _pop(self, db_name: str):
+        entry = self._entries.pop(db_name, None)
+        if entry is not None:
+            self._total_bytes -= entry[2]
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            db_name, (_, _, footprint) = self._entries.popitem(last=False)
+            self._total_bytes -= footprint
+            print(f"{db_name}索引已从内存淘汰，释放约{footprint / 1024 / 1024:.1f}MB")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resident": list(self._entries),
+                "total_mb": round(self._total_bytes / 1024 / 1024, 1),
+                "max_mb": round(self.max_bytes / 1024 / 1024, 1),
+            }
+
+
+# 全局注册表 - 与create_kb.py的DB_PATH保持一致
+index_registry = IndexRegistry("VectorStore")
@@ -162,6 +162,7 @@ def get_upload_block():
                     with gr.Row():
                         new_label_1 = gr.Textbox(label="数据表名称",placeholder="请输入数据表名称",scale=5)
                         create_label_btn_1 = gr.Button("新建数据表",variant="primary",scale=1)
+                        update_label_btn_1 = gr.Button("更新数据表",scale=1)
             with gr.Accordion(label="管理数据表",open=False):
                 with gr.Row():
                     data_label_1 =gr.Dropdown(choices=os.listdir(STRUCTURED_FILE_PATH),label="管理数据表",interactive=True,scale=8,multiselect=True)
@@ -170,6 +171,7 @@ def get_upload_block():
         create_label_btn.click(fn=upload_unstructured_file,inputs=[unstructured_file,new_label]).then(fn=update_label,outputs=[data_label])
         delete_data_table_btn.click(delete_data_table,inputs=[data_label_1]).then(fn=update_datatable,outputs=[data_label_1])
         create_label_btn_1.click(fn=upload_structured_file,inputs=[structured_file,new_label_1]).then(fn=update_datatable,outputs=[data_label_1])
+        update_label_btn_1.click(fn=update_structured_file,inputs=[structured_file,new_label_1]).then(fn=update_datatable,outputs=[data_label_1])
         upload.load(update_label,[],data_label)
         upload.load(update_datatable,[],data_label_1)
     return upload
@@ -189,12 +191,14 @@ def get_knowledge_base_block():
                 data_label_3 =gr.Dropdown(choices=os.listdir(STRUCTURED_FILE_PATH),label="选择数据表",interactive=True,scale=2,multiselect=True)
                 knowledge_base_name_1 = gr.Textbox(label="知识库名称",placeholder="请输入知识库名称",scale=2)
                 create_knowledge_base_btn_1 = gr.Button("确认创建知识库",variant="primary",scale=1)
+                update_knowledge_base_btn_1 = gr.Button("增量更新知识库",scale=1)
         with gr.Row():
             knowledge_base =gr.Dropdown(choices=os.listdir(DB_PATH),label="管理知识库",interactive=True,scale=4)
             delete_db_btn = gr.Button("删除知识库",variant="stop",scale=1)
         create_knowledge_base_btn.click(fn=create_unstructured_db,inputs=[knowledge_base_name,data_label_2]).then(update_knowledge_base,outputs=[knowledge_base])
         delete_db_btn.click(delete_db,inputs=[knowledge_base]).then(update_knowledge_base,outputs=[knowledge_base])
         create_knowledge_base_btn_1.click(fn=create_structured_db,inputs=[knowledge_base_name_1,data_label_3]).then(update_knowledge_base,outputs=[knowledge_base])
+        update_knowledge_base_btn_1.click(fn=update_structured_db,inputs=[knowledge_base_name_1,data_label_3]).then(update_knowledge_base,outputs=[knowledge_base])
         knowledge.load(update_knowledge_base,[],knowledge_base)
         knowledge.load(update_label,[],data_label_2)
         knowledge.load(update_datatable,[],data_label_3)
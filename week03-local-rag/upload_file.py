@@ -71,6 +71,35 @@ def upload_unstructured_file(files, label_name):
             # 异常处理 - 提供用户友好的错误反馈
             gr.Info(f"请勿重复上传")
 
+def table_to_txt(table_path, txt_path):
+    """
+    表格文件行级文本化：每行转换为【列名:值,...】，行之间以换行分隔
+    同一文件重复上传时输出会覆盖旧文本，供知识库按行增量更新
+    """
+    # 多格式表格数据统一处理 - 策略模式应用
+    if os.path.splitext(table_path)[1] == ".xlsx":
+        df = pd.read_excel(table_path)
+    elif os.path.splitext(table_path)[1] == ".csv":
+        df = pd.read_csv(table_path)
+    
+    columns = df.columns
+    
+    # 行级数据序列化处理
+    with open(txt_path, "w", encoding='utf-8') as file:
+        for idx, row in df.iterrows():
+            file.write("【")  # 数据块起始标记
+            info = []
+            # 键值对格式转换 - 保持语义结构
+            for col in columns:
+                info.append(f"{col}:{row[col]}")
+            infos = ",".join(info)
+            file.write(infos)
+            # 条件性换行处理 - 避免文件末尾多余换行
+            if idx != len(df) - 1:
+                file.write("】\n")
+            else:
+                file.write("】")
+
 # 结构化数据上传与预处理器
 def upload_structured_file(files, label_name):
     """
@@ -105,31 +134,9 @@ def upload_structured_file(files, label_name):
                 destination_file_path = os.path.join(STRUCTURED_FILE_PATH, label_name, file_name)
                 shutil.move(file_path, destination_file_path)
                 
-                # 多格式表格数据统一处理 - 策略模式应用
-                if os.path.splitext(destination_file_path)[1] == ".xlsx":
-                    df = pd.read_excel(destination_file_path)
-                elif os.path.splitext(destination_file_path)[1] == ".csv":
-                    df = pd.read_csv(destination_file_path)
-                
                 # 结构化数据文本化转换
                 txt_file_name = os.path.splitext(file_name)[0] + '.txt'
-                columns = df.columns
-                
-                # 行级数据序列化处理
-                with open(os.path.join(STRUCTURED_FILE_PATH, label_name, txt_file_name), "w", encoding='utf-8') as file:
-                    for idx, row in df.iterrows():
-                        file.write("【")  # 数据块起始标记
-                        info = []
-                        # 键值对格式转换 - 保持语义结构
-                        for col in columns:
-                            info.append(f"{col}:{row[col]}")
-                        infos = ",".join(info)
-                        file.write(infos)
-                        # 条件性换行处理 - 避免文件末尾多余换行
-                        if idx != len(df) - 1:
-                            file.write("】\n")
-                        else:
-                            file.write("】")
+                table_to_txt(destination_file_path, os.path.join(STRUCTURED_FILE_PATH, label_name, txt_file_name))
                 
                 # 原始文件清理 - 避免存储冗余和潜在的数据泄露风险
                 os.remove(destination_file_path)
@@ -138,6 +145,33 @@ def upload_structured_file(files, label_name):
         except Exception as e:
             gr.Info(f"请勿重复上传")
 
+def update_structured_file(files, label_name):
+    """
+    向已有数据表上传新版本的表格文件
+
+    与已有文件同名时覆盖其文本化结果，不同名时作为新文件加入数据表；
+    之后在知识库页面执行"增量更新知识库"，只会向量化发生变化的行
+    """
+    if files is None:
+        gr.Info("请上传文件")
+    elif len(label_name) == 0:
+        gr.Info("请输入数据表名称")
+    elif label_name not in os.listdir(STRUCTURED_FILE_PATH):
+        gr.Info(f"{label_name}数据表不存在，请先新建数据表")
+    else:
+        try:
+            for file in files:
+                file_path = file.name
+                file_name = os.path.basename(file_path)
+                destination_file_path = os.path.join(STRUCTURED_FILE_PATH, label_name, file_name)
+                shutil.move(file_path, destination_file_path)
+                txt_file_name = os.path.splitext(file_name)[0] + '.txt'
+                table_to_txt(destination_file_path, os.path.join(STRUCTURED_FILE_PATH, label_name, txt_file_name))
+                os.remove(destination_file_path)
+            gr.Info(f"{label_name}数据表已更新，请前往知识库页面增量更新")
+        except Exception as e:
+            gr.Info(f"数据表更新失败：{e}")
+
 # UI状态同步函数 - 实现响应式界面更新
 def update_datatable():
     """
@@ -185,6 +185,18 @@ MYSQL_USER_LOCAL = 'root'
 MYSQL_PASSWORD_LOCAL = '123456'
 MYSQL_DATABASE_LOCAL = 'qanything'
 
+# 问答日志后台批量写入：单批最大条数、最长等待秒数、队列上限
+QALOG_BATCH_SIZE = 64
+QALOG_FLUSH_INTERVAL = 2.0
+QALOG_QUEUE_SIZE = 10000
+# 问答日志按天归档的Parquet目录，/get_qa_info统计与Excel导出优先读取归档数据
+QALOG_ARCHIVE_PATH = os.path.join(root_path, "QANY_DB", "qalog_archive")
+
+# 链路追踪：超过该耗时(秒)的请求保留完整span树，/metrics最多返回最近TRACE_SLOW_KEEP条；单个span最多记录的子span数
+TRACE_SLOW_THRESHOLD = 5.0
+TRACE_SLOW_KEEP = 50
+TRACE_MAX_CHILDREN = 200
+
 LOCAL_OCR_SERVICE_URL = "localhost:7001"
 
 LOCAL_PDF_PARSER_SERVICE_URL = "localhost:9009"
@@ -194,16 +206,26 @@ LOCAL_RERANK_MODEL_NAME = 'rerank'
 LOCAL_RERANK_MAX_LENGTH = 512
 LOCAL_RERANK_BATCH = 1
 LOCAL_RERANK_THREADS = 1
+# 两阶段rerank：候选数超过预算时，先只用每个片段的前RERANK_CASCADE_PREVIEW_CHARS个字符粗排(每个片段只占一个窗口)，
+# 保留得分最高的max(预算, top_k)个再做全文rerank；0表示关闭，所有候选直接全文rerank
+RERANK_CASCADE_BUDGET = 0
+RERANK_CASCADE_PREVIEW_CHARS = 200
 LOCAL_RERANK_PATH = os.path.join(root_path, 'qanything_kernel/dependent_server/rerank_server', 'rerank_model_configs_v0.0.1')
 LOCAL_RERANK_MODEL_PATH = os.path.join(LOCAL_RERANK_PATH, "rerank.onnx")
+# INT8动态量化模型，由 scripts/quantize_onnx.py 生成，rerank_server 加 --quantized 时加载
+LOCAL_RERANK_QUANT_MODEL_PATH = os.path.join(LOCAL_RERANK_PATH, "rerank.int8.onnx")
 
 LOCAL_EMBED_SERVICE_URL = "localhost:9001"
 LOCAL_EMBED_MODEL_NAME = 'embed'
 LOCAL_EMBED_MAX_LENGTH = 512
 LOCAL_EMBED_BATCH = 1
 LOCAL_EMBED_THREADS = 1
+# embedding服务返回格式：json(默认，兼容旧服务)、float32、float16、int8；后三种为二进制传输，float16/int8会损失少量精度
+LOCAL_EMBED_TRANSPORT = 'json'
 LOCAL_EMBED_PATH = os.path.join(root_path, 'qanything_kernel/dependent_server/embedding_server', 'embedding_model_configs_v0.0.1')
 LOCAL_EMBED_MODEL_PATH = os.path.join(LOCAL_EMBED_PATH, "embed.onnx")
+# INT8动态量化模型，由 scripts/quantize_onnx.py 生成，embedding_server 加 --quantized 时加载
+LOCAL_EMBED_QUANT_MODEL_PATH = os.path.join(LOCAL_EMBED_PATH, "embed.int8.onnx")
 
 TOKENIZER_PATH = os.path.join(root_path, 'qanything_kernel/connector/llm/tokenizer_files')
 
@@ -211,6 +233,7 @@ DEFAULT_CHILD_CHUNK_SIZE = 400
 DEFAULT_PARENT_CHUNK_SIZE = 800
 SEPARATORS = ["\n\n", "\n", "。", "，", ",", ".", ""]
 MAX_CHARS = 1000000  # 单个文件最大字符数，超过此字符数将上传失败，改大可能会导致解析超时
+UPLOAD_ESTIMATE_WORKERS = 8  # 上传时并行估算文件字符数的线程数
 
 # llm_config = {
 #     # 回答的最大token数，一般来说对于国内模型一个中文不到1个token，国外模型一个中文1.5-2个token
@@ -31,6 +31,8 @@ class KnowledgeBaseManager:
         self.cnxpool = pooling.MySQLConnectionPool(pool_size=pool_size, pool_reset_session=True, **dbconfig)
         self.free_cnx = pool_size
         self.used_cnx = 0
+        # FileStatusCount的触发器是否全部就绪，由create_file_status_triggers_确认
+        self.file_status_count_ready = False
         self.create_tables_()
         debug_logger.info("[SUCCESS] 数据库{}连接成功".format(database))
 
@@ -60,7 +62,7 @@ class KnowledgeBaseManager:
         # 关闭数据库连接
         cnx.close()
 
-    def execute_query_(self, query, params, commit=False, fetch=False, check=False, user_dict=False):
+    def execute_query_(self, query, params, commit=False, fetch=False, check=False, user_dict=False, many=False):
         try:
             conn = self.cnxpool.get_connection()
             self.used_cnx += 1
@@ -79,7 +81,11 @@ class KnowledgeBaseManager:
                 cursor = conn.cursor(dictionary=True)
             else:
                 cursor = conn.cursor(buffered=True)
-            cursor.execute(query, params)
+            if many:
+                # params为多行参数列表，一次往返批量写入
+                cursor.executemany(query, params)
+            else:
+                cursor.execute(query, params)
 
             if commit:
                 conn.commit()
@@ -149,7 +155,9 @@ class KnowledgeBaseManager:
                 file_url VARCHAR(2048) DEFAULT '',
                 upload_infos TEXT,
                 chunk_size INT DEFAULT -1,
-                timestamp VARCHAR(255) DEFAULT '197001010000'
+                timestamp VARCHAR(255) DEFAULT '197001010000',
+                file_hash VARCHAR(64) DEFAULT '',
+                linked_file_id VARCHAR(255) DEFAULT ''
             );
 
         """
@@ -252,9 +260,34 @@ class KnowledgeBaseManager:
         """
         self.execute_query_(query, (), commit=True)
 
+        # 文件状态计数表，由File表上的触发器在同一事务内维护，
+        # list_docs / get_total_status 直接读取计数，不再扫描File表
+        query = """
+            CREATE TABLE IF NOT EXISTS FileStatusCount (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                kb_id VARCHAR(255) NOT NULL,
+                user_id VARCHAR(255) NOT NULL,
+                date CHAR(8) NOT NULL,
+                status VARCHAR(255) NOT NULL,
+                deleted BOOL NOT NULL,
+                number INT NOT NULL DEFAULT 0,
+                UNIQUE KEY uk_file_status_count (kb_id, user_id, date, status, deleted),
+                INDEX idx_user_id (user_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """
+        self.execute_query_(query, (), commit=True)
+        self.create_file_status_triggers_()
+
         # 修改索引创建方式
         index_queries = [
             "CREATE INDEX index_kb_id_deleted ON File (kb_id, deleted)",
+            "CREATE INDEX index_kb_id_deleted_timestamp ON File (kb_id, deleted, timestamp)",
+            # 文件内容哈希，用于同一知识库内的内容去重
+            "ALTER TABLE File ADD COLUMN file_hash VARCHAR(64) DEFAULT ''",
+            "CREATE INDEX index_kb_id_file_hash ON File (kb_id, file_hash)",
+            # 内容与已有文件相同的上传文件只登记一条记录，指向共用解析结果的原文件
+            "ALTER TABLE File ADD COLUMN linked_file_id VARCHAR(255) DEFAULT ''",
+            "CREATE INDEX index_linked_file_id ON File (linked_file_id)",
             "CREATE INDEX idx_user_id_status ON File (user_id, status)",
             "CREATE INDEX index_bot_id ON QaLogs (bot_id)",
             "CREATE INDEX index_query ON QaLogs (query)",
@@ -280,6 +313,69 @@ class KnowledgeBaseManager:
 
         debug_logger.info("All tables and indexes checked/created successfully.")
 
+    def create_file_status_triggers_(self):
+        inc = ("INSERT INTO FileStatusCount (kb_id, user_id, date, status, deleted, number) "
+               "VALUES (NEW.kb_id, NEW.user_id, LEFT(NEW.timestamp, 8), NEW.status, NEW.deleted, 1) "
+               "ON DUPLICATE KEY UPDATE number = number + 1;")
+        dec = ("UPDATE FileStatusCount SET number = number - 1 WHERE kb_id = OLD.kb_id AND user_id = OLD.user_id "
+               "AND date = LEFT(OLD.timestamp, 8) AND status = OLD.status AND deleted = OLD.deleted;")
+        triggers = {
+            "trg_file_status_count_insert": f"CREATE TRIGGER trg_file_status_count_insert AFTER INSERT ON File "
+                                            f"FOR EACH ROW {inc}",
+            "trg_file_status_count_update": f"""CREATE TRIGGER trg_file_status_count_update AFTER UPDATE ON File
+                FOR EACH ROW BEGIN
+                    IF NOT (OLD.status <=> NEW.status AND OLD.deleted <=> NEW.deleted AND OLD.kb_id <=> NEW.kb_id
+                            AND OLD.user_id <=> NEW.user_id AND OLD.timestamp <=> NEW.timestamp) THEN
+                        {dec}
+                        {inc}
+                    END IF;
+                END""",
+            "trg_file_status_count_delete": f"CREATE TRIGGER trg_file_status_count_delete AFTER DELETE ON File "
+                                            f"FOR EACH ROW {dec}",
+        }
+        exist_triggers = self.get_file_status_triggers_()
+        created = False
+        for name, trigger_query in triggers.items():
+            if name not in exist_triggers:
+                self.execute_query_(trigger_query, (), commit=True)
+                created = True
+        if created:
+            # execute_query_会吞掉建触发器的错误(如开启binlog且没有SUPER权限时的1419)，需要重新确认
+            exist_triggers = self.get_file_status_triggers_()
+        missing = [name for name in triggers if name not in exist_triggers]
+        # 三个触发器都存在时计数表才会随File表同步更新，否则回退为直接统计File表
+        self.file_status_count_ready = not missing
+        if missing:
+            debug_logger.error("FileStatusCount触发器创建失败，缺少{}，文件状态统计回退为扫描File表".format(missing))
+        elif created:
+            debug_logger.info("File status count triggers created successfully")
+            # 触发器首次创建时，用File表的现有数据初始化计数
+            self.rebuild_file_status_count()
+
+    def get_file_status_triggers_(self):
+        query = "SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE()"
+        return {row[0] for row in (self.execute_query_(query, (), fetch=True) or [])}
+
+    def rebuild_file_status_count(self):
+        # 重新全量统计FileStatusCount，可用于初始化或修复计数
+        conn = self.cnxpool.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM FileStatusCount")
+            cursor.execute("""
+                INSERT INTO FileStatusCount (kb_id, user_id, date, status, deleted, number)
+                SELECT kb_id, user_id, LEFT(timestamp, 8), status, deleted, COUNT(*) FROM File
+                GROUP BY kb_id, user_id, LEFT(timestamp, 8), status, deleted
+            """)
+            conn.commit()
+            debug_logger.info("FileStatusCount rebuilt successfully")
+        except MySQLError as err:
+            conn.rollback()
+            debug_logger.error("rebuild_file_status_count failed: {}".format(err))
+        finally:
+            cursor.close()
+            conn.close()
+
     def update_file_msg(self, file_id, msg):
         query = "UPDATE File SET msg = %s WHERE file_id = %s"
         insert_logger.info(f"Update file msg: {file_id} {msg}")
@@ -453,6 +549,70 @@ class KnowledgeBaseManager:
                             commit=True)
         return "success"
 
+    # [文件] 批量向知识库增加文件，file_infos中每一项为dict，字段与add_file的参数一致(另可带file_hash、linked_file_id)
+    def add_files(self, file_infos: List[Dict]):
+        if not file_infos:
+            return "success"
+        query = ("INSERT INTO File (file_id, user_id, kb_id, file_name, status, file_size, file_location, chunk_size, "
+                 "timestamp, file_url, file_hash, linked_file_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
+        rows = [(info['file_id'], info['user_id'], info['kb_id'], info['file_name'], info.get('status', 'gray'),
+                 info['file_size'], info['file_location'], info['chunk_size'], info['timestamp'],
+                 info.get('file_url', ''), info.get('file_hash', ''), info.get('linked_file_id', ''))
+                for info in file_infos]
+        self.execute_query_(query, rows, commit=True, many=True)
+        debug_logger.info(f"add_files count: {len(rows)}")
+        return "success"
+
+    def get_files_by_hash(self, kb_id, file_hashes):
+        # 在知识库内按内容哈希查找未删除且自身解析入库的文件，返回{file_hash: (file_id, file_name, status, file_location)}
+        file_hashes = [h for h in set(file_hashes) if h]
+        results = {}
+        batch_size = 100
+        for i in range(0, len(file_hashes), batch_size):
+            batch_hashes = file_hashes[i:i + batch_size]
+            placeholders = ','.join(['%s'] * len(batch_hashes))
+            query = """
+                SELECT file_hash, file_id, file_name, status, file_location FROM File
+                WHERE kb_id = %s AND deleted = 0 AND linked_file_id = '' AND file_hash IN ({})
+            """.format(placeholders)
+            for file_hash, file_id, file_name, status, file_location in self.execute_query_(
+                    query, [kb_id] + batch_hashes, fetch=True) or []:
+                results.setdefault(file_hash, (file_id, file_name, status, file_location))
+        return results
+
+    def sync_linked_files(self, file_ids):
+        # 关联文件的状态、解析信息与原文件保持一致；原文件解析完成时由入库服务同步，这里补上登记前后的时间差
+        if not file_ids:
+            return
+        placeholders = ','.join(['%s'] * len(file_ids))
+        query = """
+            UPDATE File AS linked JOIN File AS origin ON linked.linked_file_id = origin.file_id
+            SET linked.status = origin.status, linked.content_length = origin.content_length,
+                linked.chunks_number = origin.chunks_number, linked.msg = origin.msg
+            WHERE linked.file_id IN ({})
+        """.format(placeholders)
+        self.execute_query_(query, list(file_ids), commit=True)
+
+    def get_linked_files(self, file_ids):
+        # 关联到指定文件的未删除文件，返回[(file_id, file_name, linked_file_id)]，按登记顺序
+        if not file_ids:
+            return []
+        placeholders = ','.join(['%s'] * len(file_ids))
+        query = """
+            SELECT file_id, file_name, linked_file_id FROM File
+            WHERE deleted = 0 AND linked_file_id IN ({}) ORDER BY id
+        """.format(placeholders)
+        return self.execute_query_(query, list(file_ids), fetch=True) or []
+
+    def promote_linked_file(self, file_id, file_location, other_file_ids):
+        # 原文件被删除时，把第一个关联文件改为独立文件重新解析，其余关联文件改为关联到它
+        query = "UPDATE File SET linked_file_id = '', status = 'gray', file_location = %s WHERE file_id = %s"
+        self.execute_query_(query, (file_location, file_id), commit=True)
+        if other_file_ids:
+            placeholders = ','.join(['%s'] * len(other_file_ids))
+            query = "UPDATE File SET linked_file_id = %s, status = 'gray' WHERE file_id IN ({})".format(placeholders)
+            self.execute_query_(query, [file_id] + list(other_file_ids), commit=True)
+
     #  更新file中的content_length
     def update_content_length(self, file_id, content_length):
         query = "UPDATE File SET content_length = %s WHERE file_id = %s"
@@ -508,23 +668,81 @@ class KnowledgeBaseManager:
 
         return all_files
 
-    def get_total_status_by_date(self, user_id):
-        # 查询指定用户上传的文件数量，按日期和状态分组
+    def get_files_by_cursor(self, kb_id, limit, cursor=None, offset=None):
+        """
+        按timestamp倒序分页获取文件，分页下推到SQL。
+        cursor为上一页最后一条记录的(timestamp, id)，优先于offset使用；返回(files, next_cursor)
+        """
         query = """
-        SELECT
-            LEFT(timestamp, 8) as date,  -- 提取前8个字符作为日期 (YYYYMMDD)
-            status,
-            COUNT(*) as number
-        FROM File
-        WHERE user_id = %s
-        GROUP BY LEFT(timestamp, 8), status
+            SELECT file_id, file_name, status, file_size, content_length, timestamp,
+                   file_location, file_url, chunk_size, msg, id
+            FROM File
+            WHERE kb_id = %s AND deleted = 0
         """
+        params = [kb_id]
+        if cursor is not None:
+            cursor_timestamp, cursor_id = cursor
+            query += " AND (timestamp < %s OR (timestamp = %s AND id < %s))"
+            params += [cursor_timestamp, cursor_timestamp, cursor_id]
+        query += " ORDER BY timestamp DESC, id DESC LIMIT %s"
+        params.append(limit + 1)
+        if cursor is None and offset:
+            query += " OFFSET %s"
+            params.append(offset)
+        files = self.execute_query_(query, params, fetch=True) or []
+        next_cursor = None
+        if len(files) > limit:
+            files = files[:limit]
+            next_cursor = (files[-1][5], files[-1][10])
+        return [file[:10] for file in files], next_cursor
+
+    def get_kb_status_count(self, kb_ids):
+        # 从计数表读取各知识库未删除文件的状态分布：{kb_id: {status: number}}
+        if not kb_ids:
+            return {}
+        placeholders = ','.join(['%s'] * len(kb_ids))
+        if self.file_status_count_ready:
+            query = """
+                SELECT kb_id, status, SUM(number) FROM FileStatusCount
+                WHERE kb_id IN ({}) AND deleted = 0
+                GROUP BY kb_id, status
+            """.format(placeholders)
+        else:
+            query = """
+                SELECT kb_id, status, COUNT(*) FROM File
+                WHERE kb_id IN ({}) AND deleted = 0
+                GROUP BY kb_id, status
+            """.format(placeholders)
+        result = self.execute_query_(query, list(kb_ids), fetch=True) or []
+        status_count = defaultdict(dict)
+        for kb_id, status, number in result:
+            if number:
+                status_count[kb_id][status] = int(number)
+        return dict(status_count)
+
+    def get_total_status_by_date(self, user_id):
+        # 查询指定用户上传的文件数量，按日期和状态分组(读取计数表，与File表一样包含已删除文件)
+        if self.file_status_count_ready:
+            query = """
+            SELECT date, status, SUM(number) as number
+            FROM FileStatusCount
+            WHERE user_id = %s
+            GROUP BY date, status
+            """
+        else:
+            query = """
+            SELECT LEFT(timestamp, 8) as date, status, COUNT(*) as number
+            FROM File
+            WHERE user_id = %s
+            GROUP BY LEFT(timestamp, 8), status
+            """
         result = self.execute_query_(query, (user_id,), fetch=True)
 
         files_by_date = defaultdict(lambda: defaultdict(int))
 
         for date, status, number in result:
-            files_by_date[date][status] = number
+            if number:
+                files_by_date[date][status] = int(number)
 
         return {date: dict(status_dict) for date, status_dict in files_by_date.items()}
 
@@ -670,22 +888,37 @@ class KnowledgeBaseManager:
             total_deleted += res
         debug_logger.info(f"delete_faqs count: {total_deleted}")
 
-    def add_qalog(self, user_id, bot_id, kb_ids, query, model, product_source, time_record, history, condense_question,
-                  prompt, result, retrieval_documents, source_documents):
-        debug_logger.info("add_qalog: {}".format(query))
+    @staticmethod
+    def _qalog_row(user_id, bot_id, kb_ids, query, model, product_source, time_record, history, condense_question,
+                   prompt, result, retrieval_documents, source_documents):
         qa_id = uuid.uuid4().hex
         kb_ids = json.dumps(kb_ids, ensure_ascii=False)
         retrieval_documents = json.dumps(retrieval_documents, ensure_ascii=False)
         source_documents = json.dumps(source_documents, ensure_ascii=False)
         history = json.dumps(history, ensure_ascii=False)
         time_record = json.dumps(time_record, ensure_ascii=False)
-        insert_query = (
-            "INSERT INTO QaLogs (qa_id, user_id, bot_id, kb_ids, query, model, product_source, time_record, "
-            "history, condense_question, prompt, result, retrieval_documents, source_documents) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
-        self.execute_query_(insert_query, (qa_id, user_id, bot_id, kb_ids, query, model, product_source, time_record,
-                                           history, condense_question, prompt, result, retrieval_documents,
-                                           source_documents), commit=True)
+        return (qa_id, user_id, bot_id, kb_ids, query, model, product_source, time_record, history, condense_question,
+                prompt, result, retrieval_documents, source_documents)
+
+    _insert_qalog_query = (
+        "INSERT INTO QaLogs (qa_id, user_id, bot_id, kb_ids, query, model, product_source, time_record, "
+        "history, condense_question, prompt, result, retrieval_documents, source_documents) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
+
+    def add_qalog(self, user_id, bot_id, kb_ids, query, model, product_source, time_record, history, condense_question,
+                  prompt, result, retrieval_documents, source_documents):
+        debug_logger.info("add_qalog: {}".format(query))
+        row = self._qalog_row(user_id, bot_id, kb_ids, query, model, product_source, time_record, history,
+                              condense_question, prompt, result, retrieval_documents, source_documents)
+        self.execute_query_(self._insert_qalog_query, row, commit=True)
+
+    def add_qalogs(self, qalogs: List[Dict]):
+        # 批量写入问答日志，qalogs中每一项的字段与add_qalog的参数一致
+        if not qalogs:
+            return
+        rows = [self._qalog_row(**chat_data) for chat_data in qalogs]
+        self.execute_query_(self._insert_qalog_query, rows, commit=True, many=True)
+        debug_logger.info("add_qalogs count: {}".format(len(rows)))
 
     def get_qalog_by_filter(self, need_info, user_id=None, query=None, bot_id=None, time_range=None, any_kb_id=None, qa_ids=None):
         # 判断哪些条件不是None，构建搜索query
@@ -713,22 +946,65 @@ class KnowledgeBaseManager:
         # 根据need_info构建一个dict
         qa_infos = [dict(zip(need_info.split(", "), qa_info)) for qa_info in qa_infos]
         for qa_info in qa_infos:
-            if 'timestamp' in qa_info:
-                qa_info['timestamp'] = qa_info['timestamp'].strftime("%Y-%m-%d %H:%M:%S")
-            if 'kb_ids' in qa_info:
-                qa_info['kb_ids'] = json.loads(qa_info['kb_ids'])
-            if 'time_record' in qa_info:
-                qa_info['time_record'] = json.loads(qa_info['time_record'])
-            if 'retrieval_documents' in qa_info:
-                qa_info['retrieval_documents'] = json.loads(qa_info['retrieval_documents'])
-            if 'source_documents' in qa_info:
-                qa_info['source_documents'] = json.loads(qa_info['source_documents'])
-            if 'history' in qa_info:
-                qa_info['history'] = json.loads(qa_info['history'])
+            self.decode_qalog(qa_info)
         if 'timestamp' in need_info:
             qa_infos = sorted(qa_infos, key=lambda x: x["timestamp"], reverse=True)
         return qa_infos
 
+    @staticmethod
+    def decode_qalog(qa_info):
+        # 将QaLogs中以JSON字符串存储的字段还原，timestamp转为字符串
+        if 'timestamp' in qa_info:
+            qa_info['timestamp'] = qa_info['timestamp'].strftime("%Y-%m-%d %H:%M:%S")
+        for key in ('kb_ids', 'time_record', 'retrieval_documents', 'source_documents', 'history'):
+            if key in qa_info:
+                qa_info[key] = json.loads(qa_info[key])
+        return qa_info
+
+    def get_qalogs_after_id(self, time_range, last_id=0, limit=1000):
+        # 按自增id做游标分页读取某个时间段的完整日志，供离线归档使用
+        query = ("SELECT * FROM QaLogs WHERE timestamp BETWEEN %s AND %s AND id > %s "
+                 "ORDER BY id LIMIT %s")
+        return self.execute_query_(query, (time_range[0], time_range[1], last_id, limit), fetch=True,
+                                   user_dict=True)
+
+    def delete_qalogs_by_time_range(self, time_range, batch_size=5000):
+        # 分批删除已归档时间段内的日志，避免长事务锁表
+        query = "DELETE FROM QaLogs WHERE timestamp BETWEEN %s AND %s LIMIT %s"
+        total_deleted = 0
+        while True:
+            res = self.execute_query_(query, (time_range[0], time_range[1], batch_size), commit=True, check=True)
+            if not res:
+                break
+            total_deleted += res
+        debug_logger.info(f"delete_qalogs_by_time_range {time_range} count: {total_deleted}")
+        return total_deleted
+
+    def get_qalog_user_counts(self, time_range):
+        # 按用户聚合问答数，用于合并归档数据与在线数据的统计
+        query = "SELECT user_id, COUNT(*) FROM QaLogs WHERE timestamp BETWEEN %s AND %s GROUP BY user_id"
+        result = self.execute_query_(query, time_range, fetch=True)
+        return {user_id: count for user_id, count in result}
+
+    def get_qalog_count_by_day(self, time_range, user_id=None):
+        query = "SELECT DATE(timestamp), COUNT(*) FROM QaLogs WHERE timestamp BETWEEN %s AND %s"
+        params = list(time_range)
+        if user_id:
+            query += " AND user_id = %s"
+            params.append(user_id)
+        query += " GROUP BY DATE(timestamp)"
+        result = self.execute_query_(query, params, fetch=True)
+        return {str(day): count for day, count in result}
+
+    def get_user_qalogs(self, user_id, need_info, time_range, limit=50):
+        # 某用户在时间段内最早的limit条日志，与归档中的日志合并后返回给get_related_qa
+        query = (f"SELECT {', '.join(need_info)} FROM QaLogs WHERE user_id = %s AND timestamp BETWEEN %s AND %s "
+                 "ORDER BY timestamp LIMIT %s")
+        logs = self.execute_query_(query, (user_id, time_range[0], time_range[1], limit), fetch=True, user_dict=True)
+        for log in logs:
+            log['timestamp'] = log['timestamp'].strftime("%Y-%m-%d %H:%M:%S")
+        return logs
+
     def get_qalog_by_ids(self, ids, need_info):
         placeholders = ','.join(['%s'] * len(ids))
         need_info = ", ".join(need_info)
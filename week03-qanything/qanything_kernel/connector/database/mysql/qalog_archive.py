@@ -0,0 +1,273 @@
+from qanything_kernel.configs.model_config import QALOG_ARCHIVE_PATH
+from qanything_kernel.connector.database.mysql.mysql_client import KnowledgeBaseManager
+from qanything_kernel.utils.custom_log import debug_logger
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import random
+import os
+
+QALOG_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('qa_id', pa.string()),
+    ('user_id', pa.string()),
+    ('bot_id', pa.string()),
+    ('kb_ids', pa.string()),
+    ('query', pa.string()),
+    ('model', pa.string()),
+    ('product_source', pa.string()),
+    ('time_record', pa.string()),
+    ('history', pa.string()),
+    ('condense_question', pa.string()),
+    ('prompt', pa.string()),
+    ('result', pa.string()),
+    ('retrieval_documents', pa.string()),
+    ('source_documents', pa.string()),
+    ('timestamp', pa.timestamp('s')),
+])
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 查询不限起止时间时使用的边界
+MIN_TIME = "1970-01-01 00:00:00"
+MAX_TIME = "9999-12-31 23:59:59"
+
+
+class QaLogArchive:
+    """
+    问答日志的按天Parquet归档
+
+    目录结构：{archive_path}/date=YYYY-MM-DD/qalogs.parquet，每个分区只包含完整的一天。
+    统计、导出、分页查询和随机抽样时，已归档的日期读取Parquet，未归档的日期(通常只有当天)再回落到MySQL，
+    这样分析查询不会扫描在线的QaLogs大表；已归档的日志从MySQL清理后，这些接口仍能查到。
+    按qa_id查询时先查MySQL，查不到再查归档。
+    """
+
+    def __init__(self, kb_manager: KnowledgeBaseManager, archive_path=QALOG_ARCHIVE_PATH):
+        self.kb_manager = kb_manager
+        self.archive_path = archive_path
+
+    def _partition_file(self, day: str) -> str:
+        return os.path.join(self.archive_path, f"date={day}", "qalogs.parquet")
+
+    def archived_days(self) -> set:
+        if not os.path.exists(self.archive_path):
+            return set()
+        return {name[len("date="):] for name in os.listdir(self.archive_path)
+                if name.startswith("date=") and os.path.exists(self._partition_file(name[len("date="):]))}
+
+    # ---------------------------- 归档与压缩 ----------------------------
+
+    def export_day(self, day: str, batch_size=1000, overwrite=False) -> int:
+        """将MySQL中某一天(YYYY-MM-DD)的日志写成一个Parquet分区，返回写入条数"""
+        file_path = self._partition_file(day)
+        if os.path.exists(file_path) and not overwrite:
+            debug_logger.info(f"qalog archive {day} already exists, skip")
+            return 0
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = file_path + ".tmp"
+        time_range = (f"{day} 00:00:00", f"{day} 23:59:59")
+        total = 0
+        last_id = 0
+        # 按批写入row group，内存占用与单天数据量无关
+        with pq.ParquetWriter(tmp_path, QALOG_SCHEMA, compression='zstd') as writer:
+            while True:
+                rows = self.kb_manager.get_qalogs_after_id(time_range, last_id=last_id, limit=batch_size)
+                if not rows:
+                    break
+                columns = {name: [row.get(name) for row in rows] for name in QALOG_SCHEMA.names}
+                writer.write_table(pa.table(columns, schema=QALOG_SCHEMA))
+                total += len(rows)
+                last_id = rows[-1]['id']
+        # 写完再原子替换，读端不会看到半个分区
+        os.replace(tmp_path, file_path)
+        debug_logger.info(f"qalog archive {day} exported, count: {total}")
+        return total
+
+    def purge_archived(self, before_day: str) -> int:
+        """删除MySQL中早于before_day且已经归档的日志，返回删除条数"""
+        total = 0
+        for day in sorted(self.archived_days()):
+            if day >= before_day:
+                continue
+            total += self.kb_manager.delete_qalogs_by_time_range((f"{day} 00:00:00", f"{day} 23:59:59"))
+        return total
+
+    # ---------------------------- 读取 ----------------------------
+
+    def split_time_range(self, time_range) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        将时间范围拆成：已归档的日期列表 + 需要查询MySQL的连续时间段列表
+        """
+        start_day, end_day = time_range[0][:10], time_range[1][:10]
+        archived_days = sorted(day for day in self.archived_days() if start_day <= day <= end_day)
+        mysql_ranges = []
+        # 只遍历已归档的日期，相邻归档日期之间的空隙查询MySQL，不限起止时间时也不用逐日遍历
+        span_start = time_range[0]
+        for day_str in archived_days:
+            day = datetime.strptime(day_str, "%Y-%m-%d")
+            if span_start < f"{day_str} 00:00:00":
+                mysql_ranges.append((span_start, f"{(day - timedelta(days=1)).strftime('%Y-%m-%d')} 23:59:59"))
+            span_start = max(time_range[0], f"{(day + timedelta(days=1)).strftime('%Y-%m-%d')} 00:00:00")
+        if span_start <= time_range[1]:
+            mysql_ranges.append((span_start, time_range[1]))
+        return archived_days, mysql_ranges
+
+    def _read_days(self, days: List[str], columns: List[str], time_range=None,
+                   user_id=None, bot_id=None, query=None, any_kb_id=None, qa_ids=None) -> Optional[pa.Table]:
+        filters = []
+        if time_range:
+            filters += [('timestamp', '>=', datetime.strptime(time_range[0], TIME_FORMAT)),
+                        ('timestamp', '<=', datetime.strptime(time_range[1], TIME_FORMAT))]
+        if qa_ids is not None:
+            filters.append(('qa_id', 'in', list(qa_ids)))
+        if user_id:
+            filters.append(('user_id', '=', user_id))
+        if bot_id:
+            filters.append(('bot_id', '=', bot_id))
+        if query:
+            filters.append(('query', '=', query))
+        read_columns = list(columns)
+        if any_kb_id and 'kb_ids' not in read_columns:
+            read_columns.append('kb_ids')
+        tables = [pq.read_table(self._partition_file(day), columns=read_columns, filters=filters or None)
+                  for day in days]
+        if not tables:
+            return None
+        table = pa.concat_tables(tables)
+        if any_kb_id:
+            table = table.filter(pc.match_substring(table['kb_ids'], any_kb_id))
+        return table.select(columns)
+
+    def get_statistic(self, time_range) -> Dict:
+        archived_days, mysql_ranges = self.split_time_range(time_range)
+        users = set()
+        total_queries = 0
+        table = self._read_days(archived_days, ['user_id'], time_range)
+        if table is not None:
+            users.update(pc.unique(table['user_id']).to_pylist())
+            total_queries += table.num_rows
+        for mysql_range in mysql_ranges:
+            user_counts = self.kb_manager.get_qalog_user_counts(mysql_range)
+            users.update(user_counts.keys())
+            total_queries += sum(user_counts.values())
+        return {"total_users": len(users), "total_queries": total_queries}
+
+    def get_qalog_count_by_day(self, time_range, user_id=None) -> Dict[str, int]:
+        archived_days, mysql_ranges = self.split_time_range(time_range)
+        counts = {}
+        for day in archived_days:
+            table = self._read_days([day], ['qa_id'], time_range, user_id=user_id)
+            if table.num_rows:
+                counts[day] = table.num_rows
+        for mysql_range in mysql_ranges:
+            counts.update(self.kb_manager.get_qalog_count_by_day(mysql_range, user_id=user_id))
+        return dict(sorted(counts.items()))
+
+    def get_qalog_by_filter(self, need_info, user_id=None, query=None, bot_id=None, time_range=None,
+                            any_kb_id=None, qa_ids=None) -> List[Dict]:
+        """与KnowledgeBaseManager.get_qalog_by_filter返回格式一致"""
+        if qa_ids is not None:
+            return self._get_qalog_by_qa_ids(need_info, qa_ids)
+        archived_days, mysql_ranges = self.split_time_range(time_range)
+        qa_infos = []
+        table = self._read_days(archived_days, need_info, time_range, user_id=user_id, bot_id=bot_id,
+                                query=query, any_kb_id=any_kb_id)
+        if table is not None:
+            qa_infos.extend(self.kb_manager.decode_qalog(qa_info) for qa_info in table.to_pylist())
+        for mysql_range in mysql_ranges:
+            qa_infos.extend(self.kb_manager.get_qalog_by_filter(need_info=need_info, user_id=user_id, query=query,
+                                                                bot_id=bot_id, time_range=mysql_range,
+                                                                any_kb_id=any_kb_id))
+        if 'timestamp' in need_info:
+            qa_infos = sorted(qa_infos, key=lambda x: x["timestamp"], reverse=True)
+        return qa_infos
+
+    def _get_qalog_by_qa_ids(self, need_info, qa_ids) -> List[Dict]:
+        # qa_id不带日期：先查MySQL，已清理的再到全部归档分区中查找
+        columns = list(need_info) if 'qa_id' in need_info else list(need_info) + ['qa_id']
+        qa_infos = self.kb_manager.get_qalog_by_filter(need_info=columns, qa_ids=qa_ids) if qa_ids else []
+        found = {qa_info['qa_id'] for qa_info in qa_infos}
+        missing = [qa_id for qa_id in qa_ids if qa_id not in found]
+        if missing:
+            table = self._read_days(sorted(self.archived_days()), columns, qa_ids=missing)
+            if table is not None:
+                qa_infos.extend(self.kb_manager.decode_qalog(qa_info) for qa_info in table.to_pylist())
+        if 'qa_id' not in need_info:
+            for qa_info in qa_infos:
+                qa_info.pop('qa_id')
+        if 'timestamp' in need_info:
+            qa_infos = sorted(qa_infos, key=lambda x: x["timestamp"], reverse=True)
+        return qa_infos
+
+    @staticmethod
+    def _format_rows(table: Optional[pa.Table]) -> List[Dict]:
+        # 与MySQL的user_dict查询结果一致：JSON字段保持字符串，timestamp转为字符串
+        rows = table.to_pylist() if table is not None else []
+        for row in rows:
+            if 'timestamp' in row:
+                row['timestamp'] = row['timestamp'].strftime(TIME_FORMAT)
+        return rows
+
+    def get_random_qa_infos(self, limit=10, time_range=None, need_info=None) -> List[Dict]:
+        """
+        与KnowledgeBaseManager.get_random_qa_infos返回格式一致
+        在归档和各MySQL时间段的全部日志中等概率抽样，归档部分只读取qa_id列计数，抽中的再读取完整字段
+        """
+        if need_info is None:
+            need_info = ["qa_id", "user_id", "kb_ids", "query", "result", "timestamp"]
+        need_info = list(need_info) + [key for key in ("qa_id", "user_id", "timestamp") if key not in need_info]
+        archived_days, mysql_ranges = self.split_time_range(time_range)
+        table = self._read_days(archived_days, ['qa_id'], time_range)
+        archived_ids = table['qa_id'].to_pylist() if table is not None else []
+        mysql_counts = [sum(self.kb_manager.get_qalog_user_counts(mysql_range).values())
+                        for mysql_range in mysql_ranges]
+        total = len(archived_ids) + sum(mysql_counts)
+        picks = random.sample(range(total), min(limit, total))
+
+        picked_ids = [archived_ids[i] for i in picks if i < len(archived_ids)]
+        qa_infos = []
+        if picked_ids:
+            qa_infos.extend(self._format_rows(self._read_days(archived_days, need_info, time_range,
+                                                              qa_ids=picked_ids)))
+        offset = len(archived_ids)
+        for mysql_range, count in zip(mysql_ranges, mysql_counts):
+            picked = sum(offset <= i < offset + count for i in picks)
+            if picked:
+                qa_infos.extend(self.kb_manager.get_random_qa_infos(limit=picked, time_range=mysql_range,
+                                                                    need_info=list(need_info)))
+            offset += count
+        random.shuffle(qa_infos)
+        return qa_infos
+
+    def _get_user_qalogs(self, user_id, need_info, time_range, limit) -> List[Dict]:
+        # 某用户在时间段内最早的limit条日志
+        archived_days, mysql_ranges = self.split_time_range(time_range)
+        logs = self._format_rows(self._read_days(archived_days, need_info, time_range, user_id=user_id))
+        for mysql_range in mysql_ranges:
+            logs.extend(self.kb_manager.get_user_qalogs(user_id, need_info, mysql_range, limit=limit))
+        return sorted(logs, key=lambda x: x["timestamp"])[:limit]
+
+    def get_related_qa_infos(self, qa_id, need_info=None, need_more=False):
+        """与KnowledgeBaseManager.get_related_qa_infos返回格式一致"""
+        if need_info is None:
+            need_info = ["user_id", "kb_ids", "query", "condense_question", "result", "timestamp", "product_source"]
+        need_info = list(need_info) + [key for key in ("user_id", "kb_ids") if key not in need_info]
+        rows = self.kb_manager.get_qalog_by_ids([qa_id], need_info)
+        if rows:
+            qa_log = dict(zip(need_info, rows[0]))
+            qa_log['timestamp'] = qa_log['timestamp'].strftime(TIME_FORMAT)
+        else:
+            qa_log = self._format_rows(self._read_days(sorted(self.archived_days()), need_info, qa_ids=[qa_id]))[0]
+        if not need_more:
+            return qa_log, [], []
+
+        # 7天以内与7天之前的日志，各返回最早的50条
+        # TODO 后续可以有翻页逻辑
+        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        recent_range = (seven_days_ago.strftime(TIME_FORMAT), MAX_TIME)
+        older_range = (MIN_TIME, (seven_days_ago - timedelta(seconds=1)).strftime(TIME_FORMAT))
+        recent_logs = self._get_user_qalogs(qa_log['user_id'], need_info, recent_range, limit=50)
+        older_logs = self._get_user_qalogs(qa_log['user_id'], need_info, older_range, limit=50)
+        return qa_log, recent_logs, older_logs
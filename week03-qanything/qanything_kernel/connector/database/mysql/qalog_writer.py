@@ -0,0 +1,84 @@
+from qanything_kernel.configs.model_config import QALOG_BATCH_SIZE, QALOG_FLUSH_INTERVAL, QALOG_QUEUE_SIZE
+from qanything_kernel.connector.database.mysql.mysql_client import KnowledgeBaseManager
+from qanything_kernel.utils.custom_log import debug_logger, qa_logger
+from typing import Dict, List, Optional
+import traceback
+import asyncio
+import time
+
+
+class QaLogWriter:
+    """
+    问答日志后台批量写入器
+
+    问答接口只负责把chat_data放入内存队列，由后台协程按批次(条数或时间)取出，
+    在线程池中完成JSON序列化和MySQL批量插入，避免阻塞流式输出所在的事件循环。
+    """
+
+    def __init__(self, kb_manager: KnowledgeBaseManager, batch_size=QALOG_BATCH_SIZE,
+                 flush_interval=QALOG_FLUSH_INTERVAL, max_queue_size=QALOG_QUEUE_SIZE):
+        self.kb_manager = kb_manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def start(self):
+        # 必须在事件循环内调用(sanic的before_server_start/after_server_start)
+        if self._task is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        debug_logger.info(f"QaLogWriter started, batch_size: {self.batch_size}, "
+                          f"flush_interval: {self.flush_interval}s")
+
+    def put(self, chat_data: Dict):
+        if self.queue is None or self._closed:
+            # 未启动或已关闭时退化为同步写入，保证日志不丢
+            self._write_batch([chat_data])
+            return
+        try:
+            self.queue.put_nowait(chat_data)
+        except asyncio.QueueFull:
+            debug_logger.warning(f"QaLogWriter queue is full ({self.max_queue_size}), write in executor directly")
+            asyncio.get_running_loop().run_in_executor(None, self._write_batch, [chat_data])
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await loop.run_in_executor(None, self._write_batch, batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def _write_batch(self, batch: List[Dict]):
+        try:
+            self.kb_manager.add_qalogs(batch)
+            for chat_data in batch:
+                qa_logger.info("chat_data: %s", chat_data)
+        except Exception:
+            debug_logger.error(f"QaLogWriter write {len(batch)} qalogs failed: {traceback.format_exc()}")
+
+    async def close(self):
+        # 服务停止前调用，等待队列中剩余的日志全部落库
+        if self._task is None or self._closed:
+            return
+        self._closed = True
+        await self.queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        debug_logger.info("QaLogWriter closed, all pending qalogs flushed")
@@ -1,9 +1,12 @@
 """Wrapper around YouDao embedding models."""
-from typing import List
+from typing import List, Union
 from qanything_kernel.utils.custom_log import debug_logger, embed_logger
 from qanything_kernel.utils.general_utils import get_time_async, get_time
+from qanything_kernel.utils.tracing import inject_trace_headers
+from qanything_kernel.utils.embedding_codec import EMBEDDING_MEDIA_TYPE, embedding_accept_header, decode_embeddings
 from langchain_core.embeddings import Embeddings
-from qanything_kernel.configs.model_config import LOCAL_EMBED_SERVICE_URL, LOCAL_RERANK_BATCH
+from qanything_kernel.configs.model_config import LOCAL_EMBED_SERVICE_URL, LOCAL_RERANK_BATCH, LOCAL_EMBED_TRANSPORT
+import numpy as np
 import traceback
 import aiohttp
 import asyncio
@@ -17,40 +20,65 @@ def _process_query(query):
 
 
 class YouDaoEmbeddings(Embeddings):
-    def __init__(self):
+    def __init__(self, transport: str = LOCAL_EMBED_TRANSPORT):
         self.model_version = 'local_v20240725'
         self.url = f"http://{LOCAL_EMBED_SERVICE_URL}/embedding"
         self.session = requests.Session()
+        self.transport = transport
         super().__init__()
 
+    def _request_headers(self):
+        headers = inject_trace_headers()
+        if self.transport != 'json':
+            headers['Accept'] = embedding_accept_header(self.transport)
+        return headers
+
     async def _get_embedding_async(self, session, queries):
         data = {'texts': queries}
-        async with session.post(self.url, json=data) as response:
+        async with session.post(self.url, json=data, headers=self._request_headers()) as response:
+            # 服务端是旧版本时即使请求了二进制也会返回JSON，按Content-Type判断
+            if response.content_type == EMBEDDING_MEDIA_TYPE:
+                return decode_embeddings(await response.read())
             return await response.json()
 
     @get_time_async
-    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+    async def aembed_documents_native(self, texts: List[str]) -> Union[List[List[float]], np.ndarray]:
+        """
+        json传输时返回List[List[float]]；二进制传输时返回(n, dim)的float32矩阵，
+        Milvus入库直接使用矩阵，避免再转成Python列表
+        """
         batch_size = LOCAL_RERANK_BATCH  # 增大客户端批处理大小
         # 向上取整
         embed_logger.info(f'embedding texts number: {len(texts) / batch_size}')
-        all_embeddings = []
         async with aiohttp.ClientSession() as session:
             tasks = [self._get_embedding_async(session, texts[i:i + batch_size])
                      for i in range(0, len(texts), batch_size)]
             results = await asyncio.gather(*tasks)
+        if results and all(isinstance(result, np.ndarray) for result in results):
+            all_embeddings = results[0] if len(results) == 1 else np.concatenate(results)
+        else:
+            all_embeddings = []
             for result in results:
-                all_embeddings.extend(result)
+                all_embeddings.extend(result.tolist() if isinstance(result, np.ndarray) else result)
         debug_logger.info(f'success embedding number: {len(all_embeddings)}')
         return all_embeddings
 
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        embeddings = await self.aembed_documents_native(texts)
+        if isinstance(embeddings, np.ndarray):
+            return embeddings.tolist()
+        return embeddings
+
     async def aembed_query(self, text: str) -> List[float]:
         return (await self.aembed_documents([text]))[0]
 
     def _get_embedding_sync(self, texts):
         data = {'texts': [_process_query(text) for text in texts]}
         try:
-            response = self.session.post(self.url, json=data)
+            response = self.session.post(self.url, json=data, headers=self._request_headers())
             response.raise_for_status()
+            if response.headers.get('content-type', '').startswith(EMBEDDING_MEDIA_TYPE):
+                return decode_embeddings(response.content).tolist()
             result = response.json()
             return result
         except Exception as e:
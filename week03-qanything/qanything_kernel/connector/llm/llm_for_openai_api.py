@@ -162,8 +162,10 @@ class OpenAILLM:
                 if not chunk_str.startswith("[DONE]"):
                     chunk_js = json.loads(chunk_str)
                     complete_answer += chunk_js["answer"]
-                completion_tokens = self.num_tokens_from_messages([complete_answer])
-                total_tokens = prompt_tokens + completion_tokens
+                else:
+                    # 只在结束时统计一次token，避免每个delta都对完整回答重新分词
+                    completion_tokens = self.num_tokens_from_messages([complete_answer])
+                    total_tokens = prompt_tokens + completion_tokens
 
             history[-1] = [prompt, complete_answer]
             answer_result = AnswerResult()
@@ -3,6 +3,7 @@ import aiohttp
 from typing import List
 from qanything_kernel.utils.custom_log import debug_logger
 from qanything_kernel.utils.general_utils import get_time_async
+from qanything_kernel.utils.tracing import inject_trace_headers
 from qanything_kernel.configs.model_config import LOCAL_RERANK_SERVICE_URL, LOCAL_RERANK_BATCH
 from langchain.schema import Document
 import traceback
@@ -17,7 +18,7 @@ class YouDaoRerank:
             'query': query,
             'passages': passages
         }
-        headers = {"content-type": "application/json"}
+        headers = inject_trace_headers({"content-type": "application/json"})
         try:
             async with aiohttp.ClientSession() as session:
                 async with session.post(self.url, json=data, headers=headers) as response:
@@ -1,6 +1,6 @@
 from qanything_kernel.configs.model_config import VECTOR_SEARCH_TOP_K, VECTOR_SEARCH_SCORE_THRESHOLD, \
     PROMPT_TEMPLATE, STREAMING, SYSTEM, INSTRUCTIONS, SIMPLE_PROMPT_TEMPLATE, CUSTOM_PROMPT_TEMPLATE, \
-    LOCAL_RERANK_MODEL_NAME, LOCAL_EMBED_MAX_LENGTH, SEPARATORS
+    LOCAL_RERANK_MODEL_NAME, LOCAL_EMBED_MAX_LENGTH, SEPARATORS, RERANK_CASCADE_BUDGET, RERANK_CASCADE_PREVIEW_CHARS
 from typing import List, Tuple, Union, Dict
 import time
 from scipy.spatial import cKDTree
@@ -13,6 +13,8 @@ from langchain.schema import Document
 from langchain.schema.messages import AIMessage, HumanMessage
 from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
 from qanything_kernel.connector.database.mysql.mysql_client import KnowledgeBaseManager
+from qanything_kernel.connector.database.mysql.qalog_writer import QaLogWriter
+from qanything_kernel.connector.database.mysql.qalog_archive import QaLogArchive
 from qanything_kernel.core.retriever.vectorstore import VectorStoreMilvusClient
 from qanything_kernel.core.retriever.elasticsearchstore import StoreElasticSearchClient
 from qanything_kernel.core.retriever.parent_retriever import ParentRetriever
@@ -66,6 +68,8 @@ class LocalDocQA:
         self.retriever: ParentRetriever = None  # 父级检索器，整合多种检索策略
         self.milvus_summary: KnowledgeBaseManager = None  # 知识库管理器
         self.es_client: StoreElasticSearchClient = None  # ElasticSearch客户端，用于关键词检索
+        self.qalog_writer: QaLogWriter = None  # 问答日志后台批量写入器
+        self.qalog_archive: QaLogArchive = None  # 问答日志Parquet归档，用于统计和导出
         self.session = self.create_retry_session(retries=3, backoff_factor=1)  # HTTP会话，支持重试机制
         # 文档分割器，用于将长文档分割成适合嵌入的小块
         self.doc_splitter = CharacterTextSplitter(
@@ -122,6 +126,8 @@ class LocalDocQA:
         self.embeddings = YouDaoEmbeddings()  # 初始化嵌入模型
         self.rerank = YouDaoRerank()  # 初始化重排序模型
         self.milvus_summary = KnowledgeBaseManager()  # 初始化知识库管理器
+        self.qalog_writer = QaLogWriter(self.milvus_summary)  # 问答日志不在请求链路上同步落库
+        self.qalog_archive = QaLogArchive(self.milvus_summary)  # 分析查询优先读取归档，减少对在线表的扫描
         self.milvus_kb = VectorStoreMilvusClient()  # 初始化向量数据库客户端
         self.es_client = StoreElasticSearchClient()  # 初始化ElasticSearch客户端
         # 初始化父级检索器，整合向量检索和关键词检索
@@ -381,6 +387,39 @@ class LocalDocQA:
                 doc.metadata['score'] = cosine_similarity(embed1, embed2)
             return docs
 
+    async def cascade_rerank(self, query: str, source_documents: List[Document], budget: int,
+                             time_record: Dict) -> List[Document]:
+        """
+        两阶段rerank：长片段会被rerank服务切成多个512 token窗口，全部候选都做全文rerank代价最高。
+        第一阶段只取每个片段开头RERANK_CASCADE_PREVIEW_CHARS个字符打分，保留得分最高的budget个；
+        第二阶段只对保留下来、且确实被截断过的片段做全文rerank，未截断的片段直接沿用第一阶段分数。
+        """
+        t1 = time.perf_counter()
+        preview_docs = [Document(page_content=doc.page_content[:RERANK_CASCADE_PREVIEW_CHARS], metadata={'idx': idx})
+                        for idx, doc in enumerate(source_documents)]
+        preview_docs = await self.rerank.arerank_documents(query, preview_docs)
+        time_record['rerank_preview'] = round(time.perf_counter() - t1, 2)
+        if any('score' not in doc.metadata for doc in preview_docs):
+            # 粗排失败时退回全文rerank
+            debug_logger.warning("cascade rerank preview failed, fallback to full rerank")
+            return await self.rerank.arerank_documents(query, source_documents)
+
+        kept_docs = []
+        for preview_doc in preview_docs[:budget]:
+            doc = source_documents[preview_doc.metadata['idx']]
+            doc.metadata['score'] = preview_doc.metadata['score']
+            kept_docs.append(doc)
+        truncated_docs = [doc for doc in kept_docs if len(doc.page_content) > RERANK_CASCADE_PREVIEW_CHARS]
+        time_record['rerank_candidates_num'] = len(source_documents)
+        time_record['rerank_pruned_num'] = len(source_documents) - len(kept_docs)
+        time_record['rerank_full_num'] = len(truncated_docs)
+        debug_logger.info(f"cascade rerank candidates: {len(source_documents)}, kept: {len(kept_docs)}, "
+                          f"full rerank: {len(truncated_docs)}")
+        if truncated_docs:
+            # arerank_documents会直接改写文档的score
+            await self.rerank.arerank_documents(query, truncated_docs)
+        return sorted(kept_docs, key=lambda x: x.metadata['score'], reverse=True)
+
     async def prepare_source_documents(self, custom_llm: OpenAILLM, retrieval_documents: List[Document],
                                        limited_token_nums: int, rerank: bool):
         return retrieval_documents, retrieval_documents
@@ -528,7 +567,7 @@ class LocalDocQA:
                                          temperature, api_base, api_key, api_context_length, top_p, top_k, web_chunk_size,
                                          chat_history=None, streaming: bool = STREAMING, rerank: bool = False,
                                          only_need_search_results: bool = False, need_web_search=False,
-                                         hybrid_search=False):
+                                         hybrid_search=False, rerank_cascade_budget=RERANK_CASCADE_BUDGET):
         custom_llm = OpenAILLM(model, max_token, api_base, api_key, api_context_length, top_p, temperature)
         if chat_history is None:
             chat_history = []
@@ -633,7 +672,13 @@ class LocalDocQA:
             try:
                 t1 = time.perf_counter()
                 debug_logger.info(f"use rerank, rerank docs num: {len(source_documents)}")
-                source_documents = await self.rerank.arerank_documents(condense_question, source_documents)
+                # 预算不能小于top_k，否则会比原来少返回文档
+                budget = max(rerank_cascade_budget, top_k) if rerank_cascade_budget > 0 else 0
+                if budget and len(source_documents) > budget:
+                    source_documents = await self.cascade_rerank(condense_question, source_documents, budget,
+                                                                 time_record)
+                else:
+                    source_documents = await self.rerank.arerank_documents(condense_question, source_documents)
                 t2 = time.perf_counter()
                 time_record['rerank'] = round(t2 - t1, 2)
                 # 过滤掉低分的文档
@@ -773,13 +818,10 @@ class LocalDocQA:
         est_prompt_tokens = num_tokens(prompt) + num_tokens(str(chat_history))
         async for answer_result in custom_llm.generatorAnswer(prompt=prompt, history=chat_history, streaming=streaming):
             resp = answer_result.llm_output["answer"]
-            if 'answer' in resp:
-                acc_resp += json.loads(resp[6:])['answer']
             prompt = answer_result.prompt
             history = answer_result.history
-            total_tokens = answer_result.total_tokens
-            prompt_tokens = answer_result.prompt_tokens
-            completion_tokens = answer_result.completion_tokens
+            # generatorAnswer已经累积了完整回答，无需对每个delta再做json解析
+            acc_resp = history[-1][1]
             history[-1][0] = query
             response = {"query": query,
                         "prompt": prompt,
@@ -787,15 +829,19 @@ class LocalDocQA:
                         "condense_question": condense_question,
                         "retrieval_documents": retrieval_documents,
                         "source_documents": source_documents}
-            time_record['prompt_tokens'] = prompt_tokens if prompt_tokens != 0 else est_prompt_tokens
-            time_record['completion_tokens'] = completion_tokens if completion_tokens != 0 else num_tokens(acc_resp)
-            time_record['total_tokens'] = total_tokens if total_tokens != 0 else time_record['prompt_tokens'] + \
-                                                                                 time_record['completion_tokens']
             if has_first_return is False:
                 first_return_time = time.perf_counter()
                 has_first_return = True
                 time_record['llm_first_return'] = round(first_return_time - t1, 2)
             if resp[6:].startswith("[DONE]"):
+                # token统计只在结束时计算一次
+                total_tokens = answer_result.total_tokens
+                prompt_tokens = answer_result.prompt_tokens
+                completion_tokens = answer_result.completion_tokens
+                time_record['prompt_tokens'] = prompt_tokens if prompt_tokens != 0 else est_prompt_tokens
+                time_record['completion_tokens'] = completion_tokens if completion_tokens != 0 else num_tokens(acc_resp)
+                time_record['total_tokens'] = total_tokens if total_tokens != 0 else time_record['prompt_tokens'] + \
+                                                                                     time_record['completion_tokens']
                 if extra_msg is not None:
                     msg_response = {"query": query,
                                 "prompt": prompt,
@@ -2,17 +2,24 @@ from typing import Union, Tuple, Dict
 from qanything_kernel.connector.database.mysql.mysql_client import KnowledgeBaseManager
 from sanic.request import File
 from qanything_kernel.configs.model_config import UPLOAD_ROOT_PATH
+import hashlib
 import uuid
 import os
 
 
+def compute_file_hash(file_content: bytes) -> str:
+    # 文件内容的sha256，用于知识库内的内容去重
+    return hashlib.sha256(file_content).hexdigest()
+
+
 class LocalFile:
-    def __init__(self, user_id, kb_id, file: Union[File, str, Dict], file_name):
+    def __init__(self, user_id, kb_id, file: Union[File, str, Dict], file_name, file_hash=None):
         self.user_id = user_id
         self.kb_id = kb_id
         self.file_id = uuid.uuid4().hex
         self.file_name = file_name
         self.file_url = ''
+        self.file_hash = file_hash or ''
         if isinstance(file, Dict):
             self.file_location = "FAQ"
             self.file_content = b''
@@ -22,6 +29,8 @@ class LocalFile:
             self.file_url = file
         else:
             self.file_content = file.body
+            if not self.file_hash:
+                self.file_hash = compute_file_hash(self.file_content)
             # nos_key = construct_nos_key_for_local_file(user_id, kb_id, self.file_id, self.file_name)
             # debug_logger.info(f'file nos_key: {self.file_id}, {self.file_name}, {nos_key}')
             # self.file_location = nos_key
@@ -6,6 +6,7 @@ from qanything_kernel.configs.model_config import UPLOAD_ROOT_PATH, LOCAL_OCR_SE
 from langchain.docstore.document import Document
 from qanything_kernel.utils.loader.my_recursive_url_loader import MyRecursiveUrlLoader
 from qanything_kernel.utils.custom_log import insert_logger
+from qanything_kernel.utils.tracing import inject_trace_headers, trace_span
 from langchain_community.document_loaders import UnstructuredFileLoader, TextLoader
 from langchain_community.document_loaders import UnstructuredWordDocumentLoader
 from langchain_community.document_loaders import UnstructuredEmailLoader
@@ -35,7 +36,9 @@ import time
 
 def get_ocr_result_sync(image_data):
     try:
-        response = requests.post(f"http://{LOCAL_OCR_SERVICE_URL}/ocr", data=image_data, timeout=120)
+        with trace_span('ocr_request'):
+            response = requests.post(f"http://{LOCAL_OCR_SERVICE_URL}/ocr", data=image_data,
+                                     headers=inject_trace_headers(), timeout=120)
         response.raise_for_status()  # 如果请求返回了错误状态码，将会抛出异常
         ocr_res = response.text
         ocr_res = json.loads(ocr_res)
@@ -50,9 +53,9 @@ def get_pdf_result_sync(file_path):
             'filename': file_path,
             'save_dir': os.path.dirname(file_path)
         }
-        headers = {"content-type": "application/json"}
-        response = requests.post(f"http://{LOCAL_PDF_PARSER_SERVICE_URL}/pdfparser", json=data, headers=headers,
-                                 timeout=240)
+        with trace_span('pdf_parser_request'):
+            response = requests.post(f"http://{LOCAL_PDF_PARSER_SERVICE_URL}/pdfparser", json=data,
+                                     headers=inject_trace_headers({"content-type": "application/json"}), timeout=240)
         response.raise_for_status()  # 如果请求返回了错误状态码，将会抛出异常
         response_json = response.json()
         markdown_file = response_json.get('markdown_file')
@@ -7,6 +7,7 @@ from qanything_kernel.connector.embedding.embedding_for_online_client import You
 from qanything_kernel.utils.general_utils import get_time, get_time_async
 from langchain_community.vectorstores.milvus import Milvus
 from pymilvus.orm.collection import MutationResult
+import numpy as np
 import asyncio
 import time
 
@@ -177,7 +178,11 @@ class SelfMilvus(Milvus):
         # Assuming self.embedding_func has an async method embed_documents_async
         embedding_start = time.perf_counter()
         try:
-            embeddings = await self.embedding_func.aembed_documents(texts)
+            if hasattr(self.embedding_func, 'aembed_documents_native'):
+                # 二进制传输时拿到的是float32矩阵，一直保留到分批写入Milvus
+                embeddings = await self.embedding_func.aembed_documents_native(texts)
+            else:
+                embeddings = await self.embedding_func.aembed_documents(texts)
         except NotImplementedError:
             embeddings = [await self.embedding_func.aembed_query(x) for x in texts]
         time_record['milvus_embedding_time'] = round(time.perf_counter() - embedding_start, 2)
@@ -234,8 +239,10 @@ class SelfMilvus(Milvus):
             # Grab end index
             end = min(i + batch_size, total_count)
             # Convert dict to list of lists batch for insertion
+            # pymilvus逐元素读取向量，ndarray按批tolist()一次转换比逐个numpy标量快得多
             insert_list = [
-                insert_dict[x][i:end] for x in self.fields if x in insert_dict
+                insert_dict[x][i:end].tolist() if isinstance(insert_dict[x], np.ndarray) else insert_dict[x][i:end]
+                for x in self.fields if x in insert_dict
             ]
             # Insert into the collection.
             try:
@@ -1,18 +1,20 @@
 import numpy as np
 import time
+import os
 from typing import List, Union
 from numpy import ndarray
 import torch
 from torch import Tensor
 from onnxruntime import InferenceSession, SessionOptions, GraphOptimizationLevel
-from qanything_kernel.configs.model_config import LOCAL_EMBED_MODEL_PATH, LOCAL_EMBED_PATH, LOCAL_EMBED_BATCH, LOCAL_RERANK_MAX_LENGTH
+from qanything_kernel.configs.model_config import LOCAL_EMBED_MODEL_PATH, LOCAL_EMBED_PATH, LOCAL_EMBED_BATCH, LOCAL_RERANK_MAX_LENGTH, \
+    LOCAL_EMBED_QUANT_MODEL_PATH
 from qanything_kernel.utils.custom_log import debug_logger
 from transformers import AutoTokenizer
 from qanything_kernel.dependent_server.embedding_server.embedding_backend import EmbeddingBackend
 
 
 class EmbeddingOnnxBackend:
-    def __init__(self, use_cpu: bool = False):
+    def __init__(self, use_cpu: bool = False, quantized: bool = False):
         self._tokenizer = AutoTokenizer.from_pretrained(LOCAL_EMBED_PATH)
         self.return_tensors = "np"
         self.batch_size = LOCAL_EMBED_BATCH
@@ -25,8 +27,11 @@ class EmbeddingOnnxBackend:
             providers = ['CPUExecutionProvider']
         else:
             providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
-        self._session = InferenceSession(LOCAL_EMBED_MODEL_PATH, sess_options=sess_options, providers=providers)
-        debug_logger.info(f"EmbeddingClient: model_path: {LOCAL_EMBED_MODEL_PATH}")
+        model_path = LOCAL_EMBED_QUANT_MODEL_PATH if quantized else LOCAL_EMBED_MODEL_PATH
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} not found, run scripts/quantize_onnx.py --model embed first")
+        self._session = InferenceSession(model_path, sess_options=sess_options, providers=providers)
+        debug_logger.info(f"EmbeddingClient: model_path: {model_path}")
 
     def get_embedding(self, sentences, max_length):
         inputs_onnx = self._tokenizer(sentences, padding=True, truncation=True, max_length=max_length, return_tensors=self.return_tensors)
@@ -136,11 +141,13 @@ class EmbeddingOnnxBackend:
         else:
             return embeddings
 
-    def predict(self, queries, return_tokens_num=False):
+    def predict(self, queries, return_tokens_num=False, return_numpy=False):
         embeddings = self.encode(
             queries, batch_size=self.batch_size, normalize_to_unit=True, return_numpy=True, max_length=self.max_length,
             tokenizer=self._tokenizer,
             return_tokens_num=return_tokens_num
         )
-
+        # 二进制传输时直接返回float32矩阵，省掉tolist和JSON序列化
+        if return_numpy:
+            return embeddings
         return embeddings.tolist()
\ No newline at end of file
@@ -11,11 +11,13 @@ sys.path.append(root_dir)
 print(root_dir)
 
 from sanic import Sanic
-from sanic.response import json
+from sanic.response import json, raw
 from qanything_kernel.dependent_server.embedding_server.embedding_async_backend import EmbeddingAsyncBackend
 from qanything_kernel.dependent_server.embedding_server.embedding_onnx_backend import EmbeddingOnnxBackend
 from qanything_kernel.configs.model_config import LOCAL_EMBED_MODEL_PATH, LOCAL_EMBED_THREADS
 from qanything_kernel.utils.general_utils import get_time_async
+from qanything_kernel.utils.tracing import setup_tracing
+from qanything_kernel.utils.embedding_codec import EMBEDDING_MEDIA_TYPE, negotiate_embedding_format, encode_embeddings
 import argparse
 
 # 接收外部参数mode
@@ -23,11 +25,13 @@ parser = argparse.ArgumentParser()
 # mode必须是local或online
 parser.add_argument('--use_gpu', action="store_true", help='use gpu or not')
 parser.add_argument('--workers', type=int, default=1, help='workers')
+parser.add_argument('--quantized', action="store_true", help='load the INT8 model generated by scripts/quantize_onnx.py')
 # 检查是否是local或online，不是则报错
 args = parser.parse_args()
 print("args:", args)
 
 app = Sanic("embedding_server")
+setup_tracing(app)
 
 
 @get_time_async
@@ -40,6 +44,11 @@ async def embedding(request):
     # onnx_backend: EmbeddingAsyncBackend = request.app.ctx.onnx_backend
     onnx_backend: EmbeddingOnnxBackend = request.app.ctx.onnx_backend
     # result_data = await onnx_backend.embed_documents_async(texts)
+    # 客户端通过Accept协商二进制格式，否则保持原来的JSON返回
+    transport = negotiate_embedding_format(request.headers.get('accept'))
+    if transport != 'json':
+        embeddings = onnx_backend.predict(texts, return_numpy=True)
+        return raw(encode_embeddings(embeddings, transport), content_type=EMBEDDING_MEDIA_TYPE)
     result_data = onnx_backend.predict(texts)
     # print("local embedding result number:", len(result_data), flush=True)
     # print("local embedding result:", result_data, flush=True)
@@ -51,7 +60,7 @@ async def embedding(request):
 async def setup_onnx_backend(app, loop):
     # app.ctx.onnx_backend = EmbeddingAsyncBackend(model_path=LOCAL_EMBED_MODEL_PATH,
     #                                              use_cpu=not args.use_gpu, num_threads=LOCAL_EMBED_THREADS)
-    app.ctx.onnx_backend = EmbeddingOnnxBackend(use_cpu=not args.use_gpu)
+    app.ctx.onnx_backend = EmbeddingOnnxBackend(use_cpu=not args.use_gpu, quantized=args.quantized)
 
 
 if __name__ == "__main__":
@@ -13,6 +13,7 @@ print(root_dir)
 from sanic import Sanic, response
 from qanything_kernel.utils.custom_log import insert_logger
 from qanything_kernel.utils.general_utils import get_time_async
+from qanything_kernel.utils.tracing import setup_tracing, observe_time_record, current_span
 from qanything_kernel.core.retriever.general_document import LocalFileForInsert
 from qanything_kernel.core.retriever.vectorstore import VectorStoreMilvusClient
 from qanything_kernel.connector.database.mysql.mysql_client import KnowledgeBaseManager
@@ -42,6 +43,7 @@ insert_logger.info(f"INSERT_WORKERS: {INSERT_WORKERS}")
 
 # 创建 Sanic 应用
 app = Sanic("InsertFileService")
+setup_tracing(app)
 
 # 数据库配置
 db_config = {
@@ -62,6 +64,7 @@ async def process_data(retriever, milvus_kb, mysql_client, file_info, time_recor
     process_start = time.perf_counter()
     insert_logger.info(f'Start insert file: {file_info}')
     _, file_id, user_id, file_name, kb_id, file_location, file_size, file_url, chunk_size = file_info
+    current_span().tags.update({'file_id': file_id, 'kb_id': kb_id})
     # 获取格式为'2021-08-01 00:00:00'的时间戳
     insert_timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
     mysql_client.update_knowlegde_base_latest_insert_time(kb_id, insert_timestamp)
@@ -130,6 +133,7 @@ async def process_data(retriever, milvus_kb, mysql_client, file_info, time_recor
 
     mysql_client.update_file_msg(file_id, f'Processing:{random.randint(75, 100)}%')
     time_record['upload_total_time'] = round(time.perf_counter() - process_start, 2)
+    observe_time_record('insert', time_record)
     mysql_client.update_file_upload_infos(file_id, time_record)
     insert_logger.info(f'insert_files_to_milvus: {user_id}, {kb_id}, {file_id}, {file_name}, {status}')
     msg = json.dumps(time_record, ensure_ascii=False)
@@ -155,7 +159,7 @@ async def check_and_process(pool):
                 async with conn.cursor() as cur:  # 创建游标
                     query = f"""
                         SELECT id, timestamp, file_id, file_name FROM File
-                        WHERE status = 'gray' AND MOD(id, %s) = %s AND deleted = 0
+                        WHERE status = 'gray' AND MOD(id, %s) = %s AND deleted = 0 AND linked_file_id = ''
                         ORDER BY timestamp ASC LIMIT 1;
                     """
 
@@ -174,6 +178,9 @@ async def check_and_process(pool):
                             UPDATE File SET status='yellow'
                             WHERE id=%s;
                         """, (id,))
+                        # 内容相同的关联文件共用这次解析结果，状态一起更新
+                        await cur.execute("UPDATE File SET status='yellow' WHERE linked_file_id=%s AND deleted=0",
+                                          (file_id,))
                         await conn.commit()
                         insert_logger.info(f"UPDATE FILE: {timestamp}, {file_id}, {file_name}, yellow")
 
@@ -193,6 +200,10 @@ async def check_and_process(pool):
                         await cur.execute(
                             "UPDATE File SET status=%s, content_length=%s, chunks_number=%s, msg=%s WHERE id=%s",
                             (status, content_length, chunks_number, msg, file_info[0]))
+                        await cur.execute(
+                            "UPDATE File SET status=%s, content_length=%s, chunks_number=%s, msg=%s "
+                            "WHERE linked_file_id=%s AND deleted=0",
+                            (status, content_length, chunks_number, msg, file_id))
                         await conn.commit()
                         insert_logger.info(f"UPDATE FILE: {timestamp}, {file_id}, {file_name}, {status}")
                         sleep_time = 0.1
@@ -207,6 +218,8 @@ async def check_and_process(pool):
                         # 如果file的status是yellow，就改为red
                         if id is not None:
                             await cur.execute("UPDATE File SET status='red' WHERE id=%s AND status='yellow'", (id,))
+                            await cur.execute("UPDATE File SET status='red' WHERE linked_file_id=%s AND status='yellow'",
+                                              (file_id,))
                             await conn.commit()
 
                             await cur.execute(
@@ -16,6 +16,7 @@ import os
 from qanything_kernel.dependent_server.ocr_server.operators import *
 from qanything_kernel.dependent_server.ocr_server.postprocess import build_post_process
 from qanything_kernel.utils.general_utils import safe_get
+from qanything_kernel.utils.tracing import setup_tracing
 from qanything_kernel.configs.model_config import OCR_MODEL_PATH
 import numpy as np
 import onnxruntime as ort
@@ -614,6 +615,7 @@ class OCRQAnything(object):
 
 
 app = Sanic("OCRService")
+setup_tracing(app)
 
 
 @app.before_server_start
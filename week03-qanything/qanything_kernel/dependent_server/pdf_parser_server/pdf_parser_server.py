@@ -12,6 +12,7 @@ print(root_dir)
 
 
 from qanything_kernel.utils.general_utils import safe_get
+from qanything_kernel.utils.tracing import setup_tracing
 from sanic import Sanic, response
 from sanic.request import Request
 from sanic.response import json
@@ -31,6 +32,7 @@ print("args:", args)
 
 
 app = Sanic("pdf_parser_server")
+setup_tracing(app)
 
 
 @app.before_server_start
@@ -1,8 +1,9 @@
 import onnxruntime
 from qanything_kernel.dependent_server.rerank_server.rerank_backend import RerankBackend
-from qanything_kernel.configs.model_config import LOCAL_RERANK_MODEL_PATH
+from qanything_kernel.configs.model_config import LOCAL_RERANK_MODEL_PATH, LOCAL_RERANK_QUANT_MODEL_PATH
 from qanything_kernel.utils.custom_log import debug_logger
 import numpy as np
+import os
 
 def sigmoid(x):
     x = x.astype('float32')
@@ -11,7 +12,7 @@ def sigmoid(x):
     return scores
 
 class RerankOnnxBackend(RerankBackend):
-    def __init__(self, use_cpu: bool = False):
+    def __init__(self, use_cpu: bool = False, quantized: bool = False):
         super().__init__(use_cpu)
         self.return_tensors = "np"
         # 创建一个ONNX Runtime会话设置，使用GPU执行
@@ -23,7 +24,11 @@ class RerankOnnxBackend(RerankBackend):
             providers = ['CPUExecutionProvider']
         else:
             providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
-        self.session = onnxruntime.InferenceSession(LOCAL_RERANK_MODEL_PATH, sess_options, providers=providers)
+        model_path = LOCAL_RERANK_QUANT_MODEL_PATH if quantized else LOCAL_RERANK_MODEL_PATH
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} not found, run scripts/quantize_onnx.py --model rerank first")
+        self.session = onnxruntime.InferenceSession(model_path, sess_options, providers=providers)
+        debug_logger.info(f"RerankClient: model_path: {model_path}")
 
     def inference(self, batch):
         # 准备输入数据
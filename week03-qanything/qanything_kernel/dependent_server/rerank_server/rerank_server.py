@@ -16,6 +16,7 @@ from qanything_kernel.dependent_server.rerank_server.rerank_async_backend import
 from qanything_kernel.dependent_server.rerank_server.rerank_onnx_backend import RerankOnnxBackend
 from qanything_kernel.configs.model_config import LOCAL_RERANK_MODEL_PATH, LOCAL_RERANK_THREADS
 from qanything_kernel.utils.general_utils import get_time_async
+from qanything_kernel.utils.tracing import setup_tracing
 import argparse
 
 # 接收外部参数mode
@@ -23,11 +24,13 @@ parser = argparse.ArgumentParser()
 # mode必须是local或online
 parser.add_argument('--use_gpu', action="store_true", help='use gpu or not')
 parser.add_argument('--workers', type=int, default=1, help='workers')
+parser.add_argument('--quantized', action="store_true", help='load the INT8 model generated by scripts/quantize_onnx.py')
 # 检查是否是local或online，不是则报错
 args = parser.parse_args()
 print("args:", args)
 
 app = Sanic("rerank_server")
+setup_tracing(app)
 
 
 @get_time_async
@@ -52,7 +55,7 @@ async def rerank(request):
 async def setup_onnx_backend(app, loop):
     # app.ctx.onnx_backend = RerankAsyncBackend(model_path=LOCAL_RERANK_MODEL_PATH, use_cpu=not args.use_gpu,
     #                                           num_threads=LOCAL_RERANK_THREADS)
-    app.ctx.onnx_backend = RerankOnnxBackend(use_cpu=not args.use_gpu)
+    app.ctx.onnx_backend = RerankOnnxBackend(use_cpu=not args.use_gpu, quantized=args.quantized)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,13 @@
 import shutil
 
-from qanything_kernel.core.local_file import LocalFile
+from qanything_kernel.core.local_file import LocalFile, compute_file_hash
 from qanything_kernel.core.local_doc_qa import LocalDocQA
 from qanything_kernel.utils.custom_log import debug_logger, qa_logger
 from qanything_kernel.configs.model_config import (BOT_DESC, BOT_IMAGE, BOT_PROMPT, BOT_WELCOME,
                                                    DEFAULT_PARENT_CHUNK_SIZE, MAX_CHARS, VECTOR_SEARCH_TOP_K,
-                                                   UPLOAD_ROOT_PATH, IMAGES_ROOT_PATH)
+                                                   UPLOAD_ROOT_PATH, IMAGES_ROOT_PATH, UPLOAD_ESTIMATE_WORKERS)
 from qanything_kernel.utils.general_utils import *
+from qanything_kernel.utils.tracing import observe_time_record
 from langchain.schema import Document
 from sanic.response import ResponseStream
 from sanic.response import json as sanic_json
@@ -45,6 +46,10 @@ async def run_in_background(func, *args):
         await loop.run_in_executor(pool, func, *args)
 
 
+# 上传时估算文件字符数的线程池，各请求共享
+upload_estimate_executor = ThreadPoolExecutor(max_workers=UPLOAD_ESTIMATE_WORKERS)
+
+
 # 使用aiohttp异步请求另一个API
 async def fetch(session, url, input_json):
     headers = {'Content-Type': 'application/json'}
@@ -207,10 +212,11 @@ async def upload_files(req: request):
         msg = "invalid kb_id: {}, please check...".format(not_exist_kb_ids)
         return sanic_json({"code": 2001, "msg": msg, "data": [{}]})
 
-    exist_files = local_doc_qa.milvus_summary.get_files(user_id, kb_id)
-    if len(exist_files) + len(files) > 10000:
+    status_count = local_doc_qa.milvus_summary.get_kb_status_count([kb_id]).get(kb_id, {})
+    exist_files_num = sum(status_count.values())
+    if exist_files_num + len(files) > 10000:
         return sanic_json({"code": 2002,
-                           "msg": f"fail, exist files is {len(exist_files)}, upload files is {len(files)}, total files is {len(exist_files) + len(files)}, max length is 10000."})
+                           "msg": f"fail, exist files is {exist_files_num}, upload files is {len(files)}, total files is {exist_files_num + len(files)}, max length is 10000."})
 
     data = []
     local_files = []
@@ -243,34 +249,82 @@ async def upload_files(req: request):
     now = datetime.now()
     timestamp = now.strftime("%Y%m%d%H%M")
 
-    failed_files = []
-    for file, file_name in zip(files, file_names):
-        if file_name in exist_file_names:
+    # 按内容哈希去重：与知识库中已有文件或本批次中前面的文件内容相同的，登记为关联文件(有自己的file_id和文件名，
+    # 可在文件列表中查看和删除)，共用原文件的解析结果，不再重复解析入库
+    candidates = [(file, file_name) for file, file_name in zip(files, file_names) if file_name not in exist_file_names]
+    file_hashes = [compute_file_hash(file.body) if not isinstance(file, str) else '' for file, _ in candidates]
+    duplicate_files = []
+    exist_hash_to_file = {}
+    batch_hash_to_file = {}
+    batch_links = []  # 与本批次中其他文件内容相同的文件，等目标文件确认入库后再关联
+    if mode == 'soft':
+        exist_hash_to_file = local_doc_qa.milvus_summary.get_files_by_hash(kb_id, file_hashes)
+    linked_file_infos = []
+
+    def link_file(file, file_name, file_hash, linked_file_id, linked_file_name, linked_status, linked_location):
+        debug_logger.info(f"{file_name} has same content as {linked_file_name}, link to {linked_file_id}")
+        file_id = uuid.uuid4().hex
+        duplicate_files.append(file_name)
+        linked_file_infos.append({"file_id": file_id, "user_id": user_id, "kb_id": kb_id, "file_name": file_name,
+                                  "status": linked_status, "file_size": len(file.body),
+                                  "file_location": linked_location, "chunk_size": chunk_size,
+                                  "timestamp": timestamp, "file_hash": file_hash, "linked_file_id": linked_file_id})
+        data.append({"file_id": file_id, "file_name": file_name, "status": linked_status, "bytes": len(file.body),
+                     "timestamp": timestamp, "linked_file_id": linked_file_id, "linked_file_name": linked_file_name})
+
+    for (file, file_name), file_hash in zip(candidates, file_hashes):
+        if file_hash and file_hash in exist_hash_to_file:
+            link_file(file, file_name, file_hash, *exist_hash_to_file[file_hash])
             continue
-        local_file = LocalFile(user_id, kb_id, file, file_name)
-        chars = fast_estimate_file_char_count(local_file.file_location)
+        if file_hash and file_hash in batch_hash_to_file:
+            batch_links.append((file, file_name, batch_hash_to_file[file_hash]))
+            continue
+        local_file = LocalFile(user_id, kb_id, file, file_name, file_hash=file_hash)
+        if file_hash and mode == 'soft':
+            batch_hash_to_file[file_hash] = local_file
+        local_files.append(local_file)
+
+    # 字符数估算涉及文档解析，放到线程池并行执行，避免逐个串行阻塞请求
+    loop = asyncio.get_running_loop()
+    chars_list = await asyncio.gather(*[loop.run_in_executor(upload_estimate_executor, fast_estimate_file_char_count,
+                                                             local_file.file_location) for local_file in local_files])
+
+    failed_files = []
+    new_file_infos = []
+    for local_file, chars in zip(local_files, chars_list):
+        file_name = local_file.file_name
         debug_logger.info(f"{file_name} char_size: {chars}")
         if chars and chars > MAX_CHARS:
             debug_logger.warning(f"fail, file {file_name} chars is {chars}, max length is {MAX_CHARS}.")
             # return sanic_json({"code": 2003, "msg": f"fail, file {file_name} chars is too much, max length is {MAX_CHARS}."})
             failed_files.append(file_name)
             continue
-        file_id = local_file.file_id
-        file_size = len(local_file.file_content)
-        file_location = local_file.file_location
-        local_files.append(local_file)
-        msg = local_doc_qa.milvus_summary.add_file(file_id, user_id, kb_id, file_name, file_size, file_location,
-                                                   chunk_size, timestamp)
-        debug_logger.info(f"{file_name}, {file_id}, {msg}")
+        new_file_infos.append({"file_id": local_file.file_id, "user_id": user_id, "kb_id": kb_id,
+                               "file_name": file_name, "file_size": len(local_file.file_content),
+                               "file_location": local_file.file_location, "chunk_size": chunk_size,
+                               "timestamp": timestamp, "file_hash": local_file.file_hash})
         data.append(
-            {"file_id": file_id, "file_name": file_name, "status": "gray", "bytes": len(local_file.file_content),
-             "timestamp": timestamp, "estimated_chars": chars})
+            {"file_id": local_file.file_id, "file_name": file_name, "status": "gray",
+             "bytes": len(local_file.file_content), "timestamp": timestamp, "estimated_chars": chars})
+    for file, file_name, linked_file in batch_links:
+        if linked_file.file_name in failed_files:
+            failed_files.append(file_name)
+            continue
+        link_file(file, file_name, linked_file.file_hash, linked_file.file_id, linked_file.file_name, "gray",
+                  linked_file.file_location)
+    # 一次批量插入所有文件记录(关联文件排在原文件之后)
+    msg = local_doc_qa.milvus_summary.add_files(new_file_infos + linked_file_infos)
+    debug_logger.info(f"add {len(new_file_infos)} files, {len(linked_file_infos)} linked files, {msg}")
+    # 查询哈希到登记之间原文件可能已解析完成，登记后再同步一次状态
+    local_doc_qa.milvus_summary.sync_linked_files([info["file_id"] for info in linked_file_infos])
 
     # asyncio.create_task(local_doc_qa.insert_files_to_milvus(user_id, kb_id, local_files))
     if exist_file_names:
         msg = f'warning，当前的mode是soft，无法上传同名文件{exist_file_names}，如果想强制上传同名文件，请设置mode：strong'
     elif failed_files:
         msg = f"warning, {failed_files} chars is too much, max characters length is {MAX_CHARS}, skip upload."
+    elif duplicate_files:
+        msg = f"warning，{duplicate_files}与知识库中已有文件内容相同，已关联到已有文件，不再重复上传"
     else:
         msg = "success，后台正在飞速上传文件，请耐心等待"
     return sanic_json({"code": 200, "msg": msg, "data": data})
@@ -399,44 +453,47 @@ async def list_docs(req: request):
     file_id = safe_get(req, 'file_id')
     page_id = safe_get(req, 'page_id', 1)  # 默认为第一页
     page_limit = safe_get(req, 'page_limit', 10)  # 默认每页显示10条记录
-    data = []
-    if file_id is None:
-        file_infos = local_doc_qa.milvus_summary.get_files(user_id, kb_id)
-    else:
-        file_infos = local_doc_qa.milvus_summary.get_files(user_id, kb_id, file_id)
-    status_count = {}
+    # 游标分页：传入上一页返回的next_cursor即可获取下一页，避免大偏移量
+    cursor = safe_get(req, 'cursor')
     # msg_map = {'gray': "已上传到服务器，进入上传等待队列",
     #            'red': "上传出错，请删除后重试或联系工作人员",
     #            'yellow': "已进入上传队列，请耐心等待", 'green': "上传成功"}
+    # 状态计数与总数来自FileStatusCount计数表，不随知识库文件数增长
+    status_count = local_doc_qa.milvus_summary.get_kb_status_count([kb_id]).get(kb_id, {})
+    total_count = sum(status_count.values())
+    # 计算总页数
+    total_pages = (total_count + page_limit - 1) // page_limit
+    next_cursor = None
+    if file_id is not None:
+        file_infos = local_doc_qa.milvus_summary.get_files(user_id, kb_id, file_id)
+        status_count = dict(Counter(file_info[2] for file_info in file_infos))
+        total_count = len(file_infos)
+        total_pages = (total_count + page_limit - 1) // page_limit
+    elif cursor:
+        try:
+            cursor_timestamp, cursor_id = cursor.rsplit('_', 1)
+            cursor = (cursor_timestamp, int(cursor_id))
+        except ValueError:
+            return sanic_json({"code": 2002, "msg": f'输入非法！cursor格式错误，cursor: {cursor}，请检查！'})
+        file_infos, next_cursor = local_doc_qa.milvus_summary.get_files_by_cursor(kb_id, page_limit, cursor=cursor)
+    else:
+        if page_id > total_pages and total_count != 0:
+            return sanic_json({"code": 2002, "msg": f'输入非法！page_id超过最大值，page_id: {page_id}，最大值：{total_pages}，请检查！'})
+        # 计算当前页的起始索引
+        start_index = (page_id - 1) * page_limit
+        file_infos, next_cursor = local_doc_qa.milvus_summary.get_files_by_cursor(kb_id, page_limit,
+                                                                                  offset=start_index)
+    current_page_data = []
     for file_info in file_infos:
-        status = file_info[2]
-        if status not in status_count:
-            status_count[status] = 1
-        else:
-            status_count[status] += 1
-        data.append({"file_id": file_info[0], "file_name": file_info[1], "status": file_info[2], "bytes": file_info[3],
-                     "content_length": file_info[4], "timestamp": file_info[5], "file_location": file_info[6],
-                     "file_url": file_info[7], "chunks_number": file_info[8], "msg": file_info[9]})
+        current_page_data.append({"file_id": file_info[0], "file_name": file_info[1], "status": file_info[2],
+                                  "bytes": file_info[3], "content_length": file_info[4], "timestamp": file_info[5],
+                                  "file_location": file_info[6], "file_url": file_info[7],
+                                  "chunks_number": file_info[8], "msg": file_info[9]})
         if file_info[1].endswith('.faq'):
             faq_info = local_doc_qa.milvus_summary.get_faq(file_info[0])
             user_id, kb_id, question, answer, nos_keys = faq_info
-            data[-1]['question'] = question
-            data[-1]['answer'] = answer
-
-    # data根据timestamp排序，时间越新的越靠前
-    data = sorted(data, key=lambda x: int(x['timestamp']), reverse=True)
-
-    # 计算总记录数
-    total_count = len(data)
-    # 计算总页数
-    total_pages = (total_count + page_limit - 1) // page_limit
-    if page_id > total_pages and total_count != 0:
-        return sanic_json({"code": 2002, "msg": f'输入非法！page_id超过最大值，page_id: {page_id}，最大值：{total_pages}，请检查！'})
-    # 计算当前页的起始和结束索引
-    start_index = (page_id - 1) * page_limit
-    end_index = start_index + page_limit
-    # 截取当前页的数据
-    current_page_data = data[start_index:end_index]
+            current_page_data[-1]['question'] = question
+            current_page_data[-1]['answer'] = answer
 
     # return sanic_json({"code": 200, "msg": "success", "data": {'total': status_count, 'details': data}})
     return sanic_json({
@@ -448,7 +505,9 @@ async def list_docs(req: request):
             "status_count": status_count,  # 各状态的文件数
             "details": current_page_data,  # 当前页码下的文件目录
             "page_id": page_id,  # 当前页码,
-            "page_limit": page_limit  # 每页显示的文件数
+            "page_limit": page_limit,  # 每页显示的文件数
+            # 下一页游标，没有更多数据时为None
+            "next_cursor": f"{next_cursor[0]}_{next_cursor[1]}" if next_cursor else None
         }
     })
 
@@ -540,6 +599,24 @@ async def delete_docs(req: request):
         return sanic_json({"code": 2004, "msg": "fail, files {} not found".format(file_ids)})
     valid_file_ids = [file_info[0] for file_info in valid_file_infos]
     debug_logger.info("delete_docs valid_file_ids %s", valid_file_ids)
+    # 被删除文件的关联文件(内容相同、共用其解析结果)不随之失效：第一个改为独立文件重新解析，其余关联到它
+    linked_files = defaultdict(list)
+    for linked_file_id, linked_file_name, origin_file_id in local_doc_qa.milvus_summary.get_linked_files(valid_file_ids):
+        if linked_file_id not in valid_file_ids:
+            linked_files[origin_file_id].append((linked_file_id, linked_file_name))
+    for origin_file_id, files in linked_files.items():
+        (promoted_file_id, promoted_file_name), others = files[0], files[1:]
+        file_dir = os.path.join(UPLOAD_ROOT_PATH, user_id, kb_id, promoted_file_id)
+        os.makedirs(file_dir, exist_ok=True)
+        file_location = os.path.join(file_dir, promoted_file_name)
+        origin_location = local_doc_qa.milvus_summary.get_file_location(origin_file_id)
+        if origin_location and os.path.exists(origin_location):
+            shutil.copyfile(origin_location, file_location)
+        else:
+            debug_logger.error(f"delete_docs origin file of {promoted_file_id} not found: {origin_location}")
+        local_doc_qa.milvus_summary.promote_linked_file(promoted_file_id, file_location,
+                                                        [file_id for file_id, _ in others])
+        debug_logger.info(f"delete_docs promote linked file {promoted_file_id} of {origin_file_id}")
     # milvus_kb = local_doc_qa.match_milvus_kb(user_id, [kb_id])
     # milvus_kb.delete_files(file_ids)
     expr = f"""kb_id == "{kb_id}" and file_id in {valid_file_ids}"""  # 删除数据库中的记录
@@ -592,14 +669,13 @@ async def get_total_status(req: request):
             res[user] = local_doc_qa.milvus_summary.get_total_status_by_date(user)
             continue
         kbs = local_doc_qa.milvus_summary.get_knowledge_bases(user)
+        kb_status_count = local_doc_qa.milvus_summary.get_kb_status_count([kb_id for kb_id, _ in kbs])
         for kb_id, kb_name in kbs:
-            gray_file_infos = local_doc_qa.milvus_summary.get_file_by_status([kb_id], 'gray')
-            red_file_infos = local_doc_qa.milvus_summary.get_file_by_status([kb_id], 'red')
-            yellow_file_infos = local_doc_qa.milvus_summary.get_file_by_status([kb_id], 'yellow')
-            green_file_infos = local_doc_qa.milvus_summary.get_file_by_status([kb_id], 'green')
-            res[user][kb_name + kb_id] = {'green': len(green_file_infos), 'yellow': len(yellow_file_infos),
-                                          'red': len(red_file_infos),
-                                          'gray': len(gray_file_infos)}
+            status_count = kb_status_count.get(kb_id, {})
+            res[user][kb_name + kb_id] = {'green': status_count.get('green', 0),
+                                          'yellow': status_count.get('yellow', 0),
+                                          'red': status_count.get('red', 0),
+                                          'gray': status_count.get('gray', 0)}
 
     return sanic_json({"code": 200, "status": res})
 
@@ -709,6 +785,8 @@ async def local_doc_chat(req: request):
     kb_ids = [correct_kb_id(kb_id) for kb_id in kb_ids]
     question = safe_get(req, 'question')
     streaming = safe_get(req, 'streaming', False)
+    # full: 兼容模式，每个delta都返回完整的响应结构；delta: 文档只发一次，delta原样转发
+    stream_mode = safe_get(req, 'stream_mode', 'full')
     history = safe_get(req, 'history', [])
 
     if top_k > 100:
@@ -737,6 +815,8 @@ async def local_doc_chat(req: request):
     if only_need_search_results and streaming:
         return sanic_json(
             {"code": 2006, "msg": "fail, only_need_search_results and streaming can't be True at the same time"})
+    if stream_mode not in ('full', 'delta'):
+        return sanic_json({"code": 2003, "msg": f"fail, stream_mode should be 'full' or 'delta', got {stream_mode}"})
     request_source = safe_get(req, 'source', 'unknown')
 
     debug_logger.info("history: %s ", history)
@@ -783,10 +863,26 @@ async def local_doc_chat(req: request):
     qa_timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
     for kb_id in kb_ids:
         local_doc_qa.milvus_summary.update_knowledge_base_latest_qa_time(kb_id, qa_timestamp)
-    debug_logger.info("streaming: %s", streaming)
+    debug_logger.info("streaming: %s, stream_mode: %s", streaming, stream_mode)
     if streaming:
         debug_logger.info("start generate answer")
 
+        def build_chat_data(resp, result, formatted_time_record, retrieval_documents, source_documents):
+            return {'user_id': user_id, 'kb_ids': kb_ids, 'query': question, "model": model,
+                    "product_source": request_source, 'time_record': formatted_time_record,
+                    'history': history,
+                    'condense_question': resp['condense_question'], 'prompt': resp['prompt'],
+                    'result': result, 'retrieval_documents': retrieval_documents,
+                    'source_documents': source_documents, 'bot_id': bot_id}
+
+        def finish_time_record(result):
+            time_record['chat_completed'] = round(time.perf_counter() - preprocess_start, 2)
+            if time_record.get('llm_completed', 0) > 0:
+                time_record['tokens_per_second'] = round(
+                    len(result) / time_record['llm_completed'], 2)
+            observe_time_record('chat', time_record)
+            return format_time_record(time_record)
+
         async def generate_answer(response):
             debug_logger.info("start generate...")
             async for resp, next_history in local_doc_qa.get_knowledge_based_answer(model=model,
@@ -818,19 +914,10 @@ async def local_doc_chat(req: request):
                     source_documents = format_source_documents(resp["source_documents"])
                     result = next_history[-1][1]
                     # result = resp['result']
-                    time_record['chat_completed'] = round(time.perf_counter() - preprocess_start, 2)
-                    if time_record.get('llm_completed', 0) > 0:
-                        time_record['tokens_per_second'] = round(
-                            len(result) / time_record['llm_completed'], 2)
-                    formatted_time_record = format_time_record(time_record)
-                    chat_data = {'user_id': user_id, 'kb_ids': kb_ids, 'query': question, "model": model,
-                                 "product_source": request_source, 'time_record': formatted_time_record,
-                                 'history': history,
-                                 'condense_question': resp['condense_question'], 'prompt': resp['prompt'],
-                                 'result': result, 'retrieval_documents': retrieval_documents,
-                                 'source_documents': source_documents, 'bot_id': bot_id}
-                    local_doc_qa.milvus_summary.add_qalog(**chat_data)
-                    qa_logger.info("chat_data: %s", chat_data)
+                    formatted_time_record = finish_time_record(result)
+                    chat_data = build_chat_data(resp, result, formatted_time_record, retrieval_documents,
+                                                source_documents)
+                    local_doc_qa.qalog_writer.put(chat_data)
                     debug_logger.info("response: %s", chat_data['result'])
                     stream_res = {
                         "code": 200,
@@ -866,6 +953,79 @@ async def local_doc_chat(req: request):
                     await response.eof()
                 await asyncio.sleep(0.001)
 
+        async def generate_answer_delta(response):
+            """
+            增量流式输出(stream_mode="delta")：
+            1. 第一条事件携带source_documents/retrieval_documents，只发送一次；
+            2. 之后LLM的每个delta原样转发(data: {"answer": "..."})，不再重复序列化累积状态；
+            3. 最后一条事件携带完整回答、history和time_record，不再重复文档。
+            response.write会等待连接可写，客户端读取慢时上游LLM的消费也随之放缓(背压)。
+            """
+            debug_logger.info("start generate delta...")
+            sent_documents = False
+            async for resp, next_history in local_doc_qa.get_knowledge_based_answer(model=model,
+                                                                                    max_token=max_token,
+                                                                                    kb_ids=kb_ids,
+                                                                                    query=question,
+                                                                                    retriever=local_doc_qa.retriever,
+                                                                                    chat_history=history,
+                                                                                    streaming=True,
+                                                                                    rerank=rerank,
+                                                                                    custom_prompt=custom_prompt,
+                                                                                    time_record=time_record,
+                                                                                    need_web_search=need_web_search,
+                                                                                    hybrid_search=hybrid_search,
+                                                                                    web_chunk_size=chunk_size,
+                                                                                    temperature=temperature,
+                                                                                    api_base=api_base,
+                                                                                    api_key=api_key,
+                                                                                    api_context_length=api_context_length,
+                                                                                    top_p=top_p,
+                                                                                    top_k=top_k
+                                                                                    ):
+                chunk_data = resp["result"]
+                if not chunk_data:
+                    continue
+                if not sent_documents:
+                    sent_documents = True
+                    retrieval_documents = format_source_documents(resp["retrieval_documents"])
+                    source_documents = format_source_documents(resp["source_documents"])
+                    head_res = {
+                        "code": 200,
+                        "msg": "success stream start",
+                        "question": question,
+                        "model": model,
+                        "condense_question": resp['condense_question'],
+                        "source_documents": source_documents,
+                        "retrieval_documents": retrieval_documents,
+                    }
+                    await response.write(f"data: {json.dumps(head_res, ensure_ascii=False)}\n\n")
+                if not chunk_data[6:].startswith("[DONE]"):
+                    if 'first_return' not in time_record:
+                        time_record['first_return'] = round(time.perf_counter() - preprocess_start, 2)
+                    # chunk_data已经是"data: {\"answer\": ...}"格式，直接转发
+                    await response.write(chunk_data + "\n\n")
+                    continue
+                result = next_history[-1][1]
+                formatted_time_record = finish_time_record(result)
+                chat_data = build_chat_data(resp, result, formatted_time_record, retrieval_documents,
+                                            source_documents)
+                local_doc_qa.qalog_writer.put(chat_data)
+                tail_res = {
+                    "code": 200,
+                    "msg": "success stream chat",
+                    "question": question,
+                    "response": result,
+                    "model": model,
+                    "history": next_history,
+                    "time_record": formatted_time_record,
+                    "show_images": resp.get('show_images', [])
+                }
+                await response.write(f"data: {json.dumps(tail_res, ensure_ascii=False)}\n\n")
+                await response.eof()
+
+        if stream_mode == 'delta':
+            return ResponseStream(generate_answer_delta, content_type='text/event-stream')
         response_stream = ResponseStream(generate_answer, content_type='text/event-stream')
         return response_stream
 
@@ -896,14 +1056,14 @@ async def local_doc_chat(req: request):
                 {"code": 200, "question": question, "source_documents": format_source_documents(resp)})
         retrieval_documents = format_source_documents(resp["retrieval_documents"])
         source_documents = format_source_documents(resp["source_documents"])
+        observe_time_record('chat', time_record)
         formatted_time_record = format_time_record(time_record)
         chat_data = {'user_id': user_id, 'kb_ids': kb_ids, 'query': question, 'time_record': formatted_time_record,
                      'history': history, "condense_question": resp['condense_question'], "model": model,
                      "product_source": request_source,
                      'retrieval_documents': retrieval_documents, 'prompt': resp['prompt'], 'result': resp['result'],
                      'source_documents': source_documents, 'bot_id': bot_id}
-        local_doc_qa.milvus_summary.add_qalog(**chat_data)
-        qa_logger.info("chat_data: %s", chat_data)
+        local_doc_qa.qalog_writer.put(chat_data)
         debug_logger.info("response: %s", chat_data['result'])
         return sanic_json({"code": 200, "msg": "success no stream chat", "question": question,
                            "response": resp["result"], "model": model,
@@ -1057,14 +1217,8 @@ async def get_qa_info(req: request):
     only_need_count = safe_get(req, 'only_need_count', False)
     debug_logger.info(f"only_need_count: {only_need_count}")
     if only_need_count:
-        need_info = ["timestamp"]
-        qa_infos = local_doc_qa.milvus_summary.get_qalog_by_filter(need_info=need_info, user_id=user_id, time_range=time_range)
-        # timestamp = now.strftime("%Y%m%d%H%M")
-        # 按照timestamp，按照天数进行统计，比如20240628，20240629，20240630，计算每天的问答数量
-        qa_infos = sorted(qa_infos, key=lambda x: x['timestamp'])
-        qa_infos = [qa_info['timestamp'] for qa_info in qa_infos]
-        qa_infos = [qa_info[:10] for qa_info in qa_infos]
-        qa_infos_by_day = dict(Counter(qa_infos))
+        # 按天统计问答数量，比如2024-06-28，2024-06-29，已归档的日期直接读取Parquet分区
+        qa_infos_by_day = local_doc_qa.qalog_archive.get_qalog_count_by_day(time_range, user_id=user_id)
         return sanic_json({"code": 200, "msg": "success", "qa_infos_by_day": qa_infos_by_day})
 
     page_id = safe_get(req, 'page_id', 1)
@@ -1074,9 +1228,10 @@ async def get_qa_info(req: request):
                          "timestamp"]
     need_info = safe_get(req, 'need_info', default_need_info)
     save_to_excel = safe_get(req, 'save_to_excel', False)
-    qa_infos = local_doc_qa.milvus_summary.get_qalog_by_filter(need_info=need_info, user_id=user_id, query=query,
-                                                               bot_id=bot_id, time_range=time_range,
-                                                               any_kb_id=any_kb_id, qa_ids=qa_ids)
+    # 导出和分页查询都走归档数据：避免大范围扫描在线QaLogs表，MySQL中已清理的历史日志也能查到
+    qa_infos = local_doc_qa.qalog_archive.get_qalog_by_filter(need_info=need_info, user_id=user_id, query=query,
+                                                              bot_id=bot_id, time_range=time_range,
+                                                              any_kb_id=any_kb_id, qa_ids=qa_ids)
     if save_to_excel:
         timestamp = datetime.now().strftime("%Y%m%d%H%M")
         file_name = f"QAnything_QA_{timestamp}.xlsx"
@@ -1129,9 +1284,9 @@ async def get_random_qa(req: request):
         return {"code": 2002, "msg": f'输入非法！time_start格式错误，time_start: {time_start}，示例：2024-10-05，请检查！'}
 
     debug_logger.info(f"get_random_qa limit: {limit}, time_range: {time_range}")
-    qa_infos = local_doc_qa.milvus_summary.get_random_qa_infos(limit=limit, time_range=time_range, need_info=need_info)
+    qa_infos = local_doc_qa.qalog_archive.get_random_qa_infos(limit=limit, time_range=time_range, need_info=need_info)
 
-    counts = local_doc_qa.milvus_summary.get_statistic(time_range=time_range)
+    counts = local_doc_qa.qalog_archive.get_statistic(time_range=time_range)
     return sanic_json({"code": 200, "msg": "success", "total_users": counts["total_users"],
                        "total_queries": counts["total_queries"], "qa_infos": qa_infos})
 
@@ -1145,7 +1300,7 @@ async def get_related_qa(req: request):
     need_info = safe_get(req, 'need_info')
     need_more = safe_get(req, 'need_more', False)
     debug_logger.info("get_related_qa %s", qa_id)
-    qa_log, recent_logs, older_logs = local_doc_qa.milvus_summary.get_related_qa_infos(qa_id, need_info, need_more)
+    qa_log, recent_logs, older_logs = local_doc_qa.qalog_archive.get_related_qa_infos(qa_id, need_info, need_more)
     # 按kb_ids划分sections
     recent_sections = defaultdict(list)
     for log in recent_logs:
@@ -18,6 +18,7 @@ sys.path.append(root_dir)
 from handler import *
 from qanything_kernel.core.local_doc_qa import LocalDocQA
 from qanything_kernel.utils.custom_log import debug_logger, qa_logger
+from qanything_kernel.utils.tracing import setup_tracing
 from sanic.worker.manager import WorkerManager
 from sanic import Sanic
 from sanic_ext import Extend
@@ -38,6 +39,7 @@ args = parser.parse_args()
 start_time = time.time()
 app = Sanic("QAnything")
 app.config.CORS_ORIGINS = "*"
+setup_tracing(app)
 Extend(app)
 # 设置请求体最大为 128MB
 app.config.REQUEST_MAX_SIZE = 128 * 1024 * 1024
@@ -54,7 +56,15 @@ async def init_local_doc_qa(app, loop):
     end = time.time()
     print(f'init local_doc_qa cost {end - start}s', flush=True)
     app.ctx.local_doc_qa = local_doc_qa
-    
+    local_doc_qa.qalog_writer.start()
+
+
+@app.before_server_stop
+async def flush_qalog_writer(app, loop):
+    # 停止服务前把缓冲中的问答日志写入数据库
+    await app.ctx.local_doc_qa.qalog_writer.close()
+
+
 @app.after_server_start
 async def notify_server_started(app, loop):
     print(f"Server Start Cost {time.time() - start_time} seconds", flush=True)
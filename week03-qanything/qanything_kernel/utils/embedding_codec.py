@@ -0,0 +1,83 @@
+"""
+embedding服务的二进制传输格式
+
+客户端通过 Accept: application/x-qa-embedding; dtype=float32|float16|int8 协商，
+服务端返回 16 字节头 + 小端向量数据；不带该 Accept 时仍返回JSON，新旧客户端/服务端可以混用。
+
+头部：magic(4s) version(B) dtype(B) 保留(2x) rows(I) dim(I)
+数据：float32/float16 为 rows*dim 个元素；int8 先是 rows 个 float32 缩放系数，再是 rows*dim 个int8
+"""
+from typing import Optional
+import numpy as np
+import struct
+
+__all__ = ['EMBEDDING_MEDIA_TYPE', 'EMBEDDING_DTYPES', 'negotiate_embedding_format', 'embedding_accept_header',
+           'encode_embeddings', 'decode_embeddings']
+
+EMBEDDING_MEDIA_TYPE = "application/x-qa-embedding"
+EMBEDDING_DTYPES = ('float32', 'float16', 'int8')
+
+_MAGIC = b'QAEM'
+_VERSION = 1
+_HEADER = struct.Struct('<4sBBxxII')
+_DTYPE_CODES = {'float32': 1, 'float16': 2, 'int8': 3}
+_CODE_DTYPES = {v: k for k, v in _DTYPE_CODES.items()}
+
+
+def negotiate_embedding_format(accept: Optional[str]) -> str:
+    """解析Accept头，返回 'json' 或二进制dtype"""
+    if not accept:
+        return 'json'
+    for media_range in accept.split(','):
+        parts = [part.strip() for part in media_range.split(';')]
+        if parts[0].lower() != EMBEDDING_MEDIA_TYPE:
+            continue
+        dtype = 'float32'
+        for param in parts[1:]:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'dtype':
+                dtype = value.strip().lower()
+        if dtype in _DTYPE_CODES:
+            return dtype
+    return 'json'
+
+
+def embedding_accept_header(dtype: str) -> str:
+    # 同时声明json，服务端为旧版本时照常返回json
+    return f"{EMBEDDING_MEDIA_TYPE}; dtype={dtype}, application/json;q=0.5"
+
+
+def encode_embeddings(embeddings, dtype: str = 'float32') -> bytes:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim == 1:
+        embeddings = embeddings.reshape(1, -1)
+    rows, dim = embeddings.shape
+    header = _HEADER.pack(_MAGIC, _VERSION, _DTYPE_CODES[dtype], rows, dim)
+    if dtype == 'float32':
+        return header + embeddings.astype('<f4', copy=False).tobytes()
+    if dtype == 'float16':
+        return header + embeddings.astype('<f2').tobytes()
+    # int8：按行对称量化，scale = max|x| / 127
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.rint(embeddings / scales[:, None]).astype(np.int8)
+    return header + scales.astype('<f4').tobytes() + quantized.tobytes()
+
+
+def decode_embeddings(buf) -> np.ndarray:
+    """
+    解码为 (rows, dim) 的float32矩阵。float32直接在响应缓冲区上np.frombuffer，不做拷贝(结果只读)；
+    float16/int8 需要一次转换回float32，Milvus的FLOAT_VECTOR只接受float32
+    """
+    magic, version, code, rows, dim = _HEADER.unpack_from(buf, 0)
+    if magic != _MAGIC or version != _VERSION or code not in _CODE_DTYPES:
+        raise ValueError(f"invalid embedding payload header: {magic!r}, version {version}, dtype {code}")
+    offset = _HEADER.size
+    dtype = _CODE_DTYPES[code]
+    if dtype == 'float32':
+        return np.frombuffer(buf, dtype='<f4', count=rows * dim, offset=offset).reshape(rows, dim)
+    if dtype == 'float16':
+        return np.frombuffer(buf, dtype='<f2', count=rows * dim, offset=offset).reshape(rows, dim).astype(np.float32)
+    scales = np.frombuffer(buf, dtype='<f4', count=rows, offset=offset)
+    quantized = np.frombuffer(buf, dtype=np.int8, count=rows * dim, offset=offset + rows * 4).reshape(rows, dim)
+    return quantized.astype(np.float32) * scales[:, None]
@@ -1,6 +1,7 @@
 from sanic.request import Request
 from sanic.exceptions import BadRequest
 from qanything_kernel.utils.custom_log import debug_logger, embed_logger, rerank_logger
+from qanything_kernel.utils.tracing import trace_span
 from qanything_kernel.configs.model_config import (KB_SUFFIX, UPLOAD_ROOT_PATH, LOCAL_EMBED_PATH, LOCAL_RERANK_PATH)
 from transformers import AutoTokenizer
 import pandas as pd
@@ -143,9 +144,11 @@ def truncate_filename(filename, max_length=200):
 
 # 同步执行环境下的耗时统计装饰器
 def get_time(func):
+    @wraps(func)
     def get_time_inner(*arg, **kwargs):
         s_time = time.time()
-        res = func(*arg, **kwargs)
+        with trace_span(func.__name__):
+            res = func(*arg, **kwargs)
         e_time = time.time()
         if 'embed' in func.__name__:
             embed_logger.info('函数 {} 执行耗时: {:.2f} 秒'.format(func.__name__, e_time - s_time))
@@ -163,7 +166,8 @@ def get_time_async(func):
     @wraps(func)
     async def get_time_async_inner(*args, **kwargs):
         s_time = time.perf_counter()
-        res = await func(*args, **kwargs)  # 注意这里使用 await 来调用异步函数
+        with trace_span(func.__name__):
+            res = await func(*args, **kwargs)  # 注意这里使用 await 来调用异步函数
         e_time = time.perf_counter()
         if 'embed' in func.__name__:
             embed_logger.info('函数 {} 执行耗时: {:.2f} 秒'.format(func.__name__, e_time - s_time))
@@ -0,0 +1,248 @@
+"""
+轻量级链路追踪与延迟直方图
+
+- trace_span(name)：记录一个阶段的耗时，嵌套调用自动形成父子关系(基于contextvars，
+  asyncio.to_thread/create_task 会自动继承当前span)
+- 跨服务传播：调用方用 inject_trace_headers() 把 trace_id/span_id 放进请求头，
+  被调方 setup_tracing(app) 注册的中间件读取请求头，让同一次问答/入库在各个服务中共享trace_id
+- 每个阶段维护一个对数分桶直方图，常数内存、O(1)记录，/metrics 接口输出 p50/p95/p99
+- 超过 TRACE_SLOW_THRESHOLD 的请求保留完整的span树，便于直接定位慢请求耗时在哪个阶段
+
+注意：sanic多worker时每个进程各自统计，/metrics 返回的是处理该请求的worker的数据。
+"""
+from qanything_kernel.configs.model_config import TRACE_SLOW_THRESHOLD, TRACE_SLOW_KEEP, TRACE_MAX_CHILDREN
+from qanything_kernel.utils.custom_log import debug_logger
+from contextlib import contextmanager
+from collections import deque
+from typing import Dict, Optional
+import contextvars
+import threading
+import math
+import time
+import uuid
+
+__all__ = ['TRACE_ID_HEADER', 'PARENT_SPAN_HEADER', 'Span', 'LatencyHistogram', 'Tracer', 'tracer', 'trace_span',
+           'current_span', 'current_trace_id', 'inject_trace_headers', 'observe_time_record', 'setup_tracing']
+
+TRACE_ID_HEADER = "X-QA-Trace-Id"
+PARENT_SPAN_HEADER = "X-QA-Parent-Span-Id"
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("qa_current_span", default=None)
+
+
+def _new_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'duration', 'tags', 'children')
+
+    def __init__(self, name, trace_id=None, parent_id=None):
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.duration = None
+        self.tags = {}
+        self.children = []
+
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.start
+        return self.duration
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "tags": self.tags,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class LatencyHistogram:
+    """
+    对数分桶直方图：第i个桶的上界为 MIN_MS * GROWTH**i，相对误差不超过一个桶宽(约9%)。
+    覆盖0.1ms ~ 约55分钟，单个阶段只占用一个定长列表。
+    """
+    MIN_MS = 0.1
+    GROWTH = 2 ** 0.125
+    NUM_BUCKETS = 200
+
+    def __init__(self):
+        self.buckets = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms: float):
+        if ms <= self.MIN_MS:
+            index = 0
+        else:
+            index = min(int(math.ceil(math.log(ms / self.MIN_MS, self.GROWTH))), self.NUM_BUCKETS - 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, p: float) -> float:
+        if self.count == 0:
+            return 0.0
+        target = max(1, int(math.ceil(self.count * p / 100)))
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                # 返回桶上界，但不超过观测到的最大值
+                return min(self.MIN_MS * self.GROWTH ** index, self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class Tracer:
+    def __init__(self, slow_threshold=TRACE_SLOW_THRESHOLD, slow_keep=TRACE_SLOW_KEEP):
+        self.slow_threshold = slow_threshold
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.slow_traces = deque(maxlen=slow_keep)
+        self.lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.record(seconds * 1000)
+
+    def finish_span(self, span: Span, parent: Optional[Span]):
+        self.record(span.name, span.finish())
+        if parent is not None and len(parent.children) < TRACE_MAX_CHILDREN:
+            parent.children.append(span)
+
+    def finish_root(self, span: Span):
+        duration = span.finish()
+        self.record(span.name, duration)
+        if duration >= self.slow_threshold:
+            trace = span.to_dict()
+            trace["trace_id"] = span.trace_id
+            trace["end_time"] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+            self.slow_traces.append(trace)
+            debug_logger.info(f"slow trace {span.trace_id}: {span.name} {duration:.2f}s")
+
+    def snapshot(self, reset=False) -> Dict:
+        with self.lock:
+            stages = {stage: histogram.summary() for stage, histogram in sorted(self.histograms.items())}
+            slow_traces = list(self.slow_traces)
+            if reset:
+                self.histograms = {}
+                self.slow_traces.clear()
+        return {"stages": stages, "slow_traces": slow_traces}
+
+
+tracer = Tracer()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+@contextmanager
+def trace_span(name: str, **tags):
+    parent = _current_span.get()
+    span = Span(name, trace_id=parent.trace_id if parent else None, parent_id=parent.span_id if parent else None)
+    if tags:
+        span.tags.update(tags)
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+        if parent is None:
+            # 没有上游span(如入库服务的后台任务)时，自身作为根span，同样参与慢请求记录
+            tracer.finish_root(span)
+        else:
+            tracer.finish_span(span, parent)
+
+
+def inject_trace_headers(headers: Optional[Dict] = None) -> Dict:
+    """为下游服务调用添加trace请求头，没有当前span时原样返回"""
+    headers = dict(headers) if headers else {}
+    span = _current_span.get()
+    if span is not None:
+        headers[TRACE_ID_HEADER] = span.trace_id
+        headers[PARENT_SPAN_HEADER] = span.span_id
+    return headers
+
+
+def observe_time_record(prefix: str, time_record: Dict):
+    """
+    把已有的time_record(单位秒，token数和*_num计数除外)记入直方图，并挂到当前span的tags上，
+    这样慢请求的trace里能直接看到各阶段耗时
+    """
+    span = _current_span.get()
+    for k, v in time_record.items():
+        if 'tokens' in k or k.endswith('_num') or isinstance(v, bool) or not isinstance(v, (int, float)):
+            continue
+        tracer.record(f"{prefix}.{k}", v)
+    if span is not None:
+        span.tags.update(time_record)
+
+
+def setup_tracing(app, service_name: Optional[str] = None):
+    """
+    为sanic应用注册trace中间件和 GET /metrics 接口
+
+    根span在 http.lifecycle.response 信号中结束：普通响应在发送前触发，
+    ResponseStream 在流式输出全部结束后触发，因此流式问答记录的是完整耗时。
+    """
+    from sanic.response import json as sanic_json
+
+    service_name = service_name or app.name
+
+    @app.on_request
+    async def _start_trace(request):
+        trace_id = request.headers.get(TRACE_ID_HEADER)
+        parent_id = request.headers.get(PARENT_SPAN_HEADER)
+        span = Span(f"{service_name}:{request.path}", trace_id=trace_id, parent_id=parent_id)
+        request.ctx.trace_span = span
+        _current_span.set(span)
+
+    @app.on_response
+    async def _add_trace_header(request, response):
+        span = getattr(request.ctx, 'trace_span', None)
+        if span is not None:
+            response.headers[TRACE_ID_HEADER] = span.trace_id
+
+    @app.signal("http.lifecycle.response")
+    async def _finish_trace(request, response):
+        span = getattr(request.ctx, 'trace_span', None)
+        if span is None or span.duration is not None:
+            return
+        tracer.finish_root(span)
+        # keep-alive连接上的后续请求复用同一个task，这里清掉当前span避免串到下一个请求
+        _current_span.set(None)
+
+    async def metrics(request):
+        reset = request.args.get('reset', 'false').lower() in ('1', 'true')
+        data = tracer.snapshot(reset=reset)
+        data["service"] = service_name
+        return sanic_json(data)
+
+    app.add_route(metrics, "/metrics", methods=['GET'], name="qa_tracing_metrics")
@@ -0,0 +1,45 @@
+"""
+问答日志离线归档任务：将QaLogs中已结束的日期按天导出为Parquet分区，并可选清理MySQL中已归档的旧日志。
+
+用法示例(建议每天凌晨通过crontab执行)：
+    python scripts/archive_qalogs.py --days 1
+    python scripts/archive_qalogs.py --date 2024-10-05 --overwrite
+    python scripts/archive_qalogs.py --days 7 --purge_before_days 90
+"""
+import sys
+import os
+
+# 将项目根目录添加到sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qanything_kernel.connector.database.mysql.mysql_client import KnowledgeBaseManager
+from qanything_kernel.connector.database.mysql.qalog_archive import QaLogArchive
+from datetime import datetime, timedelta
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--days', type=int, default=1, help='归档最近N个完整的自然日(不含今天)')
+parser.add_argument('--date', type=str, default=None, help='只归档指定日期，格式YYYY-MM-DD')
+parser.add_argument('--overwrite', action='store_true', help='已存在的分区重新导出')
+parser.add_argument('--batch_size', type=int, default=1000, help='每批从MySQL读取的条数')
+parser.add_argument('--purge_before_days', type=int, default=None,
+                    help='删除MySQL中N天之前且已归档的日志，不传则不删除')
+args = parser.parse_args()
+
+if __name__ == '__main__':
+    archive = QaLogArchive(KnowledgeBaseManager(pool_size=2))
+    today = datetime.now().date()
+    if args.date:
+        days = [args.date]
+    else:
+        days = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(args.days, 0, -1)]
+    for day in days:
+        if day >= today.strftime("%Y-%m-%d"):
+            print(f"skip {day}: only finished days can be archived")
+            continue
+        count = archive.export_day(day, batch_size=args.batch_size, overwrite=args.overwrite)
+        print(f"archived {day}: {count} qalogs")
+    if args.purge_before_days is not None:
+        before_day = (today - timedelta(days=args.purge_before_days)).strftime("%Y-%m-%d")
+        deleted = archive.purge_archived(before_day)
+        print(f"purged {deleted} archived qalogs before {before_day} from mysql")
@@ -0,0 +1,71 @@
+"""
+压测用的OpenAI兼容假LLM服务：按配置的首token延迟和逐token延迟返回固定回答，
+让chat压测结果只反映QAnything自身各阶段的开销，而不受真实大模型波动影响。
+
+用法示例：
+    python scripts/benchmark/fake_llm_server.py --port 9300 --first_token_latency 0.3 --token_latency 0.02
+    OpenAI客户端的 api_base 配置为 http://127.0.0.1:9300/v1
+"""
+from sanic import Sanic
+from sanic.response import json as sanic_json
+import argparse
+import json
+import asyncio
+import time
+import uuid
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--host', type=str, default='127.0.0.1')
+parser.add_argument('--port', type=int, default=9300)
+parser.add_argument('--first_token_latency', type=float, default=0.3, help='首个token前的等待秒数')
+parser.add_argument('--token_latency', type=float, default=0.02, help='每个后续token的间隔秒数')
+parser.add_argument('--answer_tokens', type=int, default=200, help='每次回答返回的token数')
+parser.add_argument('--workers', type=int, default=1)
+args = parser.parse_args()
+
+app = Sanic("fake_llm_server")
+
+ANSWER_TOKENS = ["根据", "参考", "信息", "，", "QAnything", "支持", "上传", "多种", "格式", "的", "文件", "。"]
+
+
+def _answer_tokens(n):
+    return [ANSWER_TOKENS[i % len(ANSWER_TOKENS)] for i in range(n)]
+
+
+def _chunk(completion_id, model, content=None, finish_reason=None):
+    delta = {} if content is None else {"role": "assistant", "content": content}
+    return {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request):
+    data = request.json
+    model = data.get('model', 'fake-llm')
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    n_tokens = min(data.get('max_tokens') or args.answer_tokens, args.answer_tokens)
+    tokens = _answer_tokens(n_tokens)
+    prompt_chars = sum(len(m.get('content') or '') for m in data.get('messages', []))
+    usage = {"prompt_tokens": prompt_chars, "completion_tokens": n_tokens, "total_tokens": prompt_chars + n_tokens}
+
+    if not data.get('stream'):
+        await asyncio.sleep(args.first_token_latency + args.token_latency * max(n_tokens - 1, 0))
+        return sanic_json({"id": completion_id, "object": "chat.completion", "created": int(time.time()),
+                           "model": model,
+                           "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                                        "finish_reason": "stop"}],
+                           "usage": usage})
+
+    response = await request.respond(content_type="text/event-stream")
+    await asyncio.sleep(args.first_token_latency)
+    for i, token in enumerate(tokens):
+        if i:
+            await asyncio.sleep(args.token_latency)
+        await response.send("data: " + json.dumps(_chunk(completion_id, model, token), ensure_ascii=False) + "\n\n")
+    await response.send("data: " + json.dumps(_chunk(completion_id, model, finish_reason="stop")) + "\n\n")
+    await response.send("data: [DONE]\n\n")
+    await response.eof()
+
+
+if __name__ == "__main__":
+    app.run(host=args.host, port=args.port, workers=args.workers, access_log=False)
@@ -0,0 +1,455 @@
+"""
+QAnything离线压测：上传(upload_files→入库服务process_data：解析→切分→embedding→写入向量库/ES)和
+问答(local_doc_chat：检索→rerank→拼prompt→LLM流式输出→写问答日志)两条链路，
+在指定并发下统计各阶段p50/p95/p99和吞吐，结果保存为json，可与上一版本的结果对比发现性能回退。
+
+压测直接调用线上代码：handler中的new_knowledge_base/upload_files/local_doc_chat、LocalDocQA、ParentRetriever、
+KnowledgeBaseManager以及入库服务的process_data，只替换存储层和LLM：
+    - MySQL/Milvus/ES 由 standins.py 中的替身代替(SQLite/内存向量索引/内存BM25)，按init_cfg的方式注入LocalDocQA，无需外部服务
+    - LLM使用 fake_llm_server.py(--start_fake_llm 时自动拉起)，问答请求的api_base指向它，首token和逐token延迟可配置
+    - embedding(9001)和rerank(8001)仍是真实服务，即 qanything_kernel/dependent_server 下的ONNX服务
+各阶段耗时取自线上代码自己记录的time_record(入库服务的parse_time/milvus_embedding_time等、问答的
+retriever_search/rerank/llm_first_return等，精度10ms)，另外在客户端记录上传请求、首个流式事件和整体耗时。
+
+用法示例：
+    python scripts/benchmark/run_benchmark.py --start_fake_llm --mode all --concurrency 8 \\
+        --num_docs 200 --chat_requests 200 --output benchmark_results/v2.1.json
+    python scripts/benchmark/run_benchmark.py --start_fake_llm --mode chat --docs_dir ./docs \\
+        --baseline benchmark_results/v2.0.json --max_regression 0.2
+"""
+import sys
+import os
+
+# 将项目根目录和当前目录添加到sys.path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
+sys.path.append(current_dir)
+
+from qanything_kernel.configs.model_config import LOCAL_EMBED_TRANSPORT
+from qanything_kernel.connector.embedding.embedding_for_online_client import YouDaoEmbeddings
+from qanything_kernel.connector.rerank.rerank_for_online_client import YouDaoRerank
+from qanything_kernel.connector.database.mysql.qalog_writer import QaLogWriter
+from qanything_kernel.core.retriever.parent_retriever import ParentRetriever
+from qanything_kernel.core.retriever import docstrore, general_document
+from qanything_kernel.core.local_doc_qa import LocalDocQA
+from qanything_kernel.core import local_doc_qa as local_doc_qa_module
+from qanything_kernel.core import local_file
+from qanything_kernel.qanything_server import handler
+from standins import SQLiteKnowledgeBase, InMemoryMilvusClient, InMemoryESClient
+from sanic.request import File, RequestParameters
+from sanic.response import ResponseStream
+from types import SimpleNamespace
+from contextlib import contextmanager
+from collections import defaultdict
+from datetime import datetime
+import numpy as np
+import subprocess
+import traceback
+import argparse
+import asyncio
+import tempfile
+import random
+import shutil
+import socket
+import json
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--mode', type=str, default='all', choices=['upload', 'chat', 'all'])
+parser.add_argument('--concurrency', type=int, default=8, help='并发数')
+parser.add_argument('--docs_dir', type=str, default=None, help='上传的文本文件目录(.txt/.md)，不传则生成合成文档')
+parser.add_argument('--num_docs', type=int, default=100, help='合成文档数量')
+parser.add_argument('--doc_chars', type=int, default=3000, help='合成文档字符数')
+parser.add_argument('--queries', type=str, default=None, help='问题文件，每行一个问题，不传则从文档中抽句子')
+parser.add_argument('--chat_requests', type=int, default=100, help='问答请求总数')
+parser.add_argument('--kb_num', type=int, default=4, help='文档平均分到几个知识库，问答时检索全部知识库')
+parser.add_argument('--top_k', type=int, default=30, help='问答请求的top_k')
+parser.add_argument('--no_rerank', action='store_true', help='问答请求中rerank=False')
+parser.add_argument('--hybrid_search', action='store_true', help='问答请求中hybrid_search=True，同时做BM25检索')
+parser.add_argument('--stream_mode', type=str, default='full', choices=['full', 'delta'], help='流式输出模式')
+parser.add_argument('--insert_workers', type=int, default=4, help='入库服务的worker数，与insert_files_server的--workers对应')
+parser.add_argument('--llm_api_base', type=str, default='http://127.0.0.1:9300/v1')
+parser.add_argument('--llm_model', type=str, default='fake-llm')
+parser.add_argument('--api_context_length', type=int, default=32000)
+parser.add_argument('--start_fake_llm', action='store_true', help='自动启动fake_llm_server.py')
+parser.add_argument('--first_token_latency', type=float, default=0.3)
+parser.add_argument('--token_latency', type=float, default=0.02)
+parser.add_argument('--answer_tokens', type=int, default=200)
+parser.add_argument('--seed', type=int, default=42)
+parser.add_argument('--output', type=str, default=None, help='结果json路径，默认 benchmark_results/<时间>.json')
+parser.add_argument('--baseline', type=str, default=None, help='对比的历史结果json')
+parser.add_argument('--max_regression', type=float, default=0.2, help='p95相对基线增长超过该比例视为回退')
+args = parser.parse_args()
+
+# insert_files_server在导入时解析命令行参数，导入期间只保留脚本名，避免解析压测脚本自己的参数
+_argv, sys.argv = sys.argv, sys.argv[:1]
+try:
+    from qanything_kernel.dependent_server.insert_files_serve import insert_files_server
+finally:
+    sys.argv = _argv
+
+USER_ID = 'benchmark'
+SENTENCES = [
+    "QAnything支持上传pdf、docx、txt、md、xlsx、pptx、eml、csv以及图片等多种格式的文件。",
+    "上传后的文件会先被解析成文本，再按照父子块切分，子块用于向量检索，父块用于提供完整上下文。",
+    "embedding服务把文本编码为向量并写入Milvus，同时原文写入Elasticsearch用于关键词检索。",
+    "问答时先对问题做向量检索和BM25检索，合并去重后送入rerank模型重新打分。",
+    "rerank分数低于0.28的片段会被过滤，剩余片段按照token预算拼接成大模型的参考信息。",
+    "大模型以流式方式返回回答，第一条消息携带参考文档，之后只返回增量内容。",
+    "知识库的文件数量上限是一万个，单个文件解析后的字符数不能超过一百万。",
+    "问答日志会写入QaLogs表，并每天归档为Parquet文件用于统计分析。",
+    "FAQ以问答对的形式上传，高分完全匹配的FAQ会直接作为答案返回。",
+    "网页链接上传后会被抓取并转换成markdown，再进入同样的切分和向量化流程。",
+    "The insert worker polls MySQL for gray files and processes them one by one per worker.",
+    "Each chat request records time usage for retrieval, rerank, prompt building and LLM generation.",
+]
+
+
+class StageRecorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def summary(self):
+        result = {}
+        for stage, values in sorted(self.samples.items()):
+            ms = np.asarray(values) * 1000
+            result[stage] = {
+                "count": int(ms.size),
+                "mean_ms": round(float(ms.mean()), 2),
+                "p50_ms": round(float(np.percentile(ms, 50)), 2),
+                "p95_ms": round(float(np.percentile(ms, 95)), 2),
+                "p99_ms": round(float(np.percentile(ms, 99)), 2),
+                "max_ms": round(float(ms.max()), 2),
+            }
+        return result
+
+
+def load_docs(rng):
+    if args.docs_dir:
+        docs = []
+        for name in sorted(os.listdir(args.docs_dir)):
+            if name.lower().endswith(('.txt', '.md')):
+                with open(os.path.join(args.docs_dir, name), 'r', encoding='utf-8', errors='ignore') as f:
+                    docs.append((name, f.read()))
+        return docs
+    docs = []
+    for i in range(args.num_docs):
+        text = ''
+        while len(text) < args.doc_chars:
+            text += rng.choice(SENTENCES) + ('\n\n' if rng.random() < 0.2 else '')
+        docs.append((f'synthetic_{i}.txt', text))
+    return docs
+
+
+def load_queries(rng):
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = [sentence.rstrip('。.') + '？' for sentence in SENTENCES]
+    return [rng.choice(queries) for _ in range(args.chat_requests)]
+
+
+class BenchmarkRequest:
+    """handler只通过safe_get读取参数、通过req.files读取上传文件、通过req.app.ctx获取LocalDocQA，压测时直接构造这几项"""
+
+    def __init__(self, app, params, files=None):
+        self.app = app
+        self.form = RequestParameters()
+        self.args = RequestParameters()
+        self.json = params
+        self.files = RequestParameters({'files': files or []})
+
+
+class StreamCollector:
+    """代替sanic的流式响应：记录首个事件和结束的时间，保留最后一个事件(带完整回答和time_record)"""
+
+    def __init__(self, start):
+        self.start = start
+        self.first_event = None
+        self.completed = None
+        self.last_event = None
+
+    async def write(self, data):
+        if self.first_event is None:
+            self.first_event = time.perf_counter() - self.start
+        self.last_event = data
+
+    async def eof(self):
+        self.completed = time.perf_counter() - self.start
+
+
+def build_local_doc_qa():
+    """与LocalDocQA.init_cfg相同的组装方式，MySQL/Milvus/ES客户端换成替身；问答链路不读取归档，qalog_archive保持为None"""
+    local_doc_qa = LocalDocQA(port=0)
+    local_doc_qa.embeddings = YouDaoEmbeddings()
+    local_doc_qa.rerank = YouDaoRerank()
+    local_doc_qa.milvus_summary = SQLiteKnowledgeBase()
+    local_doc_qa.qalog_writer = QaLogWriter(local_doc_qa.milvus_summary)
+    local_doc_qa.milvus_kb = InMemoryMilvusClient(YouDaoEmbeddings())
+    local_doc_qa.es_client = InMemoryESClient()
+    local_doc_qa.retriever = ParentRetriever(local_doc_qa.milvus_kb, local_doc_qa.milvus_summary,
+                                             local_doc_qa.es_client)
+    # 检索结果为空时get_source_documents会重建Milvus客户端重试，改为返回替身
+    local_doc_qa_module.VectorStoreMilvusClient = lambda: local_doc_qa.milvus_kb
+    return local_doc_qa
+
+
+def add_time_record(recorder, time_record):
+    # 只统计耗时(秒)，跳过token数、*_num计数和rollback_length等非耗时字段
+    for stage, value in time_record.items():
+        if stage == 'rollback_length' or stage.endswith('_num') or isinstance(value, bool) \
+                or not isinstance(value, (int, float)):
+            continue
+        recorder.add(stage, value)
+
+
+class Benchmark:
+    def __init__(self):
+        self.local_doc_qa = build_local_doc_qa()
+        self.app = SimpleNamespace(ctx=SimpleNamespace(local_doc_qa=self.local_doc_qa))
+        self.kb_ids = []
+        # 每个入库worker有自己的ParentRetriever(与insert_files_server的每个worker进程一致)，共用同一套存储
+        self.insert_workers = asyncio.Queue()
+        for _ in range(args.insert_workers):
+            self.insert_workers.put_nowait(ParentRetriever(self.local_doc_qa.milvus_kb,
+                                                           self.local_doc_qa.milvus_summary,
+                                                           self.local_doc_qa.es_client))
+
+    def request(self, params, files=None):
+        return BenchmarkRequest(self.app, dict(params, user_id=USER_ID), files)
+
+    async def setup(self):
+        for i in range(args.kb_num):
+            response = await handler.new_knowledge_base(self.request({'kb_name': f'benchmark_{i}'}))
+            self.kb_ids.append(json.loads(response.body)['data']['kb_id'])
+        self.local_doc_qa.qalog_writer.start()
+
+    async def insert_file(self, retriever, file_id):
+        """
+        入库服务check_and_process处理一个文件的流程：置为yellow(连同关联文件)→process_data→写回状态，
+        SQL与check_and_process一致，只是不再轮询File表，直接处理刚上传的文件
+        """
+        kb = self.local_doc_qa.milvus_summary
+        await asyncio.to_thread(kb.execute_query_, "UPDATE File SET status='yellow' WHERE file_id=%s",
+                                (file_id,), commit=True)
+        await asyncio.to_thread(kb.execute_query_,
+                                "UPDATE File SET status='yellow' WHERE linked_file_id=%s AND deleted=0",
+                                (file_id,), commit=True)
+        file_info = (await asyncio.to_thread(
+            kb.execute_query_, "SELECT id, file_id, user_id, file_name, kb_id, file_location, file_size, file_url, "
+                               "chunk_size FROM File WHERE file_id=%s", (file_id,), fetch=True))[0]
+        time_record = {}
+        status, content_length, chunks_number, msg = await insert_files_server.process_data(
+            retriever, self.local_doc_qa.milvus_kb, kb, file_info, time_record)
+        await asyncio.to_thread(kb.execute_query_,
+                                "UPDATE File SET status=%s, content_length=%s, chunks_number=%s, msg=%s "
+                                "WHERE file_id=%s", (status, content_length, chunks_number, msg, file_id),
+                                commit=True)
+        await asyncio.to_thread(kb.execute_query_,
+                                "UPDATE File SET status=%s, content_length=%s, chunks_number=%s, msg=%s "
+                                "WHERE linked_file_id=%s AND deleted=0",
+                                (status, content_length, chunks_number, msg, file_id), commit=True)
+        return status, chunks_number, msg, time_record
+
+    async def upload_one(self, recorder: StageRecorder, idx, file_name, text):
+        kb_id = self.kb_ids[idx % len(self.kb_ids)]
+        start = time.perf_counter()
+        request = self.request({'kb_id': kb_id, 'mode': 'soft'},
+                               files=[File(type='text/plain', body=text.encode('utf-8'), name=file_name)])
+        with recorder.timed('upload_files'):
+            response = json.loads((await handler.upload_files(request)).body)
+        if response['code'] != 200 or not response['data']:
+            raise RuntimeError(response['msg'])
+        file_info = response['data'][0]
+        chunks_number = 0
+        # 内容与已有文件相同的关联文件共用原文件的解析结果，入库服务不处理
+        if not file_info.get('linked_file_id'):
+            wait_start = time.perf_counter()
+            retriever = await self.insert_workers.get()
+            recorder.add('insert_wait', time.perf_counter() - wait_start)
+            try:
+                status, chunks_number, msg, time_record = await self.insert_file(retriever, file_info['file_id'])
+            finally:
+                self.insert_workers.put_nowait(retriever)
+            if status != 'green':
+                raise RuntimeError(f'{file_name} insert failed: {msg}')
+            add_time_record(recorder, time_record)
+        recorder.add('total', time.perf_counter() - start)
+        return chunks_number
+
+    async def chat_one(self, recorder: StageRecorder, query):
+        start = time.perf_counter()
+        request = self.request({'kb_ids': list(self.kb_ids), 'question': query, 'streaming': True,
+                                'stream_mode': args.stream_mode, 'rerank': not args.no_rerank,
+                                'hybrid_search': args.hybrid_search, 'top_k': args.top_k,
+                                'api_base': args.llm_api_base, 'api_key': 'EMPTY',
+                                'api_context_length': args.api_context_length, 'model': args.llm_model,
+                                'max_token': args.answer_tokens, 'source': 'benchmark'})
+        response = await handler.local_doc_chat(request)
+        if not isinstance(response, ResponseStream):
+            raise RuntimeError(json.loads(response.body)['msg'])
+        stream = StreamCollector(start)
+        await response.streaming_fn(stream)
+        if stream.completed is None:
+            raise RuntimeError(f'stream not finished, last event: {stream.last_event}')
+        recorder.add('first_event', stream.first_event)
+        recorder.add('total', stream.completed)
+        last_event = json.loads(stream.last_event[len('data: '):])
+        add_time_record(recorder, last_event['time_record']['time_usage'])
+
+    async def run_workload(self, name, items, worker):
+        recorder = StageRecorder()
+        semaphore = asyncio.Semaphore(args.concurrency)
+        errors = 0
+        results = []
+
+        async def run(item):
+            nonlocal errors
+            async with semaphore:
+                try:
+                    results.append(await worker(recorder, *item))
+                except Exception:
+                    errors += 1
+                    print(f'{name} error: {traceback.format_exc()}')
+
+        start = time.perf_counter()
+        await asyncio.gather(*[run(item) for item in items])
+        wall = time.perf_counter() - start
+        report = {"requests": len(items), "errors": errors, "wall_seconds": round(wall, 3),
+                  "throughput_per_second": round((len(items) - errors) / wall, 3) if wall > 0 else None,
+                  "stages": recorder.summary()}
+        return report, results
+
+    async def run(self, docs, queries):
+        report = {}
+        await self.setup()
+        # 只压测chat时也要先把文档入库，只是不输出upload的结果
+        upload, chunk_counts = await self.run_workload(
+            'upload', [(i, name, text) for i, (name, text) in enumerate(docs)], self.upload_one)
+        upload["chunks"] = int(sum(chunk_counts))
+        upload["chunks_per_second"] = round(upload["chunks"] / upload["wall_seconds"], 3) \
+            if upload["wall_seconds"] > 0 else None
+        if args.mode in ('upload', 'all'):
+            report['upload'] = upload
+        if args.mode in ('chat', 'all'):
+            report['chat'], _ = await self.run_workload('chat', [(query,) for query in queries], self.chat_one)
+        # 问答日志由QaLogWriter在后台批量写入，关闭时等待全部落库
+        await self.local_doc_qa.qalog_writer.close()
+        if 'chat' in report:
+            report['chat']['qalogs'] = self.local_doc_qa.milvus_summary.execute_query_(
+                "SELECT COUNT(*) FROM QaLogs", (), fetch=True)[0][0]
+        return report
+
+
+def wait_port(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex((host, port)) == 0:
+                return True
+        time.sleep(0.5)
+    return False
+
+
+def start_fake_llm():
+    host_port = args.llm_api_base.split('//')[-1].split('/')[0]
+    host, port = host_port.split(':')
+    process = subprocess.Popen([sys.executable, os.path.join(current_dir, 'fake_llm_server.py'),
+                                '--host', host, '--port', port,
+                                '--first_token_latency', str(args.first_token_latency),
+                                '--token_latency', str(args.token_latency),
+                                '--answer_tokens', str(args.answer_tokens)])
+    if not wait_port(host, int(port)):
+        process.terminate()
+        raise RuntimeError(f'fake llm server not ready on {host_port}')
+    return process
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=current_dir,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def compare_with_baseline(report, baseline):
+    """逐阶段对比p95，返回回退列表"""
+    regressions = []
+    for section in ('upload', 'chat'):
+        if section not in report or section not in baseline:
+            continue
+        for stage, stats in report[section]['stages'].items():
+            old = baseline[section]['stages'].get(stage)
+            if not old or old['p95_ms'] < 1:
+                continue
+            change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms']
+            print(f"{section}.{stage}: p95 {old['p95_ms']}ms -> {stats['p95_ms']}ms ({change:+.1%})")
+            if change > args.max_regression:
+                regressions.append(f"{section}.{stage} p95 {change:+.1%}")
+        old_tp = baseline[section].get('throughput_per_second')
+        new_tp = report[section].get('throughput_per_second')
+        if old_tp and new_tp:
+            change = (new_tp - old_tp) / old_tp
+            print(f"{section}.throughput: {old_tp}/s -> {new_tp}/s ({change:+.1%})")
+            if -change > args.max_regression:
+                regressions.append(f"{section}.throughput {change:+.1%}")
+    return regressions
+
+
+async def main():
+    rng = random.Random(args.seed)
+    docs = load_docs(rng)
+    queries = load_queries(rng)
+    # 上传的文件写到临时目录，不污染QANY_DB
+    upload_root = tempfile.mkdtemp(prefix='qanything_benchmark_')
+    for module in (handler, local_file, docstrore, general_document):
+        module.UPLOAD_ROOT_PATH = upload_root
+    try:
+        benchmark = Benchmark()
+        report = await benchmark.run(docs, queries)
+    finally:
+        shutil.rmtree(upload_root, ignore_errors=True)
+    report['meta'] = {
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "git_commit": git_commit(),
+        "embed_transport": LOCAL_EMBED_TRANSPORT,
+        "docs": len(docs),
+        "args": vars(args),
+    }
+    return report
+
+
+if __name__ == '__main__':
+    fake_llm = start_fake_llm() if args.start_fake_llm and args.mode in ('chat', 'all') else None
+    try:
+        report = asyncio.run(main())
+    finally:
+        if fake_llm is not None:
+            fake_llm.terminate()
+
+    output = args.output or os.path.join('benchmark_results', datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps({k: v for k, v in report.items() if k != 'meta'}, ensure_ascii=False, indent=2))
+    print(f'benchmark result saved to {output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_with_baseline(report, json.load(f))
+        if regressions:
+            print('性能回退：' + '; '.join(regressions))
+            sys.exit(1)
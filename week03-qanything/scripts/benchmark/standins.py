@@ -0,0 +1,389 @@
+"""
+压测用的本地替身：SQLite代替MySQL，内存向量索引代替Milvus，内存倒排索引代替ES。
+替身按线上客户端的接口实现，注入到LocalDocQA、ParentRetriever和入库服务的process_data中，
+压测时handler、LocalDocQA、KnowledgeBaseManager走的都是线上代码，只有存储层被替换：
+    - SQLiteKnowledgeBase 继承 KnowledgeBaseManager，只替换连接层(execute_query_)和建表语句，其余SQL沿用线上实现
+    - InMemoryMilvusClient/InMemoryMilvus 对应 VectorStoreMilvusClient/SelfMilvus(langchain的VectorStore)
+    - InMemoryESClient/InMemoryESStore 对应 StoreElasticSearchClient/ElasticsearchStore(BM25)
+"""
+from qanything_kernel.connector.database.mysql.mysql_client import KnowledgeBaseManager
+from qanything_kernel.utils.custom_log import debug_logger, insert_logger
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from typing import Dict, List, Tuple
+from collections import Counter, defaultdict
+import numpy as np
+import itertools
+import threading
+import asyncio
+import sqlite3
+import time
+import uuid
+import ast
+import math
+import re
+
+# 与KnowledgeBaseManager.create_tables_中压测链路用到的表字段一致，MySQL专有语法换成SQLite写法
+SQLITE_TABLES = """
+    CREATE TABLE IF NOT EXISTS User (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id VARCHAR(255) UNIQUE,
+        user_name VARCHAR(255),
+        creation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS KnowledgeBase (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kb_id VARCHAR(255) UNIQUE,
+        user_id VARCHAR(255),
+        kb_name VARCHAR(255),
+        deleted BOOL DEFAULT 0,
+        latest_qa_time TIMESTAMP,
+        latest_insert_time TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS File (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        file_id VARCHAR(255) UNIQUE,
+        user_id VARCHAR(255) DEFAULT 'unknown',
+        kb_id VARCHAR(255),
+        file_name VARCHAR(255),
+        status VARCHAR(255),
+        msg VARCHAR(255) DEFAULT 'success',
+        transfer_status VARCHAR(255),
+        deleted BOOL DEFAULT 0,
+        file_size INT DEFAULT -1,
+        content_length INT DEFAULT -1,
+        chunks_number INT DEFAULT -1,
+        file_location VARCHAR(255) DEFAULT 'unknown',
+        file_url VARCHAR(2048) DEFAULT '',
+        upload_infos TEXT,
+        chunk_size INT DEFAULT -1,
+        timestamp VARCHAR(255) DEFAULT '197001010000',
+        file_hash VARCHAR(64) DEFAULT '',
+        linked_file_id VARCHAR(255) DEFAULT ''
+    );
+    CREATE INDEX IF NOT EXISTS index_kb_id_deleted ON File (kb_id, deleted);
+    CREATE INDEX IF NOT EXISTS index_kb_id_deleted_timestamp ON File (kb_id, deleted, timestamp);
+    CREATE INDEX IF NOT EXISTS index_kb_id_file_hash ON File (kb_id, file_hash);
+    CREATE INDEX IF NOT EXISTS index_linked_file_id ON File (linked_file_id);
+    CREATE TABLE IF NOT EXISTS Faqs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        faq_id VARCHAR(255) UNIQUE,
+        user_id VARCHAR(255) NOT NULL,
+        kb_id VARCHAR(255) NOT NULL,
+        question VARCHAR(512) NOT NULL,
+        answer VARCHAR(2048) NOT NULL,
+        nos_keys VARCHAR(768)
+    );
+    CREATE TABLE IF NOT EXISTS Documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        doc_id VARCHAR(255) UNIQUE,
+        json_data LONGTEXT
+    );
+    CREATE TABLE IF NOT EXISTS QaLogs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        qa_id VARCHAR(255) UNIQUE,
+        user_id VARCHAR(255) NOT NULL,
+        bot_id VARCHAR(255),
+        kb_ids VARCHAR(2048) NOT NULL,
+        query VARCHAR(512) NOT NULL,
+        model VARCHAR(64) NOT NULL,
+        product_source VARCHAR(64) NOT NULL,
+        time_record VARCHAR(512) NOT NULL,
+        history MEDIUMTEXT NOT NULL,
+        condense_question VARCHAR(1024) NOT NULL,
+        prompt MEDIUMTEXT NOT NULL,
+        result TEXT NOT NULL,
+        retrieval_documents MEDIUMTEXT NOT NULL,
+        source_documents MEDIUMTEXT NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS index_bot_id ON QaLogs (bot_id);
+    CREATE INDEX IF NOT EXISTS index_timestamp ON QaLogs (timestamp);
+"""
+
+
+class SQLiteKnowledgeBase(KnowledgeBaseManager):
+    """
+    MySQL替身：继承KnowledgeBaseManager，业务方法(add_files、get_files、add_qalogs等)的SQL原样执行，
+    只把连接池换成一个由锁保护的SQLite连接，执行前把%s占位符和INSERT IGNORE改写为SQLite语法
+    """
+
+    def __init__(self, db_path=':memory:'):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        # 没有FileStatusCount触发器，文件状态统计直接扫描File表
+        self.file_status_count_ready = False
+        self.create_tables_()
+
+    def execute_query_(self, query, params, commit=False, fetch=False, check=False, user_dict=False, many=False):
+        query = query.replace('%s', '?').replace('INSERT IGNORE', 'INSERT OR IGNORE')
+        result = None
+        with self.lock:
+            cursor = self.conn.cursor()
+            if user_dict:
+                cursor.row_factory = sqlite3.Row
+            try:
+                if many:
+                    cursor.executemany(query, params)
+                else:
+                    cursor.execute(query, params or ())
+                if commit:
+                    self.conn.commit()
+                if fetch:
+                    result = cursor.fetchall()
+                    if user_dict:
+                        result = [dict(row) for row in result]
+                elif check:
+                    result = cursor.rowcount
+            except sqlite3.Error as err:
+                debug_logger.error("执行数据库操作失败：{}，SQL：{}".format(err, query))
+                if commit:
+                    self.conn.rollback()
+            finally:
+                cursor.close()
+        return result
+
+    def create_tables_(self):
+        with self.lock:
+            self.conn.executescript(SQLITE_TABLES)
+
+    def sync_linked_files(self, file_ids):
+        # SQLite不支持UPDATE ... JOIN，改为按行子查询，语义与线上一致
+        if not file_ids:
+            return
+        placeholders = ','.join(['%s'] * len(file_ids))
+        query = """
+            UPDATE File SET (status, content_length, chunks_number, msg) = (
+                SELECT origin.status, origin.content_length, origin.chunks_number, origin.msg
+                FROM File AS origin WHERE origin.file_id = File.linked_file_id)
+            WHERE file_id IN ({}) AND linked_file_id != ''
+        """.format(placeholders)
+        self.execute_query_(query, list(file_ids), commit=True)
+
+
+class InMemoryVectorIndex:
+    """Milvus的存储：向量按块追加到float32矩阵，检索为内积(向量已归一化)精确top_k，按kb_id过滤"""
+
+    def __init__(self, dim=None, block_size=4096):
+        self.dim = dim
+        self.block_size = block_size
+        self.vectors = None
+        self.size = 0
+        self.docs: List[Dict] = []
+        # kb_id编码成整数与向量并列存放，检索时用np.isin做分区过滤；已删除的片段编码为-1
+        self.kb_codes = None
+        self.kb_code_map: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def add(self, vectors, docs: List[Dict]):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.lock:
+            if self.vectors is None:
+                self.dim = vectors.shape[1]
+                self.vectors = np.empty((self.block_size, self.dim), dtype=np.float32)
+                self.kb_codes = np.empty(self.block_size, dtype=np.int32)
+            if self.size + len(vectors) > len(self.vectors):
+                capacity = max(len(self.vectors) * 2, self.size + len(vectors))
+                grown = np.empty((capacity, self.dim), dtype=np.float32)
+                grown[:self.size] = self.vectors[:self.size]
+                self.vectors = grown
+                grown_codes = np.empty(capacity, dtype=np.int32)
+                grown_codes[:self.size] = self.kb_codes[:self.size]
+                self.kb_codes = grown_codes
+            end = self.size + len(vectors)
+            self.vectors[self.size:end] = vectors
+            self.kb_codes[self.size:end] = [self.kb_code_map.setdefault(doc['kb_id'], len(self.kb_code_map))
+                                            for doc in docs]
+            self.size = end
+            self.docs.extend(docs)
+
+    def remove(self, predicate):
+        with self.lock:
+            for i, doc in enumerate(self.docs):
+                if predicate(doc):
+                    self.kb_codes[i] = -1
+
+    def search(self, query_vector, kb_ids: List[str], top_k: int) -> List[Tuple[Dict, float]]:
+        with self.lock:
+            size = self.size
+            if size == 0:
+                return []
+            vectors = self.vectors[:size]
+            codes = [self.kb_code_map[kb_id] for kb_id in kb_ids if kb_id in self.kb_code_map]
+            mask = np.isin(self.kb_codes[:size], codes)
+        scores = vectors @ np.asarray(query_vector, dtype=np.float32)
+        scores[~mask] = -np.inf
+        k = min(top_k, int(mask.sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.docs[i], float(scores[i])) for i in top]
+
+
+class InMemoryMilvus(VectorStore):
+    """
+    SelfMilvus替身：入库与SelfMilvus.aadd_texts一样用aembed_documents_native生成向量并记录耗时，
+    检索与langchain的Milvus一样在线程中embed_query后搜索，按expr中的kb_id过滤。
+    线上集合使用默认的L2度量，向量已归一化，返回的距离为2-2*内积
+    """
+
+    def __init__(self, embedding_function, block_size=4096):
+        self.embedding_func = embedding_function
+        self.index = InMemoryVectorIndex(block_size=block_size)
+        self._pks = itertools.count(1)
+
+    @property
+    def embeddings(self):
+        return self.embedding_func
+
+    def _insert(self, texts, embeddings, metadatas):
+        docs = [{'kb_id': metadata['kb_id'], 'text': text, 'metadata': metadata}
+                for text, metadata in zip(texts, metadatas)]
+        self.index.add(embeddings, docs)
+        return [next(self._pks) for _ in texts]
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        texts = list(texts)
+        return self._insert(texts, self.embedding_func.embed_documents(texts), metadatas or [{} for _ in texts])
+
+    async def aadd_texts(self, texts, metadatas=None, **kwargs):
+        time_record = kwargs.get('time_record', {})
+        texts = list(texts)
+        embedding_start = time.perf_counter()
+        embeddings = await self.embedding_func.aembed_documents_native(texts)
+        time_record['milvus_embedding_time'] = round(time.perf_counter() - embedding_start, 2)
+        if len(embeddings) == 0:
+            insert_logger.info("Nothing to insert, skipping.")
+            return []
+        insert_start = time.perf_counter()
+        pks = await asyncio.to_thread(self._insert, texts, embeddings, metadatas or [{} for _ in texts])
+        time_record['milvus_insert_time'] = round(time.perf_counter() - insert_start, 2)
+        return pks
+
+    def similarity_search_with_score(self, query, k=4, expr=None, **kwargs):
+        # ParentRetriever传入的expr形如 kb_id in ['KB1', 'KB2']
+        kb_ids = ast.literal_eval(expr.split(' in ', 1)[1]) if expr else list(self.index.kb_code_map)
+        hits = self.index.search(self.embedding_func.embed_query(query), kb_ids, k)
+        return [(Document(page_content=hit['text'], metadata=dict(hit['metadata'])), 2 - 2 * score)
+                for hit, score in hits]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        vectorstore = cls(embedding)
+        vectorstore.add_texts(texts, metadatas)
+        return vectorstore
+
+
+class InMemoryMilvusClient:
+    """VectorStoreMilvusClient替身，ParentRetriever和入库服务只用到local_vectorstore和delete_expr"""
+
+    def __init__(self, embeddings):
+        self.local_vectorstore = InMemoryMilvus(embeddings)
+
+    def delete_expr(self, expr):
+        # 入库超时时按 file_id == "xxx" 删除已写入的片段
+        file_id = expr.split('==', 1)[1].strip().strip('"')
+        self.local_vectorstore.index.remove(lambda doc: doc['metadata'].get('file_id') == file_id)
+
+
+_TOKEN_PATTERN = re.compile(r'[一-鿿]|[A-Za-z0-9_]+')
+
+
+def _tokenize(text):
+    return [token.lower() for token in _TOKEN_PATTERN.findall(text)]
+
+
+class InMemoryBM25Index:
+    """ES的存储：中文按单字、英文按单词切分的BM25；已删除的文档kb_id置为None，不再被检索到"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: List[Dict] = []
+        self.doc_lens: List[int] = []
+        self.total_len = 0
+        self.postings = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def add(self, docs: List[Dict]):
+        with self.lock:
+            for doc in docs:
+                doc_idx = len(self.docs)
+                counts = Counter(_tokenize(doc['content']))
+                for token, tf in counts.items():
+                    self.postings[token].append((doc_idx, tf))
+                self.docs.append(doc)
+                self.doc_lens.append(sum(counts.values()))
+                self.total_len += self.doc_lens[-1]
+
+    def remove(self, predicate):
+        with self.lock:
+            for doc in self.docs:
+                if predicate(doc):
+                    doc['kb_id'] = None
+
+    def search(self, query, kb_ids: List[str], top_k: int) -> List[Tuple[Dict, float]]:
+        with self.lock:
+            n = len(self.docs)
+            if n == 0:
+                return []
+            avg_len = self.total_len / n
+            scores = defaultdict(float)
+            for token in set(_tokenize(query)):
+                postings = self.postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_idx, tf in postings:
+                    if self.docs[doc_idx]['kb_id'] not in kb_ids:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lens[doc_idx] / avg_len)
+                    scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+            top = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+            return [(self.docs[doc_idx], score) for doc_idx, score in top]
+
+
+class InMemoryESStore:
+    """ElasticsearchStore(BM25RetrievalStrategy)替身，实现ParentRetriever用到的aadd_documents和asimilarity_search"""
+
+    def __init__(self):
+        self.index = InMemoryBM25Index()
+
+    async def aadd_documents(self, documents: List[Document], ids=None, **kwargs):
+        ids = ids or [uuid.uuid4().hex for _ in documents]
+        docs = [{'id': _id, 'kb_id': doc.metadata['kb_id'], 'content': doc.page_content, 'metadata': doc.metadata}
+                for _id, doc in zip(ids, documents)]
+        await asyncio.to_thread(self.index.add, docs)
+        return ids
+
+    async def asimilarity_search(self, query, k=4, filter=None, **kwargs):
+        # 与ParentRetriever构造的filter对应：[{"terms": {"metadata.kb_id.keyword": kb_ids}}]
+        kb_ids = filter[0]['terms']['metadata.kb_id.keyword']
+        hits = await asyncio.to_thread(self.index.search, query, kb_ids, k)
+        return [Document(page_content=hit['content'], metadata=dict(hit['metadata'])) for hit, _ in hits]
+
+    def delete(self, ids, **kwargs):
+        ids = set(ids)
+        self.index.remove(lambda doc: doc['id'] in ids)
+        return True
+
+
+class InMemoryESClient:
+    """StoreElasticSearchClient替身"""
+
+    def __init__(self):
+        self.es_store = InMemoryESStore()
+
+    def delete(self, docs_ids):
+        self.es_store.delete(docs_ids)
+
+    def delete_files(self, file_ids, file_chunks):
+        docs_ids = []
+        for file_id, file_chunk in zip(file_ids, file_chunks):
+            docs_ids.extend([file_id + '_' + str(i) for i in range(file_chunk)])
+        if docs_ids:
+            self.delete(docs_ids)
@@ -57,9 +57,15 @@ fi
 cd /workspace/QAnything || exit
 ### 找到启动的服务
 echo "embedding和rerank服务将在CPU上运行"
-nohup python3 -u qanything_kernel/dependent_server/rerank_server/rerank_server.py > /workspace/QAnything/logs/debug_logs/rerank_server.log 2>&1 &
+# QUANTIZED_MODEL=1 时加载INT8量化模型(需先执行 scripts/quantize_onnx.py 生成，并用 scripts/quantize_eval.py 验证精度)
+MODEL_ARGS=""
+if [ "$QUANTIZED_MODEL" = "1" ]; then
+  MODEL_ARGS="--quantized"
+  echo "embedding和rerank服务使用INT8量化模型"
+fi
+nohup python3 -u qanything_kernel/dependent_server/rerank_server/rerank_server.py $MODEL_ARGS > /workspace/QAnything/logs/debug_logs/rerank_server.log 2>&1 &
 PID1=$!
-nohup python3 -u qanything_kernel/dependent_server/embedding_server/embedding_server.py > /workspace/QAnything/logs/debug_logs/embedding_server.log 2>&1 &
+nohup python3 -u qanything_kernel/dependent_server/embedding_server/embedding_server.py $MODEL_ARGS > /workspace/QAnything/logs/debug_logs/embedding_server.log 2>&1 &
 PID2=$!
 nohup python3 -u qanything_kernel/dependent_server/pdf_parser_server/pdf_parser_server.py > /workspace/QAnything/logs/debug_logs/pdf_parser_server.log 2>&1 &
 PID3=$!
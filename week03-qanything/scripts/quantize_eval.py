@@ -0,0 +1,202 @@
+"""
+INT8量化模型精度回归：在固定语料上对比FP32与INT8模型的embedding和rerank结果。
+
+输出指标：
+    embedding：同一文本两种模型向量的余弦相似度(均值/最小值)，以及按向量相似度对候选排序的一致性
+    rerank：分数绝对误差，top1一致率，Kendall tau，以及0.28阈值(LocalDocQA的过滤线)判定一致率
+未达到 --min_cosine / --min_top1 时以非0状态码退出，可直接放进发布前检查。
+
+用法示例：
+    python scripts/quantize_eval.py
+    python scripts/quantize_eval.py --corpus my_corpus.jsonl --output quantize_report.json
+语料为jsonl，每行 {"query": "...", "passages": ["...", "..."]}，不传则使用内置语料。
+"""
+import sys
+import os
+
+# 将项目根目录添加到sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qanything_kernel.dependent_server.embedding_server.embedding_onnx_backend import EmbeddingOnnxBackend
+from qanything_kernel.dependent_server.rerank_server.rerank_onnx_backend import RerankOnnxBackend
+import numpy as np
+import argparse
+import json
+import time
+
+RERANK_THRESHOLD = 0.28
+
+DEFAULT_CORPUS = [
+    {"query": "如何新建一个知识库？",
+     "passages": ["调用new_knowledge_base接口，传入user_id和kb_name即可新建知识库，返回kb_id。",
+                  "上传文件接口支持pdf、docx、txt、md等多种格式，单个文件不超过30MB。",
+                  "删除知识库后，该知识库下的所有文件和向量数据都会被清除。",
+                  "知识库名称可以通过rename_knowledge_base接口修改。",
+                  "问答接口支持流式和非流式两种返回方式。"]},
+    {"query": "上传文件支持哪些格式",
+     "passages": ["目前支持的文件格式包括：md、txt、pdf、jpg、png、jpeg、docx、xlsx、pptx、eml、csv。",
+                  "网页链接可以通过upload_weblink接口上传，系统会自动抓取页面内容。",
+                  "文件解析失败时状态会变为red，可以在msg字段查看失败原因。",
+                  "FAQ可以通过upload_faqs接口批量上传，每条包含问题和答案。",
+                  "embedding服务默认运行在9001端口。"]},
+    {"query": "rerank模型的作用是什么",
+     "passages": ["rerank模型对检索召回的候选片段和问题逐对打分，按相关性重新排序。",
+                  "embedding模型把文本编码成向量，用于向量检索。",
+                  "rerank分数低于0.28的片段会被过滤，不会进入大模型的上下文。",
+                  "OCR服务负责从图片中识别文字。",
+                  "Milvus是一个开源的向量数据库。"]},
+    {"query": "北京今天的天气怎么样",
+     "passages": ["北京今天晴转多云，最高气温25度，最低气温13度，北风二级。",
+                  "上海明天有小雨，气温18到22度。",
+                  "天气预报数据每小时更新一次。",
+                  "北京是中国的首都，有着三千多年的建城史。",
+                  "空气质量指数AQI低于50为优。"]},
+    {"query": "What is the maximum file size for upload?",
+     "passages": ["Each uploaded file must be smaller than 30MB, and a knowledge base can hold at most 10000 files.",
+                  "The chat API returns source documents together with the answer.",
+                  "Files larger than the limit are rejected with an error message.",
+                  "Uploads are processed asynchronously by the insert worker.",
+                  "The default chunk size is 800 tokens for parent chunks."]},
+    {"query": "流式问答如何返回参考文档",
+     "passages": ["流式返回时，第一条事件会携带source_documents，后续事件只包含增量回答。",
+                  "非流式问答在response字段中一次性返回完整答案。",
+                  "history参数用于多轮对话，格式为问答对的列表。",
+                  "设置streaming为true即可开启流式输出。",
+                  "每个文档片段都会附带file_id和file_name。"]},
+]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--corpus', type=str, default=None, help='jsonl语料路径，不传则使用内置语料')
+parser.add_argument('--skip_embed', action='store_true', help='不评估embedding模型')
+parser.add_argument('--skip_rerank', action='store_true', help='不评估rerank模型')
+parser.add_argument('--min_cosine', type=float, default=0.99, help='embedding余弦相似度均值下限')
+parser.add_argument('--min_top1', type=float, default=0.9, help='排序top1一致率下限')
+parser.add_argument('--output', type=str, default=None, help='评估结果保存为json')
+args = parser.parse_args()
+
+
+def load_corpus(path):
+    if path is None:
+        return DEFAULT_CORPUS
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def kendall_tau(a, b):
+    concordant = discordant = 0
+    for i in range(len(a)):
+        for j in range(i + 1, len(a)):
+            sign = (a[i] - a[j]) * (b[i] - b[j])
+            if sign > 0:
+                concordant += 1
+            elif sign < 0:
+                discordant += 1
+    return (concordant - discordant) / max(concordant + discordant, 1)
+
+
+def ranking_agreement(fp32_scores, int8_scores, top_k=3):
+    top1, overlap, taus = [], [], []
+    for a, b in zip(fp32_scores, int8_scores):
+        a, b = np.asarray(a), np.asarray(b)
+        order_a, order_b = np.argsort(-a), np.argsort(-b)
+        top1.append(order_a[0] == order_b[0])
+        k = min(top_k, len(a))
+        overlap.append(len(set(order_a[:k]) & set(order_b[:k])) / k)
+        taus.append(kendall_tau(a, b))
+    return {
+        "top1_agreement": round(float(np.mean(top1)), 4),
+        f"top{top_k}_overlap": round(float(np.mean(overlap)), 4),
+        "kendall_tau_mean": round(float(np.mean(taus)), 4),
+        "kendall_tau_min": round(float(np.min(taus)), 4),
+    }
+
+
+def eval_embedding(corpus):
+    fp32 = EmbeddingOnnxBackend(use_cpu=True)
+    int8 = EmbeddingOnnxBackend(use_cpu=True, quantized=True)
+    texts = [item['query'] for item in corpus] + [p for item in corpus for p in item['passages']]
+
+    start = time.perf_counter()
+    emb_fp32 = fp32.predict(texts, return_numpy=True)
+    fp32_time = time.perf_counter() - start
+    start = time.perf_counter()
+    emb_int8 = int8.predict(texts, return_numpy=True)
+    int8_time = time.perf_counter() - start
+
+    # 两种模型的输出都已归一化，逐行点积即余弦相似度
+    cosine = np.sum(emb_fp32 * emb_int8, axis=1)
+    num_queries = len(corpus)
+    fp32_scores, int8_scores = [], []
+    offset = num_queries
+    for qid, item in enumerate(corpus):
+        end = offset + len(item['passages'])
+        fp32_scores.append(emb_fp32[offset:end] @ emb_fp32[qid])
+        int8_scores.append(emb_int8[offset:end] @ emb_int8[qid])
+        offset = end
+    report = {
+        "texts": len(texts),
+        "cosine_mean": round(float(cosine.mean()), 6),
+        "cosine_min": round(float(cosine.min()), 6),
+        "cosine_drift": round(float(1 - cosine.mean()), 6),
+        "fp32_seconds": round(fp32_time, 3),
+        "int8_seconds": round(int8_time, 3),
+        "speedup": round(fp32_time / int8_time, 2) if int8_time > 0 else None,
+    }
+    report.update(ranking_agreement(fp32_scores, int8_scores))
+    return report
+
+
+def eval_rerank(corpus):
+    fp32 = RerankOnnxBackend(use_cpu=True)
+    int8 = RerankOnnxBackend(use_cpu=True, quantized=True)
+
+    fp32_scores, int8_scores = [], []
+    fp32_time = int8_time = 0.0
+    for item in corpus:
+        start = time.perf_counter()
+        fp32_scores.append(fp32.get_rerank(item['query'], item['passages']))
+        fp32_time += time.perf_counter() - start
+        start = time.perf_counter()
+        int8_scores.append(int8.get_rerank(item['query'], item['passages']))
+        int8_time += time.perf_counter() - start
+
+    a = np.concatenate([np.asarray(s) for s in fp32_scores])
+    b = np.concatenate([np.asarray(s) for s in int8_scores])
+    report = {
+        "pairs": int(a.size),
+        "score_abs_diff_mean": round(float(np.abs(a - b).mean()), 6),
+        "score_abs_diff_max": round(float(np.abs(a - b).max()), 6),
+        "threshold_agreement": round(float(np.mean((a >= RERANK_THRESHOLD) == (b >= RERANK_THRESHOLD))), 4),
+        "fp32_seconds": round(fp32_time, 3),
+        "int8_seconds": round(int8_time, 3),
+        "speedup": round(fp32_time / int8_time, 2) if int8_time > 0 else None,
+    }
+    report.update(ranking_agreement(fp32_scores, int8_scores))
+    return report
+
+
+if __name__ == '__main__':
+    corpus = load_corpus(args.corpus)
+    print(f'corpus: {len(corpus)} queries, {sum(len(item["passages"]) for item in corpus)} passages')
+    results = {}
+    failures = []
+    if not args.skip_embed:
+        results['embedding'] = eval_embedding(corpus)
+        if results['embedding']['cosine_mean'] < args.min_cosine:
+            failures.append(f"embedding cosine_mean {results['embedding']['cosine_mean']} < {args.min_cosine}")
+        if results['embedding']['top1_agreement'] < args.min_top1:
+            failures.append(f"embedding top1_agreement {results['embedding']['top1_agreement']} < {args.min_top1}")
+    if not args.skip_rerank:
+        results['rerank'] = eval_rerank(corpus)
+        if results['rerank']['top1_agreement'] < args.min_top1:
+            failures.append(f"rerank top1_agreement {results['rerank']['top1_agreement']} < {args.min_top1}")
+    results['passed'] = not failures
+    results['failures'] = failures
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if failures:
+        print('INT8模型精度未达标，不建议开启 --quantized：' + '; '.join(failures))
+        sys.exit(1)
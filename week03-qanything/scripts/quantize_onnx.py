@@ -0,0 +1,64 @@
+"""
+embedding/rerank ONNX模型离线INT8动态量化：在原模型旁边生成 embed.int8.onnx / rerank.int8.onnx。
+
+动态量化只量化权重(MatMul/Gemm等)，激活在推理时按batch计算scale，不需要校准数据。
+生成后请先用 scripts/quantize_eval.py 对比FP32模型的精度，再给服务加 --quantized 启用。
+
+用法示例：
+    python scripts/quantize_onnx.py --model all
+    python scripts/quantize_onnx.py --model embed --per_channel
+    python scripts/quantize_onnx.py --model rerank --reduce_range   # 不支持VNNI的老CPU建议打开
+"""
+import sys
+import os
+
+# 将项目根目录添加到sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qanything_kernel.configs.model_config import LOCAL_EMBED_MODEL_PATH, LOCAL_EMBED_QUANT_MODEL_PATH, \
+    LOCAL_RERANK_MODEL_PATH, LOCAL_RERANK_QUANT_MODEL_PATH
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from onnxruntime.quantization.shape_inference import quant_pre_process
+import argparse
+import time
+
+MODELS = {
+    'embed': (LOCAL_EMBED_MODEL_PATH, LOCAL_EMBED_QUANT_MODEL_PATH),
+    'rerank': (LOCAL_RERANK_MODEL_PATH, LOCAL_RERANK_QUANT_MODEL_PATH),
+}
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', type=str, default='all', choices=['embed', 'rerank', 'all'], help='要量化的模型')
+parser.add_argument('--per_channel', action='store_true', help='按通道量化权重，精度更好、模型略大')
+parser.add_argument('--reduce_range', action='store_true', help='权重使用7bit范围，避免老CPU上的溢出')
+parser.add_argument('--skip_preprocess', action='store_true', help='跳过shape推断和图优化预处理')
+parser.add_argument('--overwrite', action='store_true', help='已存在的量化模型重新生成')
+args = parser.parse_args()
+
+
+def quantize(model_input, model_output):
+    if os.path.exists(model_output) and not args.overwrite:
+        print(f'{model_output} already exists, skip (use --overwrite to regenerate)')
+        return
+    start = time.time()
+    source = model_input
+    if not args.skip_preprocess:
+        # 预处理(符号shape推断+图优化)后量化，能覆盖更多的MatMul节点
+        source = model_output + '.preprocessed.onnx'
+        quant_pre_process(model_input, source, skip_symbolic_shape=False)
+    try:
+        quantize_dynamic(source, model_output, weight_type=QuantType.QInt8,
+                         per_channel=args.per_channel, reduce_range=args.reduce_range)
+    finally:
+        if source != model_input and os.path.exists(source):
+            os.remove(source)
+    fp32_size = os.path.getsize(model_input) / 1024 / 1024
+    int8_size = os.path.getsize(model_output) / 1024 / 1024
+    print(f'{model_input} -> {model_output}: {fp32_size:.1f}MB -> {int8_size:.1f}MB, '
+          f'cost {time.time() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    names = list(MODELS) if args.model == 'all' else [args.model]
+    for name in names:
+        quantize(*MODELS[name])
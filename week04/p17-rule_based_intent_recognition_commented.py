@@ -11,6 +11,7 @@
 4. 使用 LangChain 风格的链式调用设计模式
 
 核心组件:
+- MultiPatternMatcher: 多模式匹配自动机 (一次扫描找出全部命中的关键词/字面量)
 - RegexIntentParser: 正则表达式意图解析器
 - KeywordIntentParser: 关键词权重意图解析器  
 - SlotExtractor: 槽位信息提取器
@@ -22,9 +23,18 @@
 """
 
 import re
-from typing import Dict, List, Any, Optional
+import sys
+import time
+import random
+from collections import deque
+from typing import Dict, List, Any, Optional, Iterable
 from dataclasses import dataclass
 
+try:
+    from re import _parser as sre_parse   # Python 3.11+
+except ImportError:                       # 兼容旧版本
+    import sre_parse
+
 @dataclass
 class IntentResult:
     """
@@ -47,6 +57,129 @@ class IntentResult:
         if self.matched_rules is None:
             self.matched_rules = []
 
+class MultiPatternMatcher:
+    """
+    多模式匹配自动机 (Aho-Corasick)
+    ==============================
+    
+    功能说明:
+    - 把任意数量的字符串模式预编译成一个自动机
+    - 对输入文本只扫描一遍，就能找出所有出现过的模式
+    - 扫描耗时只与文本长度和命中数有关，与模式数量无关
+    
+    与逐个 `word in text` 的对比:
+    - 逐个判断: 耗时 = 模式数 × 文本长度，规则越多越慢
+    - 自动机:   耗时 ≈ 文本长度，规则从10条涨到1000条几乎不变
+    
+    使用方式:
+        matcher = MultiPatternMatcher(['退款', '退货', '发票'])
+        matcher.find_all('我要退货并开发票')  # -> {'退货', '发票'}
+    """
+    
+    def __init__(self, patterns: Iterable[str]):
+        """
+        构建自动机
+        
+        构建步骤:
+        1. goto: 把所有模式插入字典树 (trie)
+        2. fail: 广度优先计算失败指针，匹配失败时跳到最长的可用后缀
+        3. output: 沿失败指针合并输出，保证重叠/嵌套的模式都能被报告
+        """
+        self.goto: List[Dict[str, int]] = [{}]   # 每个节点的字符转移表
+        self.fail: List[int] = [0]               # 失败指针
+        self.output: List[List[str]] = [[]]      # 到达该节点时命中的模式
+        
+        # 步骤1: 构建字典树 (空串无法放进自动机，也没有必要)
+        for pattern in dict.fromkeys(p for p in patterns if p):
+            node = 0
+            for ch in pattern:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.output[node].append(pattern)
+        
+        # 步骤2/3: 广度优先计算失败指针并合并输出
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+    
+    def find_all(self, text: str) -> set:
+        """
+        一次扫描找出文本中出现过的全部模式
+        
+        Args:
+            text: 待匹配文本
+            
+        Returns:
+            set: 出现过的模式集合 (与 `pattern in text` 的判断结果完全一致)
+        """
+        found = set()
+        node = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+def _required_literals(pattern: str, flags: int = 0) -> List[str]:
+    """
+    提取正则表达式匹配成功时"必然出现"的字面量片段
+    
+    Args:
+        pattern: 正则表达式
+        flags: 编译标志
+        
+    Returns:
+        List[str]: 必现字面量列表，空列表表示无法预筛选 (每次都要执行该正则)
+        
+    提取规则 (保守策略，宁可漏提也不能多提):
+    - 顶层连续的普通字符组成一个片段，例如 '查.*订单' -> ['查', '订单']
+    - 分组和最少重复1次的子模式递归提取
+    - 分支 (a|b)、字符集、可选/可重复0次的部分一律跳过
+    - 忽略大小写时跳过有大小写之分的字符，保证预筛选结果与 re.search 一致
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return []
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    ignore_case = bool(state.flags & re.IGNORECASE)
+    literals = []
+    
+    def walk(items):
+        run = []
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                ch = chr(av)
+                if not ignore_case or ch.lower() == ch.upper():
+                    run.append(ch)
+                    continue
+            if run:
+                literals.append(''.join(run))
+                run = []
+            if op is sre_parse.SUBPATTERN:
+                walk(av[-1])
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+                walk(av[2])
+        if run:
+            literals.append(''.join(run))
+    
+    walk(parsed)
+    return list(dict.fromkeys(literals))
+
 class RegexIntentParser:
     """
     正则表达式意图解析器
@@ -94,6 +227,50 @@ class RegexIntentParser:
                 r'发票.*开'              # 匹配: "发票怎么开"
             ]
         }
+        self.compile()
+    
+    def compile(self):
+        """
+        预编译全部正则规则 (修改 self.patterns 后需重新调用)
+        
+        编译产物:
+        - rules: 按优先级排列的 (意图, 序号, 已编译正则)，顺序与 patterns 的遍历顺序一致
+        - literal_rules: 必现字面量 -> 依赖它的规则下标列表
+        - required_counts: 每条规则的必现字面量个数
+        - always_rules: 提取不到必现字面量、每次都要执行的规则
+        - matcher: 所有必现字面量组成的多模式自动机
+        
+        预筛选原理:
+        正则 '查.*订单.*(\\d+)' 要匹配成功，文本里必须同时出现 '查' 和 '订单'。
+        先用自动机一次扫描找出文本中出现的字面量，只有字面量全部出现的规则
+        才真正执行 re.search，其余规则直接跳过。
+        """
+        self.rules = []
+        self.literal_rules: Dict[str, List[int]] = {}
+        self.required_counts: List[int] = []
+        self.always_rules: List[int] = []
+        
+        for intent, patterns in self.patterns.items():
+            for i, pattern in enumerate(patterns):
+                index = len(self.rules)
+                self.rules.append((intent, i, re.compile(pattern, re.IGNORECASE)))
+                literals = _required_literals(pattern, re.IGNORECASE)
+                self.required_counts.append(len(literals))
+                if not literals:
+                    self.always_rules.append(index)
+                for literal in literals:
+                    self.literal_rules.setdefault(literal, []).append(index)
+        
+        self.matcher = MultiPatternMatcher(self.literal_rules)
+    
+    def _candidate_rules(self, text: str) -> List[int]:
+        """一次扫描得到可能匹配的规则下标 (按优先级排序)"""
+        hits: Dict[int, int] = {}
+        for literal in self.matcher.find_all(text):
+            for index in self.literal_rules[literal]:
+                hits[index] = hits.get(index, 0) + 1
+        candidates = [index for index, count in hits.items() if count == self.required_counts[index]]
+        return sorted(candidates + self.always_rules)
     
     def parse(self, text: str) -> IntentResult:
         """
@@ -106,28 +283,32 @@ class RegexIntentParser:
             IntentResult: 包含意图、置信度、匹配规则等信息的结果对象
             
         处理流程:
-        1. 遍历所有意图类型
-        2. 对每个意图的所有模式进行匹配
+        1. 自动机一次扫描，筛出必现字面量全部出现的候选规则
+        2. 按原有优先级(意图顺序、模式顺序)依次执行候选规则的正则
         3. 找到第一个匹配的模式就立即返回(优先级机制)
         4. 如果没有匹配，返回默认的未知意图结果
+        
+        结果与逐条遍历全部规则完全一致，但耗时只与候选规则数有关
         """
-        # 遍历所有意图类型和对应的正则模式
-        for intent, patterns in self.patterns.items():
-            # 遍历当前意图的所有正则模式
-            for i, pattern in enumerate(patterns):
-                # 执行正则匹配，忽略大小写
-                match = re.search(pattern, text, re.IGNORECASE)
-                if match:
-                    # 匹配成功，构造并返回结果
-                    return IntentResult(
-                        intent=intent,                                    # 意图类型
-                        confidence=0.9,                                   # 正则匹配的高置信度
-                        matched_rules=[f"regex_{intent}_{i}"],           # 匹配规则标识
-                        extracted_entities=match.groups() if match.groups() else None  # 提取的实体
-                    )
+        for index in self._candidate_rules(text):
+            intent, i, regex = self.rules[index]
+            # 执行正则匹配 (编译时已指定忽略大小写)
+            match = regex.search(text)
+            if match:
+                # 匹配成功，构造并返回结果
+                return IntentResult(
+                    intent=intent,                                    # 意图类型
+                    confidence=0.9,                                   # 正则匹配的高置信度
+                    matched_rules=[f"regex_{intent}_{i}"],           # 匹配规则标识
+                    extracted_entities=match.groups() if match.groups() else None  # 提取的实体
+                )
         
         # 没有任何模式匹配，返回默认结果
         return IntentResult()
+    
+    def parse_batch(self, texts: List[str]) -> List[IntentResult]:
+        """批量解析，返回与输入顺序一致的结果列表"""
+        return [self.parse(text) for text in texts]
 
 class KeywordIntentParser:
     """
@@ -185,6 +366,28 @@ class KeywordIntentParser:
                 'weights': {'primary': 0.8, 'secondary': 0.4}
             }
         }
+        self.compile()
+    
+    def compile(self):
+        """
+        把所有意图的关键词编译进同一个自动机 (修改 self.keywords 后需重新调用)
+        
+        编译产物:
+        - matcher: 全部关键词的多模式自动机
+        - word_intents: 关键词 -> 包含它的意图列表 (同一个词可能属于多个意图)
+        - intent_order: 意图 -> 配置中的顺序，用于保持同分时的选择结果不变
+        - empty_intents: 配置了空字符串关键词的意图 (空串包含于任何文本)
+        """
+        self.word_intents: Dict[str, List[str]] = {}
+        self.intent_order = {intent: order for order, intent in enumerate(self.keywords)}
+        self.empty_intents: List[str] = []
+        for intent, config in self.keywords.items():
+            for word in config['primary'] + config['secondary']:
+                if not word:
+                    self.empty_intents.append(intent)
+                elif intent not in self.word_intents.setdefault(word, []):
+                    self.word_intents[word].append(intent)
+        self.matcher = MultiPatternMatcher(self.word_intents)
     
     def parse(self, text: str) -> IntentResult:
         """
@@ -197,28 +400,35 @@ class KeywordIntentParser:
             IntentResult: 包含意图、置信度、匹配词汇等信息的结果对象
             
         算法流程:
-        1. 遍历所有意图类型
-        2. 对每个意图计算关键词匹配得分
+        1. 自动机一次扫描，找出文本中出现的全部关键词及其所属意图
+        2. 只对命中的意图计算关键词匹配得分
         3. 累积主关键词和次关键词的权重得分
         4. 选择得分最高的意图作为最终结果
         5. 如果没有任何匹配，返回未知意图
         """
+        found = self.matcher.find_all(text)  # 文本中出现的关键词
+        found.add('')                        # 空串总是"出现"，与 `'' in text` 一致
+        hit_intents = set(self.empty_intents)
+        for word in found:
+            hit_intents.update(self.word_intents.get(word, ()))
+        
         scores = {}  # 存储每个意图的得分信息
         
-        # 遍历所有意图类型及其关键词配置
-        for intent, config in self.keywords.items():
+        # 按配置顺序遍历命中的意图，保证同分时选中的意图与逐个遍历时一致
+        for intent in sorted(hit_intents, key=self.intent_order.get):
+            config = self.keywords[intent]
             score = 0                # 当前意图的累积得分
             matched_words = []       # 匹配到的关键词列表
             
-            # 计算主关键词得分
+            # 计算主关键词得分 (按配置顺序累加，得分与逐个判断时完全相同)
             for word in config['primary']:
-                if word in text:     # 简单的字符串包含匹配
+                if word in found:
                     score += config['weights']['primary']  # 累加主关键词权重
                     matched_words.append(word)             # 记录匹配的词汇
             
             # 计算次关键词得分
             for word in config['secondary']:
-                if word in text:     # 简单的字符串包含匹配
+                if word in found:
                     score += config['weights']['secondary'] # 累加次关键词权重
                     matched_words.append(word)              # 记录匹配的词汇
             
@@ -242,6 +452,10 @@ class KeywordIntentParser:
         
         # 没有任何关键词匹配，返回默认的未知意图结果
         return IntentResult()
+    
+    def parse_batch(self, texts: List[str]) -> List[IntentResult]:
+        """批量解析，返回与输入顺序一致的结果列表"""
+        return [self.parse(text) for text in texts]
 
 class SlotExtractor:
     """
@@ -296,6 +510,14 @@ class SlotExtractor:
                 'amount': r'(\d+\.?\d*)元'                  # 提取金额数字(支持小数)
             }
         }
+        self.compile()
+    
+    def compile(self):
+        """预编译全部槽位正则 (修改 self.slot_patterns 后需重新调用)"""
+        self.compiled_patterns = {
+            intent: {slot_name: re.compile(pattern) for slot_name, pattern in patterns.items()}
+            for intent, patterns in self.slot_patterns.items()
+        }
     
     def extract_slots(self, text: str, intent: str) -> Dict[str, str]:
         """
@@ -323,13 +545,13 @@ class SlotExtractor:
         slots = {}  # 初始化槽位结果字典
         
         # 检查当前意图是否有对应的槽位配置
-        if intent in self.slot_patterns:
-            patterns = self.slot_patterns[intent]  # 获取该意图的槽位模式
+        if intent in self.compiled_patterns:
+            patterns = self.compiled_patterns[intent]  # 获取该意图预编译的槽位模式
             
             # 遍历所有槽位，尝试提取信息
             for slot_name, pattern in patterns.items():
                 # 执行正则匹配
-                match = re.search(pattern, text)
+                match = pattern.search(text)
                 if match:
                     # 匹配成功，提取捕获组的内容
                     slots[slot_name] = match.group(1)
@@ -431,6 +653,35 @@ class RuleBasedIntentChain:
             "reasoning": reasoning                            # 推理过程说明
         }
     
+    def batch(self, inputs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量执行意图识别 (LangChain Runnable 风格的 batch 接口)
+        
+        Args:
+            inputs: 输入字典列表，每个字典包含 'text' 键
+            
+        Returns:
+            List[Dict[str, Any]]: 与输入顺序一一对应的识别结果
+            
+        说明:
+        - 每条文本的结果与单独调用 invoke 完全一致
+        - 同一批次中重复的文本只识别一次 (高并发场景下重复问法很常见)，
+          重复项返回结果的独立副本，调用方修改其中一个不会影响其他
+        """
+        unique: Dict[str, Dict[str, Any]] = {}
+        outputs = []
+        for input_dict in inputs:
+            text = input_dict.get("text", "")
+            if text not in unique:
+                unique[text] = self.invoke({"text": text})
+                outputs.append(unique[text])
+            else:
+                cached = unique[text]
+                outputs.append({**cached,
+                                "slots": dict(cached["slots"]),
+                                "matched_rules": list(cached["matched_rules"])})
+        return outputs
+    
     def _merge_results(self, results: List[IntentResult]) -> IntentResult:
         """
         融合多个解析器的识别结果
@@ -603,6 +854,109 @@ class FSMProcessor:
         
         return None
 
+def _naive_regex_parse(patterns: Dict[str, List[str]], text: str) -> IntentResult:
+    """逐条遍历正则规则的原始实现，作为基准测试的对照组和结果一致性的参照"""
+    for intent, rules in patterns.items():
+        for i, pattern in enumerate(rules):
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                return IntentResult(intent=intent, confidence=0.9,
+                                    matched_rules=[f"regex_{intent}_{i}"],
+                                    extracted_entities=match.groups() if match.groups() else None)
+    return IntentResult()
+
+def _naive_keyword_parse(keywords: Dict[str, Dict], text: str) -> IntentResult:
+    """逐个判断 `word in text` 的原始实现，作为基准测试的对照组"""
+    scores = {}
+    for intent, config in keywords.items():
+        score = 0
+        matched_words = []
+        for level in ('primary', 'secondary'):
+            for word in config[level]:
+                if word in text:
+                    score += config['weights'][level]
+                    matched_words.append(word)
+        if score > 0:
+            scores[intent] = {'score': min(score, 1.0), 'matched_words': matched_words}
+    if scores:
+        best_intent = max(scores.keys(), key=lambda x: scores[x]['score'])
+        return IntentResult(intent=best_intent, confidence=scores[best_intent]['score'],
+                            matched_rules=[f"keyword_{best_intent}"],
+                            extracted_entities=tuple(scores[best_intent]['matched_words']))
+    return IntentResult()
+
+def benchmark(rule_counts=(10, 100, 1000), num_texts: int = 300, seed: int = 42):
+    """
+    规则规模基准测试
+    ================
+    
+    测试方法:
+    - 在内置的3个意图之外，随机生成 N 个合成意图 (每个意图3条正则、5个关键词)
+    - 合成语料一部分包含合成规则的字面量 (会命中)，一部分是随机汉字 (不命中)
+    - 分别统计逐条遍历 (原始实现) 与自动机预筛选 (当前实现) 的单句耗时
+    - 同时逐句比对两种实现的识别结果，必须完全一致
+    
+    预期结果:
+    - 原始实现的单句耗时随规则数线性增长；正则超过 re 模块内部缓存上限(512条)后，
+      每次 re.search 都要重新编译，耗时会陡增
+    - 当前实现的单句耗时基本持平
+    """
+    rng = random.Random(seed)
+    pool = [chr(code) for code in range(0x4e00, 0x4e00 + 3000)]  # 常用汉字区间
+    word = lambda k: ''.join(rng.choice(pool) for _ in range(k))
+    
+    # 生成最大规模的合成规则，小规模取其前缀，保证各组语料与规则可比
+    synthetic_patterns, synthetic_keywords = {}, {}
+    for j in range(max(rule_counts)):
+        a, b, c = word(2), word(2), word(3)
+        synthetic_patterns[f'synthetic_{j}'] = [f'{a}.*{b}', f'{c}.*?(\\d{{4,}})', f'{b}.*{word(1)}']
+        synthetic_keywords[f'synthetic_{j}'] = {
+            'primary': [word(2), word(2), a + word(1)],
+            'secondary': [word(2), c],
+            'weights': {'primary': 0.8, 'secondary': 0.4}
+        }
+    
+    # 构造语料: 内置测试句 + 命中合成规则的句子 + 随机句子
+    builtin_texts = ["我要查订单号123456的物流状态", "退款退款，我不要这个商品了", "帮我开个发票吧",
+                     "昨天下的订单888888想要退货", "查一下我的快递到了吗", "不知道说什么"]
+    intents = list(synthetic_patterns)
+    texts = []
+    for k in range(num_texts):
+        if k % 3 == 0:
+            texts.append(rng.choice(builtin_texts))
+        elif k % 3 == 1:
+            intent = rng.choice(intents[:min(rule_counts)])
+            parts = synthetic_keywords[intent]['primary'][:1] + synthetic_keywords[intent]['secondary'][1:]
+            texts.append(word(5) + ''.join(parts) + word(3) + str(rng.randint(1000, 99999)))
+        else:
+            texts.append(word(rng.randint(8, 30)))
+    
+    print("规则规模基准测试 (单句平均耗时, 微秒)")
+    print(f"{'意图数':>8} {'正则规则':>8} {'关键词':>8} {'原始实现':>10} {'自动机':>10} {'加速比':>8}  结果一致")
+    print("-" * 72)
+    for count in rule_counts:
+        chain = RuleBasedIntentChain()
+        chain.regex_parser.patterns.update({k: synthetic_patterns[k] for k in intents[:count]})
+        chain.keyword_parser.keywords.update({k: synthetic_keywords[k] for k in intents[:count]})
+        chain.regex_parser.compile()
+        chain.keyword_parser.compile()
+        patterns, keywords = chain.regex_parser.patterns, chain.keyword_parser.keywords
+        
+        start = time.perf_counter()
+        naive = [(_naive_regex_parse(patterns, t), _naive_keyword_parse(keywords, t)) for t in texts]
+        naive_us = (time.perf_counter() - start) / len(texts) * 1e6
+        
+        start = time.perf_counter()
+        compiled = list(zip(chain.regex_parser.parse_batch(texts), chain.keyword_parser.parse_batch(texts)))
+        compiled_us = (time.perf_counter() - start) / len(texts) * 1e6
+        
+        same = naive == compiled
+        num_rules = sum(len(v) for v in patterns.values())
+        num_words = sum(len(v['primary']) + len(v['secondary']) for v in keywords.values())
+        print(f"{len(patterns):>8} {num_rules:>8} {num_words:>8} {naive_us:>10.1f} {compiled_us:>10.1f} "
+              f"{naive_us / compiled_us:>7.1f}x  {'是' if same else '否'}")
+        assert same, "自动机实现与原始实现的识别结果不一致"
+
 def main():
     """
     主函数 - 系统演示和测试
@@ -676,7 +1030,7 @@ def main():
     ]
     
     # 批量执行意图识别
-    batch_results = [intent_chain.invoke({"text": text}) for text in batch_texts]
+    batch_results = intent_chain.batch([{"text": text} for text in batch_texts])
     
     # 输出批量处理结果的摘要
     for text, result in zip(batch_texts, batch_results):
@@ -692,4 +1046,8 @@ def main():
     print("6. 模块化设计: LangChain 风格的组件架构")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # python p17-rule_based_intent_recognition_commented.py --benchmark 运行规则规模基准测试
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        main()
\ No newline at end of file
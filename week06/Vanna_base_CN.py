@@ -75,15 +75,21 @@ flowchart
 # 【第五步：导入模块分析】
 # ============================================================================
 # 标准库导入：处理JSON、文件操作、正则表达式、SQLite、异常追踪等
+import functools
 import json
 import os
 import re
+import queue
 import sqlite3
+import threading
 import traceback
+import uuid
 # ABC相关：定义抽象基类和抽象方法
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
 # 类型提示：用于代码可读性和IDE支持
-from typing import List, Tuple, Union
+from typing import Any, Callable, Iterator, List, Optional, Tuple, Union
 # URL解析：处理数据库连接字符串
 from urllib.parse import urlparse
 
@@ -101,6 +107,200 @@ from ..types import TrainingPlan, TrainingPlanItem
 from ..utils import validate_config_path
 
 
+# ============================================================================
+# 【连接池与分块读取】connect_to_* 共用的连接层
+# ============================================================================
+DEFAULT_CONNECTION_POOL_SIZE = 5   # 每个数据库连接池的最大连接数
+DEFAULT_SQL_CHUNK_SIZE = 10000     # run_sql_chunked 每批返回的行数
+
+
+class ConnectionPool:
+    """
+    【线程安全的数据库连接池】
+    
+    - 连接按需创建，归还后复用，同时借出的连接数不超过 max_size
+    - 借出时可用 is_alive 检查连接是否可用，不可用的连接直接丢弃重建
+    - 使用过程中抛出异常时先回滚，回滚失败（连接已断开）则丢弃该连接
+    
+    Args:
+        connect: 创建新连接的函数
+        max_size: 最大连接数，超出时等待其他调用归还
+        timeout: 等待空闲连接的最长秒数
+        is_alive: 借出前检查连接可用性的函数，返回False或抛异常表示不可用
+    """
+
+    def __init__(self, connect: Callable[[], Any], max_size: int = DEFAULT_CONNECTION_POOL_SIZE,
+                 timeout: float = 30.0, is_alive: Optional[Callable[[Any], bool]] = None):
+        self._connect = connect
+        self._is_alive = is_alive
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._closed = False
+        self.max_size = max_size
+        self.timeout = timeout
+        self.stats = {"created": 0, "reused": 0, "discarded": 0}
+
+    def _checkout(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+                self.stats["created"] += 1
+                return conn
+            try:
+                alive = self._is_alive is None or self._is_alive(conn)
+            except Exception:
+                alive = False
+            if alive:
+                self.stats["reused"] += 1
+                return conn
+            self._discard(conn)
+
+    def _discard(self, conn):
+        self.stats["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """借出一个连接，with 块结束后自动归还"""
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"等待数据库连接超时({self.timeout}s)，连接池上限 {self.max_size}")
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except Exception:
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    self._discard(conn)
+                    conn = None
+            raise
+        finally:
+            if conn is not None:
+                if self._closed:
+                    self._discard(conn)
+                else:
+                    self._idle.put(conn)
+            self._slots.release()
+
+    def close(self):
+        """关闭全部空闲连接；借出中的连接在归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+def fetch_dataframe(cursor) -> pd.DataFrame:
+    """读取游标的全部结果为DataFrame"""
+    results = cursor.fetchall()
+    return pd.DataFrame(results, columns=[desc[0] for desc in cursor.description])
+
+
+def iter_dataframes(cursor, chunk_size: int, max_rows: Optional[int] = None):
+    """
+    按 chunk_size 行分批读取已执行的游标，每批产出一个DataFrame，最多读取 max_rows 行
+    
+    - 结果为空时产出一个只有列名的空DataFrame
+    - 生成器的返回值表示结果是否因 max_rows 被截断
+    """
+    columns = None
+    remaining = max_rows
+    while remaining is None or remaining > 0:
+        rows = cursor.fetchmany(chunk_size if remaining is None else min(chunk_size, remaining))
+        if columns is None:
+            # 服务端游标（如psycopg2命名游标）首次读取后才有description
+            if cursor.description is None:
+                return False
+            columns = [desc[0] for desc in cursor.description]
+            if not rows:
+                yield pd.DataFrame([], columns=columns)
+                return False
+        if not rows:
+            return False
+        if remaining is not None:
+            remaining -= len(rows)
+        yield pd.DataFrame(rows, columns=columns)
+    return bool(cursor.fetchmany(1))
+
+
+# ============================================================================
+# 【问题-SQL缓存】generate_sql 的检索结果和最终SQL缓存
+# ============================================================================
+DEFAULT_SQL_CACHE_SIZE = 256  # 缓存的问题数上限，设为0关闭缓存
+
+# 这些方法会改变训练数据，子类实现调用后训练数据版本号加一、缓存失效
+_TRAINING_DATA_MUTATORS = ("add_question_sql", "add_ddl", "add_documentation", "remove_training_data")
+
+
+def normalize_question(question: str) -> str:
+    """问题归一化：合并空白、忽略结尾标点，作为缓存键；保留大小写，问题中的字面量大小写不同时SQL也不同"""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?？。.!！ ")
+
+
+class LRUCache:
+    """线程安全的LRU缓存，max_size为0时不缓存"""
+
+    def __init__(self, max_size: int = DEFAULT_SQL_CACHE_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _invalidates_sql_cache(method):
+    """包装训练数据的增删方法：调用成功后使 generate_sql 缓存失效"""
+    if getattr(method, "_invalidates_sql_cache", False):
+        return method
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        # remove_training_data 返回False表示没有删除任何数据
+        if result is not False:
+            self.invalidate_sql_cache()
+        return result
+
+    wrapper._invalidates_sql_cache = True
+    return wrapper
+
+
 # ============================================================================
 # 【第六步：核心类定义 - VannaBase】
 # ============================================================================
@@ -140,6 +340,30 @@ class VannaBase(ABC):
         self.dialect = self.config.get("dialect", "SQL")  # SQL方言
         self.language = self.config.get("language", None)  # 响应语言
         self.max_tokens = self.config.get("max_tokens", 14000)  # 最大token数
+        self.max_rows = self.config.get("max_rows", None)  # run_sql_chunked 默认的行数上限
+        self.connection_pool = None  # connect_to_* 创建的连接池，多次调用共享
+        # generate_sql 缓存：键为 (归一化问题, 训练数据版本)，训练数据变化时版本加一并清空
+        self.training_data_version = 0
+        cache_size = self.config.get("sql_cache_size", DEFAULT_SQL_CACHE_SIZE)
+        self.context_cache = LRUCache(cache_size)  # 检索到的相似问题SQL/DDL/文档
+        self.sql_cache = LRUCache(cache_size)      # LLM生成的最终SQL
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        【缓存失效】子类（向量库实现）覆盖的 add_* / remove_training_data 自动包装，
+        无论通过 train、ask 的自动训练还是直接调用，训练数据变化后缓存都会失效
+        """
+        super().__init_subclass__(**kwargs)
+        for name in _TRAINING_DATA_MUTATORS:
+            method = cls.__dict__.get(name)
+            if callable(method) and not getattr(method, "__isabstractmethod__", False):
+                setattr(cls, name, _invalidates_sql_cache(method))
+
+    def invalidate_sql_cache(self):
+        """训练数据版本加一并清空问题-SQL缓存；训练数据在其他进程中被修改时也可手动调用"""
+        self.training_data_version += 1
+        self.context_cache.clear()
+        self.sql_cache.clear()
 
     def log(self, message: str, title: str = "Info"):
         """
@@ -219,10 +443,31 @@ class VannaBase(ABC):
         else:
             initial_prompt = None
             
+        # 缓存：同一问题（归一化后）在训练数据未变化时直接返回上次的SQL；
+        # 传入额外参数时检索结果可能不同，不使用缓存。
+        # SQL缓存键包含 allow_llm_to_see_data，检索结果与它无关
+        cache_key = None
+        sql_cache_key = None
+        context = None
+        if not kwargs:
+            cache_key = (normalize_question(question), self.training_data_version)
+            sql_cache_key = cache_key + (bool(allow_llm_to_see_data),)
+            cached_sql = self.sql_cache.get(sql_cache_key)
+            if cached_sql is not None:
+                self.log(title="SQL Cache Hit", message=cached_sql)
+                return cached_sql
+            context = self.context_cache.get(cache_key)
+
         # 【步骤2-4】RAG检索阶段：获取相关信息
-        question_sql_list = self.get_similar_question_sql(question, **kwargs)  # 相似问题
-        ddl_list = self.get_related_ddl(question, **kwargs)  # 相关表结构
-        doc_list = self.get_related_documentation(question, **kwargs)  # 相关文档
+        if context is None:
+            context = (
+                self.get_similar_question_sql(question, **kwargs),  # 相似问题
+                self.get_related_ddl(question, **kwargs),  # 相关表结构
+                self.get_related_documentation(question, **kwargs),  # 相关文档
+            )
+            if cache_key is not None:
+                self.context_cache.put(cache_key, context)
+        question_sql_list, ddl_list, doc_list = context
         
         # 【步骤5】构建提示词
         prompt = self.get_sql_prompt(
@@ -240,12 +485,14 @@ class VannaBase(ABC):
         self.log(title="LLM Response", message=llm_response)
 
         # 【步骤7】处理中间SQL查询（用于复杂查询的分步处理）
+        used_intermediate = False
         if 'intermediate_sql' in llm_response:
             if not allow_llm_to_see_data:
                 return "The LLM is not allowed to see the data in your database. Your question requires database introspection to generate the necessary SQL. Please set allow_llm_to_see_data=True to enable this."
 
             if allow_llm_to_see_data:
                 intermediate_sql = self.extract_sql(llm_response)
+                used_intermediate = True
 
                 try:
                     self.log(title="Running Intermediate SQL", message=intermediate_sql)
@@ -268,7 +515,11 @@ class VannaBase(ABC):
 
 
         # 【步骤8】提取最终SQL
-        return self.extract_sql(llm_response)
+        sql = self.extract_sql(llm_response)
+        # 依赖中间查询结果的SQL会随数据变化，且不能返回给不允许查看数据的调用，不缓存
+        if sql_cache_key is not None and not used_intermediate and 'intermediate_sql' not in llm_response:
+            self.sql_cache.put(sql_cache_key, sql)
+        return sql
 
     def extract_sql(self, llm_response: str) -> str:
         """
@@ -1511,18 +1762,21 @@ class VannaBase(ABC):
                 f.write(response.content)
             url = path
 
-        # Connect to the database
-        conn = sqlite3.connect(
-            url,
-            check_same_thread=check_same_thread,
-            **kwargs
+        # Connect to the database（连接池按需创建连接，并发的run_sql各用一个连接）
+        pool = self._set_connection_pool(
+            lambda: sqlite3.connect(url, check_same_thread=check_same_thread, **kwargs)
         )
 
         def run_sql_sqlite(sql: str):
-            return pd.read_sql_query(sql, conn)
+            with pool.connection() as conn:
+                return pd.read_sql_query(sql, conn)
+
+        def run_sql_chunked_sqlite(sql: str, chunk_size: int = DEFAULT_SQL_CHUNK_SIZE, max_rows: int = None):
+            return self._stream_query(pool, sql, chunk_size, max_rows)
 
         self.dialect = "SQLite"
         self.run_sql = run_sql_sqlite
+        self.run_sql_chunked = run_sql_chunked_sqlite
         self.run_sql_is_set = True
 
     def connect_to_postgres(
@@ -1634,62 +1888,60 @@ class VannaBase(ABC):
         if not port:
             raise ImproperlyConfigured("Please set your postgres port")
 
-        conn = None
-
-        try:
-            conn = psycopg2.connect(
-                host=host,
-                dbname=dbname,
-                user=user,
-                password=password,
-                port=port,
-                **kwargs
-            )
-        except psycopg2.Error as e:
-            raise ValidationError(e)
-
         def connect_to_db():
             return psycopg2.connect(host=host, dbname=dbname,
                         user=user, password=password, port=port, **kwargs)
 
+        # 连接池：连接在多次run_sql之间复用，已断开的连接(closed != 0)借出前丢弃
+        pool = self._set_connection_pool(connect_to_db, is_alive=lambda conn: conn.closed == 0)
 
-        def run_sql_postgres(sql: str) -> Union[pd.DataFrame, None]:
-            conn = None
-            try:
-                conn = connect_to_db()  # Initial connection attempt
+        try:
+            # 建立第一个连接，尽早暴露配置错误
+            with pool.connection():
+                pass
+        except psycopg2.Error as e:
+            raise ValidationError(e)
+
+        def query(sql: str) -> pd.DataFrame:
+            with pool.connection() as conn:
                 cs = conn.cursor()
                 cs.execute(sql)
-                results = cs.fetchall()
-
-                # Create a pandas dataframe from the results
-                df = pd.DataFrame(results, columns=[desc[0] for desc in cs.description])
+                df = fetch_dataframe(cs)
+                # 结束隐式事务再归还连接，避免池中连接长期处于 idle in transaction
+                conn.rollback()
                 return df
 
-            except psycopg2.InterfaceError as e:
-                # Attempt to reconnect and retry the operation
-                if conn:
-                    conn.close()  # Ensure any existing connection is closed
-                conn = connect_to_db()
-                cs = conn.cursor()
-                cs.execute(sql)
-                results = cs.fetchall()
+        def run_sql_postgres(sql: str) -> Union[pd.DataFrame, None]:
+            try:
+                return query(sql)
 
-                # Create a pandas dataframe from the results
-                df = pd.DataFrame(results, columns=[desc[0] for desc in cs.description])
-                return df
+            except psycopg2.InterfaceError as e:
+                # 连接在使用中断开，已被连接池丢弃，用新连接重试一次
+                try:
+                    return query(sql)
+                except psycopg2.Error as e:
+                    raise ValidationError(e)
 
             except psycopg2.Error as e:
-                if conn:
-                    conn.rollback()
-                    raise ValidationError(e)
+                raise ValidationError(e)
 
-            except Exception as e:
-                        conn.rollback()
-                        raise e
+        def run_sql_chunked_postgres(sql: str, chunk_size: int = DEFAULT_SQL_CHUNK_SIZE, max_rows: int = None):
+            # 命名游标是服务端游标，结果按 itersize 分批从服务器拉取
+            def open_cursor(conn):
+                cs = conn.cursor(name=f"vanna_{uuid.uuid4().hex}")
+                cs.itersize = chunk_size
+                return cs
+
+            try:
+                yield from self._stream_query(pool, sql, chunk_size, max_rows, open_cursor=open_cursor,
+                                              finish=lambda conn: conn.rollback())
+            except psycopg2.Error as e:
+                raise ValidationError(e)
 
         self.dialect = "PostgreSQL"
         self.run_sql_is_set = True
         self.run_sql = run_sql_postgres
+        self.run_sql_chunked = run_sql_chunked_postgres
 
 
     def connect_to_mysql(
@@ -1781,10 +2033,8 @@ class VannaBase(ABC):
         if not port:
             raise ImproperlyConfigured("Please set your MySQL port")
 
-        conn = None
-
-        try:
-            conn = pymysql.connect(
+        def connect_to_db():
+            return pymysql.connect(
                 host=host,
                 user=user,
                 password=password,
@@ -1793,33 +2043,38 @@ class VannaBase(ABC):
                 cursorclass=pymysql.cursors.DictCursor,
                 **kwargs
             )
+
+        # 连接池：借出前 ping(reconnect=True)，断开的连接自动重连
+        pool = self._set_connection_pool(connect_to_db, is_alive=lambda conn: conn.ping(reconnect=True) or True)
+
+        try:
+            # 建立第一个连接，尽早暴露配置错误
+            with pool.connection():
+                pass
         except pymysql.Error as e:
             raise ValidationError(e)
 
         def run_sql_mysql(sql: str) -> Union[pd.DataFrame, None]:
-            if conn:
-                try:
-                    conn.ping(reconnect=True)
+            try:
+                with pool.connection() as conn:
                     cs = conn.cursor()
                     cs.execute(sql)
-                    results = cs.fetchall()
+                    return fetch_dataframe(cs)
 
-                    # Create a pandas dataframe from the results
-                    df = pd.DataFrame(
-                        results, columns=[desc[0] for desc in cs.description]
-                    )
-                    return df
-
-                except pymysql.Error as e:
-                    conn.rollback()
-                    raise ValidationError(e)
+            except pymysql.Error as e:
+                raise ValidationError(e)
 
-                except Exception as e:
-                    conn.rollback()
-                    raise e
+        def run_sql_chunked_mysql(sql: str, chunk_size: int = DEFAULT_SQL_CHUNK_SIZE, max_rows: int = None):
+            # SSCursor 不缓冲结果集，边读边从服务器拉取
+            try:
+                yield from self._stream_query(pool, sql, chunk_size, max_rows,
+                                              open_cursor=lambda conn: conn.cursor(pymysql.cursors.SSCursor))
+            except pymysql.Error as e:
+                raise ValidationError(e)
 
         self.run_sql_is_set = True
         self.run_sql = run_sql_mysql
+        self.run_sql_chunked = run_sql_chunked_mysql
 
     def connect_to_clickhouse(
         self,
@@ -2275,11 +2530,19 @@ class VannaBase(ABC):
         if init_sql:
             conn.query(init_sql)
 
+        # DuckDB连接不能跨线程共享，连接池中的每个连接是 conn.cursor() 复制出的同库连接
+        pool = self._set_connection_pool(conn.cursor)
+
         def run_sql_duckdb(sql: str):
-            return conn.query(sql).to_df()
+            with pool.connection() as cursor:
+                return cursor.query(sql).to_df()
+
+        def run_sql_chunked_duckdb(sql: str, chunk_size: int = DEFAULT_SQL_CHUNK_SIZE, max_rows: int = None):
+            return self._stream_query(pool, sql, chunk_size, max_rows)
 
         self.dialect = "DuckDB SQL"
         self.run_sql = run_sql_duckdb
+        self.run_sql_chunked = run_sql_chunked_duckdb
         self.run_sql_is_set = True
 
     def connect_to_mssql(self, odbc_conn_str: str, **kwargs):
@@ -2706,6 +2969,74 @@ class VannaBase(ABC):
             "You need to connect to a database first by running vn.connect_to_snowflake(), vn.connect_to_postgres(), similar function, or manually set vn.run_sql"
         )
 
+    def run_sql_chunked(self, sql: str, chunk_size: int = DEFAULT_SQL_CHUNK_SIZE,
+                        max_rows: Union[int, None] = None) -> Iterator[pd.DataFrame]:
+        """
+        分块执行SQL查询，按批产出DataFrame
+        
+        功能说明:
+        1. 与run_sql相同的查询，但结果按 chunk_size 行分批返回
+        2. 最多返回 max_rows 行，未指定时使用配置中的 max_rows，仍为None表示不限制
+        3. connect_to_sqlite/postgres/mysql/duckdb 会替换为基于游标的流式实现，
+           大结果集不会一次性加载到内存
+        
+        这里是通用的后备实现：先调用run_sql取得完整结果再切分，只限制返回的行数，不节省内存
+        
+        Example:
+        ```python
+        for df in vn.run_sql_chunked("SELECT * FROM my_table", chunk_size=5000, max_rows=100000):
+            process(df)
+        ```
+
+        Args:
+            sql (str): The SQL query to run.
+            chunk_size (int): Rows per DataFrame batch.
+            max_rows (int): Maximum number of rows to return.
+
+        Returns:
+            Iterator[pd.DataFrame]: Batches of the query result.
+        """
+        max_rows = self._row_cap(max_rows)
+        df = self.run_sql(sql)
+        if max_rows is not None and len(df) > max_rows:
+            self.log(f"结果已截断为前 {max_rows} 行", "run_sql_chunked")
+            df = df.iloc[:max_rows]
+        if len(df) == 0:
+            yield df
+            return
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+    def _row_cap(self, max_rows: Union[int, None]) -> Union[int, None]:
+        return self.max_rows if max_rows is None else max_rows
+
+    def _set_connection_pool(self, connect: Callable[[], Any], is_alive: Optional[Callable[[Any], bool]] = None) -> ConnectionPool:
+        """为当前数据库创建连接池，替换并关闭之前connect_to_*创建的连接池"""
+        if self.connection_pool is not None:
+            self.connection_pool.close()
+        self.connection_pool = ConnectionPool(
+            connect,
+            max_size=self.config.get("connection_pool_size", DEFAULT_CONNECTION_POOL_SIZE),
+            is_alive=is_alive,
+        )
+        return self.connection_pool
+
+    def _stream_query(self, pool: ConnectionPool, sql: str, chunk_size: int, max_rows: Union[int, None],
+                      open_cursor: Callable[[Any], Any] = None, finish: Callable[[Any], None] = None):
+        """从连接池借出连接，用游标分批读取查询结果；生成器关闭或读完后游标关闭、连接归还"""
+        max_rows = self._row_cap(max_rows)
+        with pool.connection() as conn:
+            cs = open_cursor(conn) if open_cursor else conn.cursor()
+            try:
+                cs.execute(sql)
+                truncated = yield from iter_dataframes(cs, chunk_size, max_rows)
+                if truncated:
+                    self.log(f"结果已截断为前 {max_rows} 行", "run_sql_chunked")
+            finally:
+                cs.close()
+                if finish:
+                    finish(conn)
+
     def ask(
         self,
         question: Union[str, None] = None,
@@ -1,21 +1,67 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Optional, Dict, List, Tuple, Any
+from functools import lru_cache
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
 import logging
+import atexit
+import os
+import queue
 import re
+import sqlite3
+import threading
 import time
 import hashlib
 import json
+try:
+    from re import _parser as sre_parse   # Python 3.11+
+except ImportError:
+    import sre_parse
 from datetime import datetime, timezone
 from enum import Enum
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    flush_audit_log()
+
+app = FastAPI(lifespan=lifespan)
+
+# 审计日志配置：有界队列 + 后台批量写入 + 按大小轮转
+# 设置环境变量 AUDIT_LOG_FILE 才写入文件（如 logs/sql_gateway_audit.jsonl），未设置时只输出到控制台
+AUDIT_LOG_FILE = os.getenv("AUDIT_LOG_FILE") or None
+AUDIT_QUEUE_SIZE = 10000          # 队列上限，超出后按溢出策略处理
+AUDIT_BATCH_SIZE = 256            # 后台线程每批最多写入的记录数
+AUDIT_LOG_MAX_BYTES = 10 * 1024 * 1024
+AUDIT_LOG_BACKUP_COUNT = 5
+AUDIT_OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+# 通知后台写入线程退出的哨兵
+_STOP = object()
 
 # 配置结构化日志
 class StructuredLogger:
-    """结构化日志记录器"""
+    """
+    结构化日志记录器（非阻塞）
+    - 请求路径只做JSON序列化并放入有界队列，磁盘写入由后台线程按批完成
+    - 日志文件为每行一条JSON，超过 max_bytes 时轮转为 .1 ~ .backup_count
+    - 队列满时的溢出策略：
+        drop_newest 丢弃新记录（默认，请求延迟不受磁盘影响）
+        drop_oldest 丢弃队列中最旧的记录，保留最新的
+        block       在普通线程中最多等待 block_timeout 秒（等待时不持锁），超时后丢弃新记录；
+                    在事件循环线程中不等待，直接丢弃新记录，避免阻塞其他请求
+      丢弃的条数记入 stats()["dropped"]
+    - close() 把队列中的记录全部写完再返回，服务关闭时调用；之后的日志同步写入
+    """
     
-    def __init__(self, logger_name: str):
+    def __init__(self, logger_name: str, log_file: Optional[str] = AUDIT_LOG_FILE,
+                 max_queue_size: int = AUDIT_QUEUE_SIZE, batch_size: int = AUDIT_BATCH_SIZE,
+                 max_bytes: int = AUDIT_LOG_MAX_BYTES, backup_count: int = AUDIT_LOG_BACKUP_COUNT,
+                 overflow_policy: str = "drop_newest", block_timeout: float = 0.05, echo: bool = True):
+        if overflow_policy not in AUDIT_OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow_policy}，可选 {AUDIT_OVERFLOW_POLICIES}")
         self.logger = logging.getLogger(logger_name)
         
         # 配置日志格式
@@ -26,31 +72,189 @@ class StructuredLogger:
         self.logger.handlers.clear()
         self.logger.addHandler(handler)
         self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        
+        self.log_file = log_file
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.echo = echo
+        
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()         # 保护入队与关闭状态
+        self._idle = threading.Condition(self._lock)   # 等待 block 策略下正在等空位的调用方
+        self._waiting = 0
+        self._write_lock = threading.Lock()   # 保护文件句柄，关闭后同步写入时使用
+        self._stream = None
+        self._closed = False
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0,
+                       "rotations": 0, "write_errors": 0}
+        
+        self._writer = threading.Thread(target=self._run, name=f"{logger_name}-audit-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+    
+    def _emit(self, level: int, prefix: str, data: Dict[str, Any]):
+        # 在调用方线程序列化，避免调用方之后修改字典影响日志内容
+        record = (level, prefix, json.dumps(data, ensure_ascii=False, default=str))
+        with self._lock:
+            if not self._closed:
+                self._stats["enqueued"] += 1
+                if self._enqueue(record):
+                    return
+                if not self._can_wait():
+                    self._stats["dropped"] += 1
+                    return
+                self._waiting += 1
+                waiting = True
+            else:
+                waiting = False
+        if waiting:
+            # block：释放锁后再等待空位，其他线程的日志调用不受影响；close() 等这些调用结束后才放入哨兵
+            try:
+                self._queue.put(record, timeout=self.block_timeout)
+                dropped = 0
+            except queue.Full:
+                dropped = 1
+            with self._lock:
+                self._stats["dropped"] += dropped
+                self._waiting -= 1
+                self._idle.notify_all()
+            return
+        # 已关闭：后台线程已退出，直接同步写入，保证关闭后的记录也不丢
+        self._write_batch([record])
+    
+    def _can_wait(self) -> bool:
+        """block 策略且不在事件循环线程中时才等待空位"""
+        if self.overflow_policy != "block":
+            return False
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return True
+        return False
+    
+    def _enqueue(self, record) -> bool:
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            if self.overflow_policy != "drop_oldest":
+                return False
+        # drop_oldest：挤掉最旧的记录再放入；腾出的位置可能被其他线程抢先占用，循环直到放入为止
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            else:
+                self._queue.task_done()
+                self._stats["dropped"] += 1   # 只有确实挤掉了记录才计为丢弃
+            try:
+                self._queue.put_nowait(record)
+                return True
+            except queue.Full:
+                continue
+    
+    def _run(self):
+        """后台写入线程：阻塞等待第一条记录，再把队列中已有的记录一次取完写入"""
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not _STOP and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            records = batch[:-1] if stop else batch
+            if records:
+                self._write_batch(records)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+    
+    def _write_batch(self, records: List[Tuple[int, str, str]]):
+        with self._write_lock:
+            try:
+                if self.log_file:
+                    data = "".join(line + "\n" for _, _, line in records).encode("utf-8")
+                    self._rotate_if_needed(len(data))
+                    self._stream.write(data)
+                    self._stream.flush()
+                if self.echo:
+                    for level, prefix, line in records:
+                        self.logger.log(level, f"{prefix}: {line}")
+                self._stats["written"] += len(records)
+                self._stats["batches"] += 1
+            except Exception as e:
+                self._stats["write_errors"] += 1
+                logger.error(f"审计日志写入失败（{len(records)} 条）: {e}")
+    
+    def _rotate_if_needed(self, incoming: int):
+        """按大小轮转：log -> log.1 -> log.2 ...，超出 backup_count 的最旧文件被删除"""
+        if self._stream is None:
+            directory = os.path.dirname(self.log_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._stream = open(self.log_file, "ab")
+        size = self._stream.tell()
+        if self.max_bytes <= 0 or size == 0 or size + incoming <= self.max_bytes:
+            return
+        self._stream.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.log_file}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.log_file}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.log_file, f"{self.log_file}.1")
+        else:
+            os.remove(self.log_file)
+        self._stream = open(self.log_file, "ab")
+        self._stats["rotations"] += 1
+    
+    def flush(self):
+        """等待队列中已有的记录全部写入"""
+        self._queue.join()
+    
+    def close(self):
+        """停止后台线程前写完队列中的全部记录；可重复调用"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # 等正在等待空位的调用入队后再放入哨兵，之后不会再有记录入队；队列满时等待后台线程腾出空位
+            self._idle.wait_for(lambda: self._waiting == 0)
+            self._queue.put(_STOP)
+        self._writer.join()
+        with self._write_lock:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "queued": self._queue.qsize(), "overflow_policy": self.overflow_policy}
     
     def log_audit(self, audit_data: Dict[str, Any]):
         """记录审计日志"""
         # 添加时间戳
         audit_data["timestamp"] = datetime.now(timezone.utc).isoformat()
-        
-        # 格式化为JSON并记录
-        json_log = json.dumps(audit_data, ensure_ascii=False, indent=2)
-        self.logger.info(f"AUDIT_LOG: {json_log}")
+        audit_data.setdefault("log_type", "audit")
+        self._emit(logging.INFO, "AUDIT_LOG", audit_data)
     
     def log_security_alert(self, alert_data: Dict[str, Any]):
         """记录安全告警日志"""
         alert_data["timestamp"] = datetime.now(timezone.utc).isoformat()
         alert_data["log_type"] = "security_alert"
-        
-        json_log = json.dumps(alert_data, ensure_ascii=False, indent=2)
-        self.logger.critical(f"SECURITY_ALERT: {json_log}")
+        self._emit(logging.CRITICAL, "SECURITY_ALERT", alert_data)
     
     def log_error(self, error_data: Dict[str, Any]):
         """记录错误日志"""
         error_data["timestamp"] = datetime.now(timezone.utc).isoformat()
         error_data["log_type"] = "error"
-        
-        json_log = json.dumps(error_data, ensure_ascii=False, indent=2)
-        self.logger.error(f"ERROR_LOG: {json_log}")
+        self._emit(logging.ERROR, "ERROR_LOG", error_data)
 
 # 初始化结构化日志记录器
 structured_logger = StructuredLogger("sql-gateway")
@@ -64,6 +268,152 @@ class RiskLevel(Enum):
     MEDIUM = "medium"
     HIGH = "high"
 
+# 校验结论缓存容量（按规范化后的SQL缓存）
+VALIDATION_CACHE_SIZE = 4096
+# 问题形状 -> 模板 的缓存容量，同时作为 SQLite 预处理语句缓存的容量
+TEMPLATE_CACHE_SIZE = 1024
+
+_HORIZONTAL_SPACES = re.compile(r'[ \t\f\v]+')
+# 忽略大小写匹配时会与ASCII字母等价的非ASCII字符（如 'ſ'、'K'），出现时不能用小写化预筛选
+_ASCII_FOLDABLE = re.compile(r'(?i)[a-z]')
+
+def normalize_sql(sql: str) -> str:
+    """
+    规范化SQL，作为校验结论的缓存键
+    只去掉首尾空白、把连续空格/制表符压缩成一个空格；换行原样保留。
+    所有规则都以 \\s / \\b 衔接关键词，'.' 不跨换行，因此规范化前后的规则命中结果相同。
+    """
+    return _HORIZONTAL_SPACES.sub(' ', sql.strip())
+
+class LiteralMatcher:
+    """
+    多字面量匹配自动机（Aho-Corasick），一次扫描找出文本中出现的全部字面量
+    
+    week04/p17（MultiPatternMatcher）和 week01/code/medical_intent_recognition.py（KeywordAutomaton）
+    中有同样的自动机。各周目录是独立的 uv 项目、脚本单独运行，没有可共享的公共包，因此各自保留一份；
+    修改匹配逻辑时需同步检查另外两份。与 p17 的 _required_literals 不同，这里忽略大小写的规则
+    提取小写化的ASCII字面量，在小写化的文本上匹配（见 CompiledRuleSet）。
+    """
+    
+    def __init__(self, literals: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[str]] = [[]]
+        # 空串无法放进自动机，与另外两份实现一致地跳过
+        for literal in dict.fromkeys(literal for literal in literals if literal):
+            node = 0
+            for ch in literal:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.output[node].append(literal)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+    
+    def find_all(self, text: str) -> set:
+        found = set()
+        node = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+def _required_literals(pattern: str) -> Tuple[bool, List[str]]:
+    """
+    提取正则匹配成功时必然出现的字面量片段
+    返回: (是否忽略大小写, 字面量列表)；忽略大小写时字面量已转小写
+    分支、字符集、可选部分一律跳过，宁可少提取也不能多提取。
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return False, []
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    ignore_case = bool(state.flags & re.IGNORECASE)
+    literals = []
+    
+    def walk(items):
+        run = []
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                ch = chr(av)
+                if not ignore_case or ch.isascii() or ch.lower() == ch.upper():
+                    run.append(ch.lower() if ignore_case else ch)
+                    continue
+            if run:
+                literals.append(''.join(run))
+                run = []
+            if op is sre_parse.SUBPATTERN:
+                walk(av[-1])
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+                walk(av[2])
+        if run:
+            literals.append(''.join(run))
+    
+    walk(parsed)
+    return ignore_case, list(dict.fromkeys(literals))
+
+class CompiledRuleSet:
+    """
+    预编译规则集 - 把一组正则的必现字面量合并成一个自动机
+    
+    - 自动机一次扫描文本，只有必现字面量全部出现的规则才执行正则确认
+    - 正常请求几乎不会触发任何候选规则，耗时与规则数量基本无关
+    - 报告全部触发的规则，顺序与规则列表一致，结果与逐条 re.search 相同
+    """
+    
+    def __init__(self, rules: List[Tuple[Any, str]]):
+        """
+        Args:
+            rules: (命中时返回的结果, 正则) 列表
+        """
+        self.rules = [(payload, re.compile(pattern)) for payload, pattern in rules]
+        self.required_counts: List[int] = []
+        self.always_rules: List[int] = []
+        # (是否忽略大小写, 字面量) -> 依赖它的规则下标
+        self.literal_rules: Dict[Tuple[bool, str], List[int]] = {}
+        for index, (_, pattern) in enumerate(rules):
+            ignore_case, literals = _required_literals(pattern)
+            self.required_counts.append(len(literals))
+            if not literals:
+                self.always_rules.append(index)
+            for literal in literals:
+                self.literal_rules.setdefault((ignore_case, literal), []).append(index)
+        self.exact_matcher = LiteralMatcher([lit for ci, lit in self.literal_rules if not ci])
+        self.folded_matcher = LiteralMatcher([lit for ci, lit in self.literal_rules if ci])
+    
+    def _candidates(self, text: str) -> List[int]:
+        if not text.isascii() and any(ord(ch) > 127 and _ASCII_FOLDABLE.match(ch) for ch in set(text)):
+            return list(range(len(self.rules)))  # 含特殊大小写字符，逐条确认
+        hits: Dict[int, int] = {}
+        found = [(False, lit) for lit in self.exact_matcher.find_all(text)]
+        found += [(True, lit) for lit in self.folded_matcher.find_all(text.lower())]
+        for key in found:
+            for index in self.literal_rules[key]:
+                hits[index] = hits.get(index, 0) + 1
+        candidates = [index for index, count in hits.items() if count == self.required_counts[index]]
+        return sorted(candidates + self.always_rules)
+    
+    def find_all(self, text: str) -> List[Any]:
+        """返回文本触发的全部规则结果，未触发时返回空列表"""
+        return [self.rules[index][0] for index in self._candidates(text)
+                if self.rules[index][1].search(text)]
+
 class InputSanitizer:
     """输入过滤器 - 检测和清理恶意输入"""
     
@@ -88,27 +438,28 @@ class InputSanitizer:
             r'";.*?--',     # 分号加注释
             r'\bor\b.*?\b1\s*=\s*1\b',  # OR 1=1
         ]
+        
+        self.compile()
+    
+    def compile(self):
+        """把危险模式和注入模式合并成一个规则集（修改模式列表后需重新调用）"""
+        self.rule_set = CompiledRuleSet(
+            [(f"危险SQL关键词: {pattern}", pattern) for pattern in self.dangerous_patterns] +
+            [(f"SQL注入模式: {pattern}", pattern) for pattern in self.injection_patterns]
+        )
+        self.strip_chars = re.compile(r'[<>"\']')
     
     def sanitize(self, input_text: str) -> Dict[str, Any]:
         """
         清理输入文本
         返回: {"is_clean": bool, "cleaned_input": str, "detected_threats": List[str]}
         """
-        detected_threats = []
-        
-        # 检测危险模式
-        for pattern in self.dangerous_patterns:
-            if re.search(pattern, input_text):
-                detected_threats.append(f"危险SQL关键词: {pattern}")
-        
-        # 检测注入模式
-        for pattern in self.injection_patterns:
-            if re.search(pattern, input_text):
-                detected_threats.append(f"SQL注入模式: {pattern}")
+        # 检测危险模式和注入模式（一次扫描）
+        detected_threats = self.rule_set.find_all(input_text)
         
         # 基本清理
         cleaned_input = input_text.strip()
-        cleaned_input = re.sub(r'[<>"\']', '', cleaned_input)  # 移除危险字符
+        cleaned_input = self.strip_chars.sub('', cleaned_input)  # 移除危险字符
         
         return {
             "is_clean": len(detected_threats) == 0,
@@ -136,12 +487,30 @@ class SchemaRestrictor:
                 "forbidden_operations": ["DROP", "DELETE", "UPDATE", "INSERT", "ALTER", "CREATE"]
             }
         }
+        
+        self.compile()
+    
+    def compile(self):
+        """预编译表名提取正则和各角色的表白名单，并重置结论缓存（修改权限配置后需重新调用）"""
+        self.table_pattern = re.compile(r'FROM\s+(\w+)|JOIN\s+(\w+)|UPDATE\s+(\w+)|INSERT\s+INTO\s+(\w+)')
+        self.allowed_tables = {
+            role: {t.lower() for t in permissions["allowed_tables"]}
+            for role, permissions in self.role_permissions.items()
+        }
+        # 结论缓存，键为 (规范化SQL, 角色)
+        self._cached_check = lru_cache(maxsize=VALIDATION_CACHE_SIZE)(self._check)
     
     def is_allowed(self, sql: str, user_role: str) -> Tuple[bool, str]:
         """
         检查SQL是否被用户角色允许
         返回: (是否允许, 错误消息)
         """
+        return self._cached_check(normalize_sql(sql), user_role)
+    
+    def cache_info(self):
+        return self._cached_check.cache_info()
+    
+    def _check(self, sql: str, user_role: str) -> Tuple[bool, str]:
         if user_role not in self.role_permissions:
             return False, f"未知用户角色: {user_role}"
         
@@ -156,12 +525,12 @@ class SchemaRestrictor:
         # 检查表访问权限
         if "*" not in permissions["allowed_tables"]:
             # 提取SQL中的表名（简化版本）
-            table_pattern = r'FROM\s+(\w+)|JOIN\s+(\w+)|UPDATE\s+(\w+)|INSERT\s+INTO\s+(\w+)'
-            matches = re.findall(table_pattern, sql_upper)
+            matches = self.table_pattern.findall(sql_upper)
+            allowed_tables = self.allowed_tables[user_role]
             
             for match_group in matches:
                 for table in match_group:
-                    if table and table.lower() not in [t.lower() for t in permissions["allowed_tables"]]:
+                    if table and table.lower() not in allowed_tables:
                         return False, f"角色 {user_role} 不允许访问表 {table}"
         
         return True, "访问权限检查通过"
@@ -187,28 +556,75 @@ class SQLTemplater:
                 "params": ["keyword", "limit"]
             }
         }
+        
+        self.compile()
+    
+    def compile(self):
+        """
+        预编译模板（修改 self.templates 后需重新调用）
+        - 匹配规则预编译，并按问题形状缓存匹配结果
+        - 每个模板转换成参数化骨架：{param} 替换为 ? 占位符，引号内含参数的字面量整体作为一个参数
+        """
+        self.compiled_patterns = [(template_id, re.compile(template["pattern"]))
+                                  for template_id, template in self.templates.items()]
+        self.skeletons = {template_id: self._parameterize(template["sql"])
+                          for template_id, template in self.templates.items()}
+        self._match_shape_cached = lru_cache(maxsize=TEMPLATE_CACHE_SIZE)(self._match_shape)
+    
+    @staticmethod
+    def _parameterize(sql: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """把模板SQL转换为 (规范化骨架, 绑定规则列表)"""
+        bindings = []
+        
+        def replace(match):
+            if match.group(1) is not None:
+                bindings.append(("literal", match.group(1)))   # 如 '%{keyword}%'
+            else:
+                bindings.append(("param", match.group(2)))     # 如 {customer_id}
+            return "?"
+        
+        skeleton = re.sub(r"'([^']*\{\w+\}[^']*)'|\{(\w+)\}", replace, sql)
+        return normalize_sql(skeleton), bindings
+    
+    @staticmethod
+    def question_shape(question: str) -> str:
+        """问题形状：数字串统一替换为 #，"查看客户12的订单"与"查看客户7的订单"形状相同（模板匹配规则不含数字）"""
+        return re.sub(r'\d+', '#', question)
+    
+    def _match_shape(self, shape: str) -> Optional[str]:
+        for template_id, pattern in self.compiled_patterns:
+            if pattern.search(shape):
+                return template_id
+        return None
     
     def match_template(self, question: str) -> Tuple[Optional[str], Dict[str, Any]]:
         """
         匹配问题到模板
         返回: (模板ID, 参数字典)
+        模板匹配规则不依赖具体数字，同一形状的问题直接复用缓存的匹配结果
         """
-        for template_id, template in self.templates.items():
-            if re.search(template["pattern"], question):
-                # 简化参数提取（实际应用中需要更复杂的NLP处理）
-                params = {}
-                if "customer_id" in template["params"]:
-                    params["customer_id"] = "1"  # 默认值
-                if "limit" in template["params"]:
-                    params["limit"] = "10"  # 默认值
-                if "keyword" in template["params"]:
-                    # 提取关键词
-                    words = question.split()
-                    params["keyword"] = words[-1] if words else "product"
-                
-                return template_id, params
+        template_id = self._match_shape_cached(self.question_shape(question))
+        if template_id is None:
+            return None, {}
+        return template_id, self._extract_params(template_id, question)
+    
+    def _extract_params(self, template_id: str, question: str) -> Dict[str, Any]:
+        template = self.templates[template_id]
+        # 简化参数提取（实际应用中需要更复杂的NLP处理）
+        params = {}
+        if "customer_id" in template["params"]:
+            params["customer_id"] = "1"  # 默认值（不能从问题文本中提取，否则可查询其他客户的数据）
+        if "limit" in template["params"]:
+            params["limit"] = "10"  # 默认值
+        if "keyword" in template["params"]:
+            # 提取关键词
+            words = question.split()
+            params["keyword"] = words[-1] if words else "product"
         
-        return None, {}
+        return params
+    
+    def cache_info(self):
+        return self._match_shape_cached.cache_info()
     
     def render_sql(self, template_id: str, params: Dict[str, Any]) -> str:
         """渲染SQL模板"""
@@ -220,6 +636,69 @@ class SQLTemplater:
             return template["sql"].format(**params)
         except KeyError as e:
             raise ValueError(f"模板参数缺失: {e}")
+    
+    def prepare(self, template_id: str, params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """
+        生成参数化查询: (SQL骨架, 绑定参数)
+        骨架只由模板决定，参数值以绑定方式传入、不会拼进SQL文本，
+        因此同一模板的所有请求共用一条预处理语句（安全校验针对返回给调用方的完整SQL文本）。
+        """
+        if template_id not in self.skeletons:
+            raise ValueError(f"未知模板ID: {template_id}")
+        
+        skeleton, bindings = self.skeletons[template_id]
+        values = []
+        try:
+            for kind, value in bindings:
+                if kind == "literal":
+                    values.append(value.format(**params))
+                else:
+                    value = params[value]
+                    values.append(int(value) if isinstance(value, str) and value.isdigit() else value)
+        except KeyError as e:
+            raise ValueError(f"模板参数缺失: {e}")
+        return skeleton, values
+
+class SQLiteStandIn:
+    """
+    本地 SQLite 替身库 - 用参数化语句执行模板SQL
+    sqlite3 按SQL文本缓存已编译的预处理语句（cached_statements），
+    同一骨架的请求只编译一次，之后只绑定参数执行。
+    """
+    
+    def __init__(self, db_path: str = ":memory:", statement_cache_size: int = TEMPLATE_CACHE_SIZE,
+                 seed_rows: int = 100):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False,
+                                    cached_statements=statement_cache_size)
+        self.lock = threading.Lock()
+        self.executions: Dict[str, int] = {}  # 骨架 -> 执行次数
+        if seed_rows:
+            self._seed(seed_rows)
+    
+    def _seed(self, rows: int):
+        """创建与模板对应的示例表并写入演示数据"""
+        with self.lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS customers (customer_id INTEGER PRIMARY KEY, customer_name TEXT, email TEXT, phone TEXT);
+                CREATE TABLE IF NOT EXISTS orders (order_id INTEGER PRIMARY KEY, customer_id INTEGER, order_date TEXT, total_amount REAL);
+                CREATE TABLE IF NOT EXISTS products (product_id INTEGER PRIMARY KEY, product_name TEXT, price REAL, category TEXT);
+            """)
+            self.conn.executemany("INSERT OR REPLACE INTO customers VALUES (?, ?, ?, ?)",
+                                  [(i, f"客户{i}", f"user{i}@example.com", f"1380000{i:04d}") for i in range(1, rows + 1)])
+            self.conn.executemany("INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?)",
+                                  [(i, i % rows + 1, f"2024-01-{i % 28 + 1:02d}", i * 10.0) for i in range(1, rows * 5 + 1)])
+            self.conn.executemany("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)",
+                                  [(i, f"product{i}", i * 1.5, f"category{i % 5}") for i in range(1, rows + 1)])
+            self.conn.commit()
+    
+    def execute(self, sql: str, params: Tuple[Any, ...] = ()) -> List[tuple]:
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+            self.executions[sql] = self.executions.get(sql, 0) + 1
+        return rows
+    
+    def stats(self) -> Dict[str, int]:
+        return {"statements": len(self.executions), "executions": sum(self.executions.values())}
 
 class SQLValidator:
     """SQL验证器 - 最终安全检查"""
@@ -243,6 +722,23 @@ class SQLValidator:
             r'(?i)\bunion\s+select\b',
             r'(?i)\bselect\s+.*\bfrom\s+.*\bwhere\s+.*\bor\b',
         ]
+        
+        self.compile()
+    
+    def compile(self):
+        """把高/中风险模式合并成一个规则集，并重置结论缓存（修改模式列表后需重新调用）"""
+        self.rule_set = CompiledRuleSet(
+            [((f"高风险操作: {pattern}", 10), pattern) for pattern in self.high_risk_patterns] +
+            [((f"中风险操作: {pattern}", 5), pattern) for pattern in self.medium_risk_patterns]
+        )
+        # 规则命中结果缓存，键为规范化SQL；长度、语句数等检查开销很小，每次直接计算
+        self._cached_rule_issues = lru_cache(maxsize=VALIDATION_CACHE_SIZE)(self._rule_issues)
+    
+    def _rule_issues(self, normalized_sql: str) -> Tuple[Tuple[str, int], ...]:
+        return tuple(self.rule_set.find_all(normalized_sql))
+    
+    def cache_info(self):
+        return self._cached_rule_issues.cache_info()
     
     def validate(self, sql: str) -> Dict[str, Any]:
         """
@@ -252,17 +748,10 @@ class SQLValidator:
         issues = []
         risk_score = 0
         
-        # 检查高风险模式
-        for pattern in self.high_risk_patterns:
-            if re.search(pattern, sql):
-                issues.append(f"高风险操作: {pattern}")
-                risk_score += 10
-        
-        # 检查中风险模式
-        for pattern in self.medium_risk_patterns:
-            if re.search(pattern, sql):
-                issues.append(f"中风险操作: {pattern}")
-                risk_score += 5
+        # 检查高/中风险模式（一次扫描，相同SQL命中缓存）
+        for issue, score in self._cached_rule_issues(normalize_sql(sql)):
+            issues.append(issue)
+            risk_score += score
         
         # 检查其他风险因素
         if len(sql) > 1000:
@@ -301,11 +790,20 @@ class SQLRequest(BaseModel):
 
 class SQLResponse(BaseModel):
     safe_sql: Optional[str] = None
+    sql_template: Optional[str] = None       # 模板请求的参数化骨架，执行时与 sql_params 一起绑定
+    sql_params: Optional[List[Any]] = None
     status: str
     message: str
     risk_level: str
     audit_id: str
 
+class ApprovalRequest(BaseModel):
+    audit_id: str
+    user_id: str
+    user_role: str
+    approved: bool
+    reason: Optional[str] = None
+
 @app.post("/generate-sql", response_model=SQLResponse)
 async def generate_sql_endpoint(request: SQLRequest):
     audit_id = f"AUDIT-{int(time.time())}-{request.user_id[:4]}"
@@ -354,10 +852,14 @@ async def generate_sql_endpoint(request: SQLRequest):
         # 2. 优先尝试模板化
         audit_log["processing_steps"].append("template_matching")
         tmpl_id, params = templater.match_template(clean_result["cleaned_input"])
+        sql_template, sql_params = None, None
         if tmpl_id:
             audit_log["processing_steps"].append("template_rendering")
             sql = templater.render_sql(tmpl_id, params)
+            sql_template, sql_params = templater.prepare(tmpl_id, params)
             audit_log["template_used"] = tmpl_id
+            audit_log["sql_template"] = sql_template
+            audit_log["sql_params"] = sql_params
         else:
             # 3. 调用 text2SQL 模型（省略调用细节）
             audit_log["processing_steps"].append("text2sql_generation")
@@ -387,6 +889,7 @@ async def generate_sql_endpoint(request: SQLRequest):
         
         # 5. 最终校验
         audit_log["processing_steps"].append("final_validation")
+        # 校验的是最终返回的SQL文本本身（参数已填入），校验结论按规范化SQL缓存
         validation = validator.validate(sql)
         
         audit_log["validation_result"]["risk_level"] = validation["risk_level"]
@@ -458,6 +961,8 @@ async def generate_sql_endpoint(request: SQLRequest):
             
             return SQLResponse(
                 safe_sql=sql,
+                sql_template=sql_template,
+                sql_params=sql_params,
                 status="approved",
                 message="SQL 已生成",
                 risk_level="low",
@@ -484,6 +989,65 @@ async def generate_sql_endpoint(request: SQLRequest):
         logger.error(f"{audit_id} 网关内部错误: {str(e)}")
         raise HTTPException(500, "服务内部错误")
 
+def template_load_test(num_requests: int = 5000, num_customers: int = 100, seed: int = 42) -> Dict[str, Any]:
+    """
+    模板缓存压测：重复出现的问题形状 + 不同的字面量
+    - 基线：每次逐条匹配模板、渲染带字面量的SQL、重新做Schema检查和校验，并以不缓存语句的连接执行
+    - 缓存：问题形状命中模板缓存，返回给调用方的SQL命中校验缓存，以参数化语句在替身库执行
+    返回两种方式的吞吐量、缓存命中率，以及结果是否一致
+    """
+    import random
+    rng = random.Random(seed)
+    shapes = ["查看客户{n}的订单", "列出我的订单 第{n}页", "查询客户{n}的详细信息", "搜索产品 product{n}"]
+    questions = [rng.choice(shapes).format(n=rng.randint(1, num_customers)) for _ in range(num_requests)]
+    
+    baseline_templater, baseline_restrictor, baseline_validator = SQLTemplater(), SchemaRestrictor(), SQLValidator()
+    load_templater, load_restrictor, load_validator = SQLTemplater(), SchemaRestrictor(), SQLValidator()
+    db = SQLiteStandIn(seed_rows=num_customers)
+    baseline_conn = sqlite3.connect(":memory:", cached_statements=0)
+    baseline_conn.executescript("\n".join(db.conn.iterdump()))
+    
+    # 基线：不使用任何缓存
+    start = time.perf_counter()
+    baseline_rows = []
+    for question in questions:
+        template_id = baseline_templater._match_shape(question)
+        params = baseline_templater._extract_params(template_id, question)
+        sql = baseline_templater.render_sql(template_id, params)
+        baseline_restrictor._check(sql, "analyst")
+        baseline_validator.rule_set.find_all(sql)
+        baseline_rows.append(baseline_conn.execute(sql).fetchall())
+    baseline_seconds = time.perf_counter() - start
+    
+    # 缓存：问题形状 -> 模板，规范化SQL -> 校验结论，骨架 -> 预处理语句
+    start = time.perf_counter()
+    cached_rows = []
+    for question in questions:
+        template_id, params = load_templater.match_template(question)
+        sql = load_templater.render_sql(template_id, params)
+        skeleton, values = load_templater.prepare(template_id, params)
+        load_restrictor.is_allowed(sql, "analyst")
+        load_validator.validate(sql)
+        cached_rows.append(db.execute(skeleton, tuple(values)))
+    cached_seconds = time.perf_counter() - start
+    
+    template_info = load_templater.cache_info()
+    validation_info = load_validator.cache_info()
+    result = {
+        "requests": num_requests,
+        "baseline_qps": num_requests / baseline_seconds,
+        "cached_qps": num_requests / cached_seconds,
+        "template_hit_ratio": template_info.hits / (template_info.hits + template_info.misses),
+        "validation_hit_ratio": validation_info.hits / (validation_info.hits + validation_info.misses),
+        "prepared_statements": db.stats()["statements"],
+        "same_results": baseline_rows == cached_rows,
+    }
+    print(f"模板缓存压测: {num_requests} 个请求, {len(shapes)} 种问题形状")
+    print(f"  基线吞吐: {result['baseline_qps']:.0f} req/s, 缓存吞吐: {result['cached_qps']:.0f} req/s")
+    print(f"  模板缓存命中率: {result['template_hit_ratio']:.1%}, 校验缓存命中率: {result['validation_hit_ratio']:.1%}")
+    print(f"  预处理语句数: {result['prepared_statements']}, 结果一致: {result['same_results']}")
+    return result
+
 def send_alert(message: str):
     """发送安全告警"""
     try:
@@ -542,6 +1106,11 @@ async def security_middleware(request, call_next):
         logger.error(f"请求处理异常: {str(e)}")
         raise
 
+def flush_audit_log():
+    """服务关闭时（lifespan 退出阶段）写完队列中的审计日志"""
+    structured_logger.close()
+    logger.info(f"审计日志已写完: {structured_logger.stats()}")
+
 @app.post("/approve-sql")
 async def approve_sql_endpoint(request: ApprovalRequest):
     start_time = time.time()
@@ -599,6 +1168,12 @@ async def health_check():
             "sql_templater": "ok",
             "sql_validator": "ok"
         },
+        "validation_cache": {
+            "sql_templater": templater.cache_info()._asdict(),
+            "schema_restrictor": restrictor.cache_info()._asdict(),
+            "sql_validator": validator.cache_info()._asdict()
+        },
+        "audit_log": structured_logger.stats(),
         "response_time_ms": int((time.time() - start_time) * 1000)
     }
     
@@ -638,6 +1213,11 @@ async def root():
     }
 
 if __name__ == "__main__":
+    import sys
+    if "--load-test" in sys.argv:
+        # python p23-DBGateway.py --load-test 运行模板缓存压测
+        template_load_test()
+        sys.exit(0)
     import uvicorn
     logger.info("启动 SQL 安全网关服务...")
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
\ No newline at end of file
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Vanna_base_CN.py 的测试：连接池与分块读取（以本地SQLite/DuckDB作为数据库），
+以及 generate_sql 的问题-SQL缓存（桩LLM和桩向量库）
+"""
+
+import importlib
+import importlib.util
+import os
+import sqlite3
+import threading
+from collections import Counter
+
+import pytest
+
+
+def load_vanna_base():
+    """
+    加载 Vanna_base_CN.py。文件使用 from ..exceptions 等相对导入，
+    需要作为已安装 vanna 包的子模块加载（vanna 2.x 旧接口位于 vanna.legacy）
+    """
+    pytest.importorskip("vanna")
+    for package in ("vanna.base", "vanna.legacy.base"):
+        try:
+            importlib.import_module(package)
+            importlib.import_module(package.rsplit(".", 1)[0] + ".exceptions")
+            break
+        except ImportError:
+            continue
+    else:
+        pytest.skip("已安装的 vanna 中没有 base 模块")
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Vanna_base_CN.py")
+    spec = importlib.util.spec_from_file_location(f"{package}.base_cn", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_vanna(module, config=None, llm_response="SELECT 1"):
+    """
+    只实现抽象方法的最小 VannaBase 子类：内存训练数据 + 固定回复的LLM，记录各方法调用次数
+    llm_response 为列表时依次返回各条回复，用完后重复最后一条
+    """
+
+    class StubVanna(module.VannaBase):
+        def __init__(self, config=None):
+            super().__init__(config=config)
+            self.calls = Counter()
+            self.training_data = {}
+
+        def generate_embedding(self, data, **kwargs):
+            return []
+
+        def get_similar_question_sql(self, question, **kwargs):
+            self.calls["get_similar_question_sql"] += 1
+            return [item for item in self.training_data.values() if "sql" in item]
+
+        def get_related_ddl(self, question, **kwargs):
+            self.calls["get_related_ddl"] += 1
+            return [item["ddl"] for item in self.training_data.values() if "ddl" in item]
+
+        def get_related_documentation(self, question, **kwargs):
+            self.calls["get_related_documentation"] += 1
+            return [item["doc"] for item in self.training_data.values() if "doc" in item]
+
+        def add_question_sql(self, question, sql, **kwargs):
+            id = f"{len(self.training_data)}-sql"
+            self.training_data[id] = {"question": question, "sql": sql}
+            return id
+
+        def add_ddl(self, ddl, **kwargs):
+            id = f"{len(self.training_data)}-ddl"
+            self.training_data[id] = {"ddl": ddl}
+            return id
+
+        def add_documentation(self, documentation, **kwargs):
+            id = f"{len(self.training_data)}-doc"
+            self.training_data[id] = {"doc": documentation}
+            return id
+
+        def get_training_data(self, **kwargs):
+            return None
+
+        def remove_training_data(self, id, **kwargs):
+            return self.training_data.pop(id, None) is not None
+
+        def system_message(self, message):
+            return {"role": "system", "content": message}
+
+        def user_message(self, message):
+            return {"role": "user", "content": message}
+
+        def assistant_message(self, message):
+            return {"role": "assistant", "content": message}
+
+        def submit_prompt(self, prompt, **kwargs):
+            self.calls["submit_prompt"] += 1
+            if isinstance(llm_response, list):
+                return llm_response[min(self.calls["submit_prompt"], len(llm_response)) - 1]
+            return llm_response
+
+        def log(self, message, title="Info"):
+            pass
+
+    return StubVanna(config=config)
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    path = str(tmp_path / "orders.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE orders (order_id INTEGER PRIMARY KEY, customer TEXT, amount REAL)")
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?)",
+                     [(i, f"customer_{i % 50}", i * 1.5) for i in range(1, 2501)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_run_sql_chunked_sqlite(sqlite_db):
+    """分块结果拼接后与run_sql一致，行数上限生效，空结果返回带列名的空DataFrame"""
+    module = load_vanna_base()
+    vn = make_vanna(module)
+    vn.connect_to_sqlite(sqlite_db)
+    sql = "SELECT * FROM orders ORDER BY order_id"
+
+    full = vn.run_sql(sql)
+    chunks = list(vn.run_sql_chunked(sql, chunk_size=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert module.pd.concat(chunks, ignore_index=True).equals(full)
+
+    capped = list(vn.run_sql_chunked(sql, chunk_size=1000, max_rows=2200))
+    assert [len(chunk) for chunk in capped] == [1000, 1000, 200]
+    assert capped[-1]["order_id"].iloc[-1] == 2200
+
+    empty = list(vn.run_sql_chunked("SELECT * FROM orders WHERE order_id < 0"))
+    assert len(empty) == 1 and empty[0].empty
+    assert list(empty[0].columns) == ["order_id", "customer", "amount"]
+
+
+def test_row_cap_from_config(sqlite_db):
+    """未传 max_rows 时使用配置中的 max_rows"""
+    module = load_vanna_base()
+    vn = make_vanna(module, config={"max_rows": 300})
+    vn.connect_to_sqlite(sqlite_db)
+    assert sum(len(chunk) for chunk in vn.run_sql_chunked("SELECT * FROM orders", chunk_size=128)) == 300
+
+
+def test_connection_pool_shared_across_threads(sqlite_db):
+    """并发run_sql复用连接池中的连接，连接数不超过池上限；提前结束的流式读取会归还连接"""
+    module = load_vanna_base()
+    vn = make_vanna(module, config={"connection_pool_size": 2})
+    vn.connect_to_sqlite(sqlite_db)
+    errors = []
+
+    def ask_many():
+        try:
+            for _ in range(25):
+                assert len(vn.run_sql("SELECT * FROM orders WHERE amount > 100")) == 2434
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ask_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    pool = vn.connection_pool
+    assert pool.stats["created"] <= 2
+    assert pool.stats["reused"] > 0
+
+    stream = vn.run_sql_chunked("SELECT * FROM orders", chunk_size=10)
+    next(stream)
+    stream.close()
+    with pool.connection(), pool.connection():
+        pass
+    assert pool.stats["created"] <= 2
+
+
+def test_fallback_run_sql_chunked_slices_result():
+    """没有流式实现的连接器回退为切分run_sql的完整结果"""
+    module = load_vanna_base()
+    vn = make_vanna(module)
+    vn.run_sql = lambda sql: module.pd.DataFrame({"n": range(25)})
+    vn.run_sql_is_set = True
+    assert [len(chunk) for chunk in vn.run_sql_chunked("SELECT n", chunk_size=10, max_rows=22)] == [10, 10, 2]
+
+
+def test_run_sql_chunked_duckdb():
+    """DuckDB：连接池中的连接共享同一个内存库"""
+    module = load_vanna_base()
+    pytest.importorskip("duckdb")
+    vn = make_vanna(module)
+    vn.connect_to_duckdb(":memory:", init_sql="CREATE TABLE t AS SELECT range AS n FROM range(5000)")
+    assert len(vn.run_sql("SELECT * FROM t")) == 5000
+    chunks = list(vn.run_sql_chunked("SELECT * FROM t ORDER BY n", chunk_size=2048, max_rows=4500))
+    assert [len(chunk) for chunk in chunks] == [2048, 2048, 404]
+    assert chunks[-1]["n"].iloc[-1] == 4499
+
+
+def test_generate_sql_cache_skips_retrieval_and_llm():
+    """重复问题（只有空白、结尾标点差异）不再检索也不再调用LLM"""
+    module = load_vanna_base()
+    vn = make_vanna(module, llm_response="SELECT COUNT(*) FROM orders")
+    vn.train(ddl="CREATE TABLE orders (id INT)")
+
+    questions = ["How many orders are there?", "How many  orders are there", " How many orders are there？"]
+    assert [vn.generate_sql(question) for question in questions] == ["SELECT COUNT(*) FROM orders"] * 3
+    assert vn.calls["submit_prompt"] == 1
+    assert vn.calls["get_similar_question_sql"] == vn.calls["get_related_ddl"] == 1
+    assert vn.calls["get_related_documentation"] == 1
+    assert vn.sql_cache.hits == 2
+
+
+def test_generate_sql_cache_keeps_literal_case():
+    """只有字面量大小写不同的问题不共用缓存，避免返回带错误字面量的SQL"""
+    module = load_vanna_base()
+    vn = make_vanna(module, llm_response=[
+        "SELECT * FROM orders WHERE customer = 'Bob'",
+        "SELECT * FROM orders WHERE customer = 'bob'",
+    ])
+    assert vn.generate_sql("orders for Bob") == "SELECT * FROM orders WHERE customer = 'Bob'"
+    assert vn.generate_sql("orders for bob") == "SELECT * FROM orders WHERE customer = 'bob'"
+    assert vn.calls["submit_prompt"] == 2
+    assert vn.sql_cache.hits == 0
+
+
+def test_generate_sql_cache_invalidated_by_training_changes():
+    """train / remove_training_data 改变训练数据后缓存失效，删除不存在的数据不影响缓存"""
+    module = load_vanna_base()
+    vn = make_vanna(module)
+    question = "top customers"
+
+    vn.generate_sql(question)
+    vn.generate_sql(question)
+    assert vn.calls["submit_prompt"] == 1
+
+    training_id = vn.train(question="top customers", sql="SELECT name FROM customers LIMIT 10")
+    assert vn.training_data_version == 1
+    vn.generate_sql(question)
+    assert vn.calls["submit_prompt"] == 2
+    assert vn.calls["get_similar_question_sql"] == 2
+
+    assert vn.remove_training_data("missing-id") is False
+    vn.generate_sql(question)
+    assert vn.calls["submit_prompt"] == 2
+
+    assert vn.remove_training_data(training_id) is True
+    vn.generate_sql(question)
+    assert vn.calls["submit_prompt"] == 3
+    assert vn.training_data_version == 2
+
+
+def test_generate_sql_cache_bypassed_for_intermediate_sql_and_kwargs():
+    """需要中间查询的回复和带额外参数的调用不缓存最终SQL"""
+    module = load_vanna_base()
+    vn = make_vanna(module, llm_response="intermediate_sql\n```sql\nSELECT DISTINCT region FROM sales\n```")
+    vn.generate_sql("sales by region")
+    vn.generate_sql("sales by region")
+    assert vn.calls["submit_prompt"] == 2
+    # 检索结果仍然缓存
+    assert vn.calls["get_related_ddl"] == 1
+
+    vn = make_vanna(module, config={"sql_cache_size": 0})
+    vn.generate_sql("sales by region")
+    vn.generate_sql("sales by region")
+    assert vn.calls["submit_prompt"] == 2
+
+
+def test_generate_sql_cache_skips_sql_built_from_intermediate_results():
+    """依据中间查询结果生成的SQL不缓存，之后不允许查看数据的调用不会拿到它"""
+    module = load_vanna_base()
+    vn = make_vanna(module, llm_response=[
+        "intermediate_sql\n```sql\nSELECT DISTINCT region FROM sales\n```",
+        "```sql\nSELECT SUM(amount) FROM sales WHERE region = 'east'\n```",
+    ])
+    vn.run_sql = lambda sql: module.pd.DataFrame({"region": ["east"]})
+    vn.run_sql_is_set = True
+
+    assert vn.generate_sql("sales in east", allow_llm_to_see_data=True) == \
+        "SELECT SUM(amount) FROM sales WHERE region = 'east'"
+    assert vn.calls["submit_prompt"] == 2
+    assert len(vn.sql_cache) == 0
+
+    # 第三次调用LLM仍返回最终SQL，但不允许查看数据的调用必须重新生成，而不是命中缓存
+    sql = vn.generate_sql("sales in east", allow_llm_to_see_data=False)
+    assert vn.calls["submit_prompt"] == 3
+    assert vn.sql_cache.hits == 0
+    assert sql == "SELECT SUM(amount) FROM sales WHERE region = 'east'"
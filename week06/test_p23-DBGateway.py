@@ -1,11 +1,325 @@
 #!/usr/bin/env python3
 """
-简单测试：验证JSON日志格式
+简单测试：验证JSON日志格式，以及网关校验组件
 """
 
+import asyncio
+import glob
 import json
+import os
+import re
+import threading
+import time
+import importlib.util
 from datetime import datetime
 
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def gateway_audit_log(tmp_path, monkeypatch):
+    """模块导入时创建的全局审计日志写到临时目录，不在仓库中留下日志文件"""
+    monkeypatch.setenv("AUDIT_LOG_FILE", str(tmp_path / "gateway_audit.jsonl"))
+
+
+def load_gateway():
+    """加载 p23-DBGateway.py（文件名含连字符，按路径导入）"""
+    pytest.importorskip("fastapi")
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "p23-DBGateway.py")
+    spec = importlib.util.spec_from_file_location("db_gateway", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# 覆盖干净输入、各类危险/注入模式以及大小写、空白变化的样例
+SAMPLE_QUESTIONS = [
+    "查看客户1的订单",
+    "搜索产品 iPhone",
+    "显示所有订单; DROP TABLE orders",
+    "name' OR 1=1 --",
+    "x' or '1'='1'",
+    "UNION   SELECT password FROM users",
+    "<script>alert(1)</script>",
+    "exec(xp_cmdshell)",
+    "/* hidden */ select 1",
+    "帮我 delete table 日志",
+]
+
+SAMPLE_SQLS = [
+    "SELECT order_id, customer_id FROM orders WHERE customer_id = 1 LIMIT 10",
+    "SELECT * FROM orders LIMIT 10",
+    "DROP TABLE orders",
+    "drop   table\torders",
+    "DELETE FROM orders WHERE 1=1",
+    "UPDATE customers SET email = 'a' WHERE id = 1",
+    "INSERT INTO products VALUES (1, 'x')",
+    "SELECT a FROM t WHERE b = 1 OR c = 2",
+    "SELECT a FROM t\nWHERE b = 1 OR c = 2",
+    "SELECT * FROM employees JOIN salaries ON 1 = 1",
+    "GRANT ALL ON *.* TO x; CREATE USER y; SELECT 1;",
+    "  SELECT name FROM products  ",
+    "SELECT " + "a, " * 400 + "b FROM products",
+]
+
+
+def naive_sanitizer_threats(sanitizer, text):
+    """原始实现：逐条遍历模式列表"""
+    threats = [f"危险SQL关键词: {p}" for p in sanitizer.dangerous_patterns if re.search(p, text)]
+    threats += [f"SQL注入模式: {p}" for p in sanitizer.injection_patterns if re.search(p, text)]
+    return threats
+
+
+def naive_validate(validator, sql):
+    """原始实现：逐条遍历高/中风险模式"""
+    issues, score = [], 0
+    for p in validator.high_risk_patterns:
+        if re.search(p, sql):
+            issues.append(f"高风险操作: {p}")
+            score += 10
+    for p in validator.medium_risk_patterns:
+        if re.search(p, sql):
+            issues.append(f"中风险操作: {p}")
+            score += 5
+    if len(sql) > 1000:
+        issues.append("SQL语句过长")
+        score += 2
+    if sql.count(';') > 1:
+        issues.append("包含多条SQL语句")
+        score += 3
+    return issues, score
+
+
+def test_compiled_rules_match_naive_scan():
+    """预编译规则集的检测结果与逐条扫描完全一致"""
+    gateway = load_gateway()
+    sanitizer, validator = gateway.InputSanitizer(), gateway.SQLValidator()
+    for text in SAMPLE_QUESTIONS + SAMPLE_SQLS:
+        assert sanitizer.sanitize(text)["detected_threats"] == naive_sanitizer_threats(sanitizer, text), text
+    for sql in SAMPLE_SQLS + SAMPLE_QUESTIONS:
+        result = validator.validate(sql)
+        assert (result["issues"], result["score"]) == naive_validate(validator, sql), sql
+
+
+def test_validation_cache_hits_normalized_sql():
+    """只有空白差异的SQL共享同一条缓存结论，且结论与原始实现一致"""
+    gateway = load_gateway()
+    validator, restrictor = gateway.SQLValidator(), gateway.SchemaRestrictor()
+    variants = ["SELECT * FROM orders WHERE a = 1 OR b = 2",
+                "SELECT  *   FROM orders WHERE a = 1 OR b = 2  ",
+                "\tSELECT *\tFROM orders WHERE a = 1 OR b = 2"]
+    for sql in variants:
+        result = validator.validate(sql)
+        assert (result["issues"], result["score"]) == naive_validate(validator, sql)
+        assert restrictor.is_allowed(sql, "viewer") == (True, "访问权限检查通过")
+    assert validator.cache_info().hits == len(variants) - 1
+    assert restrictor.cache_info().hits == len(variants) - 1
+    assert restrictor.is_allowed("SELECT * FROM salaries", "guest")[0] is False
+
+
+def per_sql_us(validate, sqls, repeat=3):
+    """每条SQL的校验耗时（微秒），取多轮中的最小值以减少抖动"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for sql in sqls:
+            validate(sql)
+        best = min(best, (time.perf_counter() - start) / len(sqls) * 1e6)
+    return best
+
+
+def test_validation_cost_flat_with_rule_count():
+    """规则数增加到数百条时，干净SQL的校验耗时与少量规则时相当，且低于逐条扫描"""
+    gateway = load_gateway()
+    few = gateway.SQLValidator()
+    many = gateway.SQLValidator()
+    many.medium_risk_patterns += [rf'(?i)\bforbidden_keyword_{i}\b' for i in range(500)]
+    many.compile()
+    sqls = [f"SELECT name FROM products WHERE id = {i}" for i in range(2000)]
+    assert all(many.validate(sql)["risk_level"] == "low" for sql in sqls[:100])
+
+    # 每次校验前清空结论缓存，测的是规则匹配本身的耗时
+    def uncached(validator):
+        def validate(sql):
+            validator._cached_rule_issues.cache_clear()
+            return validator.validate(sql)
+        return validate
+
+    few_us = per_sql_us(uncached(few), sqls)
+    many_us = per_sql_us(uncached(many), sqls)
+    naive_us = per_sql_us(lambda sql: naive_validate(many, sql), sqls[:200])
+    assert many_us < 3 * few_us
+    assert many_us < naive_us
+
+
+def test_template_skeleton_cache_and_prepared_statements():
+    """同形状问题命中模板缓存，参数绑定执行，结果与渲染SQL一致"""
+    gateway = load_gateway()
+    templater = gateway.SQLTemplater()
+    assert templater.match_template("查看客户12的订单") == ("list_orders", {"customer_id": "1", "limit": "10"})
+    assert templater.match_template("查看客户7的订单")[1]["customer_id"] == "1"
+    assert templater.cache_info().hits == 1
+    # customer_id 不从问题文本中提取，"第3页"不会查询客户3的订单
+    assert templater.match_template("列出我的订单 第3页")[1]["customer_id"] == "1"
+
+    skeleton, values = templater.prepare(*templater.match_template("搜索产品 iPhone"))
+    assert "LIKE ?" in skeleton and "iPhone" not in skeleton
+    assert values == ["%iPhone%", 10]
+
+    result = gateway.template_load_test(num_requests=500)
+    assert result["same_results"]
+    assert result["template_hit_ratio"] > 0.9
+    assert result["prepared_statements"] == 3
+
+
+def test_endpoint_validates_returned_sql(monkeypatch):
+    """放行的模板请求：Schema检查和安全校验针对的正是返回的 safe_sql"""
+    import asyncio
+    gateway = load_gateway()
+    checked = []
+    validate, is_allowed = gateway.validator.validate, gateway.restrictor.is_allowed
+    monkeypatch.setattr(gateway.validator, "validate", lambda sql: checked.append(sql) or validate(sql))
+    monkeypatch.setattr(gateway.restrictor, "is_allowed", lambda sql, role: checked.append(sql) or is_allowed(sql, role))
+
+    request = gateway.SQLRequest(question="搜索产品 iPhone", db_id="shop", user_role="analyst", user_id="u-001")
+    response = asyncio.run(gateway.generate_sql_endpoint(request))
+    assert response.status == "approved"
+    assert "iPhone" in response.safe_sql
+    assert checked == [response.safe_sql, response.safe_sql]
+    gateway.structured_logger.close()
+
+
+def read_audit_ids(log_file):
+    """读取日志文件及全部轮转文件中的 audit_id"""
+    audit_ids = []
+    for path in glob.glob(log_file + "*"):
+        with open(path, encoding="utf-8") as f:
+            audit_ids += [json.loads(line)["audit_id"] for line in f]
+    return audit_ids
+
+
+def test_audit_log_no_loss_on_clean_shutdown(tmp_path):
+    """多线程写入 + 轮转，close() 之后全部审计记录都已落盘"""
+    gateway = load_gateway()
+    log_file = str(tmp_path / "audit.jsonl")
+    audit_logger = gateway.StructuredLogger("test-audit", log_file=log_file, max_queue_size=64, batch_size=16,
+                                            max_bytes=20000, backup_count=1000, overflow_policy="block",
+                                            block_timeout=5, echo=False)
+
+    def produce(worker):
+        for i in range(1000):
+            audit_logger.log_audit({"audit_id": f"AUDIT-{worker}-{i}", "user_id": "u1", "status": "approved"})
+
+    threads = [threading.Thread(target=produce, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    audit_logger.close()
+
+    stats = audit_logger.stats()
+    audit_ids = read_audit_ids(log_file)
+    assert stats["dropped"] == 0 and stats["write_errors"] == 0
+    assert stats["rotations"] > 0
+    assert len(audit_ids) == 4000
+    assert set(audit_ids) == {f"AUDIT-{worker}-{i}" for worker in range(4) for i in range(1000)}
+
+
+def test_audit_log_overflow_does_not_block_requests(tmp_path):
+    """写入线程卡住时，日志调用仍立即返回，溢出条数如实计数"""
+    gateway = load_gateway()
+    log_file = str(tmp_path / "audit.jsonl")
+    audit_logger = gateway.StructuredLogger("test-overflow", log_file=log_file, max_queue_size=10, echo=False)
+    disk_stall = threading.Event()
+    write_batch = audit_logger._write_batch
+    audit_logger._write_batch = lambda records: (disk_stall.wait(), write_batch(records))
+
+    start = time.perf_counter()
+    for i in range(1000):
+        audit_logger.log_audit({"audit_id": f"AUDIT-{i}"})
+    assert time.perf_counter() - start < 1.0
+    assert audit_logger.stats()["dropped"] > 0
+
+    disk_stall.set()
+    audit_logger.close()
+    stats = audit_logger.stats()
+    assert stats["written"] + stats["dropped"] == stats["enqueued"] == 1000
+    assert len(read_audit_ids(log_file)) == stats["written"]
+
+
+def test_audit_log_block_policy_never_waits_on_event_loop(tmp_path):
+    """block 策略在事件循环中不等待空位，直接丢弃计数；普通线程等待时不阻塞其他线程的日志调用"""
+    gateway = load_gateway()
+    log_file = str(tmp_path / "audit.jsonl")
+    audit_logger = gateway.StructuredLogger("test-block", log_file=log_file, max_queue_size=10,
+                                            overflow_policy="block", block_timeout=2, echo=False)
+    disk_stall = threading.Event()
+    write_batch = audit_logger._write_batch
+    audit_logger._write_batch = lambda records: (disk_stall.wait(), write_batch(records))
+
+    async def handle_requests():
+        for i in range(100):
+            audit_logger.log_audit({"audit_id": f"AUDIT-{i}"})
+
+    start = time.perf_counter()
+    asyncio.run(handle_requests())
+    assert time.perf_counter() - start < 1.0
+    dropped = audit_logger.stats()["dropped"]
+    assert dropped > 0
+
+    # 线程等待空位期间，事件循环中的调用仍立即返回
+    waiter = threading.Thread(target=audit_logger.log_audit, args=({"audit_id": "AUDIT-waiter"},))
+    waiter.start()
+    time.sleep(0.1)
+    start = time.perf_counter()
+    asyncio.run(handle_requests())
+    assert time.perf_counter() - start < 1.0
+
+    disk_stall.set()
+    waiter.join()
+    audit_logger.close()
+    stats = audit_logger.stats()
+    audit_ids = read_audit_ids(log_file)
+    assert stats["written"] + stats["dropped"] == stats["enqueued"] == 201
+    assert len(audit_ids) == stats["written"]
+    assert "AUDIT-waiter" in audit_ids
+
+
+def test_audit_log_drop_oldest_under_contention(tmp_path):
+    """drop_oldest：多线程同时溢出时日志调用不抛异常，只有确实挤掉的记录计为丢弃，最新记录保留"""
+    gateway = load_gateway()
+    log_file = str(tmp_path / "audit.jsonl")
+    audit_logger = gateway.StructuredLogger("test-drop-oldest", log_file=log_file, max_queue_size=10,
+                                            overflow_policy="drop_oldest", echo=False)
+    disk_stall = threading.Event()
+    write_batch = audit_logger._write_batch
+    audit_logger._write_batch = lambda records: (disk_stall.wait(), write_batch(records))
+    errors = []
+
+    def produce(worker):
+        try:
+            for i in range(500):
+                audit_logger.log_audit({"audit_id": f"AUDIT-{worker}-{i}"})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=produce, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    audit_logger.log_audit({"audit_id": "AUDIT-last"})
+
+    disk_stall.set()
+    audit_logger.close()
+    stats = audit_logger.stats()
+    audit_ids = read_audit_ids(log_file)
+    assert not errors
+    assert stats["written"] + stats["dropped"] == stats["enqueued"] == 2001
+    assert len(audit_ids) == stats["written"]
+    assert "AUDIT-last" in audit_ids
+
+
 def test_json_log_format():
     """测试JSON日志格式"""
     print("测试JSON日志格式...")
@@ -17,13 +17,13 @@ Date: 2024
 
 import os
 import json
-import pickle
 import uuid
 import atexit
 import logging
 from typing import List, Dict, Any, Optional, Set, Tuple, Union
 from datetime import datetime
-from collections import defaultdict, deque
+from contextlib import contextmanager
+from collections import OrderedDict, defaultdict, deque
 from dataclasses import dataclass, asdict, field
 import networkx as nx
 
@@ -45,9 +45,10 @@ from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 # 存储配置
 STORAGE_CONFIG = {
     'path': "knowledge_graph_storage",
-    'data_file': "graph_data.json",
-    'index_file': "graph_index.pkl",
-    'networkx_file': "networkx_graph.pkl"
+    'data_file': "graph_data.json",       # 快照：压缩时写入的全量数据
+    'log_file': "graph_changes.jsonl",    # 变更日志：每次写操作追加一行
+    'compact_every': 1000,                # 日志累计多少条后，save_data 压缩为新快照
+    'log_fsync': False                    # 每条日志是否 fsync（防断电，代价是每次写入一次磁盘同步）
 }
 
 # 搜索配置
@@ -57,6 +58,12 @@ SEARCH_CONFIG = {
     'max_display': 5
 }
 
+# 用户子图缓存配置：每个用户的子图常驻内存并随写入增量更新
+SUBGRAPH_CACHE_CONFIG = {
+    'max_elements': 500000,   # 全部常驻子图的节点数 + 边数上限，超出时淘汰最久未使用的用户子图
+    'max_users': 64           # 常驻子图的用户数上限
+}
+
 # 日志配置
 logging.basicConfig(
     level=logging.INFO,
@@ -103,6 +110,7 @@ class KnowledgeTriple:
     properties: Dict[str, Any] = field(default_factory=dict)
     confidence: float = 1.0
     timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
     
     def to_tuple(self) -> Tuple[str, str, str]:
         """转换为元组格式"""
@@ -121,14 +129,14 @@ class KnowledgeGraphManager:
         self.storage_path = storage_path
         self._setup_paths()
         self._init_data_structures()
+        self._init_change_log()
         self._initialize_storage()
         
     def _setup_paths(self):
         """设置文件路径"""
         self.paths = {
             'data': os.path.join(self.storage_path, STORAGE_CONFIG['data_file']),
-            'index': os.path.join(self.storage_path, STORAGE_CONFIG['index_file']),
-            'networkx': os.path.join(self.storage_path, STORAGE_CONFIG['networkx_file'])
+            'log': os.path.join(self.storage_path, STORAGE_CONFIG['log_file'])
         }
     
     def _init_data_structures(self):
@@ -136,7 +144,7 @@ class KnowledgeGraphManager:
         # 核心数据
         self.nodes: Dict[str, KnowledgeNode] = {}
         self.relations: Dict[str, KnowledgeRelation] = {}
-        self.triples: List[KnowledgeTriple] = []
+        self.triples: Dict[str, KnowledgeTriple] = {}
         
         # 索引结构 - 使用统一的索引管理
         self.indexes = {
@@ -147,11 +155,42 @@ class KnowledgeGraphManager:
             'user_relations': defaultdict(set)
         }
         
+        # 三元组 SPO 索引：(用户ID, 小写值) -> 三元组ID的有序集合（dict 保持插入顺序）
+        # 用户ID为 None 的键汇总所有用户，供不限定用户的查询使用
+        self.triple_indexes = {
+            'subject': defaultdict(dict),
+            'predicate': defaultdict(dict),
+            'object': defaultdict(dict),
+            'user': defaultdict(dict)
+        }
+        
+        # 邻接表：(用户ID, 节点ID) -> 出边/入边关系ID的有序集合
+        self.adjacency = {
+            'out': defaultdict(dict),
+            'in': defaultdict(dict)
+        }
+        
         # NetworkX 图用于高级查询
         self.nx_graph = nx.MultiDiGraph()
         
+        # 用户子图缓存：用户ID -> 子图，按最近使用排序（LRU），写入时增量更新
+        self.user_graphs: OrderedDict = OrderedDict()
+        self.subgraph_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    def _init_change_log(self):
+        """初始化变更日志状态"""
+        self._log_stream = None      # 追加写的日志文件句柄，第一次写入时才打开
+        self._log_closed = False     # close() 之后不再追加日志
+        self._log_seq = 0            # 最后一条已应用变更的序号，快照中记录它，恢复时跳过已包含的变更
+        self._log_entries = 0        # 当前日志中的条目数，用于判断何时压缩
+        self._log_batch = None       # 非None时正在收集一组原子变更
+        self._snapshot_stale = False  # 日志写入失败或关闭后仍有写入时置为True，下次 save_data 强制压缩
+        
     def _initialize_storage(self) -> None:
-        """初始化存储"""
+        """
+        初始化存储：加载最新快照，再重放快照之后的变更日志
+        只读取不写入（日志末尾损坏时截断除外），仅导入模块不会改动磁盘上的快照和日志
+        """
         try:
             os.makedirs(self.storage_path, exist_ok=True)
             if os.path.exists(self.paths['data']):
@@ -161,6 +200,8 @@ class KnowledgeGraphManager:
         except Exception as e:
             logger.error(f"初始化存储失败: {e}")
             self._create_new_storage()
+        
+        self._replay_log()
     
     def _create_new_storage(self) -> None:
         """创建新的存储"""
@@ -177,14 +218,9 @@ class KnowledgeGraphManager:
             
             # 重建数据结构
             self._rebuild_from_data(data)
+            self._log_seq = data.get('metadata', {}).get('log_seq', 0)
             
-            # 加载索引
-            self._load_indexes()
-            
-            # 加载NetworkX图
-            self._load_networkx_graph()
-            
-            # 重建索引以确保一致性
+            # 索引和NetworkX图都由数据重建
             self._rebuild_indexes()
             
             stats = self._get_stats()
@@ -208,31 +244,162 @@ class KnowledgeGraphManager:
             self.relations[relation.id] = relation
         
         # 重建三元组
-        for triple_data in data.get('triples', []):
+        for position, triple_data in enumerate(data.get('triples', [])):
+            if 'id' not in triple_data:
+                # 旧版本快照中的三元组没有ID：按位置和内容生成确定的ID，快照不变时每次加载ID相同，
+                # 日志可以直接引用，不必在加载时改写快照（下次压缩时写入新格式）
+                key = json.dumps([position, triple_data.get('subject'), triple_data.get('predicate'),
+                                  triple_data.get('object'), triple_data.get('user_id'),
+                                  triple_data.get('timestamp')], ensure_ascii=False)
+                triple_data = {**triple_data, 'id': str(uuid.uuid5(uuid.NAMESPACE_OID, key))}
             triple = KnowledgeTriple(**triple_data)
-            self.triples.append(triple)
-    
-    def _load_indexes(self) -> None:
-        """加载索引"""
-        if os.path.exists(self.paths['index']):
-            with open(self.paths['index'], 'rb') as f:
-                index_data = pickle.load(f)
-                for key, value in index_data.items():
-                    if key in self.indexes:
-                        self.indexes[key] = defaultdict(set, value)
-    
-    def _load_networkx_graph(self) -> None:
-        """加载NetworkX图"""
-        if os.path.exists(self.paths['networkx']):
-            with open(self.paths['networkx'], 'rb') as f:
-                self.nx_graph = pickle.load(f)
+            self.triples[triple.id] = triple
+    
+    # ================================
+    # 变更日志与快照
+    # ================================
+    
+    def _replay_log(self) -> None:
+        """
+        在快照之上重放变更日志
+        - 序号不大于快照 log_seq 的条目已包含在快照中，跳过
+        - 末尾不完整或损坏的行（写入时崩溃）及其之后的内容被截断，之前的变更全部恢复
+        """
+        if not os.path.exists(self.paths['log']):
+            return
+        
+        valid_bytes = 0
+        applied = 0
+        entries = 0
+        with open(self.paths['log'], 'rb') as f:
+            for line_no, raw in enumerate(f, 1):
+                try:
+                    if not raw.endswith(b'\n'):
+                        raise ValueError("行不完整")
+                    entry = json.loads(raw)
+                except ValueError as e:
+                    logger.warning(f"变更日志第 {line_no} 行损坏({e})，丢弃该行及之后的内容")
+                    break
+                valid_bytes += len(raw)
+                entries += 1
+                if entry['seq'] <= self._log_seq:
+                    continue
+                for change in entry['ops']:
+                    self._apply_change(change['op'], change['data'])
+                self._log_seq = entry['seq']
+                applied += 1
+        
+        if valid_bytes < os.path.getsize(self.paths['log']):
+            with open(self.paths['log'], 'r+b') as f:
+                f.truncate(valid_bytes)
+        self._log_entries = entries
+        if applied:
+            stats = self._get_stats()
+            logger.info(f"重放变更日志 {applied} 条: {stats['nodes']} 个节点, {stats['relations']} 个关系, {stats['triples']} 个三元组")
+            print(f" [知识图谱] 从变更日志恢复 {applied} 条变更")
+    
+    def _apply_change(self, op: str, data: Dict[str, Any]) -> None:
+        """重放单个变更；对已存在/已删除的对象不重复操作，重放是幂等的"""
+        if op == 'add_node':
+            if data['id'] not in self.nodes:
+                self._insert_node(KnowledgeNode(**data))
+        elif op == 'add_relation':
+            if data['id'] not in self.relations:
+                self._insert_relation(KnowledgeRelation(**data))
+        elif op == 'add_triple':
+            if data['id'] not in self.triples:
+                self._insert_triple(KnowledgeTriple(**data))
+        elif op == 'remove_node':
+            self._delete_node(data['id'])
+        elif op == 'remove_relation':
+            self._delete_relation(data['id'])
+        elif op == 'remove_triple':
+            self._delete_triple(data['id'])
+        else:
+            logger.warning(f"未知的变更类型: {op}")
+    
+    @contextmanager
+    def _atomic_changes(self):
+        """把一次操作产生的多个变更写成一行日志，崩溃时要么全部恢复、要么全部丢弃"""
+        if self._log_batch is not None:
+            yield
+            return
+        self._log_batch = []
+        try:
+            yield
+        finally:
+            changes, self._log_batch = self._log_batch, None
+            if changes:
+                self._write_log_entry(changes)
+    
+    def _log_change(self, op: str, data: Dict[str, Any]) -> None:
+        """记录一个已应用到内存的变更"""
+        change = {'op': op, 'data': data}
+        if self._log_batch is not None:
+            self._log_batch.append(change)
+        else:
+            self._write_log_entry([change])
+    
+    def _write_log_entry(self, changes: List[Dict[str, Any]]) -> None:
+        """追加一行日志，耗时只与本次变更的大小有关"""
+        if self._log_closed:
+            # 日志已关闭（close 之后的写入），由下次 save_data 写全量快照
+            self._snapshot_stale = True
+            return
+        try:
+            if self._log_stream is None:
+                self._log_stream = open(self.paths['log'], 'a', encoding='utf-8')
+            line = json.dumps({'seq': self._log_seq + 1, 'ops': changes}, ensure_ascii=False)
+            self._log_stream.write(line + '\n')
+            self._log_stream.flush()
+            if STORAGE_CONFIG['log_fsync']:
+                os.fsync(self._log_stream.fileno())
+            self._log_seq += 1
+            self._log_entries += 1
+        except Exception as e:
+            # 内存中的变更已生效，下次 save_data 写全量快照补上
+            self._snapshot_stale = True
+            logger.error(f"写入变更日志失败: {e}")
+    
+    def _write_snapshot(self) -> None:
+        """原子写入全量快照（临时文件 + os.replace），快照记录已包含的最后一条日志序号"""
+        stats = self._get_stats()
+        data = {
+            'nodes': [asdict(node) for node in self.nodes.values()],
+            'relations': [asdict(relation) for relation in self.relations.values()],
+            'triples': [asdict(triple) for triple in self.triples.values()],
+            'metadata': {
+                'version': '2.0',
+                'timestamp': datetime.now().isoformat(),
+                'log_seq': self._log_seq,
+                **stats
+            }
+        }
+        tmp_path = self.paths['data'] + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.paths['data'])
+    
+    def _compact(self) -> None:
+        """压缩：写入新快照后清空变更日志。两步之间崩溃也安全，恢复时按序号跳过已在快照中的日志"""
+        self._write_snapshot()
+        if self._log_stream is not None:
+            self._log_stream.close()
+            self._log_stream = None
+        if os.path.exists(self.paths['log']):
+            open(self.paths['log'], 'w', encoding='utf-8').close()
+        self._log_entries = 0
+        self._snapshot_stale = False
     
     def _rebuild_indexes(self) -> None:
         """重建所有索引"""
         # 清空索引
-        for index in self.indexes.values():
+        for index in (*self.indexes.values(), *self.triple_indexes.values(), *self.adjacency.values()):
             index.clear()
         self.nx_graph.clear()
+        self.user_graphs.clear()
         
         # 重建节点索引
         for node_id, node in self.nodes.items():
@@ -241,6 +408,10 @@ class KnowledgeGraphManager:
         # 重建关系索引
         for relation_id, relation in self.relations.items():
             self._add_relation_to_indexes(relation_id, relation)
+        
+        # 重建三元组索引
+        for triple in self.triples.values():
+            self._add_triple_to_indexes(triple)
     
     def _add_node_to_indexes(self, node_id: str, node: KnowledgeNode) -> None:
         """将节点添加到索引"""
@@ -248,17 +419,91 @@ class KnowledgeGraphManager:
         self.indexes['node_type'][node.type].add(node_id)
         self.indexes['user_nodes'][node.user_id].add(node_id)
         self.nx_graph.add_node(node_id, **asdict(node))
+        
+        user_graph = self.user_graphs.get(node.user_id)
+        if user_graph is not None:
+            user_graph.add_node(node_id)
+            # 节点晚于关系出现时，补上两端都已在子图中的关系
+            for direction in ('out', 'in'):
+                for relation_id in self.adjacency[direction].get((node.user_id, node_id), {}):
+                    self._add_edge_to_user_graph(user_graph, self.relations.get(relation_id))
     
     def _add_relation_to_indexes(self, relation_id: str, relation: KnowledgeRelation) -> None:
         """将关系添加到索引"""
         self.indexes['relation_type'][relation.relation_type].add(relation_id)
         self.indexes['user_relations'][relation.user_id].add(relation_id)
+        self.adjacency['out'][(relation.user_id, relation.source_id)][relation_id] = None
+        self.adjacency['in'][(relation.user_id, relation.target_id)][relation_id] = None
         self.nx_graph.add_edge(
             relation.source_id,
             relation.target_id,
             key=relation_id,
             **asdict(relation)
         )
+        
+        user_graph = self.user_graphs.get(relation.user_id)
+        if user_graph is not None:
+            self._add_edge_to_user_graph(user_graph, relation)
+    
+    @staticmethod
+    def _add_edge_to_user_graph(user_graph: nx.MultiDiGraph, relation: Optional[KnowledgeRelation]) -> None:
+        """关系两端节点都在用户子图中时加入子图（与整体重建的规则一致）"""
+        if relation is not None and relation.source_id in user_graph and relation.target_id in user_graph:
+            user_graph.add_edge(relation.source_id, relation.target_id, key=relation.id,
+                                relation_type=relation.relation_type, weight=relation.weight)
+    
+    @staticmethod
+    def _discard(index: Dict[Any, Any], key: Any, member: Any) -> None:
+        """从索引桶中移除成员，桶为空时删除键，避免删除后索引残留空桶"""
+        bucket = index.get(key)
+        if bucket is None:
+            return
+        if isinstance(bucket, set):
+            bucket.discard(member)
+        else:
+            bucket.pop(member, None)
+        if not bucket:
+            del index[key]
+    
+    def _remove_node_from_indexes(self, node_id: str, node: KnowledgeNode) -> None:
+        """将节点从索引中移除"""
+        self._discard(self.indexes['node_label'], node.label.lower(), node_id)
+        self._discard(self.indexes['node_type'], node.type, node_id)
+        self._discard(self.indexes['user_nodes'], node.user_id, node_id)
+        if self.nx_graph.has_node(node_id):
+            self.nx_graph.remove_node(node_id)
+        user_graph = self.user_graphs.get(node.user_id)
+        if user_graph is not None and user_graph.has_node(node_id):
+            user_graph.remove_node(node_id)
+    
+    def _remove_relation_from_indexes(self, relation_id: str, relation: KnowledgeRelation) -> None:
+        """将关系从索引中移除"""
+        self._discard(self.indexes['relation_type'], relation.relation_type, relation_id)
+        self._discard(self.indexes['user_relations'], relation.user_id, relation_id)
+        self._discard(self.adjacency['out'], (relation.user_id, relation.source_id), relation_id)
+        self._discard(self.adjacency['in'], (relation.user_id, relation.target_id), relation_id)
+        if self.nx_graph.has_edge(relation.source_id, relation.target_id, key=relation_id):
+            self.nx_graph.remove_edge(relation.source_id, relation.target_id, key=relation_id)
+        user_graph = self.user_graphs.get(relation.user_id)
+        if user_graph is not None and user_graph.has_edge(relation.source_id, relation.target_id, key=relation_id):
+            user_graph.remove_edge(relation.source_id, relation.target_id, key=relation_id)
+    
+    def _triple_index_keys(self, triple: KnowledgeTriple):
+        """三元组在 SPO 索引中的全部键：每个字段分别按所属用户和全体用户（None）登记"""
+        for field_name, value in (('subject', triple.subject), ('predicate', triple.predicate), ('object', triple.object)):
+            for scope in (triple.user_id, None):
+                yield field_name, (scope, value.lower())
+        yield 'user', triple.user_id
+    
+    def _add_triple_to_indexes(self, triple: KnowledgeTriple) -> None:
+        """将三元组添加到 SPO 索引"""
+        for index_name, key in self._triple_index_keys(triple):
+            self.triple_indexes[index_name][key][triple.id] = None
+    
+    def _remove_triple_from_indexes(self, triple: KnowledgeTriple) -> None:
+        """将三元组从 SPO 索引中移除"""
+        for index_name, key in self._triple_index_keys(triple):
+            self._discard(self.triple_indexes[index_name], key, triple.id)
     
     def _get_stats(self) -> Dict[str, int]:
         """获取统计信息"""
@@ -268,37 +513,20 @@ class KnowledgeGraphManager:
             'triples': len(self.triples)
         }
     
-    def save_data(self) -> bool:
-        """保存数据到磁盘"""
+    def save_data(self, compact: bool = False) -> bool:
+        """
+        保存数据到磁盘
+        每次写操作已经追加到变更日志，这里只在日志累计到 compact_every 条（或 compact=True）时
+        压缩为新快照，平时的开销与图谱大小无关
+        """
         try:
-            stats = self._get_stats()
-            
-            # 保存主数据
-            data = {
-                'nodes': [asdict(node) for node in self.nodes.values()],
-                'relations': [asdict(relation) for relation in self.relations.values()],
-                'triples': [asdict(triple) for triple in self.triples],
-                'metadata': {
-                    'version': '1.0',
-                    'timestamp': datetime.now().isoformat(),
-                    **stats
-                }
-            }
-            
-            with open(self.paths['data'], 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            # 保存索引
-            index_data = {key: dict(value) for key, value in self.indexes.items()}
-            with open(self.paths['index'], 'wb') as f:
-                pickle.dump(index_data, f)
-            
-            # 保存NetworkX图
-            with open(self.paths['networkx'], 'wb') as f:
-                pickle.dump(self.nx_graph, f)
-            
-            logger.info(f"知识图谱已保存到 {self.storage_path}")
-            print(f" [知识图谱] 数据已保存 ({stats['nodes']} 节点, {stats['relations']} 关系)")
+            if compact or self._snapshot_stale or self._log_entries >= STORAGE_CONFIG['compact_every']:
+                stats = self._get_stats()
+                self._compact()
+                logger.info(f"知识图谱快照已保存到 {self.storage_path}")
+                print(f" [知识图谱] 数据已保存 ({stats['nodes']} 节点, {stats['relations']} 关系)")
+            elif self._log_stream is not None:
+                self._log_stream.flush()
             return True
             
         except Exception as e:
@@ -316,8 +544,8 @@ class KnowledgeGraphManager:
                 user_id=user_id
             )
             
-            self.nodes[node.id] = node
-            self._add_node_to_indexes(node.id, node)
+            self._insert_node(node)
+            self._log_change('add_node', asdict(node))
             
             logger.info(f"添加节点成功: {label} ({node_type})")
             return node.id
@@ -344,8 +572,8 @@ class KnowledgeGraphManager:
                 weight=weight
             )
             
-            self.relations[relation.id] = relation
-            self._add_relation_to_indexes(relation.id, relation)
+            self._insert_relation(relation)
+            self._log_change('add_relation', asdict(relation))
             
             logger.info(f"添加关系成功: {relation_type} ({source_id} -> {target_id})")
             return relation.id
@@ -367,14 +595,17 @@ class KnowledgeGraphManager:
                 confidence=confidence
             )
             
-            self.triples.append(triple)
-            
-            # 自动创建节点和关系
-            subject_id = self._ensure_node_exists(subject, "entity", user_id)
-            object_id = self._ensure_node_exists(obj, "entity", user_id)
-            
-            if subject_id and object_id:
-                self.add_relation(subject_id, object_id, predicate, properties, user_id)
+            # 三元组及自动创建的节点、关系作为一条日志写入
+            with self._atomic_changes():
+                self._insert_triple(triple)
+                self._log_change('add_triple', asdict(triple))
+                
+                # 自动创建节点和关系
+                subject_id = self._ensure_node_exists(subject, "entity", user_id)
+                object_id = self._ensure_node_exists(obj, "entity", user_id)
+                
+                if subject_id and object_id:
+                    self.add_relation(subject_id, object_id, predicate, properties, user_id)
             
             logger.info(f"添加三元组成功: ({subject}, {predicate}, {obj})")
             return True
@@ -388,6 +619,95 @@ class KnowledgeGraphManager:
         existing_nodes = self.search_nodes_by_label(label, user_id)
         return existing_nodes[0].id if existing_nodes else self.add_node(label, node_type, {}, user_id)
     
+    def _insert_node(self, node: KnowledgeNode) -> None:
+        self.nodes[node.id] = node
+        self._add_node_to_indexes(node.id, node)
+    
+    def _insert_relation(self, relation: KnowledgeRelation) -> None:
+        self.relations[relation.id] = relation
+        self._add_relation_to_indexes(relation.id, relation)
+    
+    def _insert_triple(self, triple: KnowledgeTriple) -> None:
+        self.triples[triple.id] = triple
+        self._add_triple_to_indexes(triple)
+    
+    def _delete_node(self, node_id: str) -> Optional[KnowledgeNode]:
+        node = self.nodes.pop(node_id, None)
+        if node is not None:
+            self._remove_node_from_indexes(node_id, node)
+        return node
+    
+    def _delete_relation(self, relation_id: str) -> Optional[KnowledgeRelation]:
+        relation = self.relations.pop(relation_id, None)
+        if relation is not None:
+            self._remove_relation_from_indexes(relation_id, relation)
+        return relation
+    
+    def _delete_triple(self, triple_id: str) -> Optional[KnowledgeTriple]:
+        triple = self.triples.pop(triple_id, None)
+        if triple is not None:
+            self._remove_triple_from_indexes(triple)
+        return triple
+    
+    def remove_relation(self, relation_id: str) -> bool:
+        """删除知识关系"""
+        relation = self._delete_relation(relation_id)
+        if relation is None:
+            return False
+        self._log_change('remove_relation', {'id': relation_id})
+        logger.info(f"删除关系成功: {relation.relation_type} ({relation.source_id} -> {relation.target_id})")
+        return True
+    
+    def remove_node(self, node_id: str) -> bool:
+        """删除知识节点及与其相连的全部关系"""
+        if node_id not in self.nodes:
+            return False
+        
+        with self._atomic_changes():
+            incident_ids = set()
+            if self.nx_graph.has_node(node_id):
+                incident_ids.update(key for _, _, key in self.nx_graph.out_edges(node_id, keys=True))
+                incident_ids.update(key for _, _, key in self.nx_graph.in_edges(node_id, keys=True))
+            for relation_id in incident_ids:
+                self.remove_relation(relation_id)
+            
+            node = self._delete_node(node_id)
+            self._log_change('remove_node', {'id': node_id})
+        logger.info(f"删除节点成功: {node.label} ({node.type})")
+        return True
+    
+    def remove_triple(self, subject: str, predicate: str, obj: str, user_id: str) -> int:
+        """删除匹配的三元组（大小写不敏感）及 add_triple 为其创建的关系，返回删除的三元组数量"""
+        if not (subject and predicate and obj):
+            return 0
+        matched = self.search_triples(subject, predicate, obj, user_id, limit=len(self.triples))
+        with self._atomic_changes():
+            for triple in matched:
+                self._delete_triple(triple.id)
+                self._log_change('remove_triple', {'id': triple.id})
+            
+            # 每个三元组对应一条 主体 --谓词--> 客体 的关系
+            remaining = len(matched)
+            for subject_node in self.search_nodes_by_label(subject, user_id):
+                for relation in self.get_node_relations(subject_node.id, user_id, "out"):
+                    if remaining == 0:
+                        break
+                    target = self.nodes.get(relation.target_id)
+                    if relation.relation_type.lower() == predicate.lower() and target and target.label.lower() == obj.lower():
+                        self.remove_relation(relation.id)
+                        remaining -= 1
+        
+        if matched:
+            logger.info(f"删除三元组成功: ({subject}, {predicate}, {obj}) x{len(matched)}")
+        return len(matched)
+    
+    def close(self) -> None:
+        """刷新并关闭变更日志"""
+        self._log_closed = True
+        if self._log_stream is not None:
+            self._log_stream.close()
+            self._log_stream = None
+    
     # ================================
     # 查询和搜索方法
     # ================================
@@ -423,25 +743,20 @@ class KnowledgeGraphManager:
             return []
     
     def get_node_relations(self, node_id: str, user_id: str, direction: str = "both") -> List[KnowledgeRelation]:
-        """获取节点的所有关系"""
+        """获取节点的所有关系（查邻接表，耗时只与该节点的关系数有关）"""
         try:
-            relations = []
-            user_relation_ids = self.indexes['user_relations'].get(user_id, set())
-            
-            for relation_id in user_relation_ids:
-                if relation_id not in self.relations:
-                    continue
-                    
-                relation = self.relations[relation_id]
-                
-                if direction == "out" and relation.source_id == node_id:
-                    relations.append(relation)
-                elif direction == "in" and relation.target_id == node_id:
-                    relations.append(relation)
-                elif direction == "both" and (relation.source_id == node_id or relation.target_id == node_id):
-                    relations.append(relation)
+            key = (user_id, node_id)
+            if direction == "out":
+                relation_ids = self.adjacency['out'].get(key, {})
+            elif direction == "in":
+                relation_ids = self.adjacency['in'].get(key, {})
+            elif direction == "both":
+                # 自环同时出现在出边和入边中，合并去重
+                relation_ids = {**self.adjacency['out'].get(key, {}), **self.adjacency['in'].get(key, {})}
+            else:
+                return []
             
-            return relations
+            return [self.relations[relation_id] for relation_id in relation_ids if relation_id in self.relations]
             
         except Exception as e:
             logger.error(f"获取节点关系失败: {e}")
@@ -450,7 +765,7 @@ class KnowledgeGraphManager:
     def find_shortest_path(self, source_id: str, target_id: str, user_id: str) -> List[str]:
         """查找两个节点之间的最短路径"""
         try:
-            user_graph = self._create_user_subgraph(user_id)
+            user_graph = self._get_user_subgraph(user_id)
             
             if source_id not in user_graph or target_id not in user_graph:
                 return []
@@ -464,6 +779,31 @@ class KnowledgeGraphManager:
             logger.error(f"查找最短路径失败: {e}")
             return []
     
+    def get_neighborhood(self, node_id: str, user_id: str, radius: int = 2) -> Dict[str, int]:
+        """节点 radius 跳以内的邻居（不区分方向），返回 节点ID -> 跳数，不含节点自身"""
+        try:
+            user_graph = self._get_user_subgraph(user_id)
+            if node_id not in user_graph:
+                return {}
+            
+            hops = {node_id: 0}
+            frontier = [node_id]
+            for hop in range(1, radius + 1):
+                next_frontier = []
+                for current in frontier:
+                    for neighbor in (*user_graph.successors(current), *user_graph.predecessors(current)):
+                        if neighbor not in hops:
+                            hops[neighbor] = hop
+                            next_frontier.append(neighbor)
+                frontier = next_frontier
+            
+            del hops[node_id]
+            return hops
+            
+        except Exception as e:
+            logger.error(f"获取邻居节点失败: {e}")
+            return {}
+    
     def find_paths_with_relation(self, source_id: str, relation_type: str, user_id: str, 
                                max_length: int = SEARCH_CONFIG['max_path_length']) -> List[Tuple[str, str]]:
         """查找通过特定关系类型连接的路径"""
@@ -505,53 +845,55 @@ class KnowledgeGraphManager:
             return []
     
     def search_triples(self, subject: str = None, predicate: str = None, obj: str = None, 
-                      user_id: str = None) -> List[KnowledgeTriple]:
-        """搜索三元组"""
+                      user_id: str = None, limit: int = SEARCH_CONFIG['default_limit']) -> List[KnowledgeTriple]:
+        """
+        搜索三元组（查 SPO 索引）
+        从各条件中命中最少的索引桶出发，逐个检查其余条件，凑够 limit 条即停止；
+        结果按三元组添加顺序排列
+        """
         try:
-            results = []
+            scope = user_id or None
+            buckets = [
+                self.triple_indexes[field_name].get((scope, value.lower()), {})
+                for field_name, value in (('subject', subject), ('predicate', predicate), ('object', obj))
+                if value
+            ]
+            if buckets:
+                buckets.sort(key=len)
+                candidates, others = buckets[0], buckets[1:]
+            else:
+                candidates = self.triple_indexes['user'].get(scope, {}) if scope else self.triples
+                others = []
             
-            for triple in self.triples:
-                # 检查用户ID
-                if user_id and triple.user_id != user_id:
-                    continue
-                
-                # 检查主体、谓词、客体
-                if (subject and triple.subject.lower() != subject.lower()) or \
-                   (predicate and triple.predicate.lower() != predicate.lower()) or \
-                   (obj and triple.object.lower() != obj.lower()):
-                    continue
-                
-                results.append(triple)
+            results = []
+            for triple_id in candidates:
+                if all(triple_id in bucket for bucket in others):
+                    results.append(self.triples[triple_id])
+                    if len(results) >= limit:
+                        break
             
-            return results[:SEARCH_CONFIG['default_limit']]
+            return results
             
         except Exception as e:
             logger.error(f"搜索三元组失败: {e}")
             return []
     
     def _create_user_subgraph(self, user_id: str) -> nx.MultiDiGraph:
-        """创建用户的子图"""
+        """
+        创建用户的子图
+        只保存图结构和边的关系类型、权重，完整数据从 self.nodes / self.relations 获取
+        """
         try:
             user_graph = nx.MultiDiGraph()
             
             # 添加用户的节点
             user_node_ids = self.indexes['user_nodes'].get(user_id, set())
-            for node_id in user_node_ids:
-                if node_id in self.nodes:
-                    user_graph.add_node(node_id, **asdict(self.nodes[node_id]))
+            user_graph.add_nodes_from(node_id for node_id in user_node_ids if node_id in self.nodes)
             
             # 添加用户的关系
             user_relation_ids = self.indexes['user_relations'].get(user_id, set())
             for relation_id in user_relation_ids:
-                if relation_id in self.relations:
-                    relation = self.relations[relation_id]
-                    if relation.source_id in user_graph and relation.target_id in user_graph:
-                        user_graph.add_edge(
-                            relation.source_id,
-                            relation.target_id,
-                            key=relation_id,
-                            **asdict(relation)
-                        )
+                self._add_edge_to_user_graph(user_graph, self.relations.get(relation_id))
             
             return user_graph
             
@@ -559,13 +901,48 @@ class KnowledgeGraphManager:
             logger.error(f"创建用户子图失败: {e}")
             return nx.MultiDiGraph()
     
+    def _user_graph_size(self, user_id: str) -> int:
+        """用户子图的规模估计（节点数 + 关系数），直接取自索引，O(1)"""
+        return len(self.indexes['user_nodes'].get(user_id, ())) + len(self.indexes['user_relations'].get(user_id, ()))
+    
+    def _get_user_subgraph(self, user_id: str) -> nx.MultiDiGraph:
+        """
+        获取常驻的用户子图，未缓存时构建一次
+        返回的是随写入实时更新的子图本身，调用方只读不改；
+        缓存总规模超过 SUBGRAPH_CACHE_CONFIG 上限时淘汰最久未使用的用户子图
+        """
+        user_graph = self.user_graphs.get(user_id)
+        if user_graph is not None:
+            self.user_graphs.move_to_end(user_id)
+            self.subgraph_cache_stats['hits'] += 1
+        else:
+            self.subgraph_cache_stats['misses'] += 1
+            user_graph = self._create_user_subgraph(user_id)
+            if self._user_graph_size(user_id) > SUBGRAPH_CACHE_CONFIG['max_elements']:
+                # 单个子图就超过上限，只用于本次查询，不常驻
+                return user_graph
+            self.user_graphs[user_id] = user_graph
+        
+        # 常驻子图随写入增长，每次访问都检查上限（缓存的用户数有限，求和开销很小）
+        self._evict_user_graphs()
+        return user_graph
+    
+    def _evict_user_graphs(self) -> None:
+        """按最近最少使用淘汰用户子图，直到总规模和用户数都不超过上限；最近使用的子图始终保留"""
+        total = sum(self._user_graph_size(user_id) for user_id in self.user_graphs)
+        while len(self.user_graphs) > 1 and (total > SUBGRAPH_CACHE_CONFIG['max_elements'] or
+                                             len(self.user_graphs) > SUBGRAPH_CACHE_CONFIG['max_users']):
+            evicted_id, _ = self.user_graphs.popitem(last=False)
+            total -= self._user_graph_size(evicted_id)
+            self.subgraph_cache_stats['evictions'] += 1
+    
     def get_stats(self, user_id: str = None) -> Dict[str, Any]:
         """获取统计信息"""
         try:
             if user_id:
                 user_nodes = len(self.indexes['user_nodes'].get(user_id, set()))
                 user_relations = len(self.indexes['user_relations'].get(user_id, set()))
-                user_triples = len([t for t in self.triples if t.user_id == user_id])
+                user_triples = len(self.triple_indexes['user'].get(user_id, {}))
                 
                 return {
                     "user_id": user_id,
@@ -580,6 +957,8 @@ class KnowledgeGraphManager:
                     "total_relations": len(self.relations),
                     "total_triples": len(self.triples),
                     "total_users": len(self.indexes['user_nodes']),
+                    "cached_subgraphs": len(self.user_graphs),
+                    "subgraph_cache": dict(self.subgraph_cache_stats),
                     "storage_path": self.storage_path,
                     "node_types": list(self.indexes['node_type'].keys()),
                     "relation_types": list(self.indexes['relation_type'].keys())
@@ -590,6 +969,208 @@ class KnowledgeGraphManager:
             return {}
 
 
+# ================================
+# 索引基准测试
+# ================================
+
+def _naive_get_node_relations(manager: KnowledgeGraphManager, node_id: str, user_id: str,
+                              direction: str = "both") -> List[KnowledgeRelation]:
+    """原实现：扫描用户的全部关系"""
+    relations = []
+    for relation_id in manager.indexes['user_relations'].get(user_id, set()):
+        relation = manager.relations[relation_id]
+        if direction == "out" and relation.source_id == node_id:
+            relations.append(relation)
+        elif direction == "in" and relation.target_id == node_id:
+            relations.append(relation)
+        elif direction == "both" and (relation.source_id == node_id or relation.target_id == node_id):
+            relations.append(relation)
+    return relations
+
+
+def _naive_search_triples(manager: KnowledgeGraphManager, subject: str = None, predicate: str = None,
+                          obj: str = None, user_id: str = None) -> List[KnowledgeTriple]:
+    """原实现：扫描全部三元组"""
+    results = []
+    for triple in manager.triples.values():
+        if user_id and triple.user_id != user_id:
+            continue
+        if (subject and triple.subject.lower() != subject.lower()) or \
+           (predicate and triple.predicate.lower() != predicate.lower()) or \
+           (obj and triple.object.lower() != obj.lower()):
+            continue
+        results.append(triple)
+    return results[:SEARCH_CONFIG['default_limit']]
+
+
+def benchmark_indexes(sizes: Tuple[int, ...] = (10000, 50000, 120000), num_users: int = 20,
+                      num_queries: int = 100, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    索引查询基准：三元组数量逐步增长到 10 万以上，比较索引查询与原扫描实现的单次耗时，
+    并校验两者结果一致（search_triples 顺序一致，get_node_relations 集合一致）
+    """
+    import random
+    import tempfile
+    import time
+    
+    rng = random.Random(seed)
+    users = [f"bench-user-{i}" for i in range(num_users)]
+    predicates = [f"关系{i}" for i in range(30)]
+    entities_per_user = max(sizes) // num_users // 4
+    manager = KnowledgeGraphManager(storage_path=tempfile.mkdtemp(prefix="kg_bench_"))
+    
+    level = logger.level
+    logger.setLevel(logging.WARNING)  # 批量写入时关闭逐条日志
+    report = []
+    try:
+        for size in sizes:
+            while len(manager.triples) < size:
+                user_id = rng.choice(users)
+                manager.add_triple(f"实体{rng.randrange(entities_per_user)}", rng.choice(predicates),
+                                   f"实体{rng.randrange(entities_per_user)}", {}, user_id)
+            
+            queries = []
+            for _ in range(num_queries):
+                user_id = rng.choice(users)
+                entity = f"实体{rng.randrange(entities_per_user)}"
+                queries.append(("triples", dict(subject=entity, user_id=user_id)))
+                queries.append(("triples", dict(predicate=rng.choice(predicates), obj=entity, user_id=user_id)))
+                queries.append(("triples", dict(subject=entity.upper())))
+                nodes = manager.search_nodes_by_label(entity, user_id)
+                if nodes:
+                    queries.append(("relations", dict(node_id=nodes[0].id, user_id=user_id,
+                                                      direction=rng.choice(["out", "in", "both"]))))
+            
+            timings = {}
+            for name, run in (("indexed", (manager.search_triples, manager.get_node_relations)),
+                              ("naive", (lambda **kw: _naive_search_triples(manager, **kw),
+                                         lambda **kw: _naive_get_node_relations(manager, **kw)))):
+                search, relations = run
+                start = time.perf_counter()
+                results = [search(**kw) if kind == "triples" else relations(**kw) for kind, kw in queries]
+                timings[name] = ((time.perf_counter() - start) / len(queries) * 1e6, results)
+            
+            indexed_results, naive_results = timings["indexed"][1], timings["naive"][1]
+            identical = all(
+                [t.id for t in a] == [t.id for t in b] if kind == "triples" else
+                sorted(r.id for r in a) == sorted(r.id for r in b)
+                for (kind, _), a, b in zip(queries, indexed_results, naive_results)
+            )
+            row = {"triples": len(manager.triples), "queries": len(queries),
+                   "indexed_us": timings["indexed"][0], "naive_us": timings["naive"][0], "identical": identical}
+            report.append(row)
+            print(f" [索引基准] {row['triples']:>7} 三元组: 索引 {row['indexed_us']:8.1f}us/次, "
+                  f"扫描 {row['naive_us']:10.1f}us/次, 结果一致: {identical}")
+    finally:
+        logger.setLevel(level)
+    return report
+
+
+def _naive_shortest_path(manager: KnowledgeGraphManager, source_id: str, target_id: str, user_id: str) -> List[str]:
+    """原实现：每次查询都重新构建用户子图"""
+    user_graph = manager._create_user_subgraph(user_id)
+    if source_id not in user_graph or target_id not in user_graph:
+        return []
+    try:
+        return nx.shortest_path(user_graph, source_id, target_id)
+    except nx.NetworkXNoPath:
+        return []
+
+
+def _same_structure(a: nx.MultiDiGraph, b: nx.MultiDiGraph) -> bool:
+    return set(a.nodes) == set(b.nodes) and set(a.edges(keys=True)) == set(b.edges(keys=True))
+
+
+def benchmark_subgraphs(num_users: int = 10, triples_per_user: int = 5000, num_queries: int = 200,
+                        radius: int = 2, seed: int = 11) -> Dict[str, Any]:
+    """
+    多跳查询基准：比较每次查询都重建用户子图（原实现）与复用常驻子图的最短路径耗时，
+    并统计 radius 跳邻居查询耗时；随机增删后校验常驻子图与重新构建的子图一致，
+    最后在较小的缓存上限下校验淘汰
+    """
+    import random
+    import tempfile
+    import time
+    
+    rng = random.Random(seed)
+    users = [f"bench-user-{i}" for i in range(num_users)]
+    entities = triples_per_user // 2
+    manager = KnowledgeGraphManager(storage_path=tempfile.mkdtemp(prefix="kg_subgraph_bench_"))
+    
+    def random_triple(user_id: str) -> Tuple[str, str, str, Dict[str, Any], str]:
+        return f"实体{rng.randrange(entities)}", f"关系{rng.randrange(20)}", f"实体{rng.randrange(entities)}", {}, user_id
+    
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    max_elements = SUBGRAPH_CACHE_CONFIG['max_elements']
+    try:
+        for user_id in users:
+            for _ in range(triples_per_user):
+                manager.add_triple(*random_triple(user_id))
+        
+        queries = []
+        for _ in range(num_queries):
+            user_id = rng.choice(users)
+            node_ids = list(manager.indexes['user_nodes'][user_id])
+            queries.append((rng.choice(node_ids), rng.choice(node_ids), user_id))
+        
+        start = time.perf_counter()
+        naive_paths = [_naive_shortest_path(manager, *query) for query in queries]
+        naive_us = (time.perf_counter() - start) / len(queries) * 1e6
+        
+        for user_id in users:
+            manager._get_user_subgraph(user_id)  # 预热：子图只在首次查询时构建
+        start = time.perf_counter()
+        cached_paths = [manager.find_shortest_path(*query) for query in queries]
+        cached_us = (time.perf_counter() - start) / len(queries) * 1e6
+        
+        start = time.perf_counter()
+        for source_id, _, user_id in queries:
+            manager.get_neighborhood(source_id, user_id, radius)
+        neighborhood_us = (time.perf_counter() - start) / len(queries) * 1e6
+        
+        # 最短路径可能不唯一，比较长度
+        same_paths = [len(path) for path in naive_paths] == [len(path) for path in cached_paths]
+        print(f" [子图基准] {len(manager.triples)} 三元组 / {num_users} 用户: 重建子图 {naive_us:9.1f}us/次, "
+              f"常驻子图 {cached_us:7.1f}us/次, {radius} 跳邻居 {neighborhood_us:7.1f}us/次, 路径长度一致: {same_paths}")
+        
+        # 随机增删后，常驻子图与重新构建的子图一致
+        for _ in range(2000):
+            user_id = rng.choice(users)
+            operation = rng.random()
+            if operation < 0.6:
+                manager.add_triple(*random_triple(user_id))
+            elif operation < 0.9:
+                subject, predicate, obj, _, _ = random_triple(user_id)
+                manager.remove_triple(subject, predicate, obj, user_id)
+            else:
+                manager.remove_node(rng.choice(list(manager.indexes['user_nodes'][user_id])))
+        incremental_ok = all(_same_structure(manager.user_graphs[user_id], manager._create_user_subgraph(user_id))
+                             for user_id in users)
+        
+        # 缓存上限约为 3 个用户子图的规模
+        SUBGRAPH_CACHE_CONFIG['max_elements'] = manager._user_graph_size(users[0]) * 3
+        for user_id in users:
+            manager.find_shortest_path(*queries[0][:2], user_id)
+        cached_size = sum(manager._user_graph_size(user_id) for user_id in manager.user_graphs)
+        eviction_ok = cached_size <= SUBGRAPH_CACHE_CONFIG['max_elements'] and list(manager.user_graphs)[-1] == users[-1]
+        print(f" [子图基准] 增量更新一致: {incremental_ok}, 上限 {SUBGRAPH_CACHE_CONFIG['max_elements']} 时常驻 "
+              f"{len(manager.user_graphs)} 个子图 (规模 {cached_size}), 淘汰正确: {eviction_ok}, "
+              f"缓存统计: {manager.subgraph_cache_stats}")
+    finally:
+        SUBGRAPH_CACHE_CONFIG['max_elements'] = max_elements
+        logger.setLevel(level)
+    
+    return {
+        'naive_us': naive_us,
+        'cached_us': cached_us,
+        'neighborhood_us': neighborhood_us,
+        'same_paths': same_paths,
+        'incremental_ok': incremental_ok,
+        'eviction_ok': eviction_ok
+    }
+
+
 # ================================
 # 全局实例和配置
 # ================================
@@ -1159,4 +1740,12 @@ atexit.register(knowledge_manager.save_data)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import sys
+    if "--benchmark" in sys.argv:
+        # python p10-KnowledgeTripleMEM.py --benchmark 运行索引查询基准
+        benchmark_indexes()
+    elif "--subgraph-benchmark" in sys.argv:
+        # python p10-KnowledgeTripleMEM.py --subgraph-benchmark 运行常驻用户子图的多跳查询基准
+        benchmark_subgraphs()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+p10-KnowledgeTripleMEM.py 的测试：变更日志 + 快照的崩溃恢复，以及单次写入的持久化开销
+"""
+
+import importlib.util
+import os
+import random
+import shutil
+import time
+from dataclasses import asdict
+
+import pytest
+
+STORAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_graph_storage")
+
+
+@pytest.fixture
+def kg(tmp_path, monkeypatch):
+    """
+    加载 p10-KnowledgeTripleMEM.py（文件名含连字符，按路径导入）
+    模块导入时会在当前目录创建全局 KnowledgeGraphManager 并初始化通义模型，
+    切换到临时目录并设置占位 API Key，避免读写仓库中的存储目录
+    """
+    pytest.importorskip("langgraph")
+    pytest.importorskip("langchain_community")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DASHSCOPE_API_KEY", os.environ.get("DASHSCOPE_API_KEY", "test-key"))
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "p10-KnowledgeTripleMEM.py")
+    spec = importlib.util.spec_from_file_location("knowledge_triple_mem", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.logger.setLevel("WARNING")  # 批量写入时关闭逐条日志
+    return module
+
+
+def graph_state(manager):
+    """图谱的全部数据，三元组保留插入顺序，用于比较恢复前后是否一致"""
+    return {
+        "nodes": {node_id: asdict(node) for node_id, node in manager.nodes.items()},
+        "relations": {relation_id: asdict(relation) for relation_id, relation in manager.relations.items()},
+        "triples": [asdict(triple) for triple in manager.triples.values()],
+    }
+
+
+def random_triple(rng, i):
+    return (f"实体{rng.randrange(200)}", f"关系{rng.randrange(10)}", f"实体{rng.randrange(200)}",
+            {"seq": i}, f"user-{i % 3}")
+
+
+def test_recover_after_crash_with_torn_log_tail(kg, tmp_path):
+    """中途压缩一次，之后不调用 save_data 直接崩溃且日志末尾留下半行：重启后恢复全部已提交的写入"""
+    rng = random.Random(7)
+    manager = kg.KnowledgeGraphManager(storage_path=str(tmp_path / "kg"))
+    for i in range(1000):
+        manager.add_triple(*random_triple(rng, i))
+        if i % 10 == 0:
+            subject, predicate, obj, _, user_id = random_triple(rng, i)
+            manager.remove_triple(subject, predicate, obj, user_id)
+        if i == 500:
+            manager.save_data(compact=True)
+    manager._log_stream.flush()
+    with open(manager.paths["log"], "a", encoding="utf-8") as f:
+        f.write('{"seq": 999999, "ops": [{"op": "add_tri')
+
+    recovered = kg.KnowledgeGraphManager(storage_path=str(tmp_path / "kg"))
+    assert graph_state(recovered) == graph_state(manager)
+    # 损坏的半行被截断，之后的写入接在完整的日志之后
+    recovered.add_triple("苹果", "是", "水果", {}, "user-0")
+    recovered.close()
+    assert graph_state(kg.KnowledgeGraphManager(storage_path=str(tmp_path / "kg"))) == graph_state(recovered)
+
+
+def test_interrupted_compaction_does_not_duplicate(kg, tmp_path):
+    """压缩时快照已写入、日志尚未清空就崩溃：重启后按序号跳过已在快照中的日志，不重复应用"""
+    rng = random.Random(11)
+    manager = kg.KnowledgeGraphManager(storage_path=str(tmp_path / "kg"))
+    for i in range(300):
+        manager.add_triple(*random_triple(rng, i))
+    manager.remove_node(next(iter(manager.nodes)))
+    manager._write_snapshot()
+    manager.close()
+
+    replayed = kg.KnowledgeGraphManager(storage_path=str(tmp_path / "kg"))
+    assert graph_state(replayed) == graph_state(manager)
+    assert len(replayed.search_triples(limit=10000)) == len(manager.triples)
+
+
+def test_load_legacy_snapshot_is_read_only(kg, tmp_path):
+    """加载旧版本快照（三元组没有ID）不改写快照、不创建日志；之后的删除在重启后仍然生效"""
+    storage_path = str(tmp_path / "kg")
+    shutil.copytree(STORAGE_DIR, storage_path, ignore=shutil.ignore_patterns("graph_changes.jsonl*"))
+    data_file = os.path.join(storage_path, kg.STORAGE_CONFIG["data_file"])
+    with open(data_file, "rb") as f:
+        snapshot = f.read()
+
+    manager = kg.KnowledgeGraphManager(storage_path=storage_path)
+    manager.save_data()
+    with open(data_file, "rb") as f:
+        assert f.read() == snapshot
+    assert not os.path.exists(manager.paths["log"])
+
+    triple = next(iter(manager.triples.values()))
+    assert manager.remove_triple(triple.subject, triple.predicate, triple.object, triple.user_id) >= 1
+    manager.close()
+    reloaded = kg.KnowledgeGraphManager(storage_path=storage_path)
+    assert graph_state(reloaded) == graph_state(manager)
+
+
+def test_per_write_cost_independent_of_graph_size(kg, tmp_path, monkeypatch):
+    """单次写入（add_triple + save_data）只追加一行日志，耗时远小于全量快照且不随图谱增大"""
+    monkeypatch.setitem(kg.STORAGE_CONFIG, "compact_every", float("inf"))
+    rng = random.Random(5)
+    manager = kg.KnowledgeGraphManager(storage_path=str(tmp_path / "kg"))
+    rows = []
+    for size in (1000, 10000):
+        while len(manager.triples) < size:
+            manager.add_triple(*random_triple(rng, len(manager.triples)))
+        start = time.perf_counter()
+        for i in range(200):
+            manager.add_triple(*random_triple(rng, size + i))
+            manager.save_data()
+        per_write_ms = (time.perf_counter() - start) / 200 * 1e3
+        start = time.perf_counter()
+        manager._write_snapshot()
+        snapshot_ms = (time.perf_counter() - start) * 1e3
+        rows.append((len(manager.triples), per_write_ms, snapshot_ms))
+        print(f"\n{len(manager.triples)} 三元组: 追加日志 {per_write_ms:.3f}ms/次写入, 全量快照 {snapshot_ms:.1f}ms/次")
+
+    assert os.path.getsize(manager.paths["log"]) > 0
+    assert rows[-1][1] * 10 < rows[-1][2]